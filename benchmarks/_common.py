@@ -0,0 +1,143 @@
+"""
+基准测试公共工具：计时、结果收集、JSON输出和跨提交对比
+"""
+import json
+import os
+import platform
+import statistics
+import subprocess
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+# 生成测试文本用的常用汉字
+CHAR_POOL = "的一是在不了有和人这中大为上个国我以要他时来用们生到作地于出就分对成会可主发年动同工也能下过子说产种面而方后多定行学法所民得经十三之进着等部度家电力里如水化高自二理起小物现实加量都两体制机当使点从业本去把性好应开它合还因由其些然前外天政四日那社义事平形相全表间样与关各重新线内数正心反你明看原又么利比或但质气第向道命此变条只没结解问意建月公无系军很情者最立代想已通并提直题党程展五果料象员革位入常文总次品式活设及管特件长求老头基资边流路级少图山统接知较将组见计别她手角期根论运农指几九区强放决西被干做必战先回则任取据处队南给色光门即保治北造百规热领七海口东导器压志世金增争济阶油思术极交受联什认六共权收证改清己美再采转更单风切打白教速花带安场身车例真务具万每目至达走积示议声报斗完类八离华名确才科张信马节话米整空元况今集温传土许步群广石记需段研界拉林律叫且究观越织装影算低持音众书布复容儿须际商非验连断深难近矿千周委素技备半办青省列习响约支般史感劳便团往酸历市克何除消构府称太准精值号率族维划选标写存候毛亲快效斯院查江型眼王按格养易置派层片始却专状育厂京识适属圆包火住调满县局照参红细引听该铁价严龙飞"
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """计算已排序数据的百分位数（最近秩法）"""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(pct / 100 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def summarize(samples_ns: List[float], number: int = 1) -> Dict[str, float]:
+    """把纳秒采样汇总为每次操作的微秒统计"""
+    per_op_us = sorted(s / number / 1000 for s in samples_ns)
+    median = statistics.median(per_op_us)
+    return {
+        "min_us": per_op_us[0],
+        "median_us": median,
+        "mean_us": statistics.fmean(per_op_us),
+        "p95_us": percentile(per_op_us, 95),
+        "ops_per_sec": 1_000_000 / median if median else 0.0,
+        "samples": len(per_op_us),
+    }
+
+
+def measure(fn: Callable[[], Any], repeat: int = 7, number: int = 100,
+            setup: Optional[Callable[[], Any]] = None) -> Dict[str, float]:
+    """多轮执行fn，返回每次操作的耗时统计"""
+    samples = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter_ns()
+        for _ in range(number):
+            fn()
+        samples.append(time.perf_counter_ns() - start)
+    return summarize(samples, number)
+
+
+def _git_commit() -> Optional[str]:
+    """获取当前提交号，不在git仓库中时返回None"""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True, timeout=5
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+class BenchmarkReport:
+    """基准测试结果集合"""
+
+    def __init__(self, suite: str):
+        self.suite = suite
+        self.results: List[Dict[str, Any]] = []
+
+    def add(self, name: str, params: Dict[str, Any], metrics: Dict[str, Any]):
+        """记录一条结果并打印到控制台"""
+        self.results.append({"name": name, "params": params, "metrics": metrics})
+        param_str = ", ".join(f"{k}={v}" for k, v in params.items())
+        metric_str = ", ".join(
+            f"{k}={v:.2f}" if isinstance(v, float) else f"{k}={v}"
+            for k, v in metrics.items()
+        )
+        print(f"{name}[{param_str}]: {metric_str}")
+
+    def to_dict(self) -> Dict[str, Any]:
+        """转换为字典"""
+        return {
+            "suite": self.suite,
+            "commit": _git_commit(),
+            "created_at": datetime.now().isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "results": self.results,
+        }
+
+    def write(self, path: str, data: Optional[Dict[str, Any]] = None):
+        """写入机器可读的JSON结果"""
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(data or self.to_dict(), f, ensure_ascii=False, indent=2)
+        print(f"结果已写入 {path}")
+
+
+def _result_key(result: Dict[str, Any]) -> str:
+    params = ",".join(f"{k}={v}" for k, v in sorted(result["params"].items()))
+    return f"{result['name']}[{params}]"
+
+
+def compare(baseline_path: str, current: Dict[str, Any],
+            metric_names: tuple = ("median_us", "bytes_per_session", "chunks_per_sec")) -> List[Dict[str, Any]]:
+    """与基线结果对比，打印并返回同名结果的指标变化比例"""
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+
+    baseline_results = {_result_key(r): r for r in baseline.get("results", [])}
+    rows = []
+    print(f"\n对比基线 {baseline.get('commit')} -> {current.get('commit')}")
+    for result in current["results"]:
+        key = _result_key(result)
+        old = baseline_results.get(key)
+        if not old:
+            continue
+        for metric in metric_names:
+            if metric in result["metrics"] and metric in old["metrics"] and old["metrics"][metric]:
+                ratio = result["metrics"][metric] / old["metrics"][metric]
+                rows.append({"key": key, "metric": metric, "baseline": old["metrics"][metric],
+                             "current": result["metrics"][metric], "ratio": ratio})
+                print(f"  {key} {metric}: {old['metrics'][metric]:.2f} -> "
+                      f"{result['metrics'][metric]:.2f} (x{ratio:.2f})")
+    return rows
+
+
+def add_common_arguments(parser):
+    """添加所有基准脚本通用的命令行参数"""
+    parser.add_argument("--output", "-o", help="把结果写入JSON文件")
+    parser.add_argument("--compare", help="与之前输出的JSON结果对比")
+    parser.add_argument("--quick", action="store_true", help="使用较小的规模快速运行")
+
+
+def finish(report: BenchmarkReport, args) -> Dict[str, Any]:
+    """输出结果并按需与基线对比"""
+    data = report.to_dict()
+    if args.output:
+        report.write(args.output, data)
+    if args.compare:
+        compare(args.compare, data)
+    return data
@@ -0,0 +1,127 @@
+"""
+冷会话历史压缩基准测试：常驻内存、压缩耗时和解压延迟
+
+测试文本有两种：zipf从随机生成的词表中按齐普夫分布取词，接近真实对话的用词重复程度；
+random从常用汉字中均匀随机取字，几乎没有重复，是压缩效果的下限。
+
+用法（在仓库根目录）：
+    python -m benchmarks.bench_history_compaction -o history_compaction.json
+    python -m benchmarks.bench_history_compaction --sessions 2000 --messages 200 --corpus zipf
+"""
+import argparse
+import gc
+import itertools
+import random
+import time
+import tracemalloc
+from datetime import datetime
+from typing import List
+
+from ai_chat_lib.chat_interface import ChatSession
+from ai_chat_lib.history_compaction import HistoryCompactor
+from ai_chat_lib.models.message import Message, MessageRole
+
+from ._common import CHAR_POOL, BenchmarkReport, add_common_arguments, finish, measure
+
+CORPORA = ["zipf", "random"]
+
+
+class TextGenerator:
+    """生成测试消息，同一个种子生成的文本相同"""
+
+    def __init__(self, corpus: str, seed: int = 0, vocabulary_size: int = 5000):
+        self.corpus = corpus
+        self.rng = random.Random(seed)
+        if corpus == "zipf":
+            # 1到4个字的词，第k常用的词出现的概率与1/k成正比
+            self.words = ["".join(self.rng.choices(CHAR_POOL, k=self.rng.choice((1, 2, 2, 2, 3, 4))))
+                          for _ in range(vocabulary_size)]
+            self.cum_weights = list(itertools.accumulate(1 / rank for rank in range(1, vocabulary_size + 1)))
+
+    def message(self) -> str:
+        length = self.rng.randint(20, 120)
+        if self.corpus == "random":
+            return "".join(self.rng.choices(CHAR_POOL, k=length))
+        words = self.rng.choices(self.words, cum_weights=self.cum_weights, k=length // 2)
+        # 每句5到15个词
+        sentences, start = [], 0
+        while start < len(words):
+            end = start + self.rng.randint(5, 15)
+            sentences.append("".join(words[start:end]))
+            start = end
+        return "，".join(sentences) + "。"
+
+
+def make_sessions(count: int, messages: int, corpus: str = "zipf"):
+    generator = TextGenerator(corpus)
+    sessions = []
+    for s in range(count):
+        session = ChatSession(session_id=f"s{s}")
+        for i in range(messages):
+            session.chat_history.append(Message(
+                MessageRole.USER if i % 2 == 0 else MessageRole.ASSISTANT, generator.message(),
+                timestamp=datetime.now()
+            ))
+        sessions.append(session)
+    return sessions
+
+
+def traced_size() -> int:
+    gc.collect()
+    return tracemalloc.get_traced_memory()[0]
+
+
+def bench_codec(report: BenchmarkReport, codec: str, corpus: str, sessions: int, messages: int, quick: bool):
+    compactor = HistoryCompactor(idle_seconds=0, codec=codec)
+    # 压缩前后在同一次跟踪中测量，释放的消息对象才会被扣除
+    tracemalloc.start()
+    baseline = traced_size()
+    data = make_sessions(sessions, messages, corpus)
+    hot_bytes = traced_size() - baseline
+    start = time.perf_counter()
+    compactor.compact(data)
+    pack_seconds = time.perf_counter() - start
+    cold_bytes = traced_size() - baseline
+    tracemalloc.stop()
+    report.add("compact", {"codec": codec, "corpus": corpus, "sessions": sessions, "messages": messages}, {
+        "hot_mb": hot_bytes / 1024 / 1024,
+        "cold_mb": cold_bytes / 1024 / 1024,
+        "reduction": hot_bytes / cold_bytes,
+        "compressed_mb": sum(len(s.packed_history.blob) for s in data) / 1024 / 1024,
+        "pack_us_per_session": pack_seconds / sessions * 1_000_000,
+    })
+
+    packed = data[0].packed_history
+    metrics = measure(packed.unpack, repeat=3 if quick else 7, number=20)
+    report.add("inflate", {"codec": codec, "corpus": corpus, "messages": messages}, metrics)
+
+
+def run(quick: bool = False, sessions: int = None, messages: int = 100,
+        corpora: List[str] = None) -> BenchmarkReport:
+    report = BenchmarkReport("history_compaction")
+    sessions = sessions or (200 if quick else 1000)
+    codecs = ["zlib"]
+    try:
+        import zstandard  # noqa: F401
+        codecs.append("zstd")
+    except ImportError:
+        pass
+    for corpus in corpora or CORPORA:
+        for codec in codecs:
+            bench_codec(report, codec, corpus, sessions, messages, quick)
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="冷会话历史压缩基准测试")
+    add_common_arguments(parser)
+    parser.add_argument("--sessions", type=int, help="会话数（默认1000，--quick时200）")
+    parser.add_argument("--messages", type=int, default=100, help="每个会话的消息数")
+    parser.add_argument("--corpus", choices=CORPORA, action="append",
+                        help="测试文本，可重复指定（默认全部）")
+    args = parser.parse_args(argv)
+    return finish(run(args.quick, args.sessions, args.messages, args.corpus), args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,271 @@
+"""
+聊天热路径基准测试（离线运行，使用FakeAIProvider）
+
+用法（在仓库根目录）：
+    python -m benchmarks.bench_hot_paths -o bench.json
+    python -m benchmarks.bench_hot_paths --compare bench.json
+"""
+import argparse
+import asyncio
+import gc
+import os
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from ai_chat_lib.chat_interface import MultiSessionChatInterface
+from ai_chat_lib.data_adapter import DataAdapter
+from ai_chat_lib.models.character import Character, ExampleDialog
+from ai_chat_lib.models.message import Message, MessageRole
+from ai_chat_lib.metrics import ChatMetrics
+from ai_chat_lib.prompt_manager import PromptManager
+from ai_chat_lib.providers.fake_provider import FakeAIProvider
+from ai_chat_lib.streaming import ChunkCoalescer
+
+from ._common import BenchmarkReport, add_common_arguments, finish, measure, summarize
+
+USER_TEXT = "你好{{character}}，我是{{user}}，今天想和你聊聊最近读的一本书，书名叫《三体》。"
+ASSISTANT_TEXT = "好呀{{user}}！《三体》是刘慈欣的科幻作品，讲述了人类文明与三体文明之间的故事，你最喜欢哪一部分？"
+
+
+def make_character() -> Character:
+    """构造基准测试用的角色"""
+    return Character(
+        name="基准助手",
+        description="用于基准测试的角色",
+        system_prompt="你是{{character}}，一个友善的助手，正在和{{user}}聊天。" * 10,
+        example_dialogs=[ExampleDialog("你好", "你好，{{user}}！")],
+        metadata={"category": "助手", "language": "zh-CN"},
+    )
+
+
+def make_history(length: int) -> List[Message]:
+    """构造指定长度的交替聊天历史"""
+    now = datetime.now()
+    return [
+        Message(role=MessageRole.USER if i % 2 == 0 else MessageRole.ASSISTANT,
+                content=USER_TEXT if i % 2 == 0 else ASSISTANT_TEXT,
+                timestamp=now)
+        for i in range(length)
+    ]
+
+
+def make_interface(history_length: int = 0, provider=None) -> MultiSessionChatInterface:
+    """构造一个带有角色、提供商和历史的单会话接口"""
+    chat = MultiSessionChatInterface()
+    session_id = chat.create_session("bench")
+    session = chat.get_session(session_id)
+    session.character = make_character()
+    session.provider = provider or FakeAIProvider()
+    session.chat_history.extend(make_history(history_length))
+    return chat
+
+
+def bench_prepare_chat(report: BenchmarkReport, lengths: List[int]):
+    """prepare_chat 延迟随历史长度的变化"""
+    for length in lengths:
+        chat = make_interface(length)
+        session = chat.get_session("bench")
+
+        def run():
+            chat.prepare_chat("今天天气怎么样，{{character}}？", "小明", "bench")
+            session.chat_history.pop()
+
+        report.add("prepare_chat", {"history": length}, measure(run, repeat=7, number=200))
+
+
+def bench_render_prompt(report: BenchmarkReport):
+    """render_prompt 吞吐量"""
+    manager = PromptManager()
+    manager.set_variable("mood", "开心")
+    character = make_character()
+    short = "你好{{character}}，我是{{user}}，心情{{mood}}。"
+    long = character.system_prompt * 5
+
+    report.add("render_prompt", {"template": "short"},
+               measure(lambda: manager.render_prompt(short, character, "小明"), number=2000))
+    report.add("render_prompt", {"template": "long"},
+               measure(lambda: manager.render_prompt(long, character, "小明"), number=500))
+
+
+def _optional_provider_converters() -> Dict[str, Any]:
+    """返回可用的提供商消息转换函数，缺少SDK时跳过"""
+    converters = {}
+    try:
+        from ai_chat_lib.providers.openai_base_provider import OpenAIBaseProvider
+        openai_provider = OpenAIBaseProvider(api_key="bench", model="bench")
+        converters["openai_provider"] = openai_provider._convert_messages_to_openai_format
+    except ImportError as e:
+        print(f"跳过OpenAI转换基准: {e}")
+    try:
+        from ai_chat_lib.providers.google_provider import GoogleAIProvider
+        google_provider = GoogleAIProvider(api_key="bench")
+        converters["google_provider"] = google_provider._convert_messages_to_google_format
+    except ImportError as e:
+        print(f"跳过Google转换基准: {e}")
+    return converters
+
+
+def bench_message_conversion(report: BenchmarkReport, lengths: List[int]):
+    """消息格式转换开销"""
+    adapter = DataAdapter()
+    character = make_character()
+    converters = _optional_provider_converters()
+
+    for length in lengths:
+        history = make_history(length)
+        number = max(1, 20000 // max(length, 1))
+        report.add("format_messages", {"adapter": "openai", "history": length},
+                   measure(lambda: adapter.format_for_provider("openai", history, character), number=number))
+        for name, convert in converters.items():
+            report.add("format_messages", {"adapter": name, "history": length},
+                       measure(lambda: convert(character.system_prompt, history), number=number))
+
+
+def bench_chat_stream(report: BenchmarkReport, reply_chars: int, chunk_sizes: List[int]):
+    """chat_stream 分片吞吐量，以及开启片段合并后的输出片段数、开启指标后的开销"""
+    variants = [
+        ("none", None, False),
+        ("coalesce", ChunkCoalescer(max_chars=64, max_delay=0.05), False),
+        ("none", None, True),
+    ]
+    for chunk_size in chunk_sizes:
+        for coalesce_name, coalescer, with_metrics in variants:
+            provider = FakeAIProvider(reply_chars=reply_chars, chunk_size=chunk_size)
+            chat = make_interface(0, provider)
+            if with_metrics:
+                ChatMetrics().bind(chat)
+            session = chat.get_session("bench")
+
+            async def run_once() -> int:
+                count = 0
+                async for _ in chat.chat_stream("你好", "小明", "bench", coalesce=coalescer or False):
+                    count += 1
+                # 保持历史长度不变，避免测量被历史增长干扰
+                del session.chat_history[-2:]
+                return count
+
+            async def run_all(rounds: int) -> List[float]:
+                samples = []
+                for _ in range(rounds):
+                    start = time.perf_counter_ns()
+                    chunks = await run_once()
+                    samples.append((time.perf_counter_ns() - start, chunks))
+                return samples
+
+            samples = asyncio.run(run_all(30))
+            stats = summarize([s[0] for s in samples])
+            chunks = samples[0][1]
+            stats["chunks"] = chunks
+            stats["chunks_per_sec"] = chunks / (stats["median_us"] / 1_000_000) if stats["median_us"] else 0.0
+            params = {"reply_chars": reply_chars, "chunk_size": chunk_size}
+            if coalescer is not None:
+                params["coalesce"] = coalesce_name
+                stats["coalesce_ratio"] = coalescer.stats.coalesce_ratio
+            if with_metrics:
+                params["metrics"] = True
+            report.add("chat_stream", params, stats)
+
+
+def bench_session_memory(report: BenchmarkReport, sessions: int, history_length: int):
+    """每个会话的内存占用"""
+    character = make_character()
+    provider = FakeAIProvider()
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+
+    chat = MultiSessionChatInterface()
+    for i in range(sessions):
+        session_id = chat.create_session(f"s{i}")
+        session = chat.get_session(session_id)
+        session.character = character
+        session.provider = provider
+        session.chat_history.extend(make_history(history_length))
+
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    report.add("session_memory", {"sessions": sessions, "history": history_length},
+               {"bytes_per_session": (after - before) / sessions, "total_bytes": after - before})
+
+
+def bench_list_sessions(report: BenchmarkReport, counts: List[int]):
+    """list_sessions 在大量会话下的耗时"""
+    character = make_character()
+    provider = FakeAIProvider()
+    for count in counts:
+        chat = MultiSessionChatInterface()
+        for i in range(count):
+            session_id = chat.create_session(f"s{i}")
+            session = chat.get_session(session_id)
+            session.character = character
+            session.provider = provider
+        report.add("list_sessions", {"sessions": count}, measure(chat.list_sessions, repeat=5, number=1))
+
+
+def bench_export_sessions(report: BenchmarkReport, counts: List[int], history_length: int = 20):
+    """会话导出/导入的耗时和导出时的峰值内存（应与会话数量无关）"""
+    character = make_character()
+    for count in counts:
+        chat = MultiSessionChatInterface()
+        for i in range(count):
+            session = chat.get_session(chat.create_session(f"s{i}"))
+            session.character = character
+            session.chat_history.extend(make_history(history_length))
+
+        directory = tempfile.mkdtemp(prefix="bench_export_")
+        path = os.path.join(directory, "sessions.jsonl.gz")
+        try:
+            gc.collect()
+            tracemalloc.start()
+            start = time.perf_counter_ns()
+            chat.export_sessions(path)
+            export_ns = time.perf_counter_ns() - start
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            report.add("export_sessions", {"sessions": count, "history": history_length}, {
+                "us_per_session": export_ns / 1000 / count,
+                "peak_bytes": peak,
+                "file_bytes": os.path.getsize(path),
+            })
+
+            start = time.perf_counter_ns()
+            MultiSessionChatInterface().import_sessions(path)
+            report.add("import_sessions", {"sessions": count, "history": history_length},
+                       {"us_per_session": (time.perf_counter_ns() - start) / 1000 / count})
+        finally:
+            os.remove(path)
+            os.rmdir(directory)
+
+
+def run(quick: bool = False, only: Optional[List[str]] = None) -> BenchmarkReport:
+    """运行全部或指定的基准测试"""
+    report = BenchmarkReport("hot_paths")
+    benches = {
+        "prepare_chat": lambda: bench_prepare_chat(report, [10, 100] if quick else [10, 100, 1000, 10000]),
+        "render_prompt": lambda: bench_render_prompt(report),
+        "conversion": lambda: bench_message_conversion(report, [10] if quick else [10, 100, 1000]),
+        "chat_stream": lambda: bench_chat_stream(report, 2000 if quick else 20000, [1, 16]),
+        "session_memory": lambda: bench_session_memory(report, 100 if quick else 1000, 20),
+        "list_sessions": lambda: bench_list_sessions(report, [1000] if quick else [10000, 100000]),
+        "export_sessions": lambda: bench_export_sessions(report, [100, 1000] if quick else [1000, 10000]),
+    }
+    for name, bench in benches.items():
+        if not only or name in only:
+            bench()
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="聊天热路径基准测试")
+    add_common_arguments(parser)
+    parser.add_argument("--only", nargs="*", help="只运行指定的基准（如 prepare_chat list_sessions）")
+    args = parser.parse_args(argv)
+    return finish(run(args.quick, args.only), args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+导入耗时基准：每个样本在新的解释器中导入一次，同时检查是否意外导入了SDK
+
+用法（在仓库根目录）：
+    python -m benchmarks.bench_import -o import.json
+    python -m benchmarks.bench_import --max-ms 150   # 超过阈值或导入了SDK时以非零状态退出
+"""
+import argparse
+import json
+import subprocess
+import sys
+from typing import Dict, List
+
+from ._common import BenchmarkReport, add_common_arguments, finish, summarize
+
+# 这些语句都不应该导入任何SDK
+TARGETS = {
+    "package": "import ai_chat_lib",
+    "chat_interface": "from ai_chat_lib import ChatInterface",
+    "registry": "from ai_chat_lib.providers.registry import create_provider",
+    "deepseek_provider": "from ai_chat_lib import DeepSeekProvider; DeepSeekProvider('key')",
+    "google_provider": "from ai_chat_lib import GoogleAIProvider; GoogleAIProvider('key')",
+}
+HEAVY_MODULES = ("openai", "google.genai", "httpx")
+
+_PROBE = """
+import sys, time, json
+start = time.perf_counter_ns()
+{statement}
+elapsed = time.perf_counter_ns() - start
+print(json.dumps({{"ns": elapsed, "heavy": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def measure_import(statement: str, rounds: int) -> Dict:
+    """在新解释器中执行导入语句，返回耗时统计和被导入的重型模块"""
+    samples: List[int] = []
+    heavy = set()
+    for _ in range(rounds):
+        result = subprocess.run(
+            [sys.executable, "-c", _PROBE.format(statement=statement, heavy=HEAVY_MODULES)],
+            capture_output=True, text=True, check=True,
+        )
+        data = json.loads(result.stdout.strip().splitlines()[-1])
+        samples.append(data["ns"])
+        heavy.update(data["heavy"])
+    metrics = summarize(samples)
+    metrics["median_ms"] = metrics["median_us"] / 1000
+    metrics["heavy_modules"] = sorted(heavy)
+    return metrics
+
+
+def run(quick: bool = False) -> BenchmarkReport:
+    report = BenchmarkReport("import")
+    rounds = 3 if quick else 10
+    for name, statement in TARGETS.items():
+        report.add("import_time", {"target": name}, measure_import(statement, rounds))
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="导入耗时基准测试")
+    add_common_arguments(parser)
+    parser.add_argument("--max-ms", type=float, help="任一目标的中位导入耗时超过该值时失败")
+    args = parser.parse_args(argv)
+    data = finish(run(args.quick), args)
+
+    failures = []
+    for result in data["results"]:
+        target = result["params"]["target"]
+        metrics = result["metrics"]
+        if metrics["heavy_modules"]:
+            failures.append(f"{target} 导入了 {', '.join(metrics['heavy_modules'])}")
+        if args.max_ms is not None and metrics["median_ms"] > args.max_ms:
+            failures.append(f"{target} 导入耗时 {metrics['median_ms']:.1f}ms 超过 {args.max_ms}ms")
+    for failure in failures:
+        print(f"回归: {failure}")
+    if failures:
+        sys.exit(1)
+    return data
+
+
+if __name__ == "__main__":
+    main()
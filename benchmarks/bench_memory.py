@@ -0,0 +1,75 @@
+"""
+长期记忆基准测试：向量索引的构建和查询延迟、文本向量化吞吐
+
+用法（在仓库根目录，需要NumPy）：
+    python -m benchmarks.bench_memory -o memory.json
+    python -m benchmarks.bench_memory --vectors 1000000 --dim 256
+"""
+import argparse
+import time
+
+import numpy as np
+
+from ai_chat_lib.memory import HashingEmbedder, VectorIndex
+
+from ._common import BenchmarkReport, add_common_arguments, finish, measure
+
+
+def random_unit_vectors(rng, count: int, dim: int) -> np.ndarray:
+    vectors = rng.standard_normal((count, dim), dtype=np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors
+
+
+def bench_index(report: BenchmarkReport, vectors: int, dim: int, quick: bool):
+    rng = np.random.default_rng(0)
+    batch = 10_000
+    # 按批次增量追加，与会话中记忆逐步增长的情况一致（数据提前生成，不计入构建时间）
+    data = random_unit_vectors(rng, vectors, dim)
+    index = VectorIndex(dim)
+    start = time.perf_counter()
+    for offset in range(0, vectors, batch):
+        index.add(data[offset:offset + batch])
+    elapsed = time.perf_counter() - start
+    report.add("index_build", {"vectors": vectors, "dim": dim, "batch": batch}, {
+        "seconds": elapsed,
+        "vectors_per_sec": vectors / elapsed,
+        "mb": index.vectors.nbytes / 1024 / 1024,
+    })
+    del data
+
+    for queries in (1, 32):
+        query = random_unit_vectors(rng, queries, dim)
+        metrics = measure(lambda: index.search(query, k=10), repeat=3 if quick else 7, number=1)
+        metrics["queries_per_sec"] = queries * metrics["ops_per_sec"]
+        report.add("index_search", {"vectors": vectors, "dim": dim, "queries": queries, "k": 10}, metrics)
+
+
+def bench_embed(report: BenchmarkReport, dim: int, quick: bool):
+    embedder = HashingEmbedder(dim=dim)
+    texts = [f"第{i}条消息：今天我们讨论了项目进度和下周的计划，记得提醒小王准备周报 number {i}"
+             for i in range(256)]
+    metrics = measure(lambda: embedder.embed(texts), repeat=3 if quick else 7, number=1)
+    metrics["texts_per_sec"] = len(texts) * metrics["ops_per_sec"]
+    report.add("hashing_embed", {"texts": len(texts), "dim": dim}, metrics)
+
+
+def run(quick: bool = False, vectors: int = None, dim: int = 128) -> BenchmarkReport:
+    report = BenchmarkReport("memory")
+    vectors = vectors or (100_000 if quick else 1_000_000)
+    bench_index(report, vectors, dim, quick)
+    bench_embed(report, dim, quick)
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="长期记忆基准测试")
+    add_common_arguments(parser)
+    parser.add_argument("--vectors", type=int, help="索引中的向量数（默认100万，--quick时10万）")
+    parser.add_argument("--dim", type=int, default=128, help="向量维度")
+    args = parser.parse_args(argv)
+    return finish(run(args.quick, args.vectors, args.dim), args)
+
+
+if __name__ == "__main__":
+    main()
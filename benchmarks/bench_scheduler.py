@@ -0,0 +1,100 @@
+"""
+调度器基准测试：批量流式请求占满提供商并发时，交互请求的首字延迟
+
+用法（在仓库根目录）：
+    python -m benchmarks.bench_scheduler -o scheduler.json
+"""
+import argparse
+import asyncio
+import time
+from typing import List
+
+from ai_chat_lib.character_manager import CharacterManager
+from ai_chat_lib.chat_interface import MultiSessionChatInterface
+from ai_chat_lib.models.character import Character
+from ai_chat_lib.providers.fake_provider import FakeAIProvider
+from ai_chat_lib.scheduler import FairShareScheduler, Priority
+
+from ._common import BenchmarkReport, add_common_arguments, finish, percentile
+
+
+def make_interface(limit: int, batch_sessions: int, interactive_sessions: int) -> MultiSessionChatInterface:
+    chat = MultiSessionChatInterface(character_manager=CharacterManager())
+    chat.scheduler = FairShareScheduler(default_limit=limit, interactive_reserve=max(1, limit // 4))
+    provider = FakeAIProvider(reply_chars=200, chunk_size=4, first_token_delay=0.02, chunk_delay=0.002)
+    character = Character(name="助手", description="基准测试", system_prompt="你是{{character}}",
+                          example_dialogs=[])
+    for i in range(batch_sessions + interactive_sessions):
+        session = chat.get_session(chat.create_session(f"s{i}"))
+        session.character = character
+        session.provider = provider
+        session.tenant = "bulk" if i < batch_sessions else f"user{i}"
+    return chat
+
+
+async def run_scenario(limit: int, batch_sessions: int, interactive_turns: int,
+                       prioritized: bool) -> dict:
+    """prioritized为False时所有请求按同一优先级排队（相当于普通的信号量）"""
+    interactive_sessions = 8
+    chat = make_interface(limit, batch_sessions, interactive_sessions)
+    stop = asyncio.Event()
+    batch_priority = Priority.BATCH if prioritized else Priority.INTERACTIVE
+
+    async def batch_worker(session_id: str):
+        while not stop.is_set():
+            async for _ in chat.chat_stream("批量任务", session_id=session_id, priority=batch_priority):
+                pass
+
+    async def interactive_user(session_id: str, turns: int, ttfts: List[float]):
+        for _ in range(turns):
+            start = time.perf_counter()
+            first = None
+            async for _ in chat.chat_stream("你好", session_id=session_id):
+                if first is None:
+                    first = time.perf_counter() - start
+            ttfts.append(first * 1000)
+            await asyncio.sleep(0.01)
+
+    workers = [asyncio.ensure_future(batch_worker(f"s{i}")) for i in range(batch_sessions)]
+    await asyncio.sleep(0.05)
+    ttfts: List[float] = []
+    turns = max(1, interactive_turns // interactive_sessions)
+    await asyncio.gather(*(
+        interactive_user(f"s{batch_sessions + i}", turns, ttfts) for i in range(interactive_sessions)
+    ))
+    stop.set()
+    for worker in workers:
+        worker.cancel()
+    await asyncio.gather(*workers, return_exceptions=True)
+
+    ttfts.sort()
+    stats = chat.scheduler.get_stats()["fake"]
+    return {
+        "interactive_ttft_p50_ms": percentile(ttfts, 50),
+        "interactive_ttft_p99_ms": percentile(ttfts, 99),
+        "interactive_wait_p99_ms": stats["interactive"]["p99_wait_ms"],
+        "total_admitted": stats["interactive"]["admitted"] + stats["batch"]["admitted"],
+    }
+
+
+def run(quick: bool = False) -> BenchmarkReport:
+    report = BenchmarkReport("scheduler")
+    limit = 8
+    batch_sessions = 16 if quick else 64
+    interactive_turns = 32 if quick else 160
+    for prioritized in (False, True):
+        metrics = asyncio.run(run_scenario(limit, batch_sessions, interactive_turns, prioritized))
+        report.add("interactive_under_batch_load",
+                   {"limit": limit, "batch_sessions": batch_sessions, "prioritized": prioritized}, metrics)
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="调度器基准测试")
+    add_common_arguments(parser)
+    args = parser.parse_args(argv)
+    return finish(run(args.quick), args)
+
+
+if __name__ == "__main__":
+    main()
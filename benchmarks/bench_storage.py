@@ -0,0 +1,164 @@
+"""
+角色存储基准测试：FileStorage 与 SQLiteStorage 在大量角色下的保存、列举和加载耗时
+
+用法（在仓库根目录）：
+    python -m benchmarks.bench_storage -o storage.json
+"""
+import argparse
+import shutil
+import tempfile
+import time
+from typing import List
+
+from ai_chat_lib.character_manager import CharacterManager
+from ai_chat_lib.models.character import Character, ExampleDialog
+from ai_chat_lib.storage.file_storage import FileStorage
+from ai_chat_lib.storage.sqlite_storage import SQLiteStorage
+
+from ._common import BenchmarkReport, add_common_arguments, finish, summarize
+
+
+def make_characters(count: int) -> List[Character]:
+    """构造指定数量的角色"""
+    return [
+        Character(
+            name=f"角色{i:05d}",
+            description=f"第{i}个基准测试角色",
+            system_prompt="你是{{character}}，一个友善的助手，正在和{{user}}聊天。" * 20,
+            example_dialogs=[ExampleDialog(f"问题{j}", f"回答{j}" * 10) for j in range(3)],
+            metadata={"category": "助手" if i % 2 else "专业", "language": "zh-CN"},
+        )
+        for i in range(count)
+    ]
+
+
+def time_load_all(storage, names: List[str], rounds: int = 3) -> dict:
+    """加载全部角色，返回每轮耗时统计和每个角色的平均耗时"""
+    samples = []
+    for _ in range(rounds):
+        start = time.perf_counter_ns()
+        for name in names:
+            storage.load_character(name)
+        samples.append(time.perf_counter_ns() - start)
+    stats = summarize(samples)
+    stats["us_per_character"] = stats["median_us"] / len(names)
+    return stats
+
+
+def bench_file_storage(report: BenchmarkReport, counts: List[int]):
+    """旧Python格式（每次exec）与JSON格式（冷启动解析/热缓存）的对比"""
+    for count in counts:
+        characters = make_characters(count)
+        for save_format in ("py", "json"):
+            directory = tempfile.mkdtemp(prefix="bench_storage_")
+            try:
+                writer = FileStorage(directory, save_format=save_format)
+                start = time.perf_counter_ns()
+                writer.bulk_save(characters)
+                save_us = (time.perf_counter_ns() - start) / 1000
+                names = writer.list_characters()
+
+                # 每轮使用新的实例，测量冷启动时的解析开销
+                cold = summarize([
+                    time_load_all(FileStorage(directory), names, rounds=1)["median_us"] * 1000
+                    for _ in range(3)
+                ])
+                cold["us_per_character"] = cold["median_us"] / count
+                report.add("file_storage_load_cold", {"format": save_format, "characters": count}, cold)
+                report.add("file_storage_load_warm", {"format": save_format, "characters": count},
+                           time_load_all(FileStorage(directory), names))
+                report.add("file_storage_save", {"format": save_format, "characters": count},
+                           {"us_per_character": save_us / count})
+            finally:
+                shutil.rmtree(directory, ignore_errors=True)
+
+
+def bench_sqlite_storage(report: BenchmarkReport, counts: List[int]):
+    """SQLite存储：批量保存、只读名称的列举、逐个加载和批量加载"""
+    for count in counts:
+        characters = make_characters(count)
+        directory = tempfile.mkdtemp(prefix="bench_sqlite_")
+        try:
+            db_path = f"{directory}/characters.db"
+            storage = SQLiteStorage(db_path)
+            start = time.perf_counter_ns()
+            storage.bulk_save(characters)
+            report.add("sqlite_bulk_save", {"characters": count},
+                       {"us_per_character": (time.perf_counter_ns() - start) / 1000 / count})
+
+            start = time.perf_counter_ns()
+            for character in characters[:min(count, 200)]:
+                storage.save_character(character)
+            report.add("sqlite_save", {"characters": count},
+                       {"us_per_character": (time.perf_counter_ns() - start) / 1000 / min(count, 200)})
+            storage.close()
+
+            storage = SQLiteStorage(db_path)
+            names = storage.list_characters()
+            report.add("sqlite_list", {"characters": count},
+                       summarize([_timed(storage.list_characters) for _ in range(5)]))
+            report.add("sqlite_load", {"characters": count}, time_load_all(storage, names))
+            bulk = summarize([_timed(storage.bulk_load) for _ in range(3)])
+            bulk["us_per_character"] = bulk["median_us"] / count
+            report.add("sqlite_bulk_load", {"characters": count}, bulk)
+            report.add("sqlite_query", {"characters": count}, summarize([
+                _timed(lambda: storage.query_characters({"metadata.category": "助手"}, limit=20))
+                for _ in range(5)
+            ]))
+            storage.close()
+
+            file_storage = FileStorage(directory)
+            file_storage.bulk_save(characters)
+            report.add("file_list", {"characters": count},
+                       summarize([_timed(file_storage.list_characters) for _ in range(5)]))
+            # 新实例首次查询需要读取一次索引文件
+            report.add("file_query_cold", {"characters": count}, summarize([
+                _timed(lambda: FileStorage(directory).query_characters({"metadata.category": "助手"}, limit=20))
+                for _ in range(5)
+            ]))
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+
+
+def bench_preload(report: BenchmarkReport, counts: List[int]):
+    """启动预加载：没有快照时并行加载全部角色，与快照有效时一次读取的对比"""
+    for count in counts:
+        directory = tempfile.mkdtemp(prefix="bench_preload_")
+        try:
+            FileStorage(directory).bulk_save(make_characters(count))
+            snapshot_path = f"{directory}/characters.snapshot"
+            report.add("preload_parallel", {"characters": count}, summarize([
+                _timed(lambda: CharacterManager(FileStorage(directory)).preload()) for _ in range(3)
+            ]))
+            CharacterManager(FileStorage(directory)).preload(snapshot_path)
+            report.add("preload_snapshot", {"characters": count}, summarize([
+                _timed(lambda: CharacterManager(FileStorage(directory)).preload(snapshot_path))
+                for _ in range(3)
+            ]))
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+
+
+def _timed(fn) -> int:
+    start = time.perf_counter_ns()
+    fn()
+    return time.perf_counter_ns() - start
+
+
+def run(quick: bool = False) -> BenchmarkReport:
+    report = BenchmarkReport("storage")
+    bench_file_storage(report, [100] if quick else [100, 1000])
+    bench_sqlite_storage(report, [100] if quick else [100, 1000, 5000])
+    bench_preload(report, [100] if quick else [100, 1000])
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="角色存储基准测试")
+    add_common_arguments(parser)
+    args = parser.parse_args(argv)
+    return finish(run(args.quick), args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,348 @@
+"""
+并发压测工具：模拟N个真实聊天用户驱动 MultiSessionChatInterface
+
+用法（在仓库根目录）：
+    # 离线：200个用户，使用假提供商，跑60秒
+    python -m benchmarks.load_generator --users 200 --duration 60
+
+    # 真实端点：20个用户，只跑流式
+    python -m benchmarks.load_generator --provider deepseek --users 20 --stream-ratio 1.0
+
+分布参数格式：
+    const:X            固定值
+    uniform:A,B        均匀分布
+    exp:MEAN           指数分布
+    lognormal:MU,SIGMA 对数正态分布（消息长度常用）
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from ai_chat_lib.character_manager import CharacterManager
+from ai_chat_lib.chat_interface import MultiSessionChatInterface
+from ai_chat_lib.models.character import Character, ExampleDialog
+from ai_chat_lib.providers.base import BaseAIProvider
+from ai_chat_lib.providers.fake_provider import FakeAIProvider
+from ai_chat_lib.providers.registry import (
+    create_provider as create_registered_provider, get_api_key_env, list_providers
+)
+from ai_chat_lib.storage.file_storage import DEFAULT_CHARACTERS_DIR, FileStorage
+
+from ._common import CHAR_POOL, percentile
+
+
+def parse_distribution(spec: str) -> Callable[[random.Random], float]:
+    """解析分布描述字符串，返回采样函数"""
+    kind, _, params = spec.partition(":")
+    values = [float(v) for v in params.split(",")] if params else []
+    if kind == "const":
+        return lambda rng: values[0]
+    if kind == "uniform":
+        return lambda rng: rng.uniform(values[0], values[1])
+    if kind == "exp":
+        return lambda rng: rng.expovariate(1 / values[0]) if values[0] > 0 else 0.0
+    if kind == "lognormal":
+        return lambda rng: rng.lognormvariate(values[0], values[1])
+    raise ValueError(f"不支持的分布: {spec}")
+
+
+def parse_character_mix(spec: Optional[str], available: List[str]) -> List[Tuple[str, float]]:
+    """解析角色权重，如 友好助手:3,编程专家:1；为空时平均使用所有角色"""
+    if not spec:
+        return [(name, 1.0) for name in available]
+    mix = []
+    for item in spec.split(","):
+        name, _, weight = item.partition(":")
+        if name not in available:
+            raise ValueError(f"角色 {name} 不存在，可用角色: {available}")
+        mix.append((name, float(weight or 1)))
+    return mix
+
+
+def create_provider(args) -> BaseAIProvider:
+    """根据命令行参数创建提供商"""
+    if args.provider == "fake":
+        return FakeAIProvider(
+            reply_chars=args.fake_reply_chars,
+            chunk_size=args.fake_chunk_size,
+            first_token_delay=args.fake_ttft,
+            chunk_delay=args.fake_itl,
+        )
+
+    api_key = args.api_key or os.getenv(args.api_key_env or get_api_key_env(args.provider) or "")
+    if args.provider == "openai":
+        # 允许通过 --base-url 指向任意OpenAI兼容服务
+        return create_registered_provider("openai_compatible", api_key, args.model or "gpt-4o-mini",
+                                          base_url=args.base_url)
+    return create_registered_provider(args.provider, api_key, args.model)
+
+
+def create_character_manager(characters_dir: str) -> CharacterManager:
+    """创建角色管理器；目录中没有角色时生成一个合成角色"""
+    storage = FileStorage(characters_dir)
+    if not storage.list_characters():
+        storage = FileStorage(tempfile.mkdtemp(prefix="loadgen_characters_"))
+        storage.save_character(Character(
+            name="压测角色",
+            description="压测用的合成角色",
+            system_prompt="你是{{character}}，请简短地回答{{user}}的问题。",
+            example_dialogs=[ExampleDialog("你好", "你好！")],
+        ))
+    return CharacterManager(storage)
+
+
+def rss_bytes() -> int:
+    """当前进程常驻内存，优先读取/proc，其他平台退回到峰值RSS，Windows上返回0"""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+    try:
+        # resource模块只在类Unix平台上可用
+        import resource
+    except ImportError:
+        return 0
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxrss if sys.platform == "darwin" else maxrss * 1024
+
+
+@dataclass
+class LoadStats:
+    """压测过程中收集的原始数据"""
+    turns: int = 0
+    stream_turns: int = 0
+    chunks: int = 0
+    output_chars: int = 0
+    ttft: List[float] = field(default_factory=list)
+    itl: List[float] = field(default_factory=list)
+    latency: List[float] = field(default_factory=list)
+    loop_lag: List[float] = field(default_factory=list)
+    errors: Counter = field(default_factory=Counter)
+    timeline: List[Dict[str, Any]] = field(default_factory=list)
+    active_users: int = 0
+
+
+class LoadGenerator:
+    """模拟用户并发驱动聊天接口"""
+
+    def __init__(self, chat: MultiSessionChatInterface, provider: BaseAIProvider,
+                 character_mix: List[Tuple[str, float]], think_time: Callable[[random.Random], float],
+                 message_length: Callable[[random.Random], float], stream_ratio: float = 1.0,
+                 max_turns_per_session: int = 20, seed: Optional[int] = None):
+        self.chat = chat
+        self.provider = provider
+        self.character_names = [name for name, _ in character_mix]
+        self.character_weights = [weight for _, weight in character_mix]
+        self.think_time = think_time
+        self.message_length = message_length
+        self.stream_ratio = stream_ratio
+        self.max_turns_per_session = max_turns_per_session
+        self.seed = seed
+        self.stats = LoadStats()
+
+    def _make_message(self, rng: random.Random) -> str:
+        length = max(1, int(self.message_length(rng)))
+        return "".join(rng.choice(CHAR_POOL) for _ in range(length))
+
+    async def _turn(self, session_id: str, text: str, stream: bool):
+        """执行一轮对话并记录延迟"""
+        stats = self.stats
+        start = time.perf_counter()
+        if stream:
+            last = None
+            async for chunk in self.chat.chat_stream(text, session_id=session_id):
+                now = time.perf_counter()
+                if last is None:
+                    stats.ttft.append(now - start)
+                else:
+                    stats.itl.append(now - last)
+                last = now
+                stats.chunks += 1
+                stats.output_chars += len(chunk)
+            stats.stream_turns += 1
+        else:
+            # 非流式只有总延迟，不计入TTFT
+            response = await self.chat.chat(text, session_id=session_id)
+            stats.output_chars += len(response)
+        stats.latency.append(time.perf_counter() - start)
+        stats.turns += 1
+
+    async def _user(self, index: int, deadline: float, start_delay: float):
+        """单个模拟用户：思考 -> 发消息 -> 读回复，直到截止时间"""
+        rng = random.Random(None if self.seed is None else self.seed + index)
+        await asyncio.sleep(start_delay)
+
+        session_id = self.chat.create_session(f"loadgen_user_{index}")
+        character = rng.choices(self.character_names, self.character_weights)[0]
+        self.chat.switch_provider(self.provider, session_id)
+        self.chat.switch_character(character, session_id)
+
+        self.stats.active_users += 1
+        turns = 0
+        try:
+            while time.perf_counter() < deadline:
+                await asyncio.sleep(max(0.0, self.think_time(rng)))
+                if time.perf_counter() >= deadline:
+                    break
+                if turns >= self.max_turns_per_session:
+                    # 模拟用户开始新话题：重新切换角色会清空历史
+                    self.chat.switch_character(character, session_id)
+                    turns = 0
+                try:
+                    await self._turn(session_id, self._make_message(rng), rng.random() < self.stream_ratio)
+                except Exception as e:
+                    self.stats.errors[type(e).__name__] += 1
+                turns += 1
+        finally:
+            self.stats.active_users -= 1
+
+    async def _monitor(self, deadline: float, interval: float, started: float):
+        """事件循环延迟和内存采样"""
+        lag_interval = min(0.05, interval)
+        next_sample = started + interval
+        while time.perf_counter() < deadline:
+            expected = time.perf_counter() + lag_interval
+            await asyncio.sleep(lag_interval)
+            self.stats.loop_lag.append(max(0.0, time.perf_counter() - expected))
+            if time.perf_counter() >= next_sample:
+                next_sample += interval
+                self.stats.timeline.append({
+                    "t": round(time.perf_counter() - started, 3),
+                    "rss_bytes": rss_bytes(),
+                    "active_users": self.stats.active_users,
+                    "turns": self.stats.turns,
+                    "sessions": len(self.chat.sessions),
+                })
+
+    async def run(self, users: int, duration: float, ramp_up: float = 0.0,
+                  sample_interval: float = 1.0) -> Dict[str, Any]:
+        """运行压测并返回报告"""
+        started = time.perf_counter()
+        deadline = started + duration
+        rss_start = rss_bytes()
+        tasks = [
+            asyncio.create_task(self._user(i, deadline, ramp_up * i / users if users else 0.0))
+            for i in range(users)
+        ]
+        monitor = asyncio.create_task(self._monitor(deadline, sample_interval, started))
+        await asyncio.gather(*tasks)
+        await monitor
+        elapsed = time.perf_counter() - started
+        return self.report(elapsed, rss_start)
+
+    def report(self, elapsed: float, rss_start: int) -> Dict[str, Any]:
+        """汇总压测结果"""
+        stats = self.stats
+
+        def pcts(values: List[float]) -> Optional[Dict[str, float]]:
+            # 没有样本（如全部为非流式轮次时的TTFT）时为None
+            if not values:
+                return None
+            ordered = sorted(values)
+            return {
+                f"p{p}_ms": percentile(ordered, p) * 1000 for p in (50, 90, 99)
+            } | {"max_ms": ordered[-1] * 1000, "count": len(ordered)}
+
+        rss_end = rss_bytes()
+        return {
+            "elapsed_s": elapsed,
+            "turns": stats.turns,
+            "stream_turns": stats.stream_turns,
+            "turns_per_sec": stats.turns / elapsed if elapsed else 0.0,
+            "chunks_per_sec": stats.chunks / elapsed if elapsed else 0.0,
+            "output_chars_per_sec": stats.output_chars / elapsed if elapsed else 0.0,
+            "errors": dict(stats.errors),
+            "ttft": pcts(stats.ttft),
+            "itl": pcts(stats.itl),
+            "latency": pcts(stats.latency),
+            "event_loop_lag": pcts(stats.loop_lag),
+            "memory": {
+                "rss_start_bytes": rss_start,
+                "rss_end_bytes": rss_end,
+                "rss_growth_bytes": rss_end - rss_start,
+            },
+            "timeline": stats.timeline,
+        }
+
+
+def print_report(report: Dict[str, Any]):
+    """以可读的形式打印报告"""
+    print(f"\n=== 压测结果（{report['elapsed_s']:.1f}s）===")
+    print(f"轮次: {report['turns']}（流式 {report['stream_turns']}），"
+          f"吞吐: {report['turns_per_sec']:.1f} 轮/s, {report['chunks_per_sec']:.1f} 分片/s")
+    for key, title in (("ttft", "TTFT"), ("itl", "ITL"), ("latency", "总延迟"), ("event_loop_lag", "事件循环延迟")):
+        p = report[key]
+        if p is None:
+            print(f"{title}: N/A")
+            continue
+        print(f"{title}: p50={p['p50_ms']:.1f}ms p90={p['p90_ms']:.1f}ms "
+              f"p99={p['p99_ms']:.1f}ms max={p['max_ms']:.1f}ms (n={p['count']})")
+    memory = report["memory"]
+    print(f"内存: {memory['rss_start_bytes'] / 2**20:.1f}MB -> {memory['rss_end_bytes'] / 2**20:.1f}MB "
+          f"(+{memory['rss_growth_bytes'] / 2**20:.1f}MB)")
+    if report["errors"]:
+        print(f"错误: {report['errors']}")
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="聊天接口并发压测")
+    parser.add_argument("--users", type=int, default=50, help="并发模拟用户数")
+    parser.add_argument("--duration", type=float, default=30.0, help="压测时长（秒）")
+    parser.add_argument("--ramp-up", type=float, default=0.0, help="所有用户上线所需时间（秒）")
+    parser.add_argument("--think-time", default="exp:2.0", help="两轮之间的思考时间分布（秒）")
+    parser.add_argument("--message-length", default="lognormal:3.5,0.6", help="用户消息长度分布（字符）")
+    parser.add_argument("--characters", help="角色权重，如 友好助手:3,编程专家:1")
+    parser.add_argument("--characters-dir", default=DEFAULT_CHARACTERS_DIR, help="角色目录")
+    parser.add_argument("--stream-ratio", type=float, default=0.8, help="使用流式接口的轮次比例")
+    parser.add_argument("--max-turns-per-session", type=int, default=20, help="每个会话最多轮次，超出后清空历史")
+    parser.add_argument("--sample-interval", type=float, default=1.0, help="内存采样间隔（秒）")
+    parser.add_argument("--seed", type=int, help="随机种子")
+    parser.add_argument("--output", "-o", help="把结果写入JSON文件")
+
+    parser.add_argument("--provider", default="fake", choices=list_providers())
+    parser.add_argument("--model", help="模型名称")
+    parser.add_argument("--api-key", help="API Key（默认从环境变量读取）")
+    parser.add_argument("--api-key-env", help="读取API Key的环境变量名")
+    parser.add_argument("--base-url", help="OpenAI兼容端点地址（仅openai）")
+
+    parser.add_argument("--fake-ttft", type=float, default=0.3, help="假提供商首分片延迟（秒）")
+    parser.add_argument("--fake-itl", type=float, default=0.02, help="假提供商分片间隔（秒）")
+    parser.add_argument("--fake-reply-chars", type=int, default=300, help="假提供商回复长度")
+    parser.add_argument("--fake-chunk-size", type=int, default=4, help="假提供商分片大小")
+    return parser
+
+
+def main(argv=None) -> Dict[str, Any]:
+    args = build_parser().parse_args(argv)
+    character_manager = create_character_manager(args.characters_dir)
+    generator = LoadGenerator(
+        chat=MultiSessionChatInterface(character_manager),
+        provider=create_provider(args),
+        character_mix=parse_character_mix(args.characters, character_manager.list_characters()),
+        think_time=parse_distribution(args.think_time),
+        message_length=parse_distribution(args.message_length),
+        stream_ratio=args.stream_ratio,
+        max_turns_per_session=args.max_turns_per_session,
+        seed=args.seed,
+    )
+    report = asyncio.run(generator.run(args.users, args.duration, args.ramp_up, args.sample_interval))
+    report["config"] = {k: v for k, v in vars(args).items() if k != "api_key"}
+    print_report(report)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"结果已写入 {args.output}")
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -1,28 +1,117 @@
 """
 AI Chat Library - 一个灵活的AI聊天系统
+
+公开的类在首次访问时才导入（PEP 562），`import ai_chat_lib` 不会导入openai、google-genai等SDK。
 """
+import importlib
+from typing import TYPE_CHECKING
+
+__version__ = "0.1.0"
+
+# 导出名称 -> 所在模块
+_EXPORTS = {
+    "CharacterManager": ".character_manager",
+    "CharacterWatcher": ".character_watcher",
+    "DataAdapter": ".data_adapter",
+    "PromptManager": ".prompt_manager",
+    "ChatInterface": ".chat_interface",
+    "MultiSessionChatInterface": ".chat_interface",
+    "ChatSession": ".chat_interface",
+    "Character": ".models.character",
+    "ExampleDialog": ".models.character",
+    "Message": ".models.message",
+    "MessageRole": ".models.message",
+    "BaseStorage": ".storage.base",
+    "AsyncBaseStorage": ".storage.async_storage",
+    "FileStorage": ".storage.file_storage",
+    "SQLiteStorage": ".storage.sqlite_storage",
+    "BaseAIProvider": ".providers.base",
+    "StreamEvent": ".providers.base",
+    "StreamEventType": ".providers.base",
+    "FakeAIProvider": ".providers.fake_provider",
+    "OpenAIBaseProvider": ".providers.openai_base_provider",
+    "OpenAIProvider": ".providers.openai_base_provider",
+    "DeepSeekProvider": ".providers.openai_like_provider",
+    "AliYunProvider": ".providers.openai_like_provider",
+    "GoogleAIProvider": ".providers.google_provider",
+    "PooledOpenAIProvider": ".providers.pooled_provider",
+    "FairShareScheduler": ".scheduler",
+    "Priority": ".scheduler",
+    "Tool": ".tools",
+    "ToolRegistry": ".tools",
+    "ToolExecutor": ".tools",
+    "MemoryStore": ".memory",
+    "HashingEmbedder": ".memory",
+    "VectorIndex": ".memory",
+    "FullTextIndex": ".fulltext",
+    "ChatMetrics": ".metrics",
+    "MetricsRegistry": ".metrics",
+    "UsageLedger": ".usage",
+    "PriceTable": ".usage",
+    "Budget": ".usage",
+    "BudgetExceededError": ".usage",
+    "SyncChatClient": ".sync_client",
+    "TranscriptSink": ".transcripts",
+    "BufferedTranscriptSink": ".transcripts",
+    "FileTranscriptSink": ".transcripts",
+    "JsonlTranscriptSink": ".transcripts",
+    "MarkdownTranscriptSink": ".transcripts",
+    "RotatingFileTranscriptSink": ".transcripts",
+    "OverflowPolicy": ".transcripts",
+    "TranscriptRecord": ".transcripts",
+    "HistoryCompactor": ".history_compaction",
+    "ChatTimeouts": ".timeouts",
+    "ChatTimeoutError": ".timeouts",
+    "create_provider": ".providers.registry",
+    "register_provider": ".providers.registry",
+    "list_providers": ".providers.registry",
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name: str):
+    module_name = _EXPORTS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module_name, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
+
 
-# from .character_manager import CharacterManager
-# from .data_adapter import DataAdapter
-# from .prompt_manager import PromptManager
-# from .chat_interface import ChatInterface
-# from .models.character import Character, ExampleDialog
-# from .models.message import Message, MessageRole
-# from .providers.base import BaseAIProvider
-# from .providers.openai_provider import OpenAIProvider
-# from .providers.google_provider import GoogleAIProvider
-
-# __version__ = "1.0.0"
-# __all__ = [
-#     "CharacterManager",
-#     "DataAdapter", 
-#     "PromptManager",
-#     "ChatInterface",
-#     "Character",
-#     "ExampleDialog",
-#     "Message",
-#     "MessageRole",
-#     "BaseAIProvider",
-#     "OpenAIProvider",
-#     "GoogleAIProvider"
-# ]
\ No newline at end of file
+if TYPE_CHECKING:
+    from .character_manager import CharacterManager
+    from .character_watcher import CharacterWatcher
+    from .data_adapter import DataAdapter
+    from .prompt_manager import PromptManager
+    from .chat_interface import ChatInterface, MultiSessionChatInterface, ChatSession
+    from .models.character import Character, ExampleDialog
+    from .models.message import Message, MessageRole
+    from .storage.base import BaseStorage
+    from .storage.async_storage import AsyncBaseStorage
+    from .storage.file_storage import FileStorage
+    from .storage.sqlite_storage import SQLiteStorage
+    from .providers.base import BaseAIProvider, StreamEvent, StreamEventType
+    from .providers.fake_provider import FakeAIProvider
+    from .providers.openai_base_provider import OpenAIBaseProvider, OpenAIProvider
+    from .providers.openai_like_provider import DeepSeekProvider, AliYunProvider
+    from .providers.google_provider import GoogleAIProvider
+    from .providers.pooled_provider import PooledOpenAIProvider
+    from .scheduler import FairShareScheduler, Priority
+    from .tools import Tool, ToolRegistry, ToolExecutor
+    from .memory import MemoryStore, HashingEmbedder, VectorIndex
+    from .fulltext import FullTextIndex
+    from .metrics import ChatMetrics, MetricsRegistry
+    from .usage import UsageLedger, PriceTable, Budget, BudgetExceededError
+    from .sync_client import SyncChatClient
+    from .transcripts import (
+        TranscriptSink, BufferedTranscriptSink, FileTranscriptSink, JsonlTranscriptSink,
+        MarkdownTranscriptSink, RotatingFileTranscriptSink, OverflowPolicy, TranscriptRecord,
+    )
+    from .history_compaction import HistoryCompactor
+    from .timeouts import ChatTimeouts, ChatTimeoutError
+    from .providers.registry import create_provider, register_provider, list_providers
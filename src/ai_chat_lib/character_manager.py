@@ -1,31 +1,216 @@
 """
 AI角色管理器
 """
-from typing import List, Optional
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import replace
+from datetime import datetime
+from functools import partial
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional, Tuple
 from .models.character import Character
 from .storage.base import BaseStorage
+from .storage.async_storage import AsyncBaseStorage, to_async_storage
+from .storage.catalog import CatalogFilters, CatalogPage
 from .storage.file_storage import FileStorage
+from .storage.snapshot import CharacterSnapshot
 from .models.message import Message, MessageRole
 
+if TYPE_CHECKING:
+    from .metrics import ChatMetrics
+
+# 角色重新加载回调：(角色名, 新角色或None表示已删除, 新版本号)
+# 在调用reload_character的线程中执行（CharacterWatcher的后台线程），注册时可指定事件循环
+ReloadListener = Callable[[str, Optional[Character], int], None]
+
 
 class CharacterManager:
     """AI角色管理器"""
-    
-    def __init__(self, storage: Optional[BaseStorage] = None):
+
+    def __init__(self, storage: Optional[BaseStorage] = None,
+                 async_storage: Optional[AsyncBaseStorage] = None):
         self.storage = storage or FileStorage()
+        self._async_storage = async_storage
         self._characters_cache = {}
-    
+        # 正在进行的异步加载，同一角色的并发缓存未命中只触发一次存储读取
+        self._inflight_loads: Dict[str, asyncio.Task] = {}
+        # 每个角色的版本号，重新加载时递增，会话据此判断是否需要换用新角色
+        self._versions: Dict[str, int] = {}
+        self._reload_listeners: List[Tuple[ReloadListener, Optional[asyncio.AbstractEventLoop]]] = []
+        # 最近一次保存后角色的来源签名，监视器看到自己写入的文件时不再重复加载
+        self._saved_signatures: Dict[str, str] = {}
+        self._lock = threading.RLock()
+        # 设置后记录角色缓存的命中情况
+        self.metrics: Optional["ChatMetrics"] = None
+
     def load_character(self, name: str, use_cache: bool = True) -> Optional[Character]:
-        """加载角色"""
+        """加载角色
+
+        缓存的角色对象由所有会话共享，应视为只读；修改请用update_character保存一个新对象。
+        """
         if use_cache and name in self._characters_cache:
+            if self.metrics is not None:
+                self.metrics.record_cache_lookup("character", name, True)
             return self._characters_cache[name]
-        
+        if use_cache and self.metrics is not None:
+            self.metrics.record_cache_lookup("character", name, False)
+
         character = self.storage.load_character(name)
         if character and use_cache:
             self._characters_cache[name] = character
-        
+
         return character
-    
+
+    @property
+    def async_storage(self) -> AsyncBaseStorage:
+        """异步存储，未指定时把同步存储包装为线程池适配器"""
+        if self._async_storage is None:
+            self._async_storage = to_async_storage(self.storage)
+        return self._async_storage
+
+    async def load_character_async(self, name: str, use_cache: bool = True) -> Optional[Character]:
+        """异步加载角色，存储读取在线程池中执行，不阻塞事件循环"""
+        if use_cache and name in self._characters_cache:
+            if self.metrics is not None:
+                self.metrics.record_cache_lookup("character", name, True)
+            return self._characters_cache[name]
+        if not use_cache:
+            return await self.async_storage.load_character(name)
+        if self.metrics is not None:
+            self.metrics.record_cache_lookup("character", name, False)
+
+        task = self._inflight_loads.get(name)
+        if task is None or task.get_loop() is not asyncio.get_running_loop():
+            task = asyncio.ensure_future(self.async_storage.load_character(name))
+            self._inflight_loads[name] = task
+            task.add_done_callback(lambda t, n=name: self._inflight_loads.pop(n, None)
+                                   if self._inflight_loads.get(n) is t else None)
+
+        # shield：某个等待者被取消时不影响其他等待同一角色的请求
+        character = await asyncio.shield(task)
+        if character:
+            self._characters_cache.setdefault(name, character)
+            return self._characters_cache[name]
+        return character
+
+    def preload(self, snapshot_path: Optional[str] = None, max_workers: int = 8) -> Dict[str, Character]:
+        """启动时把全部角色加载到缓存，返回加载的角色
+
+        指定snapshot_path且存储支持签名时，签名未变化的角色直接从快照读取，
+        只加载新增或修改过的角色，快照过期时重新生成。
+        已在缓存中的角色保持不变。
+        """
+        signatures = self.storage.get_signatures() if snapshot_path else None
+        characters: Dict[str, Character] = {}
+        snapshot_signatures: Dict[str, str] = {}
+        if signatures is not None:
+            snapshot = CharacterSnapshot(snapshot_path)
+            cached, snapshot_signatures = snapshot.load()
+            characters = {
+                name: character for name, character in cached.items()
+                if name in signatures and snapshot_signatures.get(name) == signatures[name]
+            }
+            names = [name for name in signatures if name not in characters]
+        else:
+            names = self.storage.list_characters()
+
+        if names:
+            characters.update(self._load_many(names, max_workers))
+
+        if signatures is not None:
+            current = {name: signatures[name] for name in characters if name in signatures}
+            if current != snapshot_signatures:
+                snapshot.write(characters, signatures)
+
+        with self._lock:
+            for name, character in characters.items():
+                self._characters_cache.setdefault(name, character)
+        return characters
+
+    async def preload_async(self, snapshot_path: Optional[str] = None,
+                            max_workers: int = 8) -> Dict[str, Character]:
+        """在线程中执行preload，不阻塞事件循环"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, partial(self.preload, snapshot_path, max_workers))
+
+    def _load_many(self, names: List[str], max_workers: int) -> Dict[str, Character]:
+        """批量加载角色：存储支持bulk_load时一次查询，否则在线程池中并行加载"""
+        bulk_load = getattr(self.storage, "bulk_load", None)
+        if bulk_load is not None:
+            return bulk_load(names)
+
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="character-preload") as executor:
+            loaded = executor.map(self.storage.load_character, names)
+            return {name: character for name, character in zip(names, loaded) if character}
+
+    def get_cached_character(self, name: str) -> Optional[Character]:
+        """只从内存缓存获取角色，不访问存储"""
+        return self._characters_cache.get(name)
+
+    def get_version(self, name: str) -> int:
+        """获取角色当前版本号（只读内存）"""
+        return self._versions.get(name, 0)
+
+    def add_reload_listener(self, listener: ReloadListener,
+                            loop: Optional[asyncio.AbstractEventLoop] = None):
+        """注册角色重新加载的回调
+
+        回调默认在调用reload_character的线程中执行，使用CharacterWatcher时是它的后台线程；
+        回调需要访问事件循环中的状态（如会话）时传入loop，通过call_soon_threadsafe在该循环中执行。
+        """
+        self._reload_listeners.append((listener, loop))
+
+    def remove_reload_listener(self, listener: ReloadListener):
+        """移除角色重新加载的回调"""
+        self._reload_listeners = [item for item in self._reload_listeners if item[0] != listener]
+
+    def reload_character(self, name: str) -> Optional[Character]:
+        """让缓存失效并重新加载角色，版本号递增
+
+        只处理已经在缓存中的角色；角色文件被删除时从缓存移除，
+        已经在使用该角色的会话会保留旧版本。
+        文件仍然存在但加载失败时（如外部编辑器写了一半）保留缓存的角色，不递增版本号也不通知，返回None。
+        来源签名与本管理器最近一次保存的相同时（监视器看到的是save_character写入的文件），
+        缓存已是最新，不递增版本号，直接返回缓存的角色。
+        """
+        with self._lock:
+            if name not in self._characters_cache:
+                return None
+            saved = self._saved_signatures.get(name)
+            if saved is not None and saved == self.storage.get_signature(name):
+                return self._characters_cache[name]
+            self._saved_signatures.pop(name, None)
+
+            character = self.storage.load_character(name)
+            if character:
+                self._characters_cache[name] = character
+            elif self._character_exists(name):
+                return None
+            else:
+                del self._characters_cache[name]
+            version = self._versions.get(name, 0) + 1
+            self._versions[name] = version
+
+        for listener, loop in list(self._reload_listeners):
+            if loop is not None:
+                loop.call_soon_threadsafe(self._call_reload_listener, listener, name, character, version)
+            else:
+                self._call_reload_listener(listener, name, character, version)
+        return character
+
+    def _character_exists(self, name: str) -> bool:
+        """存储中是否还有该角色，有来源签名的存储不需要列出所有角色"""
+        if self.storage.get_signature(name) is not None:
+            return True
+        return name in self.storage.list_characters()
+
+    @staticmethod
+    def _call_reload_listener(listener: ReloadListener, name: str, character: Optional[Character], version: int):
+        try:
+            listener(name, character, version)
+        except Exception as e:
+            print(f"角色 {name} 重新加载回调失败: {e}")
+
     def character_example_chat_to_history(self, character: Character) -> List[Message]:
         """将角色的示例聊天记录转换为历史记录"""
         history = []
@@ -34,30 +219,77 @@ class CharacterManager:
             history.append(Message(role=MessageRole.ASSISTANT, content=msg.character_response))
 
         return history
-    
+
+    def _remember_saved(self, name: str, signature: Optional[str]):
+        if signature is None:
+            self._saved_signatures.pop(name, None)
+        else:
+            self._saved_signatures[name] = signature
+
     def save_character(self, character: Character) -> bool:
         """保存角色"""
         success = self.storage.save_character(character)
         if success:
-            self._characters_cache[character.name] = character
+            self._remember_saved(character.name, self.storage.get_signature(character.name))
+            with self._lock:
+                if character.name in self._characters_cache:
+                    self._versions[character.name] = self._versions.get(character.name, 0) + 1
+                self._characters_cache[character.name] = character
+        return success
+
+    async def save_character_async(self, character: Character) -> bool:
+        """异步保存角色"""
+        success = await self.async_storage.save_character(character)
+        if success:
+            signature = await asyncio.get_running_loop().run_in_executor(
+                None, self.storage.get_signature, character.name
+            )
+            self._remember_saved(character.name, signature)
+            with self._lock:
+                if character.name in self._characters_cache:
+                    self._versions[character.name] = self._versions.get(character.name, 0) + 1
+                self._characters_cache[character.name] = character
         return success
-    
+
     def list_characters(self) -> List[str]:
         """列出所有可用角色"""
         return self.storage.list_characters()
-    
+
+    async def list_characters_async(self) -> List[str]:
+        """异步列出所有可用角色"""
+        return await self.async_storage.list_characters()
+
+    def query_characters(self, filters: Optional[CatalogFilters] = None, offset: int = 0,
+                         limit: Optional[int] = None, order_by: str = "name") -> CatalogPage:
+        """按名称、描述、metadata等目录信息筛选和分页查询角色，不加载完整角色
+
+        例：query_characters({"metadata.category": "助手", "language": "zh-CN"}, limit=20)
+        """
+        return self.storage.query_characters(filters, offset, limit, order_by)
+
+    async def query_characters_async(self, filters: Optional[CatalogFilters] = None, offset: int = 0,
+                                     limit: Optional[int] = None, order_by: str = "name") -> CatalogPage:
+        """异步查询角色目录"""
+        return await self.async_storage.query_characters(filters, offset, limit, order_by)
+
     def delete_character(self, name: str) -> bool:
         """删除角色"""
         success = self.storage.delete_character(name)
         if success and name in self._characters_cache:
             del self._characters_cache[name]
         return success
-    
+
+    async def delete_character_async(self, name: str) -> bool:
+        """异步删除角色"""
+        success = await self.async_storage.delete_character(name)
+        if success and name in self._characters_cache:
+            del self._characters_cache[name]
+        return success
+
     def update_character(self, character: Character) -> bool:
-        """更新角色信息"""
-        character.updated_at = datetime.now()
-        return self.save_character(character)
-    
+        """更新角色信息，保存的是带有新updated_at的副本，传入的对象不会被修改"""
+        return self.save_character(replace(character, updated_at=datetime.now()))
+
     def clear_cache(self):
         """清空缓存"""
-        self._characters_cache.clear()
\ No newline at end of file
+        self._characters_cache.clear()
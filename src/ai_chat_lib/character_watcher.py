@@ -0,0 +1,217 @@
+"""
+角色文件监视器：文件变化时让角色缓存失效并重新加载
+"""
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import threading
+import time
+from typing import Dict, Iterable, Optional, Set, Tuple
+
+from .character_manager import CharacterManager
+from .storage.file_storage import JSON_SUFFIX, LEGACY_SUFFIX
+
+CHARACTER_SUFFIXES = (JSON_SUFFIX, LEGACY_SUFFIX)
+
+# inotify 常量（见 <sys/inotify.h>）
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_DELETE = 0x00000200
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+_EVENT_HEADER = struct.Struct("iIII")
+
+
+def _character_name(filename: str) -> Optional[str]:
+    """从文件名得到角色名，非角色文件返回None"""
+    stem, suffix = os.path.splitext(filename)
+    if suffix in CHARACTER_SUFFIXES and not filename.startswith(('__', '.')):
+        return stem
+    return None
+
+
+class _PollingBackend:
+    """stat轮询实现：每次只做一次目录扫描"""
+
+    name = "polling"
+
+    def __init__(self, directory: str, interval: float):
+        self.directory = directory
+        self.interval = interval
+        self._snapshot = self._scan()
+
+    def _scan(self) -> Dict[str, Tuple[int, int]]:
+        snapshot = {}
+        try:
+            with os.scandir(self.directory) as entries:
+                for entry in entries:
+                    if not _character_name(entry.name):
+                        continue
+                    try:
+                        stat = entry.stat()
+                    except FileNotFoundError:
+                        # 列出目录之后被删除的文件，不影响其他文件
+                        continue
+                    snapshot[entry.name] = (stat.st_mtime_ns, stat.st_size)
+        except FileNotFoundError:
+            pass
+        return snapshot
+
+    def poll(self, timeout: float) -> Set[str]:
+        """等待timeout后返回发生变化的文件名"""
+        if timeout > 0:
+            time.sleep(min(timeout, self.interval))
+        current = self._scan()
+        changed = {
+            name for name in current.keys() | self._snapshot.keys()
+            if current.get(name) != self._snapshot.get(name)
+        }
+        self._snapshot = current
+        return changed
+
+    def close(self):
+        pass
+
+
+class _InotifyBackend:
+    """Linux inotify实现，通过ctypes调用libc，不依赖第三方库"""
+
+    name = "inotify"
+
+    def __init__(self, directory: str):
+        libc_name = ctypes.util.find_library("c")
+        if not sys.platform.startswith("linux") or not libc_name:
+            raise OSError("当前平台不支持inotify")
+        libc = ctypes.CDLL(libc_name, use_errno=True)
+        if not hasattr(libc, "inotify_init1"):
+            raise OSError("libc不支持inotify")
+
+        self._fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 失败")
+        mask = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_DELETE
+        if libc.inotify_add_watch(self._fd, os.fsencode(directory), mask) < 0:
+            errno = ctypes.get_errno()
+            os.close(self._fd)
+            raise OSError(errno, f"无法监视目录 {directory}")
+
+    def poll(self, timeout: float) -> Set[str]:
+        """等待事件，返回发生变化的文件名"""
+        ready, _, _ = select.select([self._fd], [], [], timeout)
+        if not ready:
+            return set()
+        changed = set()
+        while True:
+            try:
+                data = os.read(self._fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset + _EVENT_HEADER.size <= len(data):
+                _, _, _, length = _EVENT_HEADER.unpack_from(data, offset)
+                offset += _EVENT_HEADER.size
+                raw_name = data[offset:offset + length].rstrip(b"\0")
+                offset += length
+                if raw_name:
+                    changed.add(os.fsdecode(raw_name))
+        return changed
+
+    def close(self):
+        os.close(self._fd)
+
+
+class CharacterWatcher:
+    """监视角色目录，只重新加载发生变化且已在缓存中的角色
+
+    优先使用inotify，不可用时退回到stat轮询。重新加载在后台线程完成，
+    请求路径上只需要比较内存中的版本号。
+    """
+
+    def __init__(self, character_manager: CharacterManager, characters_dir: Optional[str] = None,
+                 poll_interval: float = 1.0, debounce: float = 0.05, use_inotify: bool = True):
+        if characters_dir is None:
+            characters_dir = getattr(character_manager.storage, "characters_dir", None)
+        if characters_dir is None:
+            raise ValueError("无法确定角色目录，请显式传入 characters_dir")
+
+        self.character_manager = character_manager
+        self.characters_dir = characters_dir
+        self.poll_interval = poll_interval
+        self.debounce = debounce
+        self.use_inotify = use_inotify
+        self._backend = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+
+    @property
+    def backend_name(self) -> Optional[str]:
+        """当前使用的监视方式：inotify / polling"""
+        return self._backend.name if self._backend else None
+
+    def _create_backend(self):
+        if self.use_inotify:
+            try:
+                return _InotifyBackend(self.characters_dir)
+            except OSError:
+                pass
+        return _PollingBackend(self.characters_dir, self.poll_interval)
+
+    def start(self) -> "CharacterWatcher":
+        """启动后台监视线程"""
+        if self._thread and self._thread.is_alive():
+            return self
+        self._backend = self._create_backend()
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="character-watcher", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """停止监视"""
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+        if self._backend:
+            self._backend.close()
+            self._backend = None
+
+    def __enter__(self) -> "CharacterWatcher":
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            try:
+                changed = self._backend.poll(self.poll_interval)
+                if changed and self.debounce > 0:
+                    # 合并编辑器保存时产生的连续事件
+                    time.sleep(self.debounce)
+                    changed |= self._backend.poll(0)
+                if changed:
+                    self.handle_changes(changed)
+            except Exception as e:
+                print(f"角色监视器出错: {e}")
+                self._stop_event.wait(self.poll_interval)
+
+    def handle_changes(self, filenames: Iterable[str]) -> Set[str]:
+        """处理一批变化的文件，返回被重新加载的角色名"""
+        names = {_character_name(filename) for filename in filenames} - {None}
+        # 同步更新存储的目录索引（如果有）
+        refresh_catalog = getattr(self.character_manager.storage, "refresh_catalog", None)
+        if names and refresh_catalog:
+            refresh_catalog(sorted(names))
+
+        reloaded = set()
+        for name in names:
+            if self.character_manager.get_cached_character(name) is None:
+                continue
+            self.character_manager.reload_character(name)
+            reloaded.add(name)
+        return reloaded
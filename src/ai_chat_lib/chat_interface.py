@@ -1,15 +1,30 @@
 """
 多会话聊天接口
 """
-from typing import List, Optional, Dict, Any, AsyncGenerator
+import asyncio
+import time
+import uuid
+from typing import List, Optional, Dict, Any, AsyncGenerator, Callable, Iterable, Iterator
 from datetime import datetime
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from .models.message import Message, MessageRole
 from .models.character import Character
 from .character_manager import CharacterManager
 from .data_adapter import DataAdapter
 from .prompt_manager import PromptManager
-from .providers.base import BaseAIProvider
+from .providers.base import BaseAIProvider, StreamEvent, StreamEventType
+from .streaming import BackpressurePolicy, ChunkCoalescer, StreamBroadcaster, StreamSubscription
+from .scheduler import FairShareScheduler, Priority, SchedulerTicket
+from .timeouts import ChatTimeouts, guard_stream, wait_with_timeout
+from .tools import (
+    CompletionResult, Tool, ToolCall, ToolExecutor, ToolRegistry, add_usage, default_tool_registry
+)
+from .memory import MemoryStore
+from .metrics import ChatMetrics
+from .usage import UsageLedger, capture_usage, estimate_usage
+from .transcripts import TranscriptSink
+from .history_compaction import PackedHistory
+from .utils.token_counter import estimate_tokens
 
 @dataclass
 class ChatSession:
@@ -17,10 +32,22 @@ class ChatSession:
     session_id: str
     character: Optional[Character] = None
     provider: Optional[BaseAIProvider] = None
-    chat_history: List[Message] = None
+    # 不参与比较和repr，避免读取被压缩的历史时解压
+    chat_history: List[Message] = field(default_factory=list, compare=False, repr=False)
     last_user_message: Optional[Message] = None
     created_at: datetime = None
     updated_at: datetime = None
+    # 加载角色时使用的名称（文件名，可能与角色的name字段不同）和版本号
+    character_key: Optional[str] = None
+    character_version: int = 0
+    # 角色文件被重新加载后，是否在下一轮对话时换用新版本
+    auto_reload_character: bool = False
+    # 调度时所属的租户，None时以会话ID作为租户
+    tenant: Optional[str] = None
+    # 空闲后被HistoryCompactor压缩的历史，此时chat_history在下次访问时解压
+    packed_history: Optional[PackedHistory] = field(default=None, repr=False, compare=False)
+    # 最近一次对话或解压的时间（time.monotonic）
+    last_active: float = field(default_factory=time.monotonic, repr=False, compare=False)
     
     def __post_init__(self):
         if self.chat_history is None:
@@ -29,6 +56,75 @@ class ChatSession:
             self.created_at = datetime.now()
         if self.updated_at is None:
             self.updated_at = datetime.now()
+    
+    def __getattr__(self, name):
+        # 只在实例中没有该属性时调用：历史被压缩后解压chat_history
+        if name == "chat_history":
+            packed = self.__dict__.get("packed_history")
+            if packed is not None:
+                history = packed.unpack()
+                self.chat_history = history
+                self.packed_history = None
+                self.last_active = time.monotonic()
+                return history
+        raise AttributeError(f"'{type(self).__name__}' object has no attribute '{name}'")
+    
+    def iter_history(self) -> Iterator[Message]:
+        """只读遍历历史：历史被压缩时临时解压，不写回会话，也不更新last_active
+        
+        用于导出、建索引等只读操作，之后会话仍保持压缩状态。
+        """
+        if "chat_history" not in self.__dict__:
+            packed = self.__dict__.get("packed_history")
+            if packed is not None:
+                return iter(packed.unpack())
+        return iter(self.chat_history)
+    
+    @property
+    def message_count(self) -> int:
+        """消息数，历史被压缩时不解压"""
+        packed = self.__dict__.get("packed_history")
+        return packed.message_count if packed is not None else len(self.chat_history)
+
+
+# 续写被中断的回复时发送给提供商的指令（不写入历史）
+CONTINUE_PROMPT = "你上一条回复被中断了，请从中断的地方直接继续，不要重复已经输出的内容。"
+
+# 找回的长期记忆附加在系统提示词之后
+MEMORY_PROMPT = "以下是与当前对话相关的早前对话内容，可供参考：\n{memories}"
+
+
+async def _answer_chunks(events: AsyncGenerator[StreamEvent, None],
+                         usage_sink: Optional[List[Dict[str, Any]]] = None) -> AsyncGenerator[str, None]:
+    """从事件流中取出回复文本，用量放入usage_sink"""
+    try:
+        async for event in events:
+            if event.type == StreamEventType.ANSWER:
+                yield event.data
+            elif event.type == StreamEventType.USAGE and usage_sink is not None:
+                usage_sink.append(event.data)
+    finally:
+        # 提前结束（超时、取消）时关闭上游的事件流
+        await events.aclose()
+
+
+def _error_text(error: BaseException) -> str:
+    """保存到部分回复metadata中的错误说明，客户端断开等没有消息的异常使用类型名"""
+    return str(error) or type(error).__name__
+
+
+def _reply_metadata(reasoning: Optional[List[str]], usage: Optional[Dict[str, Any]],
+                    stream_id: Optional[str]) -> Optional[Dict[str, Any]]:
+    """回复消息的metadata：思考过程、用量和stream_id，都没有时为None"""
+    metadata = {}
+    if reasoning:
+        metadata["reasoning"] = "".join(reasoning)
+    if usage:
+        metadata["usage"] = usage
+    if stream_id:
+        metadata["stream_id"] = stream_id
+    return metadata or None
+
 
 class MultiSessionChatInterface:
     """多会话聊天接口"""
@@ -43,6 +139,98 @@ class MultiSessionChatInterface:
         # 会话管理
         self.sessions: Dict[str, ChatSession] = {}
         self.current_session_id: Optional[str] = None
+        
+        # 流式输出默认使用的片段合并器，None表示原样输出提供商的片段
+        self.stream_coalescer: Optional[ChunkCoalescer] = None
+        # 每个会话进行中的广播流式回复
+        self._broadcasts: Dict[str, StreamBroadcaster] = {}
+        # 按stream_id索引的广播流，结束后保留stream_retention秒供断线的客户端恢复
+        self._streams: Dict[str, StreamBroadcaster] = {}
+        self.stream_retention = 60.0
+        # 未传入timeout/deadline时使用的默认超时，None表示不限制
+        self.default_timeouts: Optional[ChatTimeouts] = None
+        # 设置后调用提供商前先排队获取许可（按优先级和租户权重公平调度）
+        self.scheduler: Optional[FairShareScheduler] = None
+        # 工具调用：角色通过metadata["tools"]引用注册表中的工具
+        self.tool_registry: ToolRegistry = default_tool_registry
+        self.tool_executor = ToolExecutor()
+        self.max_tool_rounds = 5
+        # 长期记忆：设置后每轮对话前找回相关的早前消息，附加到系统提示词中
+        self.memory: Optional[MemoryStore] = None
+        self.memory_top_k = 5
+        # 找回的记忆最多占用的token数（估算）
+        self.memory_token_budget = 300
+        # 最近的若干条消息本来就在上下文中，不作为记忆返回
+        self.memory_exclude_recent = 20
+        # 设置后把每轮的用量记入账本，并在请求前检查会话和租户的预算
+        self.usage_ledger: Optional[UsageLedger] = None
+        # 设置后记录请求数、错误、token、延迟等指标（见ChatMetrics.bind）
+        self.metrics: Optional[ChatMetrics] = None
+        # 历史监听器：对话完成后收到本轮新增的消息，会话删除或清空时收到通知
+        self._history_listeners: List[Any] = []
+    
+    def add_history_listener(self, listener):
+        """添加历史监听器，如FullTextIndex
+        
+        监听器需要实现on_message_appended(session, message)和on_session_removed(session_id)，
+        后者在会话被删除或历史被清空时调用。
+        """
+        if listener not in self._history_listeners:
+            self._history_listeners.append(listener)
+    
+    def remove_history_listener(self, listener):
+        if listener in self._history_listeners:
+            self._history_listeners.remove(listener)
+    
+    def add_transcript_sink(self, sink: TranscriptSink):
+        """添加对话记录器（如MarkdownTranscriptSink），每轮对话完成后收到本轮的消息"""
+        self.add_history_listener(sink)
+    
+    def remove_transcript_sink(self, sink: TranscriptSink, close: bool = True):
+        """移除对话记录器，默认同时写入剩余记录并关闭"""
+        self.remove_history_listener(sink)
+        if close:
+            sink.close()
+    
+    def _iter_history_listeners(self):
+        if self.memory is not None and self.memory not in self._history_listeners:
+            yield self.memory
+        yield from self._history_listeners
+    
+    def _notify_turn(self, session: ChatSession):
+        """把本轮新增的消息（用户消息及之后的消息）通知给监听器
+        
+        在一轮对话结束后才通知，出错回滚的消息不会被监听器看到。
+        """
+        session.last_active = time.monotonic()
+        listeners = list(self._iter_history_listeners())
+        if not listeners or session.last_user_message is None:
+            return
+        history = session.chat_history
+        for index in range(len(history) - 1, -1, -1):
+            if history[index] == session.last_user_message:
+                for message in history[index:]:
+                    for listener in listeners:
+                        listener.on_message_appended(session, message)
+                return
+    
+    def _notify_removed(self, session_id: str):
+        """通知监听器会话的历史已被删除或清空"""
+        for listener in self._iter_history_listeners():
+            listener.on_session_removed(session_id)
+    
+    def _notify_updated(self, session: ChatSession, message: Message):
+        """通知监听器历史中已有的消息被修改（如续写了部分回复）
+        
+        监听器没有on_message_updated时把消息作为新消息再通知一次。
+        """
+        session.last_active = time.monotonic()
+        for listener in list(self._iter_history_listeners()):
+            on_updated = getattr(listener, "on_message_updated", None)
+            if on_updated is not None:
+                on_updated(session, message)
+            else:
+                listener.on_message_appended(session, message)
     
     def create_session(self, session_id: Optional[str] = None) -> str:
         """创建新会话"""
@@ -73,6 +261,7 @@ class MultiSessionChatInterface:
             if self.current_session_id == session_id:
                 self.current_session_id = None
             del self.sessions[session_id]
+            self._notify_removed(session_id)
             return True
         return False
     
@@ -93,7 +282,7 @@ class MultiSessionChatInterface:
                 "session_id": session.session_id,
                 "character": session.character.name if session.character else None,
                 "provider": session.provider.get_provider_name() if session.provider else None,
-                "message_count": len(session.chat_history),
+                "message_count": session.message_count,
                 "created_at": session.created_at.isoformat(),
                 "updated_at": session.updated_at.isoformat(),
                 "is_current": session.session_id == self.current_session_id
@@ -101,8 +290,36 @@ class MultiSessionChatInterface:
             for session in self.sessions.values()
         ]
     
-    def switch_character(self, character_name: str, session_id: Optional[str] = None) -> bool:
-        """为指定会话切换AI角色"""
+    def add_sessions(self, sessions: Iterable[ChatSession], overwrite: bool = False) -> int:
+        """批量加入已有的会话（如从导出文件导入），不改变当前会话，返回加入的数量"""
+        added: Dict[str, ChatSession] = {}
+        for session in sessions:
+            if not overwrite and (session.session_id in self.sessions or session.session_id in added):
+                continue
+            added[session.session_id] = session
+        replaced = [session_id for session_id in added if session_id in self.sessions]
+        self.sessions.update(added)
+        # 被覆盖的会话：记忆和索引中旧会话的内容一并删除
+        for session_id in replaced:
+            self._notify_removed(session_id)
+        return len(added)
+    
+    def export_sessions(self, path: str, filter: Optional[Callable[[ChatSession], bool]] = None,
+                        compression: Optional[str] = None, level: Optional[int] = None) -> int:
+        """把会话流式导出为JSONL文件（.gz/.zst自动压缩），返回导出的会话数
+        
+        例：chat.export_sessions("sessions.jsonl.gz", filter=lambda s: s.updated_at >= since)
+        """
+        from .session_export import export_sessions
+        return export_sessions(list(self.sessions.values()), path, filter, compression, level)
+    
+    def import_sessions(self, path: str, batch_size: int = 500, overwrite: bool = False,
+                        compression: Optional[str] = None) -> int:
+        """从导出文件批量导入会话，返回导入的会话数"""
+        from .session_export import import_sessions
+        return import_sessions(self, path, batch_size, overwrite, compression)
+    
+    def _get_session_for_switch(self, session_id: Optional[str]) -> ChatSession:
         if session_id is None:
             session_id = self.current_session_id
         
@@ -112,12 +329,29 @@ class MultiSessionChatInterface:
         session = self.sessions.get(session_id)
         if not session:
             raise ValueError(f"会话 {session_id} 不存在")
-        
+        return session
+    
+    def switch_character(self, character_name: str, session_id: Optional[str] = None) -> bool:
+        """为指定会话切换AI角色"""
+        session = self._get_session_for_switch(session_id)
         character = self.character_manager.load_character(character_name)
+        return self._apply_character(session, character_name, character)
+    
+    async def switch_character_async(self, character_name: str, session_id: Optional[str] = None) -> bool:
+        """为指定会话切换AI角色，缓存未命中时在线程池中读取存储，不阻塞事件循环"""
+        session = self._get_session_for_switch(session_id)
+        character = await self.character_manager.load_character_async(character_name)
+        return self._apply_character(session, character_name, character)
+    
+    def _apply_character(self, session: ChatSession, character_name: str,
+                         character: Optional[Character]) -> bool:
         if character:
             session.character = character
-            # 切换角色时清空历史记录
+            session.character_key = character_name
+            session.character_version = self.character_manager.get_version(character_name)
+            # 切换角色时清空历史记录，记忆和索引中该会话的内容一并删除
             session.chat_history.clear()
+            self._notify_removed(session.session_id)
             # 把角色示例对话插入到历史中
             example_history = self.character_manager.character_example_chat_to_history(character)
             session.chat_history.extend(example_history)
@@ -125,6 +359,39 @@ class MultiSessionChatInterface:
             return True
         return False
     
+    def set_character_auto_reload(self, enabled: bool = True, session_id: Optional[str] = None) -> bool:
+        """设置会话是否在角色文件更新后自动换用新版本"""
+        if session_id is None:
+            session_id = self.current_session_id
+        
+        session = self.sessions.get(session_id) if session_id else None
+        if not session:
+            return False
+        session.auto_reload_character = enabled
+        return True
+    
+    def _refresh_session_character(self, session: ChatSession):
+        """会话开启自动更新时，换用角色的新版本（只读内存，不访问存储）"""
+        if not session.auto_reload_character or not session.character_key:
+            return
+        
+        version = self.character_manager.get_version(session.character_key)
+        if version == session.character_version:
+            return
+        
+        character = self.character_manager.get_cached_character(session.character_key)
+        session.character_version = version
+        if not character or character is session.character:
+            return
+        
+        # 历史开头仍是旧角色的示例对话时，替换为新角色的示例对话
+        old_examples = self.character_manager.character_example_chat_to_history(session.character)
+        prefix = session.chat_history[:len(old_examples)]
+        if [(m.role, m.content) for m in prefix] == [(m.role, m.content) for m in old_examples]:
+            session.chat_history[:len(old_examples)] = \
+                self.character_manager.character_example_chat_to_history(character)
+        session.character = character
+    
     def switch_provider(self, provider: BaseAIProvider, session_id: Optional[str] = None) -> bool:
         """为指定会话切换AI提供商"""
         if session_id is None:
@@ -180,6 +447,8 @@ class MultiSessionChatInterface:
         if not session.provider:
             raise ValueError(f"会话 {session_id} 未设置AI提供商")
         
+        self._refresh_session_character(session)
+        
         # 渲染用户输入中的模板变量
         rendered_input = self.prompt_manager.render_prompt(
             user_input, session.character, user_name, **kwargs
@@ -188,6 +457,8 @@ class MultiSessionChatInterface:
         system_input = self.prompt_manager.render_character_prompt(
             session.character, user_name, **kwargs
         )
+        if self.memory is not None:
+            system_input = self._with_memories(session, system_input, rendered_input)
         
         # 添加用户消息到历史
         user_message = Message(
@@ -198,6 +469,7 @@ class MultiSessionChatInterface:
         session.chat_history.append(user_message)
         session.last_user_message = user_message
         session.updated_at = datetime.now()
+        session.last_active = time.monotonic()
 
         session.chat_history = session.provider.resolve_chat_history_with_system(
             system_input, session.chat_history
@@ -205,68 +477,514 @@ class MultiSessionChatInterface:
 
         return system_input, session.chat_history, session
 
+    def _with_memories(self, session: ChatSession, system_input: str, query: str) -> str:
+        """找回与用户输入相关的记忆，在token预算内附加到系统提示词之后"""
+        recent = []
+        if self.memory_exclude_recent > 0:
+            recent = [m.content for m in session.chat_history[-self.memory_exclude_recent:]]
+        hits = self.memory.search(session.session_id, query, self.memory_top_k, exclude=recent)
+        lines = []
+        budget = self.memory_token_budget
+        for hit in hits:
+            line = f"- {'用户' if hit.role == MessageRole.USER else '助手'}: {hit.text}"
+            cost = estimate_tokens(line)
+            if cost > budget:
+                continue
+            budget -= cost
+            lines.append(line)
+        if not lines:
+            return system_input
+        return system_input + "\n\n" + MEMORY_PROMPT.format(memories="\n".join(lines))
+    
     async def chat(self, user_input: str, user_name: str = "用户", 
-                  session_id: Optional[str] = None, **kwargs) -> str:
-        """发送聊天消息并获取回复"""
+                  session_id: Optional[str] = None, timeout=None,
+                  deadline: Optional[float] = None, priority: Optional[Priority] = None,
+                  tenant: Optional[str] = None, tools: Optional[List[Any]] = None, **kwargs) -> str:
+        """发送聊天消息并获取回复
+        
+        timeout可以是总时间（秒）或ChatTimeouts，deadline是time.monotonic()的绝对截止时间；
+        超时时取消上游请求并抛出ChatTimeoutError。
+        设置了scheduler时按priority（默认交互）和tenant（默认会话的租户）排队，排队时间计入总超时。
+        tools为工具名称或Tool列表，默认使用角色metadata["tools"]；模型要求的工具并发执行，
+        结果自动返回给模型，直到得到最终回复。
+        """
+        timeouts = ChatTimeouts.resolve(timeout, deadline, self.default_timeouts)
         system_input, chat_history, session = self.prepare_chat(
             user_input, user_name, session_id, **kwargs
         )
         
         # 调用AI提供商获取回复
+        ticket = None
+        error = None
+        recorder = self.metrics.start_request(session) if self.metrics is not None else None
         try:
-            response = await session.provider.chat_completion(
-                system_input, chat_history, **kwargs
-            )
+            self._check_budget(session, tenant, kwargs)
+            ticket = await self._acquire_slot(session, priority, tenant, timeouts)
+            turn_tools = self._resolve_tools(session, tools)
+            if turn_tools:
+                result = await self._run_tool_rounds(session, system_input, turn_tools, timeouts, kwargs)
+                response, usage = result.content, result.usage
+            else:
+                # chat_completion只返回文本，用量由提供商通过report_usage报告
+                with capture_usage() as captured:
+                    response = await wait_with_timeout(
+                        session.provider.chat_completion(
+                            system_input, chat_history, **self._provider_kwargs(kwargs, timeouts)
+                        ),
+                        timeouts
+                    )
+                usage = None
+                for reported in captured:
+                    usage = add_usage(usage, reported)
+            if recorder is not None:
+                recorder.usage(usage)
+            self._record_usage(session, tenant, kwargs, usage, system_input, session.chat_history, response)
             
             # 添加AI回复到历史
             ai_message = Message(
                 role=MessageRole.ASSISTANT,
                 content=response,
-                timestamp=datetime.now()
+                timestamp=datetime.now(),
+                metadata=_reply_metadata(None, usage, None)
             )
             session.chat_history.append(ai_message)
             session.updated_at = datetime.now()
+            self._notify_turn(session)
             
             return response
         
-        except Exception as e:
-            # 如果发生错误，移除刚添加的用户消息
-            if (session.chat_history and session.last_user_message and 
-                session.chat_history[-1] == session.last_user_message):
-                session.chat_history.pop()
-            raise e
+        except BaseException as e:
+            # 如果发生错误或被取消，移除刚添加的用户消息（以及之后的工具调用消息）
+            error = e
+            self._rollback_turn(session)
+            raise
+        finally:
+            self._release_slot(ticket)
+            if recorder is not None:
+                recorder.finish(error)
+    
+    def _rollback_turn(self, session: ChatSession):
+        """移除本轮的用户消息和之后添加的消息"""
+        history = session.chat_history
+        if session.last_user_message is None:
+            return
+        for index in range(len(history) - 1, -1, -1):
+            if history[index] == session.last_user_message:
+                del history[index:]
+                return
+    
+    def _resolve_tools(self, session: ChatSession, tools: Optional[List[Any]]) -> List[Tool]:
+        """本轮可用的工具：调用参数优先，其次是角色metadata["tools"]"""
+        if tools is None:
+            tools = (session.character.metadata or {}).get("tools") or []
+        return self.tool_registry.resolve(tools)
+    
+    async def _run_tool_rounds(self, session: ChatSession, system_input: str, tools: List[Tool],
+                               timeouts: Optional[ChatTimeouts], kwargs: Dict[str, Any]) -> CompletionResult:
+        """请求模型并执行它要求的工具，直到得到不含工具调用的回复
+        
+        每轮的工具调用消息和工具结果消息写入历史，最终回复由调用方写入；返回结果的用量为所有轮次之和。
+        """
+        provider_kwargs = self._provider_kwargs(kwargs, timeouts)
+        usage = None
+        for _ in range(self.max_tool_rounds):
+            result = await wait_with_timeout(session.provider.chat_completion_with_tools(
+                system_input, session.chat_history, tools, **provider_kwargs
+            ), timeouts)
+            usage = add_usage(usage, result.usage)
+            if not result.tool_calls:
+                result.usage = usage
+                return result
+            await self._run_tool_calls(session, result.content, result.tool_calls, tools, timeouts)
+        raise Exception(f"工具调用超过{self.max_tool_rounds}轮仍未得到最终回复")
+    
+    async def _run_tool_calls(self, session: ChatSession, content: str, tool_calls: List[ToolCall],
+                              tools: List[Tool], timeouts: Optional[ChatTimeouts]):
+        """把工具调用消息写入历史，执行工具并写入结果消息"""
+        session.chat_history.append(Message(
+            role=MessageRole.ASSISTANT,
+            content=content,
+            timestamp=datetime.now(),
+            metadata={"tool_calls": [call.to_dict() for call in tool_calls]}
+        ))
+        # 同一轮的工具并发执行，耗时取决于最慢的一个
+        results = await wait_with_timeout(self.tool_executor.execute(tool_calls, tools), timeouts)
+        for tool_result in results:
+            metadata = {"tool_call_id": tool_result.call.id, "name": tool_result.call.name}
+            if tool_result.error:
+                metadata["error"] = True
+            session.chat_history.append(Message(
+                role=MessageRole.TOOL,
+                content=tool_result.content,
+                timestamp=datetime.now(),
+                metadata=metadata
+            ))
+    
+    async def _tool_turn_events(self, session: ChatSession, system_input: str, tools: List[Tool],
+                                timeouts: Optional[ChatTimeouts],
+                                kwargs: Dict[str, Any]) -> AsyncGenerator[StreamEvent, None]:
+        """使用工具时的事件流：每轮都流式请求，思考过程和回复片段立即输出
+        
+        模型要求调用工具时，该轮的文字写入工具调用消息，输出TOOL_CALLS事件后执行工具并进入下一轮；
+        USAGE事件的data为到目前为止各轮用量之和。
+        """
+        provider_kwargs = self._provider_kwargs(kwargs, timeouts)
+        usage = None
+        for _ in range(self.max_tool_rounds):
+            answer: List[str] = []
+            tool_calls: List[ToolCall] = []
+            round_usage = None
+            events = guard_stream(session.provider.chat_completion_events_with_tools(
+                system_input, session.chat_history, tools, **provider_kwargs
+            ), timeouts)
+            try:
+                async for event in events:
+                    if event.type == StreamEventType.TOOL_CALLS:
+                        tool_calls.extend(event.data)
+                    elif event.type == StreamEventType.USAGE:
+                        round_usage = event.data
+                    elif event.type != StreamEventType.COMPLETE:
+                        if event.type == StreamEventType.ANSWER:
+                            answer.append(event.data)
+                        yield event
+            finally:
+                await events.aclose()
+            
+            usage = add_usage(usage, round_usage)
+            if round_usage:
+                yield StreamEvent(StreamEventType.USAGE, usage)
+            if not tool_calls:
+                return
+            yield StreamEvent(StreamEventType.TOOL_CALLS, tool_calls)
+            await self._run_tool_calls(session, "".join(answer), tool_calls, tools, timeouts)
+        raise Exception(f"工具调用超过{self.max_tool_rounds}轮仍未得到最终回复")
+    
+    async def _acquire_slot(self, session: ChatSession, priority: Optional[Priority],
+                            tenant: Optional[str], timeouts: Optional[ChatTimeouts]) -> Optional[SchedulerTicket]:
+        """有调度器时排队等待调用提供商的许可"""
+        if self.scheduler is None:
+            return None
+        return await wait_with_timeout(self.scheduler.acquire(
+            session.provider,
+            self._tenant_of(session, tenant),
+            priority or Priority.INTERACTIVE,
+        ), timeouts)
+    
+    def _release_slot(self, ticket: Optional[SchedulerTicket]):
+        if ticket is not None:
+            self.scheduler.release(ticket)
+    
+    @staticmethod
+    def _tenant_of(session: ChatSession, tenant: Optional[str]) -> str:
+        """调度和预算使用的租户：调用参数、会话的租户、会话ID依次取第一个"""
+        return tenant or session.tenant or session.session_id
+    
+    def _check_budget(self, session: ChatSession, tenant: Optional[str], kwargs: Dict[str, Any]):
+        """请求发送前检查预算，超出时抛出BudgetExceededError，需要降级时把模型写入kwargs"""
+        if self.usage_ledger is None:
+            return
+        model = self.usage_ledger.check(session.session_id, self._tenant_of(session, tenant))
+        if model is not None:
+            kwargs["model"] = model
+    
+    def _record_usage(self, session: ChatSession, tenant: Optional[str], kwargs: Dict[str, Any],
+                      usage: Optional[Dict[str, Any]], system_input: str, messages: List[Message],
+                      completion: str):
+        """把本轮用量记入账本；提供商没有报告用量时按本地估算记入"""
+        if self.usage_ledger is None:
+            return
+        if not usage:
+            usage = estimate_usage(system_input, messages, completion)
+        provider = session.provider
+        self.usage_ledger.record(
+            usage,
+            session_id=session.session_id,
+            tenant=self._tenant_of(session, tenant),
+            character=session.character.name if session.character else "",
+            provider=provider.get_provider_name(),
+            model=kwargs.get("model") or getattr(provider, "model", "") or "",
+        )
+    
+    @staticmethod
+    def _provider_kwargs(kwargs: Dict[str, Any], timeouts: Optional[ChatTimeouts]) -> Dict[str, Any]:
+        """把超时设置传给提供商，由提供商设置到HTTP请求上"""
+        if timeouts is None:
+            return kwargs
+        return {**kwargs, "timeouts": timeouts}
+    
+    def _resolve_coalescer(self, coalesce) -> Optional[ChunkCoalescer]:
+        """coalesce: None使用接口默认设置，True使用新的默认合并器，False不合并"""
+        if coalesce is None:
+            return self.stream_coalescer
+        if coalesce is True:
+            return ChunkCoalescer()
+        return coalesce or None
     
     async def chat_stream(self, user_input: str, user_name: str = "用户", 
-                         session_id: Optional[str] = None, **kwargs) -> AsyncGenerator[str, None]:
-        """流式聊天"""
+                         session_id: Optional[str] = None, coalesce=None,
+                         stream_id: Optional[str] = None, timeout=None,
+                         deadline: Optional[float] = None, priority: Optional[Priority] = None,
+                         tenant: Optional[str] = None, **kwargs) -> AsyncGenerator[str, None]:
+        """流式聊天，只输出回复文本
+        
+        coalesce可以是ChunkCoalescer、True或False，把提供商的细碎片段合并后再输出。
+        timeout/deadline/priority/tenant同chat，ChatTimeouts中的first_token和chunk_gap限制首个分片和分片间隔；
+        调度许可在整个流式回复期间保持占用。
+        上游中途出错时保留已生成的部分回复（metadata["partial"]为True），可用continue_response续写。
+        """
+        events = self.chat_stream_events(
+            user_input, user_name, session_id, stream_id=stream_id, timeout=timeout,
+            deadline=deadline, priority=priority, tenant=tenant, **kwargs
+        )
+        coalescer = self._resolve_coalescer(coalesce)
+        stream = coalescer.coalesce(_answer_chunks(events)) if coalescer is not None else None
+        try:
+            if stream is not None:
+                async for chunk in stream:
+                    yield chunk
+                return
+            async for event in events:
+                if event.type == StreamEventType.ANSWER:
+                    yield event.data
+        finally:
+            # 调用方提前结束迭代时立即关闭内层生成器，由chat_stream_events保存部分回复或回滚
+            if stream is not None:
+                await stream.aclose()
+            await events.aclose()
+    
+    async def chat_stream_events(self, user_input: str, user_name: str = "用户",
+                                 session_id: Optional[str] = None, stream_id: Optional[str] = None,
+                                 timeout=None, deadline: Optional[float] = None,
+                                 priority: Optional[Priority] = None, tenant: Optional[str] = None,
+                                 tools: Optional[List[Any]] = None,
+                                 **kwargs) -> AsyncGenerator[StreamEvent, None]:
+        """按事件流式聊天：思考过程、回复、用量，最后是COMPLETE事件
+        
+        思考过程保存在回复消息的metadata["reasoning"]中，用量保存在metadata["usage"]中，
+        两者都不会随历史再次发给提供商。COMPLETE事件的data中包含保存到历史的message。
+        使用工具时（见chat），每轮都流式请求；模型要求调用工具时输出TOOL_CALLS事件，
+        之前输出的回复片段属于工具调用消息，保存到历史的最终回复只包含最后一轮的回复。
+        """
+        timeouts = ChatTimeouts.resolve(timeout, deadline, self.default_timeouts)
         system_input, chat_history, session = self.prepare_chat(
             user_input, user_name, session_id, **kwargs
         )
         
         # 流式获取回复
-        full_response = ""
+        answer: List[str] = []
+        reasoning: List[str] = []
+        usage = None
+        ticket = None
+        error = None
+        events = None
+        recorder = self.metrics.start_request(session, stream=True) if self.metrics is not None else None
         try:
-            async for chunk in session.provider.chat_completion_stream(
-                system_input, chat_history, **kwargs
-            ):
-                full_response += chunk
-                yield chunk
+            self._check_budget(session, tenant, kwargs)
+            ticket = await self._acquire_slot(session, priority, tenant, timeouts)
+            turn_tools = self._resolve_tools(session, tools)
+            if turn_tools:
+                events = self._tool_turn_events(session, system_input, turn_tools, timeouts, kwargs)
+            else:
+                events = guard_stream(session.provider.chat_completion_events(
+                    system_input, chat_history, **self._provider_kwargs(kwargs, timeouts)
+                ), timeouts)
+            async for event in events:
+                if event.type == StreamEventType.ANSWER:
+                    answer.append(event.data)
+                    if recorder is not None:
+                        recorder.token()
+                elif event.type == StreamEventType.TOOL_CALLS:
+                    # 之前的回复片段属于工具调用消息，最终回复从下一轮开始
+                    answer.clear()
+                elif event.type == StreamEventType.REASONING:
+                    reasoning.append(event.data)
+                elif event.type == StreamEventType.USAGE:
+                    usage = event.data
+                    if recorder is not None:
+                        recorder.usage(usage)
+                elif event.type == StreamEventType.COMPLETE:
+                    # 保存到历史之后再输出COMPLETE
+                    continue
+                yield event
+            
+            self._record_usage(session, tenant, kwargs, usage, system_input, session.chat_history, "".join(answer))
             
             # 添加完整回复到历史
             ai_message = Message(
                 role=MessageRole.ASSISTANT,
-                content=full_response,
-                timestamp=datetime.now()
+                content="".join(answer),
+                timestamp=datetime.now(),
+                metadata=_reply_metadata(reasoning, usage, stream_id)
             )
             session.chat_history.append(ai_message)
             session.updated_at = datetime.now()
+            self._notify_turn(session)
             
-        except Exception as e:
-            # 如果发生错误，移除刚添加的用户消息
-            if (session.chat_history and session.last_user_message and 
-                session.chat_history[-1] == session.last_user_message):
-                session.chat_history.pop()
-            raise e
+        except BaseException as e:
+            # 包括客户端断开（GeneratorExit）和任务取消（CancelledError）
+            error = e
+            if answer:
+                # 已经生成了部分回复：保留用户消息和部分回复，避免重新生成
+                self._record_usage(session, tenant, kwargs, usage, system_input, session.chat_history,
+                                   "".join(answer))
+                self._append_partial_response(session, "".join(answer), e, stream_id, reasoning)
+                self._notify_turn(session)
+            else:
+                # 如果没有任何输出，移除刚添加的用户消息
+                self._rollback_turn(session)
+            raise
+        finally:
+            if events is not None:
+                await events.aclose()
+            self._release_slot(ticket)
+            if recorder is not None:
+                recorder.finish(error)
+        
+        yield StreamEvent(StreamEventType.COMPLETE, {
+            "reasoning": "".join(reasoning),
+            "answer": ai_message.content,
+            "usage": usage,
+            "message": ai_message,
+        })
+    
+    def _append_partial_response(self, session: ChatSession, content: str, error: Exception,
+                                 stream_id: Optional[str] = None, reasoning: Optional[List[str]] = None):
+        metadata = {"partial": True, "error": _error_text(error)}
+        metadata.update(_reply_metadata(reasoning, None, stream_id) or {})
+        session.chat_history.append(Message(
+            role=MessageRole.ASSISTANT,
+            content=content,
+            timestamp=datetime.now(),
+            metadata=metadata
+        ))
+        session.updated_at = datetime.now()
+    
+    async def continue_response(self, user_name: str = "用户", session_id: Optional[str] = None,
+                                coalesce=None, timeout=None, deadline: Optional[float] = None,
+                                priority: Optional[Priority] = None, tenant: Optional[str] = None,
+                                **kwargs) -> AsyncGenerator[str, None]:
+        """续写会话中最后一条被中断的部分回复，只输出新生成的内容
+        
+        续写完成后新内容会接到原消息上并清除partial标记；再次出错时保留已续写的部分。
+        """
+        timeouts = ChatTimeouts.resolve(timeout, deadline, self.default_timeouts)
+        if session_id is None:
+            session_id = self.current_session_id
+        session = self.sessions.get(session_id) if session_id else None
+        if not session:
+            raise ValueError(f"会话 {session_id} 不存在")
+        if not session.provider or not session.character:
+            raise ValueError(f"会话 {session_id} 未设置AI角色或提供商")
+        
+        partial = session.chat_history[-1] if session.chat_history else None
+        if partial is None or partial.role != MessageRole.ASSISTANT or not (partial.metadata or {}).get("partial"):
+            raise ValueError(f"会话 {session_id} 没有可以续写的部分回复")
+        
+        system_input = self.prompt_manager.render_character_prompt(session.character, user_name, **kwargs)
+        # 续写指令只发送给提供商，不写入历史
+        messages = session.chat_history + [Message(role=MessageRole.USER, content=CONTINUE_PROMPT)]
+        messages = session.provider.resolve_chat_history_with_system(system_input, messages)
+        
+        chunks: List[str] = []
+        ticket = None
+        error = None
+        recorder = self.metrics.start_request(session, stream=True) if self.metrics is not None else None
+        usage_sink: List[Dict[str, Any]] = []
+        stream = None
+        try:
+            self._check_budget(session, tenant, kwargs)
+            ticket = await self._acquire_slot(session, priority, tenant, timeouts)
+            stream = guard_stream(_answer_chunks(session.provider.chat_completion_events(
+                system_input, messages, **self._provider_kwargs(kwargs, timeouts)
+            ), usage_sink), timeouts)
+            coalescer = self._resolve_coalescer(coalesce)
+            if coalescer is not None:
+                stream = coalescer.coalesce(stream)
+            async for chunk in stream:
+                chunks.append(chunk)
+                if recorder is not None:
+                    recorder.token()
+                yield chunk
+        except BaseException as e:
+            error = e
+            partial.metadata["error"] = _error_text(e)
+            session.updated_at = datetime.now()
+            if chunks:
+                self._record_usage(session, tenant, kwargs, usage_sink[-1] if usage_sink else None,
+                                   system_input, messages, "".join(chunks))
+                partial.content += "".join(chunks)
+                self._notify_updated(session, partial)
+            raise
+        finally:
+            if stream is not None:
+                await stream.aclose()
+            self._release_slot(ticket)
+            if recorder is not None:
+                recorder.finish(error)
+        
+        usage = usage_sink[-1] if usage_sink else None
+        if recorder is not None:
+            recorder.usage(usage)
+        self._record_usage(session, tenant, kwargs, usage, system_input, messages, "".join(chunks))
+        partial.content += "".join(chunks)
+        partial.metadata.pop("partial", None)
+        partial.metadata.pop("error", None)
+        partial.metadata["continued"] = partial.metadata.get("continued", 0) + 1
+        session.updated_at = datetime.now()
+        self._notify_updated(session, partial)
+    
+    def chat_stream_broadcast(self, user_input: str, user_name: str = "用户",
+                              session_id: Optional[str] = None, replay_size: int = 4096,
+                              coalesce=None, **kwargs) -> StreamBroadcaster:
+        """开始一次流式回复并广播给多个订阅者，只调用一次上游
+        
+        返回的广播器在后台读取回复；调用方和其他客户端都通过subscribe/subscribe_stream接收片段，
+        回复结束后按chat_stream的方式写入历史。
+        """
+        if session_id is None:
+            session_id = self.current_session_id
+        if session_id is None:
+            raise ValueError("没有当前会话，请先创建或切换会话")
+        
+        existing = self._broadcasts.get(session_id)
+        if existing is not None and not existing.done:
+            raise ValueError(f"会话 {session_id} 已有进行中的流式回复")
+        
+        def on_done(broadcaster: StreamBroadcaster):
+            if self._broadcasts.get(session_id) is broadcaster:
+                del self._broadcasts[session_id]
+            asyncio.get_running_loop().call_later(
+                self.stream_retention, self._streams.pop, broadcaster.stream_id, None
+            )
+        
+        stream_id = uuid.uuid4().hex
+        stream = self.chat_stream(user_input, user_name, session_id, coalesce=coalesce,
+                                  stream_id=stream_id, **kwargs)
+        broadcaster = StreamBroadcaster(stream, replay_size, on_done=on_done, stream_id=stream_id)
+        self._broadcasts[session_id] = broadcaster
+        self._streams[stream_id] = broadcaster
+        return broadcaster.start()
+    
+    def resume_stream(self, stream_id: str, chunk_offset: Optional[int] = None,
+                      byte_offset: Optional[int] = None,
+                      policy: BackpressurePolicy = BackpressurePolicy.BUFFER,
+                      max_lag: int = 256) -> StreamSubscription:
+        """断线重连的客户端从片段序号或字节偏移处继续接收（回复结束后的一段时间内仍可恢复）"""
+        broadcaster = self._streams.get(stream_id)
+        if broadcaster is None:
+            raise ValueError(f"流 {stream_id} 不存在或已过期")
+        return broadcaster.resume(chunk_offset, byte_offset, policy, max_lag)
+    
+    def subscribe_stream(self, session_id: Optional[str] = None,
+                         policy: BackpressurePolicy = BackpressurePolicy.BUFFER,
+                         max_lag: int = 256, from_start: bool = True) -> Optional[StreamSubscription]:
+        """订阅会话进行中的流式回复，没有进行中的回复时返回None"""
+        if session_id is None:
+            session_id = self.current_session_id
+        broadcaster = self._broadcasts.get(session_id) if session_id else None
+        if broadcaster is None:
+            return None
+        return broadcaster.subscribe(policy, max_lag, from_start)
     
     def get_chat_history(self, session_id: Optional[str] = None) -> List[Message]:
         """获取指定会话的聊天历史"""
@@ -285,6 +1003,7 @@ class MultiSessionChatInterface:
         if session:
             session.chat_history.clear()
             session.updated_at = datetime.now()
+            self._notify_removed(session_id)
     
     def get_session_summary(self, session_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
         """获取指定会话的摘要信息"""
@@ -299,7 +1018,7 @@ class MultiSessionChatInterface:
             "session_id": session.session_id,
             "character": session.character.name if session.character else None,
             "provider": session.provider.get_provider_name() if session.provider else None,
-            "message_count": len(session.chat_history),
+            "message_count": session.message_count,
             "created_at": session.created_at.isoformat(),
             "updated_at": session.updated_at.isoformat(),
             "is_current": session.session_id == self.current_session_id
@@ -322,6 +1041,10 @@ class ChatInterface:
         """切换AI角色"""
         return self.multi_chat.switch_character(character_name, self.session_id)
     
+    async def switch_character_async(self, character_name: str) -> bool:
+        """异步切换AI角色"""
+        return await self.multi_chat.switch_character_async(character_name, self.session_id)
+    
     def switch_provider(self, provider: BaseAIProvider) -> bool:
         """切换AI提供商"""
         return self.multi_chat.switch_provider(provider, self.session_id)
@@ -345,9 +1068,23 @@ class ChatInterface:
         return await self.multi_chat.chat(user_input, user_name, self.session_id, **kwargs)
     
     async def chat_stream(self, user_input: str, user_name: str = "用户", 
-                         **kwargs) -> AsyncGenerator[str, None]:
+                         coalesce=None, **kwargs) -> AsyncGenerator[str, None]:
         """流式聊天"""
-        async for chunk in self.multi_chat.chat_stream(user_input, user_name, self.session_id, **kwargs):
+        async for chunk in self.multi_chat.chat_stream(user_input, user_name, self.session_id,
+                                                       coalesce=coalesce, **kwargs):
+            yield chunk
+    
+    async def chat_stream_events(self, user_input: str, user_name: str = "用户",
+                                 **kwargs) -> AsyncGenerator[StreamEvent, None]:
+        """按事件流式聊天（思考过程、回复、用量）"""
+        async for event in self.multi_chat.chat_stream_events(user_input, user_name, self.session_id, **kwargs):
+            yield event
+    
+    async def continue_response(self, user_name: str = "用户", coalesce=None,
+                                **kwargs) -> AsyncGenerator[str, None]:
+        """续写被中断的部分回复"""
+        async for chunk in self.multi_chat.continue_response(user_name, self.session_id,
+                                                             coalesce=coalesce, **kwargs):
             yield chunk
     
     def get_chat_history(self) -> List[Message]:
@@ -0,0 +1,236 @@
+"""
+全文检索：在所有会话的历史中查找包含关键词的消息
+"""
+import asyncio
+import heapq
+import itertools
+import math
+from collections import Counter, deque
+from dataclasses import dataclass
+from datetime import datetime
+from typing import TYPE_CHECKING, Any, Deque, Dict, Iterable, List, Optional, Tuple
+
+from .models.message import Message, MessageRole
+from .utils.text_tokens import cjk_bigrams, is_cjk, tokenize
+
+if TYPE_CHECKING:
+    from .chat_interface import ChatSession
+
+
+def index_terms(text: str) -> List[str]:
+    """建索引用的词项：单词、单个汉字和相邻汉字的二元组"""
+    tokens = tokenize(text)
+    return tokens + cjk_bigrams(tokens)
+
+
+def query_terms(text: str) -> List[str]:
+    """查询用的词项：连续的汉字只取二元组（单独的汉字取单字），结果需要包含所有词项"""
+    tokens = tokenize(text)
+    terms = []
+    for i, token in enumerate(tokens):
+        if not is_cjk(token):
+            terms.append(token)
+            continue
+        has_next = i + 1 < len(tokens) and is_cjk(tokens[i + 1])
+        has_previous = i > 0 and is_cjk(tokens[i - 1])
+        if has_next:
+            terms.append(token + tokens[i + 1])
+        elif not has_previous:
+            terms.append(token)
+    return terms
+
+
+@dataclass
+class SearchHit:
+    """一条检索结果，message是根据索引内容新建的消息（不含metadata）"""
+    session_id: str
+    message: Message
+    score: float
+    snippet: str
+
+
+@dataclass
+class _Document:
+    # 只保存检索需要的字段，不引用历史中的Message，历史被压缩后可以释放
+    session_id: str
+    role: MessageRole
+    content: str
+    timestamp: Optional[datetime]
+    terms: Tuple[str, ...]
+    length: int
+
+
+class FullTextIndex:
+    """增量维护的倒排索引
+
+    作为MultiSessionChatInterface的历史监听器使用（add_history_listener），每轮对话完成后新增的消息
+    只放入待处理队列；在事件循环中每次处理batch_size条，处理完一批就让出事件循环，不阻塞对话。
+    查询前会先处理完剩余的队列，结果总是包含已经通知过的消息。
+    """
+
+    def __init__(self, batch_size: int = 256, snippet_chars: int = 60,
+                 roles: Iterable[MessageRole] = (MessageRole.USER, MessageRole.ASSISTANT)):
+        self.batch_size = batch_size
+        self.snippet_chars = snippet_chars
+        self.roles = set(roles)
+        self._documents: Dict[int, _Document] = {}
+        self._postings: Dict[str, Dict[int, int]] = {}
+        self._session_documents: Dict[str, List[int]] = {}
+        self._pending: Deque[Tuple[str, Message]] = deque()
+        self._next_id = 0
+        self._total_length = 0
+        self._drain_scheduled = False
+
+    def __len__(self) -> int:
+        return len(self._documents) + len(self._pending)
+
+    def add(self, session_id: str, message: Message):
+        """把消息加入待处理队列"""
+        if message.role not in self.roles or not message.content:
+            return
+        self._pending.append((session_id, message))
+        self._schedule_drain()
+
+    def add_session(self, session: "ChatSession", skip: int = 0):
+        """加入会话已有的历史，skip为开头跳过的消息数（如角色示例对话）"""
+        # 被压缩的历史只临时解压，不改变会话的状态
+        for message in itertools.islice(session.iter_history(), skip, None):
+            self.add(session.session_id, message)
+
+    def on_message_appended(self, session: "ChatSession", message: Message):
+        self.add(session.session_id, message)
+
+    def on_message_updated(self, session: "ChatSession", message: Message):
+        """消息内容被修改（如续写了部分回复）：移除旧内容的索引后重新加入"""
+        self.remove_message(session.session_id, message)
+        self.add(session.session_id, message)
+
+    def on_session_removed(self, session_id: str):
+        self.remove_session(session_id)
+
+    def remove_session(self, session_id: str):
+        if any(sid == session_id for sid, _ in self._pending):
+            self._pending = deque(item for item in self._pending if item[0] != session_id)
+        for doc_id in self._session_documents.pop(session_id, []):
+            self._remove_document(doc_id)
+
+    def _remove_document(self, doc_id: int):
+        document = self._documents.pop(doc_id)
+        self._total_length -= document.length
+        for term in document.terms:
+            postings = self._postings[term]
+            del postings[doc_id]
+            if not postings:
+                del self._postings[term]
+
+    def remove_message(self, session_id: str, message: Message):
+        """移除会话中与message角色和时间相同的消息"""
+        key = (message.role, message.timestamp)
+        if any(sid == session_id for sid, _ in self._pending):
+            self._pending = deque(
+                item for item in self._pending
+                if item[0] != session_id or (item[1].role, item[1].timestamp) != key
+            )
+        doc_ids = self._session_documents.get(session_id, [])
+        for doc_id in [d for d in doc_ids if (self._documents[d].role, self._documents[d].timestamp) == key]:
+            doc_ids.remove(doc_id)
+            self._remove_document(doc_id)
+
+    def _schedule_drain(self):
+        if self._drain_scheduled:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # 没有事件循环时留到查询前处理
+            return
+        self._drain_scheduled = True
+        loop.call_soon(self._drain_batch)
+
+    def _drain_batch(self):
+        self._drain_scheduled = False
+        self._index_pending(self.batch_size)
+        if self._pending:
+            self._schedule_drain()
+
+    def _index_pending(self, limit: Optional[int] = None):
+        count = 0
+        while self._pending and (limit is None or count < limit):
+            session_id, message = self._pending.popleft()
+            self._index(session_id, message)
+            count += 1
+
+    def _index(self, session_id: str, message: Message):
+        counts = Counter(index_terms(message.content))
+        if not counts:
+            return
+        doc_id = self._next_id
+        self._next_id += 1
+        length = sum(counts.values())
+        self._documents[doc_id] = _Document(session_id, message.role, message.content, message.timestamp,
+                                            tuple(counts), length)
+        self._session_documents.setdefault(session_id, []).append(doc_id)
+        self._total_length += length
+        for term, frequency in counts.items():
+            self._postings.setdefault(term, {})[doc_id] = frequency
+
+    def flush(self):
+        """立即处理所有待处理的消息"""
+        self._index_pending()
+
+    def search(self, query: str, limit: int = 20, session_id: Optional[str] = None) -> List[SearchHit]:
+        """查找包含query中所有词的消息，按相关度（BM25）从高到低排列，相同时较新的在前"""
+        self.flush()
+        terms = set(query_terms(query))
+        if not terms:
+            return []
+        postings = [self._postings.get(term) for term in terms]
+        if not all(postings):
+            return []
+        # 从最短的倒排表开始求交集
+        postings.sort(key=len)
+        candidates = set(postings[0])
+        for other in postings[1:]:
+            candidates.intersection_update(other)
+            if not candidates:
+                return []
+        if session_id is not None:
+            candidates = {doc_id for doc_id in candidates if self._documents[doc_id].session_id == session_id}
+
+        total = len(self._documents)
+        average_length = self._total_length / total
+        idf = [math.log(1 + (total - len(p) + 0.5) / (len(p) + 0.5)) for p in postings]
+
+        def score(doc_id: int) -> float:
+            norm = 1.2 * (0.25 + 0.75 * self._documents[doc_id].length / average_length)
+            return sum(w * p[doc_id] * 2.2 / (p[doc_id] + norm) for w, p in zip(idf, postings))
+
+        scored = heapq.nlargest(limit, ((score(doc_id), doc_id) for doc_id in candidates))
+        hits = []
+        for value, doc_id in scored:
+            document = self._documents[doc_id]
+            message = Message(document.role, document.content, document.timestamp)
+            hits.append(SearchHit(document.session_id, message, value,
+                                  self._snippet(document.content, query, terms)))
+        return hits
+
+    def _snippet(self, content: str, query: str, terms: Iterable[str]) -> str:
+        """截取第一个匹配位置附近的文本"""
+        lower = content.lower()
+        needle = query.strip().lower()
+        position = lower.find(needle) if needle else -1
+        if position < 0:
+            positions = [(p, term) for p, term in ((lower.find(t), t) for t in terms) if p >= 0]
+            position, needle = min(positions) if positions else (0, "")
+        start = max(0, position - self.snippet_chars // 3)
+        end = min(len(content), max(position + len(needle), start + self.snippet_chars))
+        snippet = " ".join(content[start:end].split())
+        return ("…" if start > 0 else "") + snippet + ("…" if end < len(content) else "")
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "documents": len(self._documents),
+            "sessions": len(self._session_documents),
+            "terms": len(self._postings),
+            "pending": len(self._pending),
+        }
@@ -0,0 +1,135 @@
+"""
+冷会话历史压缩：空闲超过阈值的会话历史在内存中打包为压缩的字节串，下次访问时再解压
+
+压缩后的历史仍在内存中，不需要读磁盘；正在使用的会话不受影响。
+"""
+import asyncio
+import pickle
+import time
+import zlib
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Callable, Iterable, List, Optional
+
+from .models.message import Message
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+if TYPE_CHECKING:
+    from .chat_interface import ChatSession, MultiSessionChatInterface
+
+
+def _compress(codec: str, data: bytes, level: int) -> bytes:
+    if codec == "zstd":
+        return zstandard.ZstdCompressor(level=level).compress(data)
+    return zlib.compress(data, level)
+
+
+def _decompress(codec: str, blob: bytes) -> bytes:
+    if codec == "zstd":
+        return zstandard.ZstdDecompressor().decompress(blob)
+    return zlib.decompress(blob)
+
+
+@dataclass
+class PackedHistory:
+    """压缩后的会话历史"""
+    codec: str
+    blob: bytes
+    message_count: int
+    raw_bytes: int
+    # 解压后调用，参数为耗时（秒），用于统计
+    on_inflate: Optional[Callable[[float], None]] = None
+
+    def unpack(self) -> List[Message]:
+        start = time.perf_counter()
+        # blob只由本进程的pack生成，不会来自外部
+        messages = pickle.loads(_decompress(self.codec, self.blob))
+        if self.on_inflate is not None:
+            self.on_inflate(time.perf_counter() - start)
+        return messages
+
+
+class HistoryCompactor:
+    """把空闲会话的历史压缩保存在内存中
+
+    会话超过idle_seconds没有对话时，compact把它的chat_history打包为PackedHistory；
+    之后第一次访问session.chat_history时自动解压。安装了zstandard时默认使用zstd，否则使用zlib。
+    compact应在事件循环线程中调用（start会定期调用）。
+    """
+
+    def __init__(self, idle_seconds: float = 600.0, min_messages: int = 4,
+                 codec: Optional[str] = None, level: Optional[int] = None):
+        if codec is None:
+            codec = "zstd" if zstandard is not None else "zlib"
+        if codec not in ("zstd", "zlib"):
+            raise ValueError(f"不支持的压缩格式: {codec}")
+        if codec == "zstd" and zstandard is None:
+            raise ImportError("使用zstd压缩需要安装zstandard：pip install zstandard")
+        self.codec = codec
+        self.level = level if level is not None else (3 if codec == "zstd" else 6)
+        self.idle_seconds = idle_seconds
+        self.min_messages = min_messages
+        self.interface: Optional["MultiSessionChatInterface"] = None
+        self.stats = {"packed": 0, "inflated": 0, "inflate_seconds": 0.0}
+        self._task: Optional[asyncio.Task] = None
+
+    def bind(self, interface: "MultiSessionChatInterface") -> "HistoryCompactor":
+        """压缩该接口的会话，解压耗时记录到接口的metrics"""
+        self.interface = interface
+        return self
+
+    def _record_inflate(self, seconds: float):
+        self.stats["inflated"] += 1
+        self.stats["inflate_seconds"] += seconds
+        metrics = self.interface.metrics if self.interface is not None else None
+        if metrics is not None:
+            metrics.history_inflate.observe(seconds)
+
+    def pack(self, session: "ChatSession") -> bool:
+        """立即压缩会话的历史，已压缩或消息太少时返回False"""
+        history = session.__dict__.get("chat_history")
+        if history is None or len(history) < self.min_messages:
+            return False
+        raw = pickle.dumps(history, protocol=pickle.HIGHEST_PROTOCOL)
+        session.packed_history = PackedHistory(
+            codec=self.codec,
+            blob=_compress(self.codec, raw, self.level),
+            message_count=len(history),
+            raw_bytes=len(raw),
+            on_inflate=self._record_inflate,
+        )
+        # 删除实例属性后，访问chat_history会经过ChatSession.__getattr__解压
+        del session.__dict__["chat_history"]
+        self.stats["packed"] += 1
+        return True
+
+    def compact(self, sessions: Optional[Iterable["ChatSession"]] = None) -> int:
+        """压缩空闲超过idle_seconds的会话，默认处理绑定接口的所有会话，返回本次压缩的会话数"""
+        if sessions is None:
+            sessions = self.interface.sessions.values() if self.interface is not None else ()
+        deadline = time.monotonic() - self.idle_seconds
+        packed = 0
+        for session in list(sessions):
+            if session.packed_history is None and session.last_active <= deadline and self.pack(session):
+                packed += 1
+        return packed
+
+    async def run(self, interval: float = 60.0):
+        """每隔interval秒压缩一次空闲会话"""
+        while True:
+            await asyncio.sleep(interval)
+            self.compact()
+
+    def start(self, interval: float = 60.0) -> asyncio.Task:
+        """在当前事件循环中启动定期压缩"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self.run(interval))
+        return self._task
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
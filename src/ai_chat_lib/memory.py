@@ -0,0 +1,242 @@
+"""
+长期记忆：把会话中的消息向量化，在新的对话中找回相关的早前内容
+
+向量索引依赖NumPy（pip install numpy），只在创建索引时导入。
+"""
+import itertools
+import zlib
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from datetime import datetime
+from typing import TYPE_CHECKING, Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from .models.message import Message, MessageRole
+from .utils.text_tokens import cjk_bigrams, tokenize
+
+if TYPE_CHECKING:
+    import numpy as np
+    from .chat_interface import ChatSession
+
+
+def _require_numpy():
+    try:
+        import numpy
+    except ImportError:
+        raise ImportError("长期记忆需要NumPy：pip install numpy")
+    return numpy
+
+
+class BaseEmbedder(ABC):
+    """文本向量化接口，返回的向量需要做L2归一化（内积即余弦相似度）"""
+
+    dim: int
+
+    @abstractmethod
+    def embed(self, texts: Sequence[str]) -> "np.ndarray":
+        """把一批文本转换为 (len(texts), dim) 的float32矩阵"""
+        pass
+
+
+class HashingEmbedder(BaseEmbedder):
+    """离线的特征哈希向量化：单词、单字和相邻汉字的二元组，按哈希值映射到固定维度
+
+    不需要训练和网络，适合作为默认实现；语义效果有限，可以换成真正的向量模型。
+    """
+
+    def __init__(self, dim: int = 256):
+        self.dim = dim
+
+    def features(self, text: str) -> List[str]:
+        tokens = tokenize(text)
+        return tokens + cjk_bigrams(tokens)
+
+    def embed(self, texts: Sequence[str]) -> "np.ndarray":
+        np = _require_numpy()
+        rows, cols, signs = [], [], []
+        for row, text in enumerate(texts):
+            for feature in self.features(text):
+                # crc32在不同进程中结果一致（内置hash每次启动都不同）
+                value = zlib.crc32(feature.encode("utf-8"))
+                rows.append(row)
+                cols.append(value % self.dim)
+                signs.append(-1.0 if value & 0x80000000 else 1.0)
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        np.add.at(matrix, (np.asarray(rows, dtype=np.intp), np.asarray(cols, dtype=np.intp)),
+                  np.asarray(signs, dtype=np.float32))
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        np.divide(matrix, norms, out=matrix, where=norms > 0)
+        return matrix
+
+
+class VectorIndex:
+    """基于NumPy的精确内积索引
+
+    向量存放在按倍数扩容的连续数组中，追加的均摊开销为O(1)；
+    查询按块做矩阵乘法并合并每块的top-k，内存占用不随索引大小增长。
+    """
+
+    def __init__(self, dim: int, capacity: int = 1024, chunk_size: int = 65536):
+        np = _require_numpy()
+        self.dim = dim
+        self.chunk_size = chunk_size
+        self._vectors = np.empty((max(1, capacity), dim), dtype=np.float32)
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def vectors(self) -> "np.ndarray":
+        """已添加的向量（视图，不复制）"""
+        return self._vectors[:self._size]
+
+    def add(self, vectors: "np.ndarray") -> range:
+        """追加一批向量，返回它们的位置"""
+        np = _require_numpy()
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dim)
+        start, end = self._size, self._size + len(vectors)
+        if end > len(self._vectors):
+            capacity = max(end, len(self._vectors) * 2)
+            grown = np.empty((capacity, self.dim), dtype=np.float32)
+            grown[:start] = self._vectors[:start]
+            self._vectors = grown
+        self._vectors[start:end] = vectors
+        self._size = end
+        return range(start, end)
+
+    def search(self, queries: "np.ndarray", k: int = 5) -> Tuple["np.ndarray", "np.ndarray"]:
+        """批量查询内积最大的k个向量，返回 (scores, positions)，形状都是 (查询数, k)
+
+        索引中的向量少于k个时，不足的位置为-1、分数为-inf。
+        """
+        np = _require_numpy()
+        queries = np.asarray(queries, dtype=np.float32).reshape(-1, self.dim)
+        count = len(queries)
+        best_scores = np.full((count, k), -np.inf, dtype=np.float32)
+        best_positions = np.full((count, k), -1, dtype=np.int64)
+        for start in range(0, self._size, self.chunk_size):
+            chunk = self._vectors[start:min(start + self.chunk_size, self._size)]
+            scores = queries @ chunk.T
+            if scores.shape[1] > k:
+                top = np.argpartition(scores, -k, axis=1)[:, -k:]
+            else:
+                top = np.broadcast_to(np.arange(scores.shape[1]), (count, scores.shape[1]))
+            merged_scores = np.concatenate([best_scores, np.take_along_axis(scores, top, axis=1)], axis=1)
+            merged_positions = np.concatenate([best_positions, top + start], axis=1)
+            keep = np.argpartition(merged_scores, -k, axis=1)[:, -k:]
+            best_scores = np.take_along_axis(merged_scores, keep, axis=1)
+            best_positions = np.take_along_axis(merged_positions, keep, axis=1)
+        order = np.argsort(-best_scores, axis=1)
+        return np.take_along_axis(best_scores, order, axis=1), np.take_along_axis(best_positions, order, axis=1)
+
+
+@dataclass
+class MemoryHit:
+    """一条被找回的记忆"""
+    score: float
+    text: str
+    role: MessageRole
+    timestamp: Optional[datetime] = None
+
+
+@dataclass
+class _MemoryRecord:
+    text: str
+    role: MessageRole
+    timestamp: Optional[datetime]
+
+
+class MemoryStore:
+    """按会话保存消息向量的记忆库
+
+    新消息先进入待处理列表（追加不做向量化），查询前批量向量化并追加到该会话的索引中。
+    作为MultiSessionChatInterface的memory使用时，对话中新增的用户和助手消息会自动加入。
+    """
+
+    def __init__(self, embedder: Optional[BaseEmbedder] = None, min_score: float = 0.2,
+                 roles: Iterable[MessageRole] = (MessageRole.USER, MessageRole.ASSISTANT)):
+        self.embedder = embedder or HashingEmbedder()
+        self.min_score = min_score
+        self.roles = set(roles)
+        self._indexes: Dict[str, VectorIndex] = {}
+        self._records: Dict[str, List[_MemoryRecord]] = {}
+        self._pending: Dict[str, List[_MemoryRecord]] = {}
+
+    def __len__(self) -> int:
+        return sum(len(r) for r in self._records.values()) + sum(len(p) for p in self._pending.values())
+
+    def add(self, session_id: str, text: str, role: MessageRole = MessageRole.USER,
+            timestamp: Optional[datetime] = None):
+        """加入一条记忆（延迟到查询或flush时才向量化）"""
+        if text and text.strip():
+            self._pending.setdefault(session_id, []).append(_MemoryRecord(text, role, timestamp))
+
+    def add_message(self, session_id: str, message: Message):
+        """加入一条消息；工具调用、部分回复等不作为记忆"""
+        if message.role not in self.roles:
+            return
+        metadata = message.metadata or {}
+        if metadata.get("tool_calls") or metadata.get("partial"):
+            return
+        self.add(session_id, message.content, message.role, message.timestamp)
+
+    def add_session(self, session: "ChatSession", skip: int = 0):
+        """把会话已有的历史加入记忆，skip为开头跳过的消息数（如角色示例对话）"""
+        # 被压缩的历史只临时解压，不改变会话的状态
+        for message in itertools.islice(session.iter_history(), skip, None):
+            self.add_message(session.session_id, message)
+
+    def on_message_appended(self, session: "ChatSession", message: Message):
+        self.add_message(session.session_id, message)
+
+    def on_session_removed(self, session_id: str):
+        self.remove_session(session_id)
+
+    def remove_session(self, session_id: str):
+        self._indexes.pop(session_id, None)
+        self._records.pop(session_id, None)
+        self._pending.pop(session_id, None)
+
+    def flush(self, session_id: Optional[str] = None):
+        """把待处理的记忆批量向量化后加入索引"""
+        session_ids = [session_id] if session_id is not None else list(self._pending)
+        for sid in session_ids:
+            pending = self._pending.pop(sid, None)
+            if not pending:
+                continue
+            index = self._indexes.get(sid)
+            if index is None:
+                index = self._indexes[sid] = VectorIndex(self.embedder.dim, capacity=max(64, len(pending)))
+            index.add(self.embedder.embed([record.text for record in pending]))
+            self._records.setdefault(sid, []).extend(pending)
+
+    def search(self, session_id: str, query: str, k: int = 5,
+               exclude: Iterable[str] = ()) -> List[MemoryHit]:
+        """查找与query最相关的k条记忆，按分数从高到低排列；exclude中的文本不返回"""
+        self.flush(session_id)
+        index = self._indexes.get(session_id)
+        if index is None or not query:
+            return []
+        exclude = set(exclude)
+        # 多取一些，给被排除的记忆留出余量
+        scores, positions = index.search(self.embedder.embed([query]), k + len(exclude))
+        records = self._records[session_id]
+        hits = []
+        for score, position in zip(scores[0].tolist(), positions[0].tolist()):
+            if position < 0 or score < self.min_score:
+                break
+            record = records[position]
+            if record.text in exclude:
+                continue
+            hits.append(MemoryHit(score, record.text, record.role, record.timestamp))
+            if len(hits) >= k:
+                break
+        return hits
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "sessions": len(set(self._records) | set(self._pending)),
+            "memories": len(self),
+            "pending": sum(len(p) for p in self._pending.values()),
+            "dim": self.embedder.dim,
+        }
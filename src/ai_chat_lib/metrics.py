@@ -0,0 +1,440 @@
+"""
+指标：计数器、仪表和直方图，以及Prometheus文本格式输出
+
+更新时每个线程只写自己的分片（不加锁），输出时再把所有分片相加；
+事件循环线程和工具线程池同时更新同一个指标也不会丢失计数。
+"""
+import asyncio
+import bisect
+import math
+import threading
+import time
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+if TYPE_CHECKING:
+    from http.server import ThreadingHTTPServer
+    from .chat_interface import ChatSession, MultiSessionChatInterface
+
+# 首字延迟、总耗时的默认分桶（秒）
+DEFAULT_LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# 分片间隔的默认分桶（秒）
+DEFAULT_INTER_TOKEN_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class _Shards:
+    """按线程分片的一组数值：每个线程只写自己的分片，读取时求和"""
+
+    def __init__(self, size: int):
+        self._size = size
+        self._local = threading.local()
+        self._cells: List[List[float]] = []
+        self._lock = threading.Lock()
+
+    def cell(self) -> List[float]:
+        try:
+            return self._local.cell
+        except AttributeError:
+            cell = [0.0] * self._size
+            with self._lock:
+                self._cells.append(cell)
+            self._local.cell = cell
+            return cell
+
+    def totals(self) -> List[float]:
+        with self._lock:
+            cells = list(self._cells)
+        return [sum(cell[i] for cell in cells) for i in range(self._size)]
+
+
+class CounterChild:
+    """一组标签值对应的计数器"""
+
+    def __init__(self):
+        self._shards = _Shards(1)
+
+    def inc(self, amount: float = 1.0):
+        self._shards.cell()[0] += amount
+
+    @property
+    def value(self) -> float:
+        return self._shards.totals()[0]
+
+
+class GaugeChild:
+    """一组标签值对应的仪表，可以增减或直接设置"""
+
+    def __init__(self):
+        self._shards = _Shards(1)
+        self._base = 0.0
+
+    def inc(self, amount: float = 1.0):
+        self._shards.cell()[0] += amount
+
+    def dec(self, amount: float = 1.0):
+        self._shards.cell()[0] -= amount
+
+    def set(self, value: float):
+        self._base = value - self._shards.totals()[0]
+
+    @property
+    def value(self) -> float:
+        return self._base + self._shards.totals()[0]
+
+
+class HistogramChild:
+    """一组标签值对应的直方图"""
+
+    def __init__(self, buckets: Sequence[float]):
+        self._buckets = buckets
+        # 各分桶（不累计）、+Inf分桶、总和、次数
+        self._shards = _Shards(len(buckets) + 3)
+
+    def observe(self, value: float):
+        cell = self._shards.cell()
+        cell[bisect.bisect_left(self._buckets, value)] += 1
+        cell[-2] += value
+        cell[-1] += 1
+
+    @property
+    def count(self) -> int:
+        return int(self._shards.totals()[-1])
+
+    def snapshot(self) -> Tuple[List[float], float, float]:
+        """返回 (累计分桶计数（含+Inf）, 总和, 次数)"""
+        totals = self._shards.totals()
+        cumulative = []
+        running = 0.0
+        for value in totals[:-2]:
+            running += value
+            cumulative.append(running)
+        return cumulative, totals[-2], totals[-1]
+
+
+class _Metric:
+    """带标签的指标，每组标签值对应一个子指标"""
+
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], Any] = {}
+        self._lock = threading.Lock()
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values: Any, **kwargs: Any):
+        """按位置或名称给出标签值，返回对应的子指标（热路径上可以缓存返回值）"""
+        if kwargs:
+            values = tuple(kwargs[name] for name in self.labelnames)
+        key = tuple(str(value) for value in values)
+        child = self._children.get(key)
+        if child is None:
+            if len(key) != len(self.labelnames):
+                raise ValueError(f"指标 {self.name} 需要标签 {self.labelnames}")
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def clear(self):
+        with self._lock:
+            self._children = {}
+
+    def samples(self) -> List[Tuple[str, Dict[str, str], float]]:
+        """输出用的 (名称, 标签, 值) 列表"""
+        return [
+            (self.name, dict(zip(self.labelnames, key)), child.value)
+            for key, child in list(self._children.items())
+        ]
+
+
+class Counter(_Metric):
+    type_name = "counter"
+
+    def _new_child(self) -> CounterChild:
+        return CounterChild()
+
+    def inc(self, amount: float = 1.0):
+        self.labels().inc(amount)
+
+
+class Gauge(_Metric):
+    type_name = "gauge"
+
+    def _new_child(self) -> GaugeChild:
+        return GaugeChild()
+
+    def inc(self, amount: float = 1.0):
+        self.labels().inc(amount)
+
+    def dec(self, amount: float = 1.0):
+        self.labels().dec(amount)
+
+    def set(self, value: float):
+        self.labels().set(value)
+
+
+class Histogram(_Metric):
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self) -> HistogramChild:
+        return HistogramChild(self.buckets)
+
+    def observe(self, value: float):
+        self.labels().observe(value)
+
+    def samples(self) -> List[Tuple[str, Dict[str, str], float]]:
+        result = []
+        for key, child in list(self._children.items()):
+            labels = dict(zip(self.labelnames, key))
+            cumulative, total, count = child.snapshot()
+            for bound, value in zip(self.buckets + (math.inf,), cumulative):
+                result.append((f"{self.name}_bucket", {**labels, "le": _format_value(bound)}, value))
+            result.append((f"{self.name}_sum", labels, total))
+            result.append((f"{self.name}_count", labels, count))
+        return result
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if value == -math.inf:
+        return "-Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class MetricsRegistry:
+    """指标注册表；同名指标重复注册时返回已有的指标"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Callable[[], None]] = []
+        self._lock = threading.Lock()
+
+    def _register(self, cls, name: str, documentation: str, labelnames: Sequence[str], **kwargs) -> Any:
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, documentation, labelnames, **kwargs)
+            elif not isinstance(metric, cls) or metric.labelnames != tuple(labelnames):
+                raise ValueError(f"指标 {name} 已注册为不同的类型或标签")
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter, name, documentation, labelnames)
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def get(self, name: str) -> Optional[_Metric]:
+        return self._metrics.get(name)
+
+    def add_collector(self, collector: Callable[[], None]):
+        """添加输出前调用的函数，用于在输出时才计算的指标（如当前会话数）"""
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        """Prometheus文本格式（0.0.4）"""
+        for collector in list(self._collectors):
+            collector()
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type_name}")
+            for name, labels, value in metric.samples():
+                if labels:
+                    label_str = ",".join(f'{k}="{_escape_label(v)}"' for k, v in labels.items())
+                    lines.append(f"{name}{{{label_str}}} {_format_value(value)}")
+                else:
+                    lines.append(f"{name} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+# 聊天指标的标签
+CHAT_LABELS = ("provider", "model", "character")
+
+
+class RequestRecorder:
+    """记录一次聊天请求的指标，由ChatMetrics.start_request创建"""
+
+    __slots__ = ("_metrics", "_labels", "_start", "_last_token", "_ttft", "_inter_token", "_stream")
+
+    def __init__(self, metrics: "ChatMetrics", labels: Tuple[str, str, str], stream: bool):
+        self._metrics = metrics
+        self._labels = labels
+        self._stream = stream
+        self._start = time.perf_counter()
+        self._last_token: Optional[float] = None
+        # 子指标在请求开始时取好，分片到达时不再查找标签
+        self._ttft = metrics.ttft.labels(*labels)
+        self._inter_token = metrics.inter_token.labels(*labels)
+        metrics.requests.labels(*labels).inc()
+        if stream:
+            metrics.active_streams.labels(*labels).inc()
+
+    def token(self):
+        """收到一个回复分片"""
+        now = time.perf_counter()
+        if self._last_token is None:
+            self._ttft.observe(now - self._start)
+        else:
+            self._inter_token.observe(now - self._last_token)
+        self._last_token = now
+
+    def usage(self, usage: Optional[Dict[str, Any]]):
+        """记录提供商报告的用量"""
+        if not usage:
+            return
+        metrics = self._metrics
+        if usage.get("prompt_tokens"):
+            metrics.input_tokens.labels(*self._labels).inc(usage["prompt_tokens"])
+        if usage.get("completion_tokens"):
+            metrics.output_tokens.labels(*self._labels).inc(usage["completion_tokens"])
+
+    def finish(self, error: Optional[BaseException] = None):
+        """请求结束（成功或出错）；客户端断开和任务取消记为中止，不算作错误"""
+        metrics = self._metrics
+        metrics.latency.labels(*self._labels).observe(time.perf_counter() - self._start)
+        if isinstance(error, GeneratorExit):
+            metrics.aborted.labels(*self._labels, "disconnect").inc()
+        elif isinstance(error, asyncio.CancelledError):
+            metrics.aborted.labels(*self._labels, "cancelled").inc()
+        elif error is not None:
+            metrics.errors.labels(*self._labels, type(error).__name__).inc()
+        if self._stream:
+            metrics.active_streams.labels(*self._labels).dec()
+
+
+class ChatMetrics:
+    """聊天流程的指标，按提供商、模型和角色分组
+
+    设置为MultiSessionChatInterface的metrics后自动记录；用bind把会话数和角色缓存命中也加入。
+    """
+
+    def __init__(self, registry: Optional[MetricsRegistry] = None,
+                 latency_buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS,
+                 inter_token_buckets: Sequence[float] = DEFAULT_INTER_TOKEN_BUCKETS):
+        self.registry = registry or MetricsRegistry()
+        r = self.registry
+        self.requests = r.counter("ai_chat_requests_total", "聊天请求数", CHAT_LABELS)
+        self.errors = r.counter("ai_chat_errors_total", "按异常类型统计的失败请求数", CHAT_LABELS + ("type",))
+        self.aborted = r.counter("ai_chat_aborted_total", "客户端断开（disconnect）或任务被取消（cancelled）的请求数",
+                                 CHAT_LABELS + ("reason",))
+        self.input_tokens = r.counter("ai_chat_input_tokens_total", "提供商报告的输入token数", CHAT_LABELS)
+        self.output_tokens = r.counter("ai_chat_output_tokens_total", "提供商报告的输出token数", CHAT_LABELS)
+        self.ttft = r.histogram("ai_chat_time_to_first_token_seconds", "首个回复分片的延迟",
+                                CHAT_LABELS, latency_buckets)
+        self.inter_token = r.histogram("ai_chat_inter_token_latency_seconds", "相邻回复分片的间隔",
+                                       CHAT_LABELS, inter_token_buckets)
+        self.latency = r.histogram("ai_chat_request_duration_seconds", "请求总耗时（含排队和工具调用）",
+                                   CHAT_LABELS, latency_buckets)
+        self.active_streams = r.gauge("ai_chat_active_streams", "进行中的流式回复数", CHAT_LABELS)
+        self.active_sessions = r.gauge("ai_chat_active_sessions", "当前的会话数", CHAT_LABELS)
+        self.cache_lookups = r.counter("ai_chat_cache_lookups_total", "缓存查找次数",
+                                       ("cache", "character", "result"))
+        self.compressed_sessions = r.gauge("ai_chat_compressed_sessions", "历史被压缩的会话数")
+        self.compressed_bytes = r.gauge("ai_chat_compressed_history_bytes", "压缩后的会话历史占用的字节数")
+        self.compressed_raw_bytes = r.gauge("ai_chat_compressed_history_raw_bytes", "被压缩的会话历史压缩前的序列化字节数")
+        self.history_inflate = r.histogram("ai_chat_history_inflate_seconds", "解压会话历史的耗时",
+                                           buckets=inter_token_buckets)
+        # bind过的接口；会话数等按所有接口汇总
+        self._interfaces: List["MultiSessionChatInterface"] = []
+
+    @staticmethod
+    def session_labels(session: "ChatSession") -> Tuple[str, str, str]:
+        provider = session.provider
+        return (
+            provider.get_provider_name() if provider else "",
+            getattr(provider, "model", "") or "",
+            session.character.name if session.character else "",
+        )
+
+    def start_request(self, session: "ChatSession", stream: bool = False) -> RequestRecorder:
+        return RequestRecorder(self, self.session_labels(session), stream)
+
+    def record_cache_lookup(self, cache: str, key: str, hit: bool):
+        self.cache_lookups.labels(cache, key, "hit" if hit else "miss").inc()
+
+    def bind(self, interface: "MultiSessionChatInterface"):
+        """记录接口的聊天请求，并在输出时统计会话数和压缩的历史、记录角色缓存命中
+
+        可以绑定多个接口，输出时汇总；重复绑定同一个接口不会重复统计。
+        """
+        interface.metrics = self
+        interface.character_manager.metrics = self
+        if any(bound is interface for bound in self._interfaces):
+            return self
+        if not self._interfaces:
+            self.registry.add_collector(self._collect_sessions)
+            self.registry.add_collector(self._collect_compressed_histories)
+        self._interfaces.append(interface)
+        return self
+
+    def _bound_sessions(self) -> List["ChatSession"]:
+        return [session for interface in self._interfaces for session in list(interface.sessions.values())]
+
+    def _collect_sessions(self):
+        counts: Dict[Tuple[str, str, str], int] = {}
+        for session in self._bound_sessions():
+            labels = self.session_labels(session)
+            counts[labels] = counts.get(labels, 0) + 1
+        self.active_sessions.clear()
+        for labels, count in counts.items():
+            self.active_sessions.labels(*labels).set(count)
+
+    def _collect_compressed_histories(self):
+        packed = [p for p in (s.packed_history for s in self._bound_sessions()) if p is not None]
+        self.compressed_sessions.set(len(packed))
+        self.compressed_bytes.set(sum(len(p.blob) for p in packed))
+        self.compressed_raw_bytes.set(sum(p.raw_bytes for p in packed))
+
+    def render(self) -> str:
+        return self.registry.render()
+
+
+def start_metrics_server(metrics: Union[MetricsRegistry, ChatMetrics], port: int = 9464,
+                         host: str = "127.0.0.1") -> "ThreadingHTTPServer":
+    """在后台线程中启动只提供 /metrics 的HTTP服务，返回服务对象（shutdown()停止）"""
+    # 用到时才导入，不增加导入本模块的耗时
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    registry = metrics.registry if isinstance(metrics, ChatMetrics) else metrics
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = registry.render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", PROMETHEUS_CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="ai_chat_metrics", daemon=True).start()
+    return server
@@ -11,6 +11,7 @@ class MessageRole(Enum):
     USER = "user"
     ASSISTANT = "assistant" 
     SYSTEM = "system"
+    TOOL = "tool"
 
 @dataclass
 class Message:
@@ -2,7 +2,29 @@
 AI提供商抽象基类
 """
 from abc import ABC, abstractmethod
-from typing import List, Dict, Any, Optional, AsyncGenerator
+from dataclasses import dataclass
+from enum import Enum
+from typing import List, Dict, Any, Optional, AsyncGenerator, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from ai_chat_lib.tools import CompletionResult, Tool
+
+
+class StreamEventType(str, Enum):
+    """流式事件类型"""
+    REASONING = "reasoning"   # 思考过程片段
+    ANSWER = "answer"         # 回复片段
+    USAGE = "usage"           # token用量，data为归一化的字典
+    TOOL_CALLS = "tool_calls" # 模型要求的工具调用，data为ToolCall列表
+    COMPLETE = "complete"     # 结束，data包含完整的reasoning、answer和usage
+
+
+@dataclass(slots=True)
+class StreamEvent:
+    """流式事件"""
+    type: StreamEventType
+    data: Any = None
+
 
 class BaseAIProvider(ABC):
     """AI提供商抽象基类"""
@@ -27,6 +49,38 @@ class BaseAIProvider(ABC):
         """流式聊天完成"""
         pass
     
+    async def chat_completion_events(self, system: str, messages: List[Dict[str, Any]],
+                                     **kwargs) -> AsyncGenerator[StreamEvent, None]:
+        """按事件输出的流式聊天完成
+
+        默认把chat_completion_stream的片段作为回复事件输出；支持思考过程或用量统计的提供商应重写此方法。
+        """
+        answer = []
+        async for chunk in self.chat_completion_stream(system, messages, **kwargs):
+            answer.append(chunk)
+            yield StreamEvent(StreamEventType.ANSWER, chunk)
+        yield StreamEvent(StreamEventType.COMPLETE, {"reasoning": "", "answer": "".join(answer), "usage": None})
+    
+    async def chat_completion_with_tools(self, system: str, messages: List[Dict[str, Any]],
+                                         tools: List["Tool"], **kwargs) -> "CompletionResult":
+        """支持工具调用的聊天完成，返回回复文本和模型要求的工具调用"""
+        raise NotImplementedError(f"提供商 {self.get_provider_name()} 不支持工具调用")
+    
+    async def chat_completion_events_with_tools(self, system: str, messages: List[Dict[str, Any]],
+                                                tools: List["Tool"], **kwargs) -> AsyncGenerator[StreamEvent, None]:
+        """支持工具调用的流式事件，模型要求的工具调用在COMPLETE之前作为TOOL_CALLS事件输出
+
+        默认调用chat_completion_with_tools后一次性输出；能流式返回工具调用的提供商应重写此方法。
+        """
+        result = await self.chat_completion_with_tools(system, messages, tools, **kwargs)
+        if result.usage:
+            yield StreamEvent(StreamEventType.USAGE, result.usage)
+        if result.content:
+            yield StreamEvent(StreamEventType.ANSWER, result.content)
+        if result.tool_calls:
+            yield StreamEvent(StreamEventType.TOOL_CALLS, list(result.tool_calls))
+        yield StreamEvent(StreamEventType.COMPLETE, {"reasoning": "", "answer": result.content, "usage": result.usage})
+    
     @abstractmethod
     def get_provider_name(self) -> str:
         """获取提供商名称"""
@@ -0,0 +1,137 @@
+"""
+离线假提供商实现，用于测试、基准测试和压测
+"""
+import asyncio
+from typing import List, Dict, Any, AsyncGenerator, Optional, Sequence
+from ai_chat_lib.tools import CompletionResult, Tool, ToolCall
+from ai_chat_lib.utils.token_counter import estimate_tokens
+from .base import BaseAIProvider, StreamEvent, StreamEventType
+
+DEFAULT_FAKE_REPLY = "你好！我是一个离线的测试回复，用来模拟真实模型的输出。"
+
+
+class FakeAIProvider(BaseAIProvider):
+    """不访问网络的假提供商，按固定节奏返回预设文本"""
+
+    def __init__(self, api_key: str = "fake", model: str = "fake-model",
+                 reply: Optional[str] = None, reply_chars: Optional[int] = None,
+                 chunk_size: int = 4, first_token_delay: float = 0.0,
+                 chunk_delay: float = 0.0, fail_after_chunks: Optional[int] = None,
+                 reasoning: Optional[str] = None,
+                 tool_rounds: Optional[Sequence[Sequence[ToolCall]]] = None):
+        super().__init__(api_key, model)
+        self.reply = reply or DEFAULT_FAKE_REPLY
+        self.reply_chars = reply_chars
+        self.chunk_size = max(1, chunk_size)
+        self.first_token_delay = first_token_delay
+        self.chunk_delay = chunk_delay
+        # 流式输出指定数量的分片后抛出异常，用于模拟上游中途出错
+        self.fail_after_chunks = fail_after_chunks
+        # 按事件输出时在回复之前输出的思考过程
+        self.reasoning = reasoning
+        # 工具调用时每次请求依次返回的工具调用，用完后返回普通回复
+        self.tool_rounds = list(tool_rounds or [])
+        self.call_count = 0
+
+    def get_provider_name(self) -> str:
+        return "fake"
+
+    def get_supported_models(self) -> List[str]:
+        return ["fake-model"]
+
+    def _build_reply(self, **kwargs) -> str:
+        """生成回复文本，reply_chars 可通过调用参数覆盖"""
+        reply_chars = kwargs.get("reply_chars", self.reply_chars)
+        if not reply_chars:
+            return self.reply
+        repeat = reply_chars // len(self.reply) + 1
+        return (self.reply * repeat)[:reply_chars]
+
+    async def chat_completion(self, system: str, messages: List[Dict[str, Any]],
+                            **kwargs) -> str:
+        """假聊天完成实现"""
+        self.call_count += 1
+        reply = self._build_reply(**kwargs)
+        chunks = (len(reply) + self.chunk_size - 1) // self.chunk_size
+        delay = self.first_token_delay + self.chunk_delay * max(0, chunks - 1)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        return reply
+
+    async def chat_completion_with_tools(self, system: str, messages: List[Dict[str, Any]],
+                                         tools: List[Tool], **kwargs) -> CompletionResult:
+        """假工具调用实现：按tool_rounds的顺序要求调用工具"""
+        if self.tool_rounds:
+            self.call_count += 1
+            if self.first_token_delay > 0:
+                await asyncio.sleep(self.first_token_delay)
+            return CompletionResult("", list(self.tool_rounds.pop(0)))
+        return CompletionResult(await self.chat_completion(system, messages, **kwargs))
+
+    async def chat_completion_events_with_tools(self, system: str, messages: List[Dict[str, Any]],
+                                                tools: List[Tool], **kwargs) -> AsyncGenerator[StreamEvent, None]:
+        """假流式工具调用实现：按tool_rounds的顺序要求调用工具，用完后流式输出回复"""
+        if not self.tool_rounds:
+            async for event in self.chat_completion_events(system, messages, **kwargs):
+                yield event
+            return
+        self.call_count += 1
+        if self.first_token_delay > 0:
+            await asyncio.sleep(self.first_token_delay)
+        yield StreamEvent(StreamEventType.TOOL_CALLS, list(self.tool_rounds.pop(0)))
+        yield StreamEvent(StreamEventType.COMPLETE, {"reasoning": "", "answer": "", "usage": None})
+
+    async def chat_completion_stream(self, system: str, messages: List[Dict[str, Any]],
+                                   **kwargs) -> AsyncGenerator[str, None]:
+        """假流式聊天完成实现"""
+        self.call_count += 1
+        reply = self._build_reply(**kwargs)
+
+        # 首个分片前的等待时间模拟TTFT，其余分片之间模拟ITL
+        if self.first_token_delay > 0:
+            await asyncio.sleep(self.first_token_delay)
+        for index, i in enumerate(range(0, len(reply), self.chunk_size)):
+            if self.fail_after_chunks is not None and index >= self.fail_after_chunks:
+                raise Exception("模拟的上游错误")
+            if i and self.chunk_delay > 0:
+                await asyncio.sleep(self.chunk_delay)
+            yield reply[i:i + self.chunk_size]
+
+    async def chat_completion_events(self, system: str, messages: List[Dict[str, Any]],
+                                     **kwargs) -> AsyncGenerator[StreamEvent, None]:
+        """假流式事件实现：等待first_token_delay后先输出思考过程，再输出回复和估算的用量"""
+        self.call_count += 1
+        reasoning = self.reasoning or ""
+        reply = self._build_reply(**kwargs)
+        # 与真实模型一样，思考过程也是首个分片之后才输出
+        if self.first_token_delay > 0:
+            await asyncio.sleep(self.first_token_delay)
+        for i in range(0, len(reasoning), self.chunk_size):
+            yield StreamEvent(StreamEventType.REASONING, reasoning[i:i + self.chunk_size])
+        answer = []
+        for index, i in enumerate(range(0, len(reply), self.chunk_size)):
+            if self.fail_after_chunks is not None and index >= self.fail_after_chunks:
+                raise Exception("模拟的上游错误")
+            if i and self.chunk_delay > 0:
+                await asyncio.sleep(self.chunk_delay)
+            chunk = reply[i:i + self.chunk_size]
+            answer.append(chunk)
+            yield StreamEvent(StreamEventType.ANSWER, chunk)
+
+        usage = None
+        # 与OpenAI提供商一致，默认输出用量；stream_options为None或include_usage为False时不输出
+        stream_options = kwargs.get("stream_options", {"include_usage": True})
+        if stream_options is not None and stream_options.get("include_usage", True) is not False:
+            prompt_tokens = estimate_tokens(system) + sum(
+                estimate_tokens(m.content if hasattr(m, "content") else m.get("content", "")) for m in messages
+            )
+            reasoning_tokens = estimate_tokens(reasoning)
+            completion_tokens = estimate_tokens("".join(answer)) + reasoning_tokens
+            usage = {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "reasoning_tokens": reasoning_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            }
+            yield StreamEvent(StreamEventType.USAGE, usage)
+        yield StreamEvent(StreamEventType.COMPLETE, {"reasoning": reasoning, "answer": "".join(answer), "usage": usage})
@@ -1,12 +1,16 @@
 """
 Google AI提供商实现
 """
-from typing import List, Dict, Any, AsyncGenerator
+from typing import List, Dict, Any, AsyncGenerator, Optional, TYPE_CHECKING
 import os
-from google import genai
-from google.genai import types
-from .base import BaseAIProvider
-from ai_chat_lib.models.message import Message
+from .base import BaseAIProvider, StreamEvent, StreamEventType
+from ai_chat_lib.models.message import Message, MessageRole
+from ai_chat_lib.timeouts import ChatTimeoutError, ChatTimeouts
+from ai_chat_lib.tools import CompletionResult, Tool, ToolCall
+from ai_chat_lib.usage import report_usage
+
+if TYPE_CHECKING:
+    from google.genai import types
 
 
 class GoogleAIProvider(BaseAIProvider):
@@ -14,7 +18,16 @@ class GoogleAIProvider(BaseAIProvider):
     
     def __init__(self, api_key: str, model: str = "gemini-2.5-flash"):
         super().__init__(api_key, model)
-        self.client = genai.Client(api_key=api_key)
+        # google-genai SDK导入较慢，首次使用客户端时才导入并创建
+        self._client = None
+
+    @property
+    def client(self):
+        """Google AI客户端"""
+        if self._client is None:
+            from google import genai
+            self._client = genai.Client(api_key=self.api_key)
+        return self._client
 
     def get_provider_name(self) -> str:
         return "google"
@@ -27,25 +40,102 @@ class GoogleAIProvider(BaseAIProvider):
     
 
     
-    def _convert_messages_to_google_format(self, system: str, messages: List[Message]) -> List[types.Content]:
+    def _get_http_options(self, timeouts: Optional[ChatTimeouts]) -> Optional["types.HttpOptions"]:
+        """距离截止时间的剩余时间作为请求超时（毫秒）"""
+        remaining = timeouts.remaining() if timeouts else None
+        if remaining is None:
+            return None
+        from google.genai import types
+        return types.HttpOptions(timeout=max(1, int(remaining * 1000)))
+
+    def _convert_timeout_error(self, error: Exception, phase: str,
+                               timeouts: Optional[ChatTimeouts]) -> Optional[ChatTimeoutError]:
+        """SDK的请求超时转换为ChatTimeoutError，其他异常返回None"""
+        import httpx
+        if not isinstance(error, (httpx.TimeoutException, TimeoutError)):
+            return None
+        if isinstance(error, httpx.ConnectTimeout):
+            phase = "connect"
+        return ChatTimeoutError(phase, getattr(timeouts, phase, None) if timeouts else None)
+
+    def _convert_messages_to_google_format(self, system: str, messages: List[Message]) -> List["types.Content"]:
         """将标准消息格式转换为Google AI格式"""
+        from google.genai import types
         contents = []
         
         # 转换消息历史
+        previous_role = None
         for message in messages:
             role = message.role
             content = message.content
+            metadata = message.metadata or {}
+            
+            if role == MessageRole.TOOL:
+                # 工具结果以function_response的形式返回给模型，同一轮的多个结果放在同一条内容中
+                part = types.Part.from_function_response(name=metadata.get("name", ""), response={"result": content})
+                if previous_role == MessageRole.TOOL:
+                    contents[-1].parts.append(part)
+                else:
+                    contents.append(types.Content(role="user", parts=[part]))
+                previous_role = role
+                continue
+            previous_role = role
             
             # Google AI API使用 "model" 而不是 "assistant"
-            google_role = "model" if role == "assistant" else "user"
+            google_role = "model" if role == MessageRole.ASSISTANT else "user"
+            parts = [types.Part.from_text(text=content)] if content or not metadata.get("tool_calls") else []
+            for call in metadata.get("tool_calls") or []:
+                arguments = call["arguments"] if isinstance(call["arguments"], dict) else {}
+                parts.append(types.Part.from_function_call(name=call["name"], args=arguments))
             
             contents.append(types.Content(
                 role=google_role,  
-                parts=[types.Part.from_text(text=content)]
+                parts=parts
             ))
         
         return contents
     
+    def _get_generate_content_config(self, system: str, **kwargs) -> "types.GenerateContentConfig":
+        """构建生成配置；thinking_budget非0时同时返回思考过程"""
+        from google.genai import types
+        thinking_budget = kwargs.get("thinking_budget", 0)
+        return types.GenerateContentConfig(
+            max_output_tokens=kwargs.get("max_tokens", 1024),
+            thinking_config=types.ThinkingConfig(
+                thinking_budget=thinking_budget,
+                include_thoughts=bool(thinking_budget),
+            ),
+            media_resolution="MEDIA_RESOLUTION_LOW",
+            # 可以根据需要添加工具
+            # tools=[
+            #     types.Tool(googleSearch=types.GoogleSearch())
+            # ] if kwargs.get("enable_search", False) else None,
+
+            system_instruction=[
+            types.Part.from_text(text= system),
+            ],
+            http_options=self._get_http_options(kwargs.get("timeouts")),
+            tools=[types.Tool(function_declarations=[
+                types.FunctionDeclaration(
+                    name=tool.name,
+                    description=tool.description,
+                    parameters_json_schema=tool.parameters,
+                )
+                for tool in kwargs["tools"]
+            ])] if kwargs.get("tools") else None,
+        )
+
+    @staticmethod
+    def _normalize_usage(usage) -> Dict[str, Any]:
+        """把usage_metadata转换为统一的字典"""
+        return {
+            "prompt_tokens": getattr(usage, "prompt_token_count", 0) or 0,
+            "completion_tokens": (getattr(usage, "candidates_token_count", 0) or 0)
+                                 + (getattr(usage, "thoughts_token_count", 0) or 0),
+            "reasoning_tokens": getattr(usage, "thoughts_token_count", 0) or 0,
+            "total_tokens": getattr(usage, "total_token_count", 0) or 0,
+        }
+
     async def chat_completion(self, system: str, messages: List[Dict[str, Any]], 
                             **kwargs) -> str:
         """Google AI聊天完成实现"""
@@ -53,30 +143,16 @@ class GoogleAIProvider(BaseAIProvider):
             # 转换消息格式
             contents = self._convert_messages_to_google_format(system, messages)
             
-            # 设置生成配置
-            generate_content_config = types.GenerateContentConfig(
-                max_output_tokens=kwargs.get("max_tokens", 1024),
-                thinking_config=types.ThinkingConfig(
-                    thinking_budget=0,
-                ),
-                media_resolution="MEDIA_RESOLUTION_LOW",
-                # 可以根据需要添加工具
-                # tools=[
-                #     types.Tool(googleSearch=types.GoogleSearch())
-                # ] if kwargs.get("enable_search", False) else None,
-
-                system_instruction=[
-                types.Part.from_text(text= system),
-                ],
-            )
-            
-            # 调用Google AI API
-            response = self.client.models.generate_content(
-                model=self.model,
+            # 调用Google AI API（异步客户端，超时或取消时不会阻塞事件循环）
+            response = await self.client.aio.models.generate_content(
+                model=kwargs.get("model") or self.model,
                 contents=contents,
-                config=generate_content_config,
+                config=self._get_generate_content_config(system, **kwargs),
             )
             
+            if response and response.usage_metadata:
+                report_usage(self._normalize_usage(response.usage_metadata))
+            
             # 提取响应文本
             if response and response.text:
                 return response.text
@@ -84,45 +160,112 @@ class GoogleAIProvider(BaseAIProvider):
                 return "抱歉，没有收到有效的响应。"
                 
         except Exception as e:
+            timeout_error = self._convert_timeout_error(e, "total", kwargs.get("timeouts"))
+            if timeout_error is not None:
+                raise timeout_error from e
+            raise Exception(f"Google AI API调用失败: {str(e)}")
+    
+    async def chat_completion_with_tools(self, system: str, messages: List[Dict[str, Any]],
+                                         tools: List[Tool], **kwargs) -> CompletionResult:
+        """Google AI工具调用实现，一次回复中可以要求多个工具"""
+        try:
+            contents = self._convert_messages_to_google_format(system, messages)
+            response = await self.client.aio.models.generate_content(
+                model=kwargs.get("model") or self.model,
+                contents=contents,
+                config=self._get_generate_content_config(system, tools=tools, **kwargs),
+            )
+            
+            tool_calls = [
+                ToolCall(id=call.id or f"call_{index}", name=call.name, arguments=dict(call.args or {}))
+                for index, call in enumerate(response.function_calls or [])
+            ]
+            candidate = response.candidates[0] if response.candidates else None
+            parts = candidate.content.parts if candidate and candidate.content else None
+            content = "".join(part.text for part in parts or [] if part.text and not part.thought)
+            usage = self._normalize_usage(response.usage_metadata) if response.usage_metadata else None
+            return CompletionResult(content, tool_calls, usage)
+        
+        except Exception as e:
+            timeout_error = self._convert_timeout_error(e, "total", kwargs.get("timeouts"))
+            if timeout_error is not None:
+                raise timeout_error from e
             raise Exception(f"Google AI API调用失败: {str(e)}")
     
     async def chat_completion_stream(self, system: str, messages: List[Dict[str, Any]], 
                                    **kwargs) -> AsyncGenerator[str, None]:
         """Google AI流式聊天完成实现"""
+        async for event in self.chat_completion_events(system, messages, **kwargs):
+            if event.type == StreamEventType.ANSWER:
+                yield event.data
+
+    async def chat_completion_events_with_tools(self, system: str, messages: List[Dict[str, Any]],
+                                                tools: List[Tool], **kwargs) -> AsyncGenerator[StreamEvent, None]:
+        """Google AI流式工具调用：回复片段立即输出，function_call在结束时作为工具调用输出"""
+        async for event in self.chat_completion_events(system, messages, tools=tools, **kwargs):
+            yield event
+
+    async def chat_completion_events(self, system: str, messages: List[Dict[str, Any]],
+                                     **kwargs) -> AsyncGenerator[StreamEvent, None]:
+        """Google AI流式事件实现：thought为True的part作为思考过程"""
+        stream = None
+        reasoning_content = []
+        answer_content = []
+        tool_calls = []
+        usage = None
         try:
             # 转换消息格式
             contents = self._convert_messages_to_google_format(system, messages)
             
-            # 设置生成配置
-            generate_content_config = types.GenerateContentConfig(
-                max_output_tokens=kwargs.get("max_tokens", 1024),
-                thinking_config=types.ThinkingConfig(
-                    thinking_budget=0,
-                ),
-                media_resolution="MEDIA_RESOLUTION_LOW",
-                # 可以根据需要添加工具
-                # tools=[
-                #     types.Tool(googleSearch=types.GoogleSearch())
-                # ] if kwargs.get("enable_search", False) else None,
-
-                system_instruction=[
-                types.Part.from_text(text= system),
-                ]
-            )
-            
             # 流式调用Google AI API
-            stream = self.client.models.generate_content_stream(
-                model=self.model,
+            stream = await self.client.aio.models.generate_content_stream(
+                model=kwargs.get("model") or self.model,
                 contents=contents,
-                config=generate_content_config,
+                config=self._get_generate_content_config(system, **kwargs),
             )
             
-            for chunk in stream:
-                if chunk.text:
-                    yield chunk.text
+            async for chunk in stream:
+                if chunk.usage_metadata:
+                    # 每个分片都带有累计用量，以最后一个为准
+                    usage = self._normalize_usage(chunk.usage_metadata)
+                candidate = chunk.candidates[0] if chunk.candidates else None
+                parts = candidate.content.parts if candidate and candidate.content else None
+                for part in parts or []:
+                    call = getattr(part, "function_call", None)
+                    if call is not None:
+                        tool_calls.append(ToolCall(id=call.id or f"call_{len(tool_calls)}", name=call.name,
+                                                   arguments=dict(call.args or {})))
+                        continue
+                    if not part.text:
+                        continue
+                    if part.thought:
+                        reasoning_content.append(part.text)
+                        yield StreamEvent(StreamEventType.REASONING, part.text)
+                    else:
+                        answer_content.append(part.text)
+                        yield StreamEvent(StreamEventType.ANSWER, part.text)
                     
         except Exception as e:
+            phase = "chunk_gap" if reasoning_content or answer_content else "first_token"
+            timeout_error = self._convert_timeout_error(e, phase, kwargs.get("timeouts"))
+            if timeout_error is not None:
+                raise timeout_error from e
             raise Exception(f"Google AI流式API调用失败: {str(e)}")
+        finally:
+            # 超时或被取消时关闭上游响应
+            aclose = getattr(stream, "aclose", None)
+            if aclose is not None:
+                await aclose()
+        
+        if usage is not None:
+            yield StreamEvent(StreamEventType.USAGE, usage)
+        if tool_calls:
+            yield StreamEvent(StreamEventType.TOOL_CALLS, tool_calls)
+        yield StreamEvent(StreamEventType.COMPLETE, {
+            "reasoning": "".join(reasoning_content),
+            "answer": "".join(answer_content),
+            "usage": usage,
+        })
     
     def _validate_config(self) -> bool:
         """验证配置是否有效"""
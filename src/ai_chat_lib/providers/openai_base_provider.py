@@ -3,11 +3,14 @@
 OpenAI基础提供商实现
 """
 from typing import List, Dict, Any, AsyncGenerator, Optional
+import json
 import os
-from openai import OpenAI, AsyncOpenAI
 
-from ai_chat_lib.models.message import Message
-from .base import BaseAIProvider
+from ai_chat_lib.models.message import Message, MessageRole
+from ai_chat_lib.timeouts import ChatTimeoutError, ChatTimeouts
+from ai_chat_lib.tools import CompletionResult, Tool, ToolCall, parse_arguments
+from ai_chat_lib.usage import report_usage
+from .base import BaseAIProvider, StreamEvent, StreamEventType
 
 
 class OpenAIBaseProvider(BaseAIProvider):
@@ -22,8 +25,26 @@ class OpenAIBaseProvider(BaseAIProvider):
         if base_url:
             client_kwargs["base_url"] = base_url
             
-        self.client = OpenAI(**client_kwargs)
-        self.async_client = AsyncOpenAI(**client_kwargs)
+        # openai SDK导入较慢，首次使用客户端时才导入并创建
+        self._client_kwargs = client_kwargs
+        self._client = None
+        self._async_client = None
+
+    @property
+    def client(self):
+        """同步客户端"""
+        if self._client is None:
+            from openai import OpenAI
+            self._client = OpenAI(**self._client_kwargs)
+        return self._client
+
+    @property
+    def async_client(self):
+        """异步客户端"""
+        if self._async_client is None:
+            from openai import AsyncOpenAI
+            self._async_client = AsyncOpenAI(**self._client_kwargs)
+        return self._async_client
 
     def get_provider_name(self) -> str:
         return "openai_base"
@@ -49,17 +70,37 @@ class OpenAIBaseProvider(BaseAIProvider):
         
         # 转换消息历史
         for message in messages:
-            openai_messages.append({
+            openai_message = {
                 "role": message.role.value,
                 "content": message.content
-            })
+            }
+            metadata = message.metadata
+            if metadata:
+                # 工具调用和工具结果需要带上调用ID，其他metadata（如思考过程）不发送
+                if metadata.get("tool_calls"):
+                    openai_message["tool_calls"] = [
+                        {
+                            "id": call["id"],
+                            "type": "function",
+                            "function": {
+                                "name": call["name"],
+                                "arguments": call["arguments"] if isinstance(call["arguments"], str)
+                                else json.dumps(call["arguments"], ensure_ascii=False),
+                            },
+                        }
+                        for call in metadata["tool_calls"]
+                    ]
+                if message.role == MessageRole.TOOL:
+                    openai_message["tool_call_id"] = metadata.get("tool_call_id")
+            openai_messages.append(openai_message)
         
         return openai_messages
     
     def _get_completion_kwargs(self, **kwargs) -> Dict[str, Any]:
         """构建API调用的参数，子类可以重写以添加特定参数"""
         completion_kwargs = {
-            "model": self.model,
+            # 预算降级等情况下可以为单次请求指定模型
+            "model": kwargs.get("model") or self.model,
             "max_tokens": kwargs.get("max_tokens", 1024),
             "temperature": kwargs.get("temperature", 0.7),
             "top_p": kwargs.get("top_p", 1.0),
@@ -69,8 +110,48 @@ class OpenAIBaseProvider(BaseAIProvider):
         extra_body = kwargs.get("extra_body", {})
         if extra_body:
             completion_kwargs["extra_body"] = extra_body
+
+        request_timeout = self._get_request_timeout(kwargs.get("timeouts"), kwargs.get("stream", False))
+        if request_timeout is not None:
+            completion_kwargs["timeout"] = request_timeout
             
         return completion_kwargs
+
+    def _get_request_timeout(self, timeouts: Optional[ChatTimeouts], stream: bool):
+        """把ChatTimeouts转换为本次请求的httpx.Timeout
+
+        流式请求的读超时取首个分片和分片间隔中较大的一个，非流式请求只受总时间限制；
+        各项都不超过距离截止时间的剩余时间。
+        """
+        if timeouts is None:
+            return None
+        remaining = timeouts.remaining()
+
+        def cap(value: Optional[float]) -> Optional[float]:
+            if remaining is None:
+                return value
+            return remaining if value is None else min(value, remaining)
+
+        read = None
+        if stream:
+            budgets = [t for t in (timeouts.first_token, timeouts.chunk_gap) if t is not None]
+            read = max(budgets) if budgets else None
+        connect, read = cap(timeouts.connect), cap(read)
+        if connect is None and read is None:
+            return None
+        import httpx
+        return httpx.Timeout(remaining, connect=connect, read=read)
+
+    def _convert_timeout_error(self, error: Exception, phase: str,
+                               timeouts: Optional[ChatTimeouts]) -> Optional[ChatTimeoutError]:
+        """SDK的请求超时转换为ChatTimeoutError，其他异常返回None"""
+        from openai import APITimeoutError
+        if not isinstance(error, APITimeoutError):
+            return None
+        import httpx
+        if isinstance(error.__cause__, httpx.ConnectTimeout):
+            phase = "connect"
+        return ChatTimeoutError(phase, getattr(timeouts, phase, None) if timeouts else None)
     
     async def chat_completion(self, system: str, messages: List[Dict[str, Any]], 
                             **kwargs) -> str:
@@ -85,6 +166,8 @@ class OpenAIBaseProvider(BaseAIProvider):
             
             # 调用OpenAI API
             response = await self.async_client.chat.completions.create(**completion_kwargs)
+            if getattr(response, "usage", None):
+                report_usage(self._normalize_usage(response.usage))
             
             # 提取响应文本
             if response.choices and response.choices[0].message.content:
@@ -93,22 +176,86 @@ class OpenAIBaseProvider(BaseAIProvider):
                 return "抱歉，没有收到有效的响应。"
                 
         except Exception as e:
+            timeout_error = self._convert_timeout_error(e, "total", kwargs.get("timeouts"))
+            if timeout_error is not None:
+                raise timeout_error from e
+            raise Exception(f"OpenAI API调用失败: {str(e)}")
+    
+    async def chat_completion_with_tools(self, system: str, messages: List[Dict[str, Any]],
+                                         tools: List[Tool], **kwargs) -> CompletionResult:
+        """OpenAI工具调用实现，一次回复中可以要求多个工具"""
+        try:
+            completion_kwargs = self._get_completion_kwargs(**kwargs)
+            completion_kwargs["messages"] = self._convert_messages_to_openai_format(system, messages)
+            if tools:
+                completion_kwargs["tools"] = [tool.to_openai() for tool in tools]
+                if kwargs.get("tool_choice"):
+                    completion_kwargs["tool_choice"] = kwargs["tool_choice"]
+            
+            response = await self.async_client.chat.completions.create(**completion_kwargs)
+            
+            message = response.choices[0].message if response.choices else None
+            tool_calls = [
+                ToolCall(id=call.id, name=call.function.name, arguments=parse_arguments(call.function.arguments))
+                for call in ((message.tool_calls if message else None) or [])
+            ]
+            usage = self._normalize_usage(response.usage) if getattr(response, "usage", None) else None
+            return CompletionResult((message.content if message else None) or "", tool_calls, usage)
+        
+        except Exception as e:
+            timeout_error = self._convert_timeout_error(e, "total", kwargs.get("timeouts"))
+            if timeout_error is not None:
+                raise timeout_error from e
             raise Exception(f"OpenAI API调用失败: {str(e)}")
     
     async def chat_completion_stream(self, system: str, messages: List[Dict[str, Any]], 
                                    **kwargs) -> AsyncGenerator[str, None]:
         """OpenAI流式聊天完成实现"""
+        async for event in self.chat_completion_events(system, messages, **kwargs):
+            if event.type == StreamEventType.ANSWER:
+                yield event.data
+
+    @staticmethod
+    def _normalize_usage(usage) -> Dict[str, Any]:
+        """把SDK的用量对象转换为统一的字典"""
+        details = getattr(usage, "completion_tokens_details", None)
+        return {
+            "prompt_tokens": getattr(usage, "prompt_tokens", 0) or 0,
+            "completion_tokens": getattr(usage, "completion_tokens", 0) or 0,
+            "reasoning_tokens": getattr(details, "reasoning_tokens", 0) or 0,
+            "total_tokens": getattr(usage, "total_tokens", 0) or 0,
+        }
+    
+    async def chat_completion_events_with_tools(self, system: str, messages: List[Dict[str, Any]],
+                                                tools: List[Tool], **kwargs) -> AsyncGenerator[StreamEvent, None]:
+        """OpenAI流式工具调用：回复片段立即输出，工具调用的增量片段拼接完整后输出"""
+        async for event in self.chat_completion_events(system, messages, tools=tools, **kwargs):
+            yield event
+    
+    async def chat_completion_events(self, system: str, messages: List[Dict[str, Any]],
+                                     **kwargs) -> AsyncGenerator[StreamEvent, None]:
+        """OpenAI流式事件实现：delta.reasoning_content作为思考过程，content作为回复"""
+        stream = None
+        reasoning_content = []
+        answer_content = []
+        # 按index拼接工具调用的增量片段
+        tool_call_parts: Dict[int, Dict[str, Any]] = {}
+        usage = None
         try:
             # 转换消息格式
             openai_messages = self._convert_messages_to_openai_format(system, messages)
             
             # 获取完成参数
-            completion_kwargs = self._get_completion_kwargs(**kwargs)
+            completion_kwargs = self._get_completion_kwargs(stream=True, **kwargs)
             completion_kwargs["messages"] = openai_messages
             completion_kwargs["stream"] = True
+            if kwargs.get("tools"):
+                completion_kwargs["tools"] = [tool.to_openai() for tool in kwargs["tools"]]
+                if kwargs.get("tool_choice"):
+                    completion_kwargs["tool_choice"] = kwargs["tool_choice"]
             
-            # 可选：添加流式选项
-            stream_options = kwargs.get("stream_options")
+            # 默认在最后一个分片中返回用量，传入stream_options=None可以关闭
+            stream_options = kwargs.get("stream_options", {"include_usage": True})
             if stream_options:
                 completion_kwargs["stream_options"] = stream_options
             
@@ -116,83 +263,78 @@ class OpenAIBaseProvider(BaseAIProvider):
             stream = await self.async_client.chat.completions.create(**completion_kwargs)
             
             async for chunk in stream:
-                if chunk.choices and chunk.choices[0].delta.content:
-                    yield chunk.choices[0].delta.content
-                    
-        except Exception as e:
-            raise Exception(f"OpenAI流式API调用失败: {str(e)}")
-    
-    async def chat_completion_stream_with_reasoning(self, system: str, messages: List[Dict[str, Any]], 
-                                                  **kwargs) -> AsyncGenerator[Dict[str, Any], None]:
-        """支持思考过程的流式聊天完成（适用于支持reasoning的模型）"""
-        try:
-            # 转换消息格式
-            openai_messages = self._convert_messages_to_openai_format(system, messages)
-            
-            # 获取完成参数并启用思考模式
-            completion_kwargs = self._get_completion_kwargs(**kwargs)
-            completion_kwargs["messages"] = openai_messages
-            completion_kwargs["stream"] = True
-            
-            # 确保启用思考模式
-            if "extra_body" not in completion_kwargs:
-                completion_kwargs["extra_body"] = {}
-            completion_kwargs["extra_body"]["enable_thinking"] = True
-            
-            # 流式调用API
-            stream = await self.async_client.chat.completions.create(**completion_kwargs)
-            
-            reasoning_content = ""
-            answer_content = ""
-            is_answering = False
-            
-            async for chunk in stream:
+                if getattr(chunk, "usage", None):
+                    usage = self._normalize_usage(chunk.usage)
+                    yield StreamEvent(StreamEventType.USAGE, usage)
                 if not chunk.choices:
-                    # 处理使用情况信息
-                    if hasattr(chunk, 'usage') and chunk.usage:
-                        yield {
-                            "type": "usage",
-                            "data": chunk.usage
-                        }
                     continue
                 
                 delta = chunk.choices[0].delta
-                
-                # 处理思考内容
-                if hasattr(delta, "reasoning_content") and delta.reasoning_content is not None:
-                    reasoning_content += delta.reasoning_content
-                    if not is_answering:
-                        yield {
-                            "type": "reasoning",
-                            "data": delta.reasoning_content
-                        }
-                
-                # 处理回复内容
-                if hasattr(delta, "content") and delta.content:
-                    if not is_answering:
-                        is_answering = True
-                        yield {
-                            "type": "answer_start",
-                            "data": None
-                        }
-                    
-                    answer_content += delta.content
-                    yield {
-                        "type": "answer",
-                        "data": delta.content
-                    }
-            
-            # 发送完整内容
-            yield {
-                "type": "complete",
-                "data": {
-                    "reasoning": reasoning_content,
-                    "answer": answer_content
-                }
-            }
+                reasoning = getattr(delta, "reasoning_content", None)
+                if reasoning:
+                    reasoning_content.append(reasoning)
+                    yield StreamEvent(StreamEventType.REASONING, reasoning)
+                if delta.content:
+                    answer_content.append(delta.content)
+                    yield StreamEvent(StreamEventType.ANSWER, delta.content)
+                for call in getattr(delta, "tool_calls", None) or []:
+                    part = tool_call_parts.setdefault(call.index, {"id": "", "name": "", "arguments": []})
+                    if call.id:
+                        part["id"] = call.id
+                    function = getattr(call, "function", None)
+                    if function is not None and function.name:
+                        part["name"] = function.name
+                    if function is not None and function.arguments:
+                        part["arguments"].append(function.arguments)
                     
         except Exception as e:
-            raise Exception(f"OpenAI思考模式流式API调用失败: {str(e)}")
+            phase = "chunk_gap" if reasoning_content or answer_content or tool_call_parts else "first_token"
+            timeout_error = self._convert_timeout_error(e, phase, kwargs.get("timeouts"))
+            if timeout_error is not None:
+                raise timeout_error from e
+            raise Exception(f"OpenAI流式API调用失败: {str(e)}")
+        finally:
+            # 超时或被取消时关闭HTTP响应，把连接还给连接池
+            if stream is not None:
+                await stream.close()
+        
+        if tool_call_parts:
+            yield StreamEvent(StreamEventType.TOOL_CALLS, [
+                ToolCall(id=part["id"], name=part["name"], arguments=parse_arguments("".join(part["arguments"])))
+                for _, part in sorted(tool_call_parts.items())
+            ])
+        yield StreamEvent(StreamEventType.COMPLETE, {
+            "reasoning": "".join(reasoning_content),
+            "answer": "".join(answer_content),
+            "usage": usage,
+        })
+    
+    async def chat_completion_stream_with_reasoning(self, system: str, messages: List[Dict[str, Any]], 
+                                                  **kwargs) -> AsyncGenerator[Dict[str, Any], None]:
+        """支持思考过程的流式聊天完成（适用于支持reasoning的模型）
+        
+        兼容旧接口，输出字典形式的事件；新代码请使用chat_completion_events。
+        """
+        # 确保启用思考模式
+        kwargs["extra_body"] = {**(kwargs.get("extra_body") or {}), "enable_thinking": True}
+        
+        is_answering = False
+        async for event in self.chat_completion_events(system, messages, **kwargs):
+            if event.type == StreamEventType.REASONING:
+                if not is_answering:
+                    yield {"type": "reasoning", "data": event.data}
+            elif event.type == StreamEventType.ANSWER:
+                if not is_answering:
+                    is_answering = True
+                    yield {"type": "answer_start", "data": None}
+                yield {"type": "answer", "data": event.data}
+            elif event.type == StreamEventType.USAGE:
+                yield {"type": "usage", "data": event.data}
+            else:
+                yield {"type": "complete", "data": {
+                    "reasoning": event.data["reasoning"],
+                    "answer": event.data["answer"],
+                }}
     
     def _validate_config(self) -> bool:
         """验证配置是否有效"""
@@ -0,0 +1,272 @@
+"""
+多Key、多端点负载均衡的提供商实现
+"""
+import time
+from dataclasses import dataclass
+from typing import Callable, List, Dict, Any, AsyncGenerator, Optional, Sequence, Tuple, Union
+from ai_chat_lib.timeouts import ChatTimeoutError
+from ai_chat_lib.tools import CompletionResult, Tool
+from .base import BaseAIProvider, StreamEvent
+from .openai_base_provider import OpenAIBaseProvider
+
+STRATEGIES = ("least_outstanding", "ewma")
+
+# (api_key, base_url)，base_url为None时使用OpenAI官方地址
+Endpoint = Tuple[str, Optional[str]]
+
+
+# 表示连接失败的异常类名（openai、httpx等），按类名匹配，不需要导入这些库
+CONNECTION_ERROR_NAMES = frozenset({
+    "APIConnectionError", "APITimeoutError", "TransportError", "ConnectError", "ConnectTimeout",
+    "RemoteProtocolError", "ServerDisconnectedError", "ClientConnectionError",
+})
+
+
+def _status_code(error: BaseException) -> Optional[int]:
+    response = getattr(error, "response", None)
+    for value in (getattr(error, "status_code", None), getattr(response, "status_code", None),
+                  getattr(error, "code", None)):
+        if isinstance(value, int) and 100 <= value < 600:
+            return value
+    return None
+
+
+def is_retryable_error(error: BaseException) -> bool:
+    """是否是成员本身的故障：连接错误、429和5xx
+
+    提供商把原始异常包装成Exception重新抛出，这里沿着__cause__/__context__查找原始异常。
+    请求本身的问题（400/401、内容审核等）和调用方的超时不算，换成员重试也会失败；
+    但连接阶段的超时（ChatTimeoutError.phase为"connect"，没有设置超时时也来自SDK的默认超时）说明成员连不上，算作故障。
+    """
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        if isinstance(error, ChatTimeoutError):
+            return error.phase == "connect"
+        status = _status_code(error)
+        if status is not None:
+            return status == 429 or status >= 500
+        if isinstance(error, ConnectionError) or any(
+                cls.__name__ in CONNECTION_ERROR_NAMES for cls in type(error).__mro__):
+            return True
+        error = error.__cause__ or error.__context__
+    return False
+
+
+@dataclass
+class PoolMember:
+    """池中的一个成员及其负载和健康状态"""
+    provider: BaseAIProvider
+    outstanding: int = 0
+    # 延迟的指数加权移动平均（秒）：非流式为总耗时，流式为首个分片的等待时间
+    ewma_latency: Optional[float] = None
+    consecutive_failures: int = 0
+    ejections: int = 0
+    ejected_until: float = 0.0
+    requests: int = 0
+    failures: int = 0
+
+    def is_available(self, now: float) -> bool:
+        return now >= self.ejected_until
+
+    def to_dict(self) -> Dict[str, Any]:
+        config = getattr(self.provider, "base_url", None)
+        return {
+            "provider": self.provider.get_provider_name(),
+            "base_url": config,
+            "outstanding": self.outstanding,
+            "ewma_latency": self.ewma_latency,
+            "consecutive_failures": self.consecutive_failures,
+            "ejected": self.ejected_until > time.monotonic(),
+            "requests": self.requests,
+            "failures": self.failures,
+        }
+
+
+class PooledOpenAIProvider(BaseAIProvider):
+    """在多个 (api_key, base_url) 之间分配请求的OpenAI兼容提供商
+
+    选择策略：
+    - least_outstanding：进行中请求最少的成员，相同时轮流选择
+    - ewma：按 延迟EWMA × (进行中请求数 + 1) 选择，没有延迟样本的成员优先
+    连续失败failure_threshold次的成员被暂时剔除，剔除时间按次数指数增长；
+    到期后自动重新加入，再次失败会立即被剔除，成功一次即恢复正常。
+    请求在没有输出任何内容前失败时，会换一个成员重试（最多max_attempts次）。
+    只有retry_on返回True的异常（默认is_retryable_error：连接错误、429和5xx）才计为成员失败并重试，
+    其他异常直接抛出。
+
+    需要端点列表，不能通过create_provider(name, api_key, model)创建，请直接构造。
+    """
+
+    def __init__(self, endpoints: Sequence[Union[Endpoint, BaseAIProvider]], model: str,
+                 strategy: str = "least_outstanding", failure_threshold: int = 3,
+                 ejection_time: float = 30.0, max_ejection_time: float = 300.0,
+                 ewma_alpha: float = 0.3, max_attempts: int = 2, name: Optional[str] = None,
+                 retry_on: Callable[[BaseException], bool] = is_retryable_error):
+        if not endpoints:
+            raise ValueError("至少需要一个端点")
+        if strategy not in STRATEGIES:
+            raise ValueError(f"不支持的选择策略: {strategy}，可选: {', '.join(STRATEGIES)}")
+
+        members = []
+        for endpoint in endpoints:
+            if isinstance(endpoint, BaseAIProvider):
+                members.append(PoolMember(endpoint))
+            else:
+                api_key, base_url = endpoint
+                members.append(PoolMember(OpenAIBaseProvider(api_key, model, base_url=base_url)))
+        super().__init__(members[0].provider.api_key, model)
+
+        self.members: List[PoolMember] = members
+        self.strategy = strategy
+        self.failure_threshold = max(1, failure_threshold)
+        self.ejection_time = ejection_time
+        self.max_ejection_time = max_ejection_time
+        self.ewma_alpha = ewma_alpha
+        self.max_attempts = max(1, max_attempts)
+        self.retry_on = retry_on
+        self._name = name
+        self._next = 0
+
+    def get_provider_name(self) -> str:
+        return self._name or self.members[0].provider.get_provider_name()
+
+    def get_supported_models(self) -> List[str]:
+        return self.members[0].provider.get_supported_models()
+
+    def resolve_chat_history_with_system(self, system, history):
+        return self.members[0].provider.resolve_chat_history_with_system(system, history)
+
+    def get_stats(self) -> List[Dict[str, Any]]:
+        """每个成员的负载和健康状态"""
+        return [member.to_dict() for member in self.members]
+
+    def _select(self, exclude: Sequence[PoolMember] = ()) -> PoolMember:
+        """选择一个成员；所有成员都被剔除时选择最早恢复的那个"""
+        now = time.monotonic()
+        count = len(self.members)
+        start = self._next
+        self._next = (self._next + 1) % count
+        # 从轮转位置开始遍历，分数相同时自然轮流选择
+        candidates = [
+            self.members[(start + i) % count] for i in range(count)
+            if self.members[(start + i) % count] not in exclude
+        ] or list(self.members)
+
+        available = [m for m in candidates if m.is_available(now)]
+        if not available:
+            return min(candidates, key=lambda m: m.ejected_until)
+        if self.strategy == "ewma":
+            return min(available, key=lambda m: (m.ewma_latency or 0.0) * (m.outstanding + 1))
+        return min(available, key=lambda m: m.outstanding)
+
+    def _record_success(self, member: PoolMember, latency: float):
+        member.consecutive_failures = 0
+        member.ejections = 0
+        if member.ewma_latency is None:
+            member.ewma_latency = latency
+        else:
+            member.ewma_latency += self.ewma_alpha * (latency - member.ewma_latency)
+
+    def _record_failure(self, member: PoolMember):
+        member.failures += 1
+        member.consecutive_failures += 1
+        if member.consecutive_failures >= self.failure_threshold:
+            duration = min(self.ejection_time * (2 ** member.ejections), self.max_ejection_time)
+            member.ejections += 1
+            member.ejected_until = time.monotonic() + duration
+
+    async def chat_completion(self, system: str, messages: List[Dict[str, Any]],
+                            **kwargs) -> str:
+        """选择成员完成请求，失败时换成员重试"""
+        return await self._call_with_failover("chat_completion", system, messages, **kwargs)
+
+    async def chat_completion_with_tools(self, system: str, messages: List[Dict[str, Any]],
+                                         tools: List[Tool], **kwargs) -> CompletionResult:
+        """工具调用请求，重试规则同chat_completion"""
+        return await self._call_with_failover("chat_completion_with_tools", system, messages, tools, **kwargs)
+
+    async def _call_with_failover(self, method: str, *args, **kwargs) -> Any:
+        tried: List[PoolMember] = []
+        while True:
+            member = self._select(tried)
+            tried.append(member)
+            member.outstanding += 1
+            member.requests += 1
+            start = time.monotonic()
+            try:
+                response = await getattr(member.provider, method)(*args, **kwargs)
+            except Exception as e:
+                if not self.retry_on(e):
+                    raise
+                self._record_failure(member)
+                if len(tried) >= self.max_attempts:
+                    raise
+                continue
+            finally:
+                member.outstanding -= 1
+            self._record_success(member, time.monotonic() - start)
+            return response
+
+    async def chat_completion_stream(self, system: str, messages: List[Dict[str, Any]],
+                                   **kwargs) -> AsyncGenerator[str, None]:
+        """流式请求：首个分片之前失败时换成员重试，之后失败直接抛出"""
+        stream = self._stream_with_failover("chat_completion_stream", system, messages, **kwargs)
+        try:
+            async for chunk in stream:
+                yield chunk
+        finally:
+            await stream.aclose()
+
+    async def chat_completion_events(self, system: str, messages: List[Dict[str, Any]],
+                                     **kwargs) -> AsyncGenerator[StreamEvent, None]:
+        """按事件输出的流式请求，重试规则同chat_completion_stream"""
+        stream = self._stream_with_failover("chat_completion_events", system, messages, **kwargs)
+        try:
+            async for event in stream:
+                yield event
+        finally:
+            await stream.aclose()
+
+    async def chat_completion_events_with_tools(self, system: str, messages: List[Dict[str, Any]],
+                                                tools: List[Tool], **kwargs) -> AsyncGenerator[StreamEvent, None]:
+        """流式工具调用请求，重试规则同chat_completion_stream"""
+        stream = self._stream_with_failover("chat_completion_events_with_tools", system, messages,
+                                            tools=tools, **kwargs)
+        try:
+            async for event in stream:
+                yield event
+        finally:
+            await stream.aclose()
+
+    async def _stream_with_failover(self, method: str, system: str, messages: List[Dict[str, Any]],
+                                    **kwargs) -> AsyncGenerator[Any, None]:
+        tried: List[PoolMember] = []
+        while True:
+            member = self._select(tried)
+            tried.append(member)
+            member.outstanding += 1
+            member.requests += 1
+            start = time.monotonic()
+            received = False
+            inner = getattr(member.provider, method)(system, messages, **kwargs)
+            try:
+                async for item in inner:
+                    if not received:
+                        received = True
+                        self._record_success(member, time.monotonic() - start)
+                    yield item
+            except Exception as e:
+                if not self.retry_on(e):
+                    raise
+                self._record_failure(member)
+                if received or len(tried) >= self.max_attempts:
+                    raise
+                continue
+            finally:
+                member.outstanding -= 1
+                # 调用方提前结束时立即关闭成员的流，把上游连接还给连接池
+                await inner.aclose()
+            if not received:
+                self._record_success(member, time.monotonic() - start)
+            return
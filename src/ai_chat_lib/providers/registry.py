@@ -0,0 +1,77 @@
+"""
+提供商注册表：按名称创建提供商，提供商模块和SDK在首次使用时才导入
+"""
+import importlib
+import os
+from typing import Callable, Dict, List, Optional, Union
+from .base import BaseAIProvider
+
+# 工厂可以是可调用对象，也可以是 "模块路径:类名" 字符串（首次创建时才导入）
+ProviderFactory = Union[str, Callable[..., BaseAIProvider]]
+
+_factories: Dict[str, ProviderFactory] = {}
+# 未传入api_key时读取的环境变量
+_api_key_envs: Dict[str, Optional[str]] = {}
+
+
+def register_provider(name: str, factory: ProviderFactory, api_key_env: Optional[str] = None,
+                      override: bool = False):
+    """注册提供商工厂"""
+    if name in _factories and not override:
+        raise ValueError(f"提供商 {name} 已注册")
+    _factories[name] = factory
+    _api_key_envs[name] = api_key_env
+
+
+def unregister_provider(name: str):
+    """移除提供商"""
+    _factories.pop(name, None)
+    _api_key_envs.pop(name, None)
+
+
+def list_providers() -> List[str]:
+    """列出已注册的提供商名称"""
+    return sorted(_factories)
+
+
+def get_api_key_env(name: str) -> Optional[str]:
+    """提供商默认读取的API Key环境变量"""
+    return _api_key_envs.get(name)
+
+
+def get_provider_factory(name: str) -> Callable[..., BaseAIProvider]:
+    """获取提供商工厂，字符串形式的工厂会在这里导入并缓存"""
+    factory = _factories.get(name)
+    if factory is None:
+        raise ValueError(f"不支持的提供商: {name}，可用的提供商: {', '.join(list_providers())}")
+    if isinstance(factory, str):
+        module_name, _, attr = factory.partition(":")
+        factory = getattr(importlib.import_module(module_name), attr)
+        _factories[name] = factory
+    return factory
+
+
+def create_provider(name: str, api_key: Optional[str] = None, model: Optional[str] = None,
+                    **kwargs) -> BaseAIProvider:
+    """按名称创建提供商
+
+    api_key为空时读取注册时指定的环境变量；model为空时使用提供商的默认模型。
+    """
+    factory = get_provider_factory(name)
+    if api_key is None and _api_key_envs.get(name):
+        api_key = os.getenv(_api_key_envs[name])
+    if api_key is not None:
+        kwargs["api_key"] = api_key
+    if model is not None:
+        kwargs["model"] = model
+    return factory(**kwargs)
+
+
+register_provider("openai", "ai_chat_lib.providers.openai_base_provider:OpenAIProvider", "OPENAI_API_KEY")
+register_provider("openai_compatible", "ai_chat_lib.providers.openai_base_provider:OpenAIBaseProvider",
+                  "OPENAI_API_KEY")
+register_provider("deepseek", "ai_chat_lib.providers.openai_like_provider:DeepSeekProvider",
+                  "DEEP_SEEK_API_KEY")
+register_provider("aliyun", "ai_chat_lib.providers.openai_like_provider:AliYunProvider", "DASHSCOPE_API_KEY")
+register_provider("google", "ai_chat_lib.providers.google_provider:GoogleAIProvider", "GEMINI_API_KEY")
+register_provider("fake", "ai_chat_lib.providers.fake_provider:FakeAIProvider")
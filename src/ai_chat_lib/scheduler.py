@@ -0,0 +1,219 @@
+"""
+上游调用的加权公平调度：优先级、按租户的加权公平排队和每个提供商的并发上限
+"""
+import asyncio
+import heapq
+import itertools
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from enum import Enum
+from typing import Any, Deque, Dict, List, Optional, Union
+
+from .providers.base import BaseAIProvider
+
+
+class Priority(Enum):
+    """优先级，值越小越先调度"""
+    INTERACTIVE = 0
+    BATCH = 1
+
+
+@dataclass
+class QueueStats:
+    """某个提供商、某个优先级的排队统计"""
+    admitted: int = 0
+    cancelled: int = 0
+    waiting: int = 0
+    total_wait: float = 0.0
+    max_wait: float = 0.0
+    # 最近的排队时间（秒），用于计算分位数
+    recent_waits: Deque[float] = field(default_factory=lambda: deque(maxlen=1024))
+
+    def record(self, wait: float):
+        self.admitted += 1
+        self.total_wait += wait
+        self.max_wait = max(self.max_wait, wait)
+        self.recent_waits.append(wait)
+
+    def to_dict(self) -> Dict[str, Any]:
+        waits = sorted(self.recent_waits)
+
+        def pct(p: float) -> float:
+            if not waits:
+                return 0.0
+            return waits[min(len(waits) - 1, int(p / 100 * len(waits)))]
+
+        return {
+            "admitted": self.admitted,
+            "cancelled": self.cancelled,
+            "waiting": self.waiting,
+            "avg_wait_ms": self.total_wait / self.admitted * 1000 if self.admitted else 0.0,
+            "max_wait_ms": self.max_wait * 1000,
+            "p50_wait_ms": pct(50) * 1000,
+            "p99_wait_ms": pct(99) * 1000,
+        }
+
+
+@dataclass
+class SchedulerTicket:
+    """一次调度请求；获得许可后调用FairShareScheduler.release归还"""
+    provider_key: str
+    tenant: str
+    priority: Priority
+    finish: float
+    seq: int
+    enqueued_at: float
+    future: "asyncio.Future"
+    admitted_at: Optional[float] = None
+
+    @property
+    def wait(self) -> Optional[float]:
+        if self.admitted_at is None:
+            return None
+        return self.admitted_at - self.enqueued_at
+
+
+class _ProviderQueue:
+    """一个提供商的并发许可和各优先级的等待队列"""
+
+    def __init__(self, limit: int, interactive_reserve: int):
+        self.limit = max(1, limit)
+        # 批量请求最多占用的许可数，保留一部分给交互请求
+        self.batch_limit = max(1, self.limit - interactive_reserve)
+        self.active = 0
+        self.active_batch = 0
+        self.heaps: Dict[Priority, List] = {p: [] for p in Priority}
+        # 加权公平排队的虚拟时间和每个租户最后一个请求的完成标记
+        self.virtual_time: Dict[Priority, float] = {p: 0.0 for p in Priority}
+        self.last_finish: Dict[Priority, Dict[str, float]] = {p: {} for p in Priority}
+        self.stats: Dict[Priority, QueueStats] = {p: QueueStats() for p in Priority}
+
+    def can_admit(self, priority: Priority) -> bool:
+        if self.active >= self.limit:
+            return False
+        return priority != Priority.BATCH or self.active_batch < self.batch_limit
+
+    def pop_next(self) -> Optional[SchedulerTicket]:
+        """按优先级取出下一个可以放行的请求，跳过已取消的"""
+        for priority in Priority:
+            heap = self.heaps[priority]
+            while heap and heap[0][2].future.done():
+                heapq.heappop(heap)
+            if heap and self.can_admit(priority):
+                ticket = heapq.heappop(heap)[2]
+                self.virtual_time[priority] = ticket.finish
+                return ticket
+            if heap:
+                # 高优先级请求在等待时不放行低优先级请求
+                return None
+        return None
+
+
+class FairShareScheduler:
+    """提供商调用前的调度器
+
+    - 每个提供商（按get_provider_name()区分）最多同时进行limits/default_limit个请求；
+    - 交互请求严格优先于批量请求，批量请求最多占用 上限 - interactive_reserve 个许可，
+      避免长时间的批量流式请求占满所有许可；
+    - 同一优先级内按租户权重做加权公平排队（虚拟完成时间），权重为2的租户获得两倍的份额。
+    """
+
+    def __init__(self, default_limit: int = 8, limits: Optional[Dict[str, int]] = None,
+                 weights: Optional[Dict[str, float]] = None, default_weight: float = 1.0,
+                 interactive_reserve: int = 1):
+        self.default_limit = default_limit
+        self.limits: Dict[str, int] = dict(limits or {})
+        self.weights: Dict[str, float] = dict(weights or {})
+        self.default_weight = default_weight
+        self.interactive_reserve = interactive_reserve
+        self._queues: Dict[str, _ProviderQueue] = {}
+        self._seq = itertools.count()
+
+    @staticmethod
+    def provider_key(provider: Union[str, BaseAIProvider]) -> str:
+        return provider if isinstance(provider, str) else provider.get_provider_name()
+
+    def set_weight(self, tenant: str, weight: float):
+        """设置租户的权重"""
+        if weight <= 0:
+            raise ValueError("权重必须大于0")
+        self.weights[tenant] = weight
+
+    def _queue(self, key: str) -> _ProviderQueue:
+        queue = self._queues.get(key)
+        if queue is None:
+            queue = _ProviderQueue(self.limits.get(key, self.default_limit), self.interactive_reserve)
+            self._queues[key] = queue
+        return queue
+
+    async def acquire(self, provider: Union[str, BaseAIProvider], tenant: str = "default",
+                      priority: Priority = Priority.INTERACTIVE, cost: float = 1.0) -> SchedulerTicket:
+        """排队等待许可；等待期间被取消时自动移出队列"""
+        key = self.provider_key(provider)
+        queue = self._queue(key)
+        weight = self.weights.get(tenant, self.default_weight)
+        last_finish = queue.last_finish[priority]
+        start = max(queue.virtual_time[priority], last_finish.get(tenant, 0.0))
+        finish = start + cost / weight
+        last_finish[tenant] = finish
+        if len(last_finish) > 1024:
+            # 完成标记不晚于虚拟时间的租户不再影响排队顺序
+            virtual_time = queue.virtual_time[priority]
+            for name in [t for t, f in last_finish.items() if f <= virtual_time]:
+                del last_finish[name]
+
+        ticket = SchedulerTicket(
+            provider_key=key, tenant=tenant, priority=priority, finish=finish,
+            seq=next(self._seq), enqueued_at=time.monotonic(),
+            future=asyncio.get_running_loop().create_future(),
+        )
+        heapq.heappush(queue.heaps[priority], (finish, ticket.seq, ticket))
+        queue.stats[priority].waiting += 1
+        self._dispatch(queue)
+        try:
+            await ticket.future
+        except asyncio.CancelledError:
+            if ticket.admitted_at is not None:
+                # 已经获得许可但调用方被取消，归还许可
+                self.release(ticket)
+            else:
+                ticket.future.cancel()
+                queue.stats[priority].waiting -= 1
+                queue.stats[priority].cancelled += 1
+            raise
+        return ticket
+
+    def release(self, ticket: SchedulerTicket):
+        """归还许可并放行等待中的请求"""
+        queue = self._queues[ticket.provider_key]
+        queue.active -= 1
+        if ticket.priority == Priority.BATCH:
+            queue.active_batch -= 1
+        self._dispatch(queue)
+
+    def _dispatch(self, queue: _ProviderQueue):
+        while True:
+            ticket = queue.pop_next()
+            if ticket is None:
+                return
+            ticket.admitted_at = time.monotonic()
+            queue.active += 1
+            if ticket.priority == Priority.BATCH:
+                queue.active_batch += 1
+            stats = queue.stats[ticket.priority]
+            stats.waiting -= 1
+            stats.record(ticket.wait)
+            ticket.future.set_result(None)
+
+    def get_stats(self) -> Dict[str, Dict[str, Any]]:
+        """每个提供商的并发情况和各优先级的排队时间统计"""
+        return {
+            key: {
+                "limit": queue.limit,
+                "active": queue.active,
+                "active_batch": queue.active_batch,
+                **{priority.name.lower(): queue.stats[priority].to_dict() for priority in Priority},
+            }
+            for key, queue in self._queues.items()
+        }
@@ -0,0 +1,196 @@
+"""
+会话导出与导入：以JSONL格式流式读写，内存占用与会话数量无关
+
+文件第一行是格式头，之后每个会话是一行会话记录，紧跟该会话的消息记录（每条消息一行）：
+    {"type": "header", "format": "ai_chat_lib.sessions", "version": 1}
+    {"type": "session", "session_id": "...", "character_key": "...", ...}
+    {"type": "message", "session_id": "...", "role": "user", "content": "...", ...}
+"""
+import gzip
+import io
+import json
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, TextIO
+from .chat_interface import ChatSession
+from .models.message import Message
+
+EXPORT_FORMAT = "ai_chat_lib.sessions"
+EXPORT_VERSION = 1
+COMPRESSIONS = ("none", "gzip", "zstd")
+# 默认压缩级别：gzip默认的9级比6级慢得多，压缩率只略高
+DEFAULT_LEVELS = {"gzip": 6, "zstd": 3}
+
+# 会话筛选：返回True的会话才会导出
+SessionFilter = Callable[[ChatSession], bool]
+
+
+def detect_compression(path: str) -> str:
+    """根据扩展名判断压缩方式"""
+    if path.endswith(".gz"):
+        return "gzip"
+    if path.endswith((".zst", ".zstd")):
+        return "zstd"
+    return "none"
+
+
+def open_text(path: str, mode: str = "r", compression: Optional[str] = None,
+              level: Optional[int] = None) -> TextIO:
+    """以文本方式打开（可能压缩的）文件，mode为 "r" 或 "w"，level为写入时的压缩级别
+
+    zstd优先使用标准库的compression.zstd（Python 3.14+），否则需要安装zstandard。
+    """
+    compression = compression or detect_compression(path)
+    if level is None:
+        level = DEFAULT_LEVELS.get(compression)
+    if compression == "none":
+        return open(path, mode, encoding="utf-8")
+    if compression == "gzip":
+        if mode == "w":
+            return gzip.open(path, "wt", compresslevel=level, encoding="utf-8")
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    if compression == "zstd":
+        try:
+            from compression import zstd
+            if mode == "w":
+                return zstd.open(path, "wt", level=level, encoding="utf-8")
+            return zstd.open(path, mode + "t", encoding="utf-8")
+        except ImportError:
+            pass
+        try:
+            import zstandard
+        except ImportError:
+            raise ImportError("zstd压缩需要 Python 3.14+ 或安装 zstandard：pip install zstandard")
+        raw = open(path, mode + "b")
+        if mode == "w":
+            stream = zstandard.ZstdCompressor(level=level).stream_writer(raw, closefd=True)
+        else:
+            stream = zstandard.ZstdDecompressor().stream_reader(raw, closefd=True)
+        return io.TextIOWrapper(stream, encoding="utf-8")
+    raise ValueError(f"不支持的压缩方式: {compression}，可选: {', '.join(COMPRESSIONS)}")
+
+
+def _isoformat(value: Optional[datetime]) -> Optional[str]:
+    return value.isoformat() if value else None
+
+
+def _parse_datetime(value: Optional[str]) -> Optional[datetime]:
+    return datetime.fromisoformat(value) if value else None
+
+
+def session_record(session: ChatSession) -> Dict[str, Any]:
+    """会话本身的记录（不含消息）"""
+    return {
+        "type": "session",
+        "session_id": session.session_id,
+        "character_key": session.character_key,
+        "character": session.character.name if session.character else None,
+        "provider": session.provider.get_provider_name() if session.provider else None,
+        "auto_reload_character": session.auto_reload_character,
+        "tenant": session.tenant,
+        "created_at": _isoformat(session.created_at),
+        "updated_at": _isoformat(session.updated_at),
+    }
+
+
+def iter_session_records(sessions: Iterable[ChatSession],
+                         filter: Optional[SessionFilter] = None) -> Iterator[Dict[str, Any]]:
+    """按顺序生成格式头、会话记录和消息记录，不复制聊天历史"""
+    yield {"type": "header", "format": EXPORT_FORMAT, "version": EXPORT_VERSION}
+    for session in sessions:
+        if filter is not None and not filter(session):
+            continue
+        yield session_record(session)
+        # 被压缩的历史只临时解压，导出后仍保持压缩
+        for message in session.iter_history():
+            # to_dict把为None的metadata写成{}，这里保留None，导入后与原消息相同
+            yield {"type": "message", "session_id": session.session_id, **message.to_dict(),
+                   "metadata": message.metadata}
+
+
+def write_records(records: Iterable[Dict[str, Any]], fp: TextIO) -> Dict[str, int]:
+    """把记录逐行写入文件，返回各类型记录的数量"""
+    counts: Dict[str, int] = {}
+    for record in records:
+        fp.write(json.dumps(record, ensure_ascii=False, separators=(",", ":")))
+        fp.write("\n")
+        counts[record["type"]] = counts.get(record["type"], 0) + 1
+    return counts
+
+
+def export_sessions(sessions: Iterable[ChatSession], path: str,
+                    filter: Optional[SessionFilter] = None,
+                    compression: Optional[str] = None, level: Optional[int] = None) -> int:
+    """把会话流式导出为JSONL（.gz/.zst自动压缩，level为压缩级别），返回导出的会话数"""
+    with open_text(path, "w", compression, level) as fp:
+        counts = write_records(iter_session_records(sessions, filter), fp)
+    return counts.get("session", 0)
+
+
+def iter_records(path: str, compression: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+    """逐行读取导出文件，校验格式头"""
+    with open_text(path, "r", compression) as fp:
+        header_checked = False
+        for line_no, line in enumerate(fp, 1):
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            if not header_checked:
+                if record.get("type") != "header" or record.get("format") != EXPORT_FORMAT:
+                    raise ValueError(f"{path} 不是会话导出文件")
+                if record.get("version", 0) > EXPORT_VERSION:
+                    raise ValueError(f"{path} 的格式版本 {record['version']} 高于当前支持的 {EXPORT_VERSION}")
+                header_checked = True
+                continue
+            yield record
+
+
+def read_sessions(path: str, compression: Optional[str] = None) -> Iterator[ChatSession]:
+    """逐个还原会话（不含角色和提供商对象），同一时间只在内存中保留一个会话"""
+    session: Optional[ChatSession] = None
+    for record in iter_records(path, compression):
+        record_type = record.get("type")
+        if record_type == "session":
+            if session is not None:
+                yield session
+            session = ChatSession(
+                session_id=record["session_id"],
+                character_key=record.get("character_key"),
+                auto_reload_character=record.get("auto_reload_character", False),
+                tenant=record.get("tenant"),
+                created_at=_parse_datetime(record.get("created_at")),
+                updated_at=_parse_datetime(record.get("updated_at")),
+            )
+        elif record_type == "message":
+            if session is None or record.get("session_id") != session.session_id:
+                raise ValueError(f"消息记录不属于当前会话: {record.get('session_id')}")
+            session.chat_history.append(Message.from_dict(record))
+    if session is not None:
+        yield session
+
+
+def import_sessions(target, path: str, batch_size: int = 500, overwrite: bool = False,
+                    compression: Optional[str] = None) -> int:
+    """把导出文件批量导入到target（MultiSessionChatInterface或实现了add_sessions的会话存储）
+
+    target有character_manager时按character_key恢复会话的角色（每个角色只加载一次）。
+    返回实际导入的会话数。
+    """
+    character_manager = getattr(target, "character_manager", None)
+    characters: Dict[str, Any] = {}
+    imported = 0
+    batch: List[ChatSession] = []
+    for session in read_sessions(path, compression):
+        key = session.character_key
+        if key and character_manager is not None:
+            if key not in characters:
+                characters[key] = character_manager.load_character(key)
+            session.character = characters[key]
+            session.character_version = character_manager.get_version(key)
+        batch.append(session)
+        if len(batch) >= batch_size:
+            imported += target.add_sessions(batch, overwrite=overwrite)
+            batch = []
+    if batch:
+        imported += target.add_sessions(batch, overwrite=overwrite)
+    return imported
@@ -0,0 +1,99 @@
+"""
+异步存储接口及把同步存储放到线程池执行的适配器
+"""
+import asyncio
+from abc import ABC, abstractmethod
+from concurrent.futures import Executor, ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, List, Optional
+from .base import BaseStorage
+from .catalog import CatalogFilters, CatalogPage
+from ..models.character import Character
+
+
+class AsyncBaseStorage(ABC):
+    """异步存储抽象基类"""
+
+    @abstractmethod
+    async def load_character(self, name: str) -> Optional[Character]:
+        """加载角色"""
+        pass
+
+    @abstractmethod
+    async def save_character(self, character: Character) -> bool:
+        """保存角色"""
+        pass
+
+    @abstractmethod
+    async def list_characters(self) -> List[str]:
+        """列出所有角色名称"""
+        pass
+
+    @abstractmethod
+    async def delete_character(self, name: str) -> bool:
+        """删除角色"""
+        pass
+
+    async def query_characters(self, filters: Optional[CatalogFilters] = None, offset: int = 0,
+                               limit: Optional[int] = None, order_by: str = "name") -> CatalogPage:
+        """按目录信息筛选和分页查询角色"""
+        raise NotImplementedError(f"{type(self).__name__} 不支持目录查询")
+
+    async def close(self):
+        """释放资源"""
+        pass
+
+
+class AsyncStorageAdapter(AsyncBaseStorage):
+    """把同步的BaseStorage（FileStorage、SQLiteStorage等）放到有界线程池中执行
+
+    存储自带线程池时（如SQLiteStorage.executor）直接复用，线程数与连接池大小一致。
+    """
+
+    def __init__(self, storage: BaseStorage, max_workers: int = 4,
+                 executor: Optional[Executor] = None):
+        self.storage = storage
+        self._owns_executor = False
+        if executor is None:
+            executor = getattr(storage, "executor", None)
+        if executor is None:
+            executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="async-storage")
+            self._owns_executor = True
+        self.executor = executor
+
+    async def _run(self, func: Callable, *args, **kwargs) -> Any:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, partial(func, *args, **kwargs))
+
+    async def load_character(self, name: str) -> Optional[Character]:
+        """在线程池中加载角色"""
+        return await self._run(self.storage.load_character, name)
+
+    async def save_character(self, character: Character) -> bool:
+        """在线程池中保存角色"""
+        return await self._run(self.storage.save_character, character)
+
+    async def list_characters(self) -> List[str]:
+        """在线程池中列出角色"""
+        return await self._run(self.storage.list_characters)
+
+    async def delete_character(self, name: str) -> bool:
+        """在线程池中删除角色"""
+        return await self._run(self.storage.delete_character, name)
+
+    async def query_characters(self, filters: Optional[CatalogFilters] = None, offset: int = 0,
+                               limit: Optional[int] = None, order_by: str = "name") -> CatalogPage:
+        """在线程池中查询目录"""
+        return await self._run(self.storage.query_characters, filters, offset, limit, order_by)
+
+    async def close(self):
+        """关闭自己创建的线程池"""
+        if self._owns_executor:
+            self.executor.shutdown(wait=False)
+
+
+def to_async_storage(storage, max_workers: int = 4) -> AsyncBaseStorage:
+    """把任意存储转换为异步存储，已经是异步存储时原样返回"""
+    if isinstance(storage, AsyncBaseStorage):
+        return storage
+    return AsyncStorageAdapter(storage, max_workers=max_workers)
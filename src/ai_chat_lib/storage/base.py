@@ -2,8 +2,9 @@
 存储基类
 """
 from abc import ABC, abstractmethod
-from typing import List, Optional
+from typing import Dict, List, Optional
 from ..models.character import Character
+from .catalog import CatalogEntry, CatalogFilters, CatalogPage, query_entries
 
 class BaseStorage(ABC):
     """存储抽象基类"""
@@ -27,3 +28,27 @@ class BaseStorage(ABC):
     def delete_character(self, name: str) -> bool:
         """删除角色"""
         pass
+
+    def query_characters(self, filters: Optional[CatalogFilters] = None, offset: int = 0,
+                         limit: Optional[int] = None, order_by: str = "name") -> CatalogPage:
+        """按目录信息筛选和分页查询角色
+
+        默认实现会逐个加载角色，有索引的存储应重写此方法。
+        """
+        entries = []
+        for name in self.list_characters():
+            character = self.load_character(name)
+            if character:
+                entries.append(CatalogEntry.from_character(name, character))
+        return query_entries(entries, filters, offset, limit, order_by)
+
+    def get_signatures(self) -> Optional[Dict[str, str]]:
+        """所有角色的来源签名（角色名 -> 签名），内容变化时签名随之变化
+
+        用于判断角色快照是否过期；返回None表示不支持，此时不会使用快照。
+        """
+        return None
+
+    def get_signature(self, name: str) -> Optional[str]:
+        """单个角色的来源签名，与get_signatures一致；返回None表示不支持或角色不存在"""
+        return None
@@ -0,0 +1,235 @@
+"""
+角色目录索引：只保存列表和筛选需要的信息，查询时不需要加载完整角色
+"""
+import hashlib
+import json
+import os
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass, field, asdict
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+from ..models.character import Character
+from ..utils.atomic_file import write_atomic
+from ..utils.token_counter import estimate_tokens
+
+CATALOG_VERSION = 1
+
+# 筛选条件：{"metadata.category": "助手", "language": "zh-CN", "prompt_tokens": lambda n: n < 500}
+CatalogFilters = Dict[str, Any]
+
+
+@dataclass
+class CatalogEntry:
+    """角色目录中的一条记录"""
+    name: str
+    display_name: str
+    description: str
+    metadata: Dict[str, Any] = field(default_factory=dict)
+    content_hash: str = ""
+    prompt_tokens: int = 0
+    example_tokens: int = 0
+    updated_at: Optional[str] = None
+    # 数据来源的签名（如文件的mtime和大小），用于判断索引是否过期
+    source: Optional[str] = None
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.example_tokens
+
+    def to_dict(self) -> Dict[str, Any]:
+        """转换为字典"""
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'CatalogEntry':
+        """从字典创建"""
+        return cls(**data)
+
+    @classmethod
+    def from_character(cls, name: str, character: Character, source: Optional[str] = None) -> 'CatalogEntry':
+        """根据完整角色生成目录记录"""
+        return cls(
+            name=name,
+            display_name=character.name,
+            description=character.description,
+            metadata=dict(character.metadata or {}),
+            content_hash=character_content_hash(character),
+            prompt_tokens=estimate_tokens(character.system_prompt),
+            example_tokens=sum(
+                estimate_tokens(d.user_message) + estimate_tokens(d.character_response)
+                for d in character.example_dialogs
+            ),
+            updated_at=character.updated_at.isoformat() if character.updated_at else None,
+            source=source
+        )
+
+
+@dataclass
+class CatalogPage:
+    """分页查询结果"""
+    entries: List[CatalogEntry]
+    total: int
+    offset: int = 0
+    limit: Optional[int] = None
+
+    @property
+    def has_more(self) -> bool:
+        return self.offset + len(self.entries) < self.total
+
+
+def character_content_hash(character: Character) -> str:
+    """角色内容的哈希（不含时间戳），内容不变时哈希不变"""
+    content = {
+        "name": character.name,
+        "description": character.description,
+        "system_prompt": character.system_prompt,
+        "example_dialogs": [[d.user_message, d.character_response] for d in character.example_dialogs],
+        "metadata": character.metadata or {},
+    }
+    encoded = json.dumps(content, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+def _entry_value(entry: CatalogEntry, key: str) -> Any:
+    """按键取值：支持 metadata.xxx；不是记录字段的键会到metadata中查找"""
+    if key.startswith("metadata."):
+        return entry.metadata.get(key[len("metadata."):])
+    if key in CatalogEntry.__dataclass_fields__ or key == "total_tokens":
+        return getattr(entry, key)
+    return entry.metadata.get(key)
+
+
+def _matches(value: Any, condition: Any) -> bool:
+    if callable(condition):
+        return bool(condition(value))
+    if isinstance(condition, (list, tuple, set, frozenset)):
+        return value in condition
+    return value == condition
+
+
+def match_filters(entry: CatalogEntry, filters: Optional[CatalogFilters]) -> bool:
+    """判断记录是否满足所有筛选条件"""
+    if not filters:
+        return True
+    return all(_matches(_entry_value(entry, key), condition) for key, condition in filters.items())
+
+
+def _sort_key(value: Any) -> Tuple[int, Any]:
+    """排序键：数字、字符串、其他值（按str）依次排列，None在最后；metadata中同一字段类型不同时也能排序"""
+    if value is None:
+        return (3, "")
+    if isinstance(value, (int, float)):
+        return (0, value)
+    if isinstance(value, str):
+        return (1, value)
+    return (2, str(value))
+
+
+def query_entries(entries: Iterable[CatalogEntry], filters: Optional[CatalogFilters] = None,
+                  offset: int = 0, limit: Optional[int] = None,
+                  order_by: str = "name") -> CatalogPage:
+    """对目录记录进行筛选、排序和分页"""
+    matched = [entry for entry in entries if match_filters(entry, filters)]
+    reverse = order_by.startswith("-")
+    key = order_by.lstrip("-")
+    matched.sort(key=lambda e: _sort_key(_entry_value(e, key)), reverse=reverse)
+    end = None if limit is None else offset + limit
+    return CatalogPage(entries=matched[offset:end], total=len(matched), offset=offset, limit=limit)
+
+
+class CharacterCatalog:
+    """持久化为单个JSON文件的角色目录
+
+    保存和删除角色时更新；查询时只读取这一个文件，文件未变化时使用内存中的副本。
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._entries: Dict[str, CatalogEntry] = {}
+        self._signature: Optional[Tuple[int, int]] = None
+        self._lock = threading.RLock()
+        self._batch_depth = 0
+        self._dirty = False
+
+    def exists(self) -> bool:
+        return os.path.exists(self.path)
+
+    def _load(self) -> Dict[str, CatalogEntry]:
+        """读取索引文件（文件未变化时直接返回内存副本）"""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return self._entries
+        signature = (stat.st_mtime_ns, stat.st_size)
+        if signature != self._signature:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") == CATALOG_VERSION:
+                self._entries = {
+                    item["name"]: CatalogEntry.from_dict(item) for item in data.get("entries", [])
+                }
+            else:
+                self._entries = {}
+            self._signature = signature
+        return self._entries
+
+    @contextmanager
+    def batch(self) -> Iterator['CharacterCatalog']:
+        """批量修改期间只在最后写一次索引文件"""
+        with self._lock:
+            self._batch_depth += 1
+            try:
+                yield self
+            finally:
+                self._batch_depth -= 1
+                if self._batch_depth == 0 and self._dirty:
+                    self._save()
+
+    def _save(self):
+        """原子地写入索引文件"""
+        if self._batch_depth:
+            self._dirty = True
+            return
+        self._dirty = False
+        data = {
+            "version": CATALOG_VERSION,
+            "entries": [entry.to_dict() for entry in self._entries.values()],
+        }
+        write_atomic(self.path, json.dumps(data, ensure_ascii=False))
+        stat = os.stat(self.path)
+        self._signature = (stat.st_mtime_ns, stat.st_size)
+
+    def entries(self) -> Dict[str, CatalogEntry]:
+        """所有记录，键为存储中的角色名"""
+        with self._lock:
+            return dict(self._load())
+
+    def get(self, name: str) -> Optional[CatalogEntry]:
+        with self._lock:
+            return self._load().get(name)
+
+    def upsert(self, entry: CatalogEntry):
+        """新增或更新一条记录并持久化"""
+        with self._lock:
+            self._load()
+            self._entries[entry.name] = entry
+            self._save()
+
+    def remove(self, name: str):
+        """删除一条记录并持久化"""
+        with self._lock:
+            if self._load().pop(name, None) is not None:
+                self._save()
+
+    def replace_all(self, entries: Iterable[CatalogEntry]):
+        """用一批记录替换整个索引"""
+        with self._lock:
+            self._entries = {entry.name: entry for entry in entries}
+            self._save()
+
+    def query(self, filters: Optional[CatalogFilters] = None, offset: int = 0,
+              limit: Optional[int] = None, order_by: str = "name") -> CatalogPage:
+        """筛选和分页查询"""
+        with self._lock:
+            entries = list(self._load().values())
+        return query_entries(entries, filters, offset, limit, order_by)
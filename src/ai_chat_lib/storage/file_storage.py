@@ -1,112 +1,315 @@
 """
 文件存储实现
 """
+import copy
 import os
+import json
 import importlib.util
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Tuple
 from datetime import datetime
 from .base import BaseStorage
+from .catalog import CatalogEntry, CatalogFilters, CatalogPage, CharacterCatalog
 from ..models.character import Character, ExampleDialog
+from ..utils.atomic_file import write_atomic
 
 DEFAULT_CHARACTERS_DIR = "storage/characters"
 
+JSON_SUFFIX = ".json"
+LEGACY_SUFFIX = ".py"
+SAVE_FORMATS = ("json", "py")
+# 以点开头，不会被当作角色文件列出
+CATALOG_FILENAME = ".catalog.json"
+
+
 class FileStorage(BaseStorage):
-    """基于Python文件的存储实现"""
-    
-    def __init__(self, characters_dir: str = DEFAULT_CHARACTERS_DIR):
+    """基于文件的存储实现
+
+    角色优先保存为纯数据的JSON文件，同时兼容旧的Python角色文件。
+    解析结果按(mtime, size)缓存，文件未变化时不会重复解析；返回的是缓存的副本，调用方修改不会影响缓存。
+    保存和删除时同步更新目录索引，列表和筛选查询只需读取索引文件。
+    """
+
+    def __init__(self, characters_dir: str = DEFAULT_CHARACTERS_DIR, save_format: str = "json"):
+        if save_format not in SAVE_FORMATS:
+            raise ValueError(f"不支持的保存格式: {save_format}")
         self.characters_dir = characters_dir
+        self.save_format = save_format
+        # name -> ((path, mtime_ns, size), Character)
+        self._cache: Dict[str, Tuple[Tuple[str, int, int], Character]] = {}
         os.makedirs(characters_dir, exist_ok=True)
-    
+        self.catalog = CharacterCatalog(os.path.join(characters_dir, CATALOG_FILENAME))
+
+    def _path(self, name: str, suffix: str) -> str:
+        return os.path.join(self.characters_dir, f"{name}{suffix}")
+
+    def _stat_character_file(self, name: str) -> Optional[Tuple[str, os.stat_result]]:
+        """查找角色文件，JSON优先于旧的Python文件"""
+        for suffix in (JSON_SUFFIX, LEGACY_SUFFIX):
+            path = self._path(name, suffix)
+            try:
+                return path, os.stat(path)
+            except FileNotFoundError:
+                continue
+        return None
+
     def load_character(self, name: str) -> Optional[Character]:
-        """从Python文件加载角色"""
-        file_path = os.path.join(self.characters_dir, f"{name}.py")
-        if not os.path.exists(file_path):
+        """从文件加载角色，文件未修改时直接返回缓存的解析结果"""
+        found = self._stat_character_file(name)
+        if found is None:
+            self._cache.pop(name, None)
             return None
-        
+
+        path, stat = found
+        signature = (path, stat.st_mtime_ns, stat.st_size)
+        cached = self._cache.get(name)
+        if cached and cached[0] == signature:
+            return copy.deepcopy(cached[1])
+
         try:
-            spec = importlib.util.spec_from_file_location(name, file_path)
-            module = importlib.util.module_from_spec(spec)
-            spec.loader.exec_module(module)
-            
-            # 获取角色数据
-            character_data = getattr(module, 'CHARACTER_DATA', {})
-            
-            # 转换示例对话
-            example_dialogs = []
-            for dialog in character_data.get('example_dialogs', []):
-                example_dialogs.append(ExampleDialog(
-                    user_message=dialog['user_message'],
-                    character_response=dialog['character_response']
-                ))
-            
-            return Character(
-                name=character_data.get('name', name),
-                description=character_data.get('description', ''),
-                system_prompt=character_data.get('system_prompt', ''),
-                example_dialogs=example_dialogs,
-                metadata=character_data.get('metadata', {}),
-                created_at=datetime.now(),
-                updated_at=datetime.now()
-            )
+            if path.endswith(JSON_SUFFIX):
+                character = self._load_json(path, name, stat)
+            else:
+                character = self._load_legacy(path, name)
         except Exception as e:
             print(f"加载角色 {name} 失败: {e}")
             return None
-    
+
+        self._cache[name] = (signature, character)
+        return copy.deepcopy(character)
+
+    def _load_json(self, path: str, name: str, stat: os.stat_result) -> Character:
+        """解析JSON角色文件"""
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+
+        # 文件中没有时间戳时使用文件修改时间
+        modified = datetime.fromtimestamp(stat.st_mtime)
+        created_at = data.get('created_at')
+        updated_at = data.get('updated_at')
+        return Character(
+            name=data.get('name', name),
+            description=data.get('description', ''),
+            system_prompt=data.get('system_prompt', ''),
+            example_dialogs=[
+                ExampleDialog(
+                    user_message=dialog['user_message'],
+                    character_response=dialog['character_response']
+                )
+                for dialog in data.get('example_dialogs', [])
+            ],
+            metadata=data.get('metadata') or {},
+            created_at=datetime.fromisoformat(created_at) if created_at else modified,
+            updated_at=datetime.fromisoformat(updated_at) if updated_at else modified
+        )
+
+    def _load_legacy(self, path: str, name: str) -> Character:
+        """执行旧的Python角色文件（兼容用，建议迁移为JSON）"""
+        spec = importlib.util.spec_from_file_location(name, path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+
+        # 获取角色数据
+        character_data = getattr(module, 'CHARACTER_DATA', {})
+
+        # 转换示例对话
+        example_dialogs = []
+        for dialog in character_data.get('example_dialogs', []):
+            example_dialogs.append(ExampleDialog(
+                user_message=dialog['user_message'],
+                character_response=dialog['character_response']
+            ))
+
+        return Character(
+            name=character_data.get('name', name),
+            description=character_data.get('description', ''),
+            system_prompt=character_data.get('system_prompt', ''),
+            example_dialogs=example_dialogs,
+            metadata=character_data.get('metadata', {}),
+            created_at=datetime.now(),
+            updated_at=datetime.now()
+        )
+
     def save_character(self, character: Character) -> bool:
-        """保存角色到Python文件"""
-        file_path = os.path.join(self.characters_dir, f"{character.name}.py")
-        
+        """保存角色到文件"""
         try:
-            # 生成Python文件内容
-            content = self._generate_character_file(character)
-            
-            with open(file_path, 'w', encoding='utf-8') as f:
-                f.write(content)
-            
+            self._write_character_file(character.name, character, self.save_format)
             return True
         except Exception as e:
             print(f"保存角色 {character.name} 失败: {e}")
             return False
-    
+
+    def bulk_save(self, characters: List[Character]) -> int:
+        """批量保存角色，目录索引只写一次，返回保存成功的数量"""
+        with self.catalog.batch():
+            return sum(self.save_character(character) for character in characters)
+
+    def _write_character_file(self, name: str, character: Character, save_format: str) -> str:
+        """原子地写入角色文件并更新解析缓存
+
+        保存为Python文件时会删除同名的JSON文件，否则加载时JSON优先，刚保存的内容会被忽略。
+        """
+        shadow_path = None
+        if save_format == "json":
+            path = self._path(name, JSON_SUFFIX)
+            content = json.dumps(character.to_dict(), ensure_ascii=False, indent=4) + "\n"
+        else:
+            path = self._path(name, LEGACY_SUFFIX)
+            shadow_path = self._path(name, JSON_SUFFIX)
+            content = self._generate_character_file(character)
+
+        # 先写临时文件再替换，读取方不会看到写了一半的文件
+        write_atomic(path, content)
+        if shadow_path and os.path.exists(shadow_path):
+            os.remove(shadow_path)
+
+        stat = os.stat(path)
+        self._cache[name] = ((path, stat.st_mtime_ns, stat.st_size), copy.deepcopy(character))
+        self.catalog.upsert(CatalogEntry.from_character(name, character, self._source(path, stat)))
+        return path
+
+    @staticmethod
+    def _source(path: str, stat: os.stat_result) -> str:
+        """目录索引中记录的文件签名"""
+        return f"{os.path.basename(path)}:{stat.st_mtime_ns}:{stat.st_size}"
+
     def list_characters(self) -> List[str]:
         """列出所有角色"""
-        characters = []
-        for file in os.listdir(self.characters_dir):
-            if file.endswith('.py') and not file.startswith('__'):
-                characters.append(file[:-3])  # 去掉.py后缀
-        return characters
-    
+        characters = {}
+        with os.scandir(self.characters_dir) as entries:
+            for entry in entries:
+                stem, suffix = os.path.splitext(entry.name)
+                if suffix in (JSON_SUFFIX, LEGACY_SUFFIX) and not entry.name.startswith(('__', '.')):
+                    characters[stem] = None
+        return list(characters)
+
+    def get_signatures(self) -> Dict[str, str]:
+        """一次目录扫描得到每个角色文件的签名（JSON优先），不读取文件内容"""
+        found: Dict[str, Dict[str, os.DirEntry]] = {}
+        with os.scandir(self.characters_dir) as entries:
+            for entry in entries:
+                stem, suffix = os.path.splitext(entry.name)
+                if suffix in (JSON_SUFFIX, LEGACY_SUFFIX) and not entry.name.startswith(('__', '.')):
+                    found.setdefault(stem, {})[suffix] = entry
+
+        signatures = {}
+        for name, by_suffix in found.items():
+            entry = by_suffix.get(JSON_SUFFIX) or by_suffix[LEGACY_SUFFIX]
+            try:
+                signatures[name] = self._source(entry.path, entry.stat())
+            except FileNotFoundError:
+                continue
+        return signatures
+
+    def get_signature(self, name: str) -> Optional[str]:
+        """角色当前生效文件的签名（只stat，不读取内容）"""
+        found = self._stat_character_file(name)
+        return self._source(*found) if found else None
+
     def delete_character(self, name: str) -> bool:
-        """删除角色文件"""
-        file_path = os.path.join(self.characters_dir, f"{name}.py")
+        """删除角色文件（JSON和旧的Python文件都会删除）"""
+        self._cache.pop(name, None)
+        deleted = False
         try:
-            if os.path.exists(file_path):
-                os.remove(file_path)
-                return True
-            return False
+            for suffix in (JSON_SUFFIX, LEGACY_SUFFIX):
+                file_path = self._path(name, suffix)
+                if os.path.exists(file_path):
+                    os.remove(file_path)
+                    deleted = True
+            self.catalog.remove(name)
+            return deleted
         except Exception as e:
             print(f"删除角色 {name} 失败: {e}")
             return False
-    
+
+    def query_characters(self, filters: Optional[CatalogFilters] = None, offset: int = 0,
+                         limit: Optional[int] = None, order_by: str = "name") -> CatalogPage:
+        """从目录索引筛选和分页查询，不加载角色文件
+
+        索引文件不存在时会先根据角色文件构建一次。
+        """
+        if not self.catalog.exists():
+            self.rebuild_catalog()
+        return self.catalog.query(filters, offset, limit, order_by)
+
+    def refresh_catalog(self, names: Optional[List[str]] = None) -> int:
+        """按文件签名增量更新目录索引，只重新解析有变化的角色，返回更新的数量
+
+        names为空时检查目录下所有角色文件，并移除已不存在的角色。
+        """
+        entries = self.catalog.entries()
+        check_all = names is None
+        if check_all:
+            names = self.list_characters()
+            for stale in set(entries) - set(names):
+                entries.pop(stale)
+
+        updated = 0
+        for name in names:
+            found = self._stat_character_file(name)
+            if found is None:
+                updated += entries.pop(name, None) is not None
+                continue
+            path, stat = found
+            source = self._source(path, stat)
+            entry = entries.get(name)
+            if entry and entry.source == source:
+                continue
+            character = self.load_character(name)
+            if character:
+                entries[name] = CatalogEntry.from_character(name, character, source)
+                updated += 1
+
+        if updated or check_all:
+            self.catalog.replace_all(entries.values())
+        return updated
+
+    def rebuild_catalog(self) -> int:
+        """根据角色文件重建目录索引，返回角色数量"""
+        self.refresh_catalog()
+        return len(self.catalog.entries())
+
+    def migrate_legacy_characters(self, remove_legacy: bool = False) -> List[str]:
+        """把旧的Python角色文件转换为JSON，返回已迁移的角色名
+
+        文件名保持不变（可能与角色的name字段不同），已有JSON文件的角色会被跳过。
+        """
+        with self.catalog.batch():
+            return self._migrate_legacy_characters(remove_legacy)
+
+    def _migrate_legacy_characters(self, remove_legacy: bool) -> List[str]:
+        migrated = []
+        for name in self.list_characters():
+            legacy_path = self._path(name, LEGACY_SUFFIX)
+            if not os.path.exists(legacy_path) or os.path.exists(self._path(name, JSON_SUFFIX)):
+                continue
+            try:
+                character = self._load_legacy(legacy_path, name)
+                self._write_character_file(name, character, "json")
+                if remove_legacy:
+                    os.remove(legacy_path)
+                migrated.append(name)
+            except Exception as e:
+                print(f"迁移角色 {name} 失败: {e}")
+        return migrated
+
     def _generate_character_file(self, character: Character) -> str:
-        """生成角色文件内容"""
+        """生成旧格式的Python角色文件内容（字符串使用repr，避免引号破坏文件）"""
         example_dialogs_str = "[\n"
         for dialog in character.example_dialogs:
-            example_dialogs_str += f'    {{\n'
-            example_dialogs_str += f'        "user_message": """{dialog.user_message}""",\n'
-            example_dialogs_str += f'        "character_response": """{dialog.character_response}"""\n'
-            example_dialogs_str += f'    }},\n'
-        example_dialogs_str += "]"
-        
-        return f'''"""
-{character.name} 角色配置文件
-"""
+            example_dialogs_str += f'        {{\n'
+            example_dialogs_str += f'            "user_message": {dialog.user_message!r},\n'
+            example_dialogs_str += f'            "character_response": {dialog.character_response!r}\n'
+            example_dialogs_str += f'        }},\n'
+        example_dialogs_str += "    ]"
+
+        title = character.name.replace("\n", " ")
+        return f'''# {title} 角色配置文件
 
 CHARACTER_DATA = {{
-    "name": "{character.name}",
-    "description": """{character.description}""",
-    "system_prompt": """{character.system_prompt}""",
+    "name": {character.name!r},
+    "description": {character.description!r},
+    "system_prompt": {character.system_prompt!r},
     "example_dialogs": {example_dialogs_str},
-    "metadata": {character.metadata or {}}
+    "metadata": {character.metadata or {}!r}
 }}
 '''
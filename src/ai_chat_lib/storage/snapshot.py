@@ -0,0 +1,67 @@
+"""
+角色快照：把解析好的全部角色写成一个二进制文件，冷启动时一次读取
+"""
+import marshal
+import os
+from typing import Dict, Optional, Tuple
+from ..models.character import Character
+from ..utils.atomic_file import write_atomic
+
+SNAPSHOT_MAGIC = b"AICHARS\0"
+# 快照结构变化时递增，旧版本的快照会被忽略并重新生成
+SNAPSHOT_VERSION = 1
+
+# 存储中的角色名 -> 数据来源签名（文件的mtime和大小，或数据库中的内容哈希）
+Signatures = Dict[str, str]
+
+
+class CharacterSnapshot:
+    """版本化的角色快照文件
+
+    使用marshal序列化角色字典，加载时不需要逐个解析JSON或执行角色文件。
+    每个角色都带着生成快照时的来源签名，签名不一致的角色视为过期。
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def load(self) -> Tuple[Dict[str, Character], Signatures]:
+        """读取快照，返回(角色, 签名)；文件不存在、损坏或版本不符时返回空结果"""
+        try:
+            with open(self.path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return {}, {}
+
+        header = SNAPSHOT_MAGIC + bytes([SNAPSHOT_VERSION])
+        if not data.startswith(header):
+            return {}, {}
+        try:
+            payload = marshal.loads(data[len(header):])
+            characters = {
+                name: Character.from_dict(item) for name, item in payload["characters"].items()
+            }
+            return characters, payload["signatures"]
+        except Exception as e:
+            print(f"读取角色快照 {self.path} 失败: {e}")
+            return {}, {}
+
+    def write(self, characters: Dict[str, Character], signatures: Signatures) -> bool:
+        """原子地写入快照，只包含有签名的角色"""
+        payload = {
+            "signatures": {name: signatures[name] for name in characters if name in signatures},
+            "characters": {
+                name: character.to_dict() for name, character in characters.items() if name in signatures
+            },
+        }
+        try:
+            data = SNAPSHOT_MAGIC + bytes([SNAPSHOT_VERSION]) + marshal.dumps(payload)
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            write_atomic(self.path, data)
+            return True
+        except Exception as e:
+            # metadata中有marshal不支持的对象时放弃写快照，不影响正常加载
+            print(f"写入角色快照 {self.path} 失败: {e}")
+            return False
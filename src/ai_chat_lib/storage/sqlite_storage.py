@@ -1,33 +1,410 @@
 """
-SQLite存储实现（接口预留）
+SQLite存储实现
 """
-from typing import List, Optional
+import asyncio
+import json
+import queue
+import sqlite3
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime
+from functools import partial
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
 from .base import BaseStorage
-from ..models.character import Character
+from .catalog import CatalogEntry, CatalogFilters, CatalogPage, query_entries
+from ..models.character import Character, ExampleDialog
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS characters (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    description TEXT NOT NULL DEFAULT '',
+    system_prompt TEXT NOT NULL DEFAULT '',
+    metadata TEXT NOT NULL DEFAULT '{}',
+    created_at TEXT,
+    updated_at TEXT,
+    content_hash TEXT NOT NULL DEFAULT '',
+    prompt_tokens INTEGER NOT NULL DEFAULT 0,
+    example_tokens INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS example_dialogs (
+    character_id INTEGER NOT NULL REFERENCES characters(id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    user_message TEXT NOT NULL,
+    character_response TEXT NOT NULL,
+    PRIMARY KEY (character_id, position)
+) WITHOUT ROWID;
+"""
+
+# 旧版本数据库缺少的目录索引列
+CATALOG_COLUMNS = {
+    "content_hash": "TEXT NOT NULL DEFAULT ''",
+    "prompt_tokens": "INTEGER NOT NULL DEFAULT 0",
+    "example_tokens": "INTEGER NOT NULL DEFAULT 0",
+}
+
+# SQL保持为常量字符串：sqlite3按SQL文本缓存每个连接上已编译的语句
+SQL_UPSERT_CHARACTER = """
+INSERT INTO characters (name, description, system_prompt, metadata, created_at, updated_at,
+                        content_hash, prompt_tokens, example_tokens)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT(name) DO UPDATE SET
+    description = excluded.description,
+    system_prompt = excluded.system_prompt,
+    metadata = excluded.metadata,
+    created_at = COALESCE(characters.created_at, excluded.created_at),
+    updated_at = excluded.updated_at,
+    content_hash = excluded.content_hash,
+    prompt_tokens = excluded.prompt_tokens,
+    example_tokens = excluded.example_tokens
+"""
+SQL_SELECT_ID = "SELECT id FROM characters WHERE name = ?"
+SQL_DELETE_DIALOGS = "DELETE FROM example_dialogs WHERE character_id = ?"
+SQL_INSERT_DIALOG = """
+INSERT INTO example_dialogs (character_id, position, user_message, character_response)
+VALUES (?, ?, ?, ?)
+"""
+SQL_SELECT_CHARACTER = """
+SELECT id, name, description, system_prompt, metadata, created_at, updated_at
+FROM characters WHERE name = ?
+"""
+SQL_SELECT_ALL_CHARACTERS = """
+SELECT id, name, description, system_prompt, metadata, created_at, updated_at
+FROM characters ORDER BY name
+"""
+SQL_SELECT_DIALOGS = """
+SELECT user_message, character_response FROM example_dialogs
+WHERE character_id = ? ORDER BY position
+"""
+SQL_SELECT_ALL_DIALOGS = """
+SELECT character_id, user_message, character_response FROM example_dialogs
+ORDER BY character_id, position
+"""
+SQL_LIST_NAMES = "SELECT name FROM characters ORDER BY name"
+SQL_SELECT_CATALOG = """
+SELECT name, description, metadata, content_hash, prompt_tokens, example_tokens, updated_at
+FROM characters
+"""
+SQL_SELECT_SIGNATURES = "SELECT name, content_hash, updated_at FROM characters"
+SQL_DELETE_CHARACTER = "DELETE FROM characters WHERE name = ?"
+
+# 单条语句中IN子句的参数上限（低于SQLite默认的999）
+MAX_IN_PARAMS = 500
+
+
+class _ConnectionPool:
+    """线程安全的SQLite连接池，每个连接同一时间只被一个线程使用"""
+
+    def __init__(self, factory: Callable[[], sqlite3.Connection], size: int, timeout: float):
+        self._factory = factory
+        self._size = size
+        self._timeout = timeout
+        self._idle: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._created = 0
+        self._all: List[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        """借出一个连接，用完自动归还"""
+        conn = self._acquire()
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            self._idle.put(conn)
+
+    def _acquire(self) -> sqlite3.Connection:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._created < self._size:
+                conn = self._factory()
+                self._created += 1
+                self._all.append(conn)
+                return conn
+        try:
+            return self._idle.get(timeout=self._timeout)
+        except queue.Empty:
+            raise TimeoutError(f"等待数据库连接超时（{self._timeout}秒）")
+
+    def close(self):
+        with self._lock:
+            for conn in self._all:
+                conn.close()
+            self._all.clear()
+            self._created = 0
+            self._idle = queue.LifoQueue()
+
 
 class SQLiteStorage(BaseStorage):
-    """SQLite数据库存储实现（预留接口）"""
-    
-    def __init__(self, db_path: str = "characters.db"):
+    """SQLite数据库存储实现
+
+    使用WAL模式和连接池，可以在多个工作线程中并发读取；
+    *_async方法把操作放到有界线程池中执行，不会阻塞事件循环。
+    """
+
+    def __init__(self, db_path: str = "characters.db", pool_size: int = 4,
+                 timeout: float = 30.0, cached_statements: int = 128):
         self.db_path = db_path
-        # TODO: 初始化数据库连接和表结构
-        
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.cached_statements = cached_statements
+
+        # 内存数据库需要共享缓存，否则每个连接看到的是不同的数据库
+        if db_path == ":memory:":
+            self._uri = f"file:aichat_{uuid.uuid4().hex}?mode=memory&cache=shared"
+        else:
+            self._uri = None
+
+        self._pool = _ConnectionPool(self._connect, pool_size, timeout)
+        self.executor = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix="sqlite-storage")
+        # 内存数据库在最后一个连接关闭时会被销毁，保持一个常驻连接
+        self._keeper = self._connect() if self._uri else None
+        self._init_schema()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._uri:
+            conn = sqlite3.connect(self._uri, uri=True, timeout=self.timeout,
+                                   check_same_thread=False, isolation_level=None,
+                                   cached_statements=self.cached_statements)
+        else:
+            conn = sqlite3.connect(self.db_path, timeout=self.timeout,
+                                   check_same_thread=False, isolation_level=None,
+                                   cached_statements=self.cached_statements)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA foreign_keys=ON")
+        return conn
+
+    def _init_schema(self):
+        with self._pool.connection() as conn:
+            conn.executescript(SCHEMA)
+            existing = {row[1] for row in conn.execute("PRAGMA table_info(characters)")}
+            for column, definition in CATALOG_COLUMNS.items():
+                if column not in existing:
+                    conn.execute(f"ALTER TABLE characters ADD COLUMN {column} {definition}")
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        """在一个写事务中执行"""
+        with self._pool.connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+
+    @staticmethod
+    def _character_row(character: Character) -> tuple:
+        entry = CatalogEntry.from_character(character.name, character)
+        return (
+            character.name,
+            character.description,
+            character.system_prompt,
+            json.dumps(character.metadata or {}, ensure_ascii=False),
+            character.created_at.isoformat() if character.created_at else None,
+            character.updated_at.isoformat() if character.updated_at else None,
+            entry.content_hash,
+            entry.prompt_tokens,
+            entry.example_tokens,
+        )
+
+    @staticmethod
+    def _build_character(row: tuple, dialogs: Iterable[tuple]) -> Character:
+        _, name, description, system_prompt, metadata, created_at, updated_at = row
+        return Character(
+            name=name,
+            description=description,
+            system_prompt=system_prompt,
+            example_dialogs=[ExampleDialog(user, response) for user, response in dialogs],
+            metadata=json.loads(metadata) if metadata else {},
+            created_at=datetime.fromisoformat(created_at) if created_at else None,
+            updated_at=datetime.fromisoformat(updated_at) if updated_at else None
+        )
+
+    def _write_character(self, conn: sqlite3.Connection, character: Character):
+        conn.execute(SQL_UPSERT_CHARACTER, self._character_row(character))
+        character_id = conn.execute(SQL_SELECT_ID, (character.name,)).fetchone()[0]
+        conn.execute(SQL_DELETE_DIALOGS, (character_id,))
+        conn.executemany(SQL_INSERT_DIALOG, [
+            (character_id, position, dialog.user_message, dialog.character_response)
+            for position, dialog in enumerate(character.example_dialogs)
+        ])
+
     def load_character(self, name: str) -> Optional[Character]:
         """从数据库加载角色"""
-        # TODO: 实现数据库查询
-        raise NotImplementedError("SQLite存储尚未实现")
-    
+        try:
+            with self._pool.connection() as conn:
+                row = conn.execute(SQL_SELECT_CHARACTER, (name,)).fetchone()
+                if row is None:
+                    return None
+                dialogs = conn.execute(SQL_SELECT_DIALOGS, (row[0],)).fetchall()
+            return self._build_character(row, dialogs)
+        except Exception as e:
+            print(f"加载角色 {name} 失败: {e}")
+            return None
+
     def save_character(self, character: Character) -> bool:
         """保存角色到数据库"""
-        # TODO: 实现数据库保存
-        raise NotImplementedError("SQLite存储尚未实现")
-    
+        try:
+            with self._transaction() as conn:
+                self._write_character(conn, character)
+            return True
+        except Exception as e:
+            print(f"保存角色 {character.name} 失败: {e}")
+            return False
+
     def list_characters(self) -> List[str]:
-        """列出所有角色"""
-        # TODO: 实现数据库查询
-        raise NotImplementedError("SQLite存储尚未实现")
-    
+        """列出所有角色（只读取名称列）"""
+        with self._pool.connection() as conn:
+            return [row[0] for row in conn.execute(SQL_LIST_NAMES)]
+
     def delete_character(self, name: str) -> bool:
-        """从数据库删除角色"""
-        # TODO: 实现数据库删除
-        raise NotImplementedError("SQLite存储尚未实现")
\ No newline at end of file
+        """从数据库删除角色（示例对话级联删除）"""
+        try:
+            with self._transaction() as conn:
+                return conn.execute(SQL_DELETE_CHARACTER, (name,)).rowcount > 0
+        except Exception as e:
+            print(f"删除角色 {name} 失败: {e}")
+            return False
+
+    def get_signatures(self) -> Dict[str, str]:
+        """每个角色的签名（内容哈希和更新时间），只读取索引列"""
+        with self._pool.connection() as conn:
+            return {
+                name: f"{content_hash}:{updated_at or ''}"
+                for name, content_hash, updated_at in conn.execute(SQL_SELECT_SIGNATURES)
+            }
+
+    def bulk_save(self, characters: Iterable[Character]) -> int:
+        """在一个事务中批量保存角色，返回保存数量"""
+        count = 0
+        with self._transaction() as conn:
+            for character in characters:
+                self._write_character(conn, character)
+                count += 1
+        return count
+
+    def bulk_load(self, names: Optional[Iterable[str]] = None) -> Dict[str, Character]:
+        """批量加载角色，names为空时加载全部"""
+        with self._pool.connection() as conn:
+            if names is None:
+                rows = conn.execute(SQL_SELECT_ALL_CHARACTERS).fetchall()
+                dialog_rows = conn.execute(SQL_SELECT_ALL_DIALOGS).fetchall()
+            else:
+                names = list(names)
+                rows, dialog_rows = [], []
+                for i in range(0, len(names), MAX_IN_PARAMS):
+                    batch = names[i:i + MAX_IN_PARAMS]
+                    placeholders = ",".join("?" * len(batch))
+                    batch_rows = conn.execute(
+                        f"SELECT id, name, description, system_prompt, metadata, created_at, updated_at "
+                        f"FROM characters WHERE name IN ({placeholders})", batch
+                    ).fetchall()
+                    rows.extend(batch_rows)
+                    if batch_rows:
+                        ids = [row[0] for row in batch_rows]
+                        dialog_rows.extend(conn.execute(
+                            f"SELECT character_id, user_message, character_response FROM example_dialogs "
+                            f"WHERE character_id IN ({','.join('?' * len(ids))}) ORDER BY character_id, position",
+                            ids
+                        ).fetchall())
+
+        dialogs: Dict[int, List[tuple]] = {}
+        for character_id, user_message, character_response in dialog_rows:
+            dialogs.setdefault(character_id, []).append((user_message, character_response))
+        return {row[1]: self._build_character(row, dialogs.get(row[0], ())) for row in rows}
+
+    def query_characters(self, filters: Optional[CatalogFilters] = None, offset: int = 0,
+                         limit: Optional[int] = None, order_by: str = "name") -> CatalogPage:
+        """查询目录信息列（不读取提示词和示例对话）
+
+        键为字符串、值为简单类型的等值条件会下推到SQL中执行，其余条件在内存中筛选。
+        """
+        filters = filters or {}
+        where, params, remaining = [], [], {}
+        for key, condition in filters.items():
+            column = self._filter_column(key)
+            if column and isinstance(condition, (str, int, float)) and not isinstance(condition, bool):
+                where.append(f"{column} = ?")
+                params.append(condition)
+            else:
+                remaining[key] = condition
+
+        sql = SQL_SELECT_CATALOG + (f" WHERE {' AND '.join(where)}" if where else "")
+        with self._pool.connection() as conn:
+            rows = conn.execute(sql, params).fetchall()
+
+        entries = [
+            CatalogEntry(
+                name=name,
+                display_name=name,
+                description=description,
+                metadata=json.loads(metadata) if metadata else {},
+                content_hash=content_hash,
+                prompt_tokens=prompt_tokens,
+                example_tokens=example_tokens,
+                updated_at=updated_at
+            )
+            for name, description, metadata, content_hash, prompt_tokens, example_tokens, updated_at in rows
+        ]
+        return query_entries(entries, remaining, offset, limit, order_by)
+
+    @staticmethod
+    def _filter_column(key: str) -> Optional[str]:
+        """把筛选键转换为SQL表达式，无法下推时返回None"""
+        if key in ("name", "description", "content_hash", "prompt_tokens", "example_tokens"):
+            return key
+        if key.startswith("metadata."):
+            key = key[len("metadata."):]
+        elif key in CatalogEntry.__dataclass_fields__ or key == "total_tokens":
+            return None
+        # 只下推简单的键名，避免拼接任意JSON路径
+        if key.isidentifier():
+            return f"json_extract(metadata, '$.{key}')"
+        return None
+
+    async def _run(self, func: Callable, *args) -> Any:
+        """在存储自己的有界线程池中执行，避免阻塞事件循环"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, partial(func, *args))
+
+    async def load_character_async(self, name: str) -> Optional[Character]:
+        """异步加载角色"""
+        return await self._run(self.load_character, name)
+
+    async def save_character_async(self, character: Character) -> bool:
+        """异步保存角色"""
+        return await self._run(self.save_character, character)
+
+    async def list_characters_async(self) -> List[str]:
+        """异步列出所有角色"""
+        return await self._run(self.list_characters)
+
+    async def delete_character_async(self, name: str) -> bool:
+        """异步删除角色"""
+        return await self._run(self.delete_character, name)
+
+    async def bulk_save_async(self, characters: Iterable[Character]) -> int:
+        """异步批量保存角色"""
+        return await self._run(self.bulk_save, list(characters))
+
+    async def bulk_load_async(self, names: Optional[Iterable[str]] = None) -> Dict[str, Character]:
+        """异步批量加载角色"""
+        return await self._run(self.bulk_load, None if names is None else list(names))
+
+    def close(self):
+        """关闭线程池和所有连接"""
+        self.executor.shutdown(wait=True)
+        self._pool.close()
+        if self._keeper:
+            self._keeper.close()
+            self._keeper = None
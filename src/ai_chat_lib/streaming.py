@@ -0,0 +1,405 @@
+"""
+流式输出工具
+"""
+import asyncio
+import bisect
+import uuid
+from collections import deque
+from dataclasses import dataclass, asdict
+from enum import Enum
+from typing import AsyncGenerator, AsyncIterator, Callable, Deque, Dict, List, Optional
+
+# 出现在片段末尾时立即输出的句子边界
+SENTENCE_BOUNDARIES = frozenset("。！？；…!?;\n")
+
+
+@dataclass
+class CoalesceStats:
+    """合并阶段的计数器（多个流共用一个合并器时累加）"""
+    streams: int = 0
+    chunks_in: int = 0
+    chunks_out: int = 0
+    chars: int = 0
+    # 按触发原因统计的输出次数
+    flush_first: int = 0
+    flush_size: int = 0
+    flush_time: int = 0
+    flush_boundary: int = 0
+    flush_end: int = 0
+
+    @property
+    def coalesce_ratio(self) -> float:
+        """平均每个输出片段合并了多少个输入片段"""
+        return self.chunks_in / self.chunks_out if self.chunks_out else 0.0
+
+    def to_dict(self) -> Dict[str, float]:
+        data = asdict(self)
+        data["coalesce_ratio"] = self.coalesce_ratio
+        return data
+
+
+class _StreamError:
+    """后台读取任务捕获的异常，转交给消费方重新抛出"""
+
+    def __init__(self, error: BaseException):
+        self.error = error
+
+
+_END = object()
+
+
+async def _pump(stream: AsyncIterator[str], queue: asyncio.Queue):
+    try:
+        async for chunk in stream:
+            await queue.put(chunk)
+    except Exception as e:
+        await queue.put(_StreamError(e))
+        return
+    await queue.put(_END)
+
+
+class ChunkCoalescer:
+    """把提供商的细碎片段合并后再输出
+
+    第一个片段总是立即输出，不影响首字延迟；之后的片段在以下任一条件满足时输出：
+    缓冲达到max_chars个字符、距离缓冲中第一个片段超过max_delay秒、片段以句子边界结尾。
+    """
+
+    def __init__(self, max_chars: int = 64, max_delay: Optional[float] = 0.05,
+                 flush_on_boundary: bool = True, boundaries=SENTENCE_BOUNDARIES,
+                 queue_size: int = 256):
+        self.max_chars = max(1, max_chars)
+        # 读取提供商片段的预读上限，队列满时暂停读取
+        self.queue_size = queue_size
+        self.max_delay = max_delay
+        self.flush_on_boundary = flush_on_boundary
+        self.boundaries = frozenset(boundaries)
+        self.stats = CoalesceStats()
+
+    def reset_stats(self):
+        self.stats = CoalesceStats()
+
+    def _should_flush(self, size: int, chunk: str) -> Optional[str]:
+        if size >= self.max_chars:
+            return "size"
+        if self.flush_on_boundary and chunk and chunk[-1] in self.boundaries:
+            return "boundary"
+        return None
+
+    def _flush(self, buffer: List[str], reason: str) -> str:
+        text = "".join(buffer)
+        buffer.clear()
+        self.stats.chunks_out += 1
+        self.stats.chars += len(text)
+        setattr(self.stats, f"flush_{reason}", getattr(self.stats, f"flush_{reason}") + 1)
+        return text
+
+    async def coalesce(self, stream: AsyncIterator[str]) -> AsyncGenerator[str, None]:
+        """包装一个文本片段流，输出合并后的片段"""
+        self.stats.streams += 1
+        if not self.max_delay:
+            async for text in self._coalesce_without_timer(stream):
+                yield text
+            return
+
+        # 由后台任务读取提供商的流，读取不会因为时间窗口到期而被取消；
+        # 队列中有片段时直接取出，只有队列为空时才需要带超时的等待
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        pump = asyncio.ensure_future(_pump(stream, queue))
+        buffer: List[str] = []
+        size = 0
+        deadline = 0.0
+        first = True
+        try:
+            while True:
+                try:
+                    item = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    if not buffer:
+                        item = await queue.get()
+                    else:
+                        timeout = deadline - loop.time()
+                        try:
+                            if timeout <= 0:
+                                raise asyncio.TimeoutError
+                            item = await asyncio.wait_for(queue.get(), timeout)
+                        except asyncio.TimeoutError:
+                            size = 0
+                            yield self._flush(buffer, "time")
+                            continue
+
+                if item is _END:
+                    break
+                if isinstance(item, _StreamError):
+                    raise item.error
+
+                self.stats.chunks_in += 1
+                if not item:
+                    continue
+                buffer.append(item)
+                if first:
+                    first = False
+                    yield self._flush(buffer, "first")
+                    continue
+
+                now = loop.time()
+                if size == 0:
+                    deadline = now + self.max_delay
+                size += len(item)
+                reason = self._should_flush(size, item) or ("time" if now >= deadline else None)
+                if reason:
+                    size = 0
+                    yield self._flush(buffer, reason)
+
+            if buffer:
+                yield self._flush(buffer, "end")
+        finally:
+            if not pump.done():
+                pump.cancel()
+                try:
+                    await pump
+                except asyncio.CancelledError:
+                    pass
+
+    async def _coalesce_without_timer(self, stream: AsyncIterator[str]) -> AsyncGenerator[str, None]:
+        """不使用时间窗口时的快速路径：每个片段到达时判断是否输出"""
+        buffer: List[str] = []
+        size = 0
+        first = True
+        async for chunk in stream:
+            self.stats.chunks_in += 1
+            if not chunk:
+                continue
+            buffer.append(chunk)
+            if first:
+                first = False
+                yield self._flush(buffer, "first")
+                continue
+            size += len(chunk)
+            reason = self._should_flush(size, chunk)
+            if reason:
+                size = 0
+                yield self._flush(buffer, reason)
+        if buffer:
+            yield self._flush(buffer, "end")
+
+
+class BackpressurePolicy(Enum):
+    """订阅者跟不上时的处理方式"""
+    # 落后超过max_lag个片段时丢弃最旧的未读片段
+    DROP = "drop"
+    # 不丢片段，未读片段保留在重放缓冲中（上限为replay_size），已被移出缓冲时断开
+    BUFFER = "buffer"
+    # 落后超过max_lag个片段时断开
+    DISCONNECT = "disconnect"
+
+
+class SubscriberDisconnected(Exception):
+    """订阅者因为落后太多被断开"""
+    pass
+
+
+class StreamBroadcaster:
+    """把一个进行中的流式回复广播给多个订阅者
+
+    后台任务读取上游并写入环形重放缓冲，写入不等待任何订阅者，慢订阅者不会拖慢上游；
+    每个订阅者只记录自己的读取位置（片段序号），按各自的背压策略处理落后。
+    """
+
+    def __init__(self, source: AsyncIterator[str], replay_size: int = 4096,
+                 on_done: Optional[Callable[["StreamBroadcaster"], None]] = None,
+                 stream_id: Optional[str] = None):
+        self.stream_id = stream_id or uuid.uuid4().hex
+        self._source = source
+        self._chunks: Deque[str] = deque(maxlen=replay_size)
+        # 每个缓冲片段在整个回复中的起始字节偏移（UTF-8），用于按字节位置恢复
+        self._byte_starts: Deque[int] = deque(maxlen=replay_size)
+        self._end = 0
+        self._end_bytes = 0
+        self._done = False
+        self._error: Optional[BaseException] = None
+        self._waiter: Optional[asyncio.Future] = None
+        self._task: Optional[asyncio.Task] = None
+        self._on_done = on_done
+        self.subscriber_count = 0
+
+    @property
+    def done(self) -> bool:
+        return self._done
+
+    @property
+    def error(self) -> Optional[BaseException]:
+        return self._error
+
+    @property
+    def base_offset(self) -> int:
+        """重放缓冲中最早片段的序号"""
+        return self._end - len(self._chunks)
+
+    @property
+    def end_offset(self) -> int:
+        """已收到的片段数"""
+        return self._end
+
+    @property
+    def end_byte_offset(self) -> int:
+        """已收到的字节数（UTF-8）"""
+        return self._end_bytes
+
+    def start(self) -> "StreamBroadcaster":
+        """启动读取上游的后台任务"""
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._run())
+        return self
+
+    async def wait(self):
+        """等待上游结束（不抛出上游的异常）"""
+        if self._task is not None:
+            await asyncio.wait({self._task})
+
+    def cancel(self):
+        """取消上游"""
+        if self._task is not None:
+            self._task.cancel()
+
+    async def _run(self):
+        try:
+            async for chunk in self._source:
+                self._chunks.append(chunk)
+                self._byte_starts.append(self._end_bytes)
+                self._end += 1
+                self._end_bytes += len(chunk.encode("utf-8"))
+                self._notify()
+        except asyncio.CancelledError:
+            self._error = SubscriberDisconnected("上游流已被取消")
+        except Exception as e:
+            self._error = e
+        finally:
+            self._done = True
+            self._notify()
+            if self._on_done is not None:
+                self._on_done(self)
+
+    def _notify(self):
+        waiter, self._waiter = self._waiter, None
+        if waiter is not None and not waiter.done():
+            waiter.set_result(None)
+
+    async def _wait_for_data(self):
+        if self._waiter is None:
+            self._waiter = asyncio.get_running_loop().create_future()
+        # shield：一个订阅者被取消时不影响其他等待中的订阅者
+        await asyncio.shield(self._waiter)
+
+    def subscribe(self, policy: BackpressurePolicy = BackpressurePolicy.BUFFER, max_lag: int = 256,
+                  from_start: bool = True) -> "StreamSubscription":
+        """订阅；from_start为True时先重放缓冲中的片段，否则只接收之后的片段"""
+        offset = self.base_offset if from_start else self._end
+        self.subscriber_count += 1
+        return StreamSubscription(self, offset, policy, max_lag)
+
+    def resume(self, chunk_offset: Optional[int] = None, byte_offset: Optional[int] = None,
+               policy: BackpressurePolicy = BackpressurePolicy.BUFFER,
+               max_lag: int = 256) -> "StreamSubscription":
+        """从片段序号或字节偏移处恢复订阅（断线重连的客户端使用）
+
+        字节偏移落在片段中间时先输出该片段的剩余部分；偏移必须位于字符边界。
+        对应的片段已被移出重放缓冲或偏移超出已收到的内容时抛出ValueError。
+        """
+        if (chunk_offset is None) == (byte_offset is None):
+            raise ValueError("chunk_offset和byte_offset必须且只能指定一个")
+
+        prefix = ""
+        if chunk_offset is not None:
+            offset = chunk_offset
+            if not self.base_offset <= offset <= self._end:
+                raise ValueError(f"片段偏移 {offset} 不在可恢复范围 [{self.base_offset}, {self._end}] 内")
+        else:
+            if byte_offset == self._end_bytes:
+                offset = self._end
+            else:
+                if not self._byte_starts or not self._byte_starts[0] <= byte_offset < self._end_bytes:
+                    raise ValueError(f"字节偏移 {byte_offset} 不在可恢复范围内")
+                index = bisect.bisect_right(self._byte_starts, byte_offset) - 1
+                offset = self.base_offset + index + 1
+                skip = byte_offset - self._byte_starts[index]
+                if skip:
+                    try:
+                        prefix = self._chunks[index].encode("utf-8")[skip:].decode("utf-8")
+                    except UnicodeDecodeError:
+                        raise ValueError(f"字节偏移 {byte_offset} 不在字符边界上")
+                else:
+                    offset -= 1
+
+        self.subscriber_count += 1
+        subscription = StreamSubscription(self, offset, policy, max_lag)
+        subscription._prefix = prefix
+        return subscription
+
+
+class StreamSubscription:
+    """一个订阅者，按顺序异步迭代片段"""
+
+    def __init__(self, broadcaster: StreamBroadcaster, offset: int,
+                 policy: BackpressurePolicy, max_lag: int):
+        self._broadcaster = broadcaster
+        self.offset = offset
+        self.policy = policy
+        self.max_lag = max(1, max_lag)
+        self.dropped = 0
+        self.closed = False
+        self.disconnected = False
+        # 按字节偏移恢复时需要先输出的片段剩余部分
+        self._prefix = ""
+
+    def __aiter__(self) -> "StreamSubscription":
+        return self
+
+    async def __anext__(self) -> str:
+        broadcaster = self._broadcaster
+        if self._prefix:
+            prefix, self._prefix = self._prefix, ""
+            return prefix
+        while True:
+            if self.closed:
+                raise StopAsyncIteration
+            self._apply_policy()
+            if self.offset < broadcaster.end_offset:
+                chunk = broadcaster._chunks[self.offset - broadcaster.base_offset]
+                self.offset += 1
+                return chunk
+            if broadcaster.done:
+                self.close()
+                if broadcaster.error is not None:
+                    raise broadcaster.error
+                raise StopAsyncIteration
+            await broadcaster._wait_for_data()
+
+    def _apply_policy(self):
+        broadcaster = self._broadcaster
+        base = broadcaster.base_offset
+        if self.offset < base:
+            if self.policy is not BackpressurePolicy.DROP:
+                self._disconnect(f"未读片段已被移出重放缓冲（落后 {broadcaster.end_offset - self.offset} 个片段）")
+            self.dropped += base - self.offset
+            self.offset = base
+
+        lag = broadcaster.end_offset - self.offset
+        if lag > self.max_lag:
+            if self.policy is BackpressurePolicy.DROP:
+                self.dropped += lag - self.max_lag
+                self.offset += lag - self.max_lag
+            elif self.policy is BackpressurePolicy.DISCONNECT:
+                self._disconnect(f"落后 {lag} 个片段，超过上限 {self.max_lag}")
+
+    def _disconnect(self, reason: str):
+        self.close()
+        self.disconnected = True
+        raise SubscriberDisconnected(reason)
+
+    def close(self):
+        """取消订阅"""
+        if not self.closed:
+            self.closed = True
+            self._broadcaster.subscriber_count -= 1
@@ -0,0 +1,162 @@
+"""
+同步接口：在专用后台线程的长期事件循环中运行MultiSessionChatInterface，供Flask、Django等同步代码调用
+"""
+import asyncio
+import concurrent.futures
+import threading
+from typing import Any, AsyncGenerator, Awaitable, Callable, Dict, Iterator, List, Optional, TypeVar
+
+from .chat_interface import ChatSession, MultiSessionChatInterface
+from .models.character import Character
+from .models.message import Message
+from .providers.base import BaseAIProvider, StreamEvent
+
+T = TypeVar("T")
+
+
+async def _anext(agen: AsyncGenerator[T, None]) -> T:
+    return await agen.__anext__()
+
+
+async def _call(fn: Callable[..., T], *args, **kwargs) -> T:
+    return fn(*args, **kwargs)
+
+
+class SyncChatClient:
+    """线程安全的同步聊天客户端
+
+    所有操作都通过run_coroutine_threadsafe交给同一个后台事件循环执行，
+    接口的状态只在该线程中读写，多个线程可以同时调用；提供商的HTTP客户端和连接池在调用之间复用。
+    不要在其他线程中直接访问interface，需要时用call/submit交给事件循环执行。
+    """
+
+    def __init__(self, interface: Optional[MultiSessionChatInterface] = None, thread_name: str = "ai_chat_loop"):
+        self.interface = interface or MultiSessionChatInterface()
+        self._loop = asyncio.new_event_loop()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run_loop, name=thread_name, daemon=True)
+        self._thread.start()
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self._loop)
+        try:
+            self._loop.run_forever()
+        finally:
+            # 取消还在运行的任务（如未读完的流式回复），再关闭事件循环
+            pending = asyncio.all_tasks(self._loop)
+            for task in pending:
+                task.cancel()
+            if pending:
+                self._loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+            self._loop.run_until_complete(self._loop.shutdown_asyncgens())
+            self._loop.close()
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        return self._loop
+
+    def submit(self, awaitable: Awaitable[T]) -> "concurrent.futures.Future[T]":
+        """把协程交给后台事件循环，立即返回concurrent.futures.Future"""
+        error = None
+        if self._closed:
+            error = "SyncChatClient已关闭"
+        elif threading.current_thread() is self._thread:
+            error = "不能在SyncChatClient的事件循环线程中同步等待，请直接await"
+        if error is not None:
+            if asyncio.iscoroutine(awaitable):
+                awaitable.close()
+            raise RuntimeError(error)
+        return asyncio.run_coroutine_threadsafe(awaitable, self._loop)
+
+    def run(self, awaitable: Awaitable[T], timeout: Optional[float] = None) -> T:
+        """在后台事件循环中运行协程并等待结果；等待超时时取消协程"""
+        future = self.submit(awaitable)
+        try:
+            return future.result(timeout)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            raise
+
+    def call(self, fn: Callable[..., T], *args, **kwargs) -> T:
+        """在事件循环线程中调用同步函数，如访问interface的属性"""
+        return self.run(_call(fn, *args, **kwargs))
+
+    def _iterate(self, agen: AsyncGenerator[T, None]) -> Iterator[T]:
+        """把异步生成器转换为同步迭代器，每次取下一项都在事件循环中执行"""
+        try:
+            while True:
+                try:
+                    item = self.run(_anext(agen))
+                except StopAsyncIteration:
+                    return
+                yield item
+        finally:
+            # 调用方提前结束迭代时关闭异步生成器，释放调度许可、关闭上游连接
+            if not self._closed:
+                self.run(agen.aclose())
+
+    # 聊天
+
+    def chat(self, user_input: str, user_name: str = "用户", session_id: Optional[str] = None, **kwargs) -> str:
+        return self.run(self.interface.chat(user_input, user_name, session_id, **kwargs))
+
+    def chat_stream(self, user_input: str, user_name: str = "用户", session_id: Optional[str] = None,
+                    **kwargs) -> Iterator[str]:
+        """流式聊天，返回同步迭代器"""
+        return self._iterate(self.interface.chat_stream(user_input, user_name, session_id, **kwargs))
+
+    def chat_stream_events(self, user_input: str, user_name: str = "用户", session_id: Optional[str] = None,
+                           **kwargs) -> Iterator[StreamEvent]:
+        return self._iterate(self.interface.chat_stream_events(user_input, user_name, session_id, **kwargs))
+
+    def continue_response(self, user_name: str = "用户", session_id: Optional[str] = None,
+                          **kwargs) -> Iterator[str]:
+        return self._iterate(self.interface.continue_response(user_name, session_id, **kwargs))
+
+    # 会话管理
+
+    def create_session(self, session_id: Optional[str] = None) -> str:
+        return self.call(self.interface.create_session, session_id)
+
+    def delete_session(self, session_id: str) -> bool:
+        return self.call(self.interface.delete_session, session_id)
+
+    def get_session(self, session_id: str) -> Optional[ChatSession]:
+        return self.call(self.interface.get_session, session_id)
+
+    def list_sessions(self) -> List[Dict[str, Any]]:
+        return self.call(self.interface.list_sessions)
+
+    def switch_character(self, character_name: str, session_id: Optional[str] = None) -> bool:
+        """切换角色，角色文件在线程池中读取，不阻塞事件循环"""
+        return self.run(self.interface.switch_character_async(character_name, session_id))
+
+    def switch_provider(self, provider: BaseAIProvider, session_id: Optional[str] = None) -> bool:
+        return self.call(self.interface.switch_provider, provider, session_id)
+
+    def get_character(self, session_id: Optional[str] = None) -> Optional[Character]:
+        return self.call(self.interface.get_character, session_id)
+
+    def get_chat_history(self, session_id: Optional[str] = None) -> List[Message]:
+        return self.call(self.interface.get_chat_history, session_id)
+
+    def clear_history(self, session_id: Optional[str] = None):
+        self.call(self.interface.clear_history, session_id)
+
+    def get_session_summary(self, session_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        return self.call(self.interface.get_session_summary, session_id)
+
+    def close(self, timeout: Optional[float] = 5.0):
+        """停止后台事件循环；之后的调用会抛出RuntimeError"""
+        if self._closed:
+            return
+        self._closed = True
+        self.interface.tool_executor.close()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout)
+
+    def __enter__(self) -> "SyncChatClient":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
@@ -0,0 +1,144 @@
+"""
+对话的截止时间和分阶段超时
+"""
+import asyncio
+import time
+from dataclasses import dataclass, replace
+from typing import AsyncGenerator, AsyncIterator, Optional, Tuple, Union
+
+PHASES = ("connect", "first_token", "chunk_gap", "total")
+
+# asyncio.timeout 在 Python 3.11+ 可用，每次等待只注册一个定时器，不需要创建任务
+_asyncio_timeout = getattr(asyncio, "timeout", None)
+
+
+class ChatTimeoutError(TimeoutError):
+    """对话的某个阶段超时"""
+
+    def __init__(self, phase: str, timeout: Optional[float], elapsed: Optional[float] = None):
+        self.phase = phase
+        self.timeout = timeout
+        self.elapsed = elapsed
+        limit = f"{timeout:.3f}s" if timeout is not None else "未知"
+        super().__init__(f"对话超时（阶段: {phase}，限制: {limit}）")
+
+
+@dataclass
+class ChatTimeouts:
+    """各阶段的超时时间（秒），None表示不限制
+
+    connect: 建立连接；first_token: 从发出请求到收到第一个分片；
+    chunk_gap: 相邻两个分片的间隔；total: 整轮对话；
+    deadline: 绝对截止时间（time.monotonic()的值），与total取较早者。
+    """
+    connect: Optional[float] = None
+    first_token: Optional[float] = None
+    chunk_gap: Optional[float] = None
+    total: Optional[float] = None
+    deadline: Optional[float] = None
+
+    @classmethod
+    def resolve(cls, timeout: Union[None, float, "ChatTimeouts"] = None,
+                deadline: Optional[float] = None,
+                default: Optional["ChatTimeouts"] = None) -> Optional["ChatTimeouts"]:
+        """合并调用参数和默认设置并开始计时；没有任何限制时返回None"""
+        if isinstance(timeout, ChatTimeouts):
+            timeouts = timeout
+        elif timeout is not None:
+            timeouts = replace(default or cls(), total=timeout)
+        else:
+            timeouts = default
+        if timeouts is None and deadline is None:
+            return None
+        timeouts = replace(timeouts or cls())
+        if deadline is not None:
+            timeouts.deadline = deadline if timeouts.deadline is None else min(timeouts.deadline, deadline)
+        return timeouts.start()
+
+    def start(self) -> "ChatTimeouts":
+        """把total换算为绝对截止时间，返回新对象"""
+        started = replace(self)
+        if self.total is not None:
+            total_deadline = time.monotonic() + self.total
+            started.deadline = total_deadline if self.deadline is None else min(self.deadline, total_deadline)
+        return started
+
+    def remaining(self) -> Optional[float]:
+        """距离截止时间的剩余秒数"""
+        if self.deadline is None:
+            return None
+        return max(0.0, self.deadline - time.monotonic())
+
+    def phase_timeout(self, phase: str) -> Tuple[Optional[float], str]:
+        """某个阶段实际生效的超时及其来源（阶段本身或total）"""
+        budget = getattr(self, phase)
+        remaining = self.remaining()
+        if remaining is not None and (budget is None or remaining <= budget):
+            return remaining, "total"
+        return budget, phase
+
+
+async def wait_with_timeout(awaitable, timeouts: Optional[ChatTimeouts], phase: str = "total"):
+    """按阶段超时等待；超时时取消等待的操作并抛出ChatTimeoutError
+
+    只有本次等待的时限到达时才转换为ChatTimeoutError，操作内部抛出的其他超时（工具、SDK等）原样抛出。
+    """
+    if timeouts is None:
+        return await awaitable
+    timeout, binding = timeouts.phase_timeout(phase)
+    if timeout is None:
+        return await awaitable
+    start = time.monotonic()
+    if _asyncio_timeout is not None:
+        cm = _asyncio_timeout(timeout)
+        try:
+            async with cm:
+                return await awaitable
+        except ChatTimeoutError:
+            raise
+        except asyncio.TimeoutError:
+            if not cm.expired():
+                raise
+            raise ChatTimeoutError(binding, getattr(timeouts, binding), time.monotonic() - start)
+    
+    # Python 3.10及以下：在任务中运行，按任务是否完成区分本次时限和操作内部的超时
+    task = asyncio.ensure_future(awaitable)
+    try:
+        done, _ = await asyncio.wait({task}, timeout=timeout)
+    except BaseException:
+        task.cancel()
+        raise
+    if not done:
+        task.cancel()
+        # 等待取消完成，不取出任务的异常
+        await asyncio.wait({task})
+        raise ChatTimeoutError(binding, getattr(timeouts, binding), time.monotonic() - start)
+    return task.result()
+
+
+def guard_stream(stream: AsyncIterator[str],
+                 timeouts: Optional[ChatTimeouts]) -> AsyncIterator[str]:
+    """为流式回复加上首个分片、分片间隔和总时间的限制，超时时关闭上游
+
+    没有超时设置时直接返回原来的流，不额外增加一层生成器。
+    """
+    if timeouts is None:
+        return stream
+    return _guarded_stream(stream, timeouts)
+
+
+async def _guarded_stream(stream: AsyncIterator[str], timeouts: ChatTimeouts) -> AsyncGenerator[str, None]:
+    iterator = stream.__aiter__()
+    phase = "first_token"
+    try:
+        while True:
+            try:
+                chunk = await wait_with_timeout(iterator.__anext__(), timeouts, phase)
+            except StopAsyncIteration:
+                return
+            phase = "chunk_gap"
+            yield chunk
+    finally:
+        aclose = getattr(iterator, "aclose", None)
+        if aclose is not None:
+            await aclose()
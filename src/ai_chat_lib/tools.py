@@ -0,0 +1,222 @@
+"""
+工具（函数）调用：工具注册表和并发执行器
+"""
+import asyncio
+import functools
+import inspect
+import json
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Set, Union
+
+# 工具参数的JSON Schema为空时使用的默认值
+EMPTY_PARAMETERS = {"type": "object", "properties": {}}
+
+
+@dataclass
+class Tool:
+    """可以被模型调用的工具；func可以是普通函数或协程函数，参数按关键字传入"""
+    name: str
+    description: str
+    func: Callable[..., Any]
+    parameters: Dict[str, Any] = field(default_factory=lambda: dict(EMPTY_PARAMETERS))
+    # 单次调用的超时（秒），None时使用执行器的默认值
+    timeout: Optional[float] = None
+
+    def to_openai(self) -> Dict[str, Any]:
+        """OpenAI的tools参数格式"""
+        return {
+            "type": "function",
+            "function": {"name": self.name, "description": self.description, "parameters": self.parameters},
+        }
+
+
+@dataclass
+class ToolCall:
+    """模型请求的一次工具调用；模型给出的参数不是合法JSON时arguments为原始字符串"""
+    id: str
+    name: str
+    arguments: Union[Dict[str, Any], str]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"id": self.id, "name": self.name, "arguments": self.arguments}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "ToolCall":
+        return cls(id=data["id"], name=data["name"], arguments=data.get("arguments") or {})
+
+
+@dataclass
+class ToolResult:
+    """一次工具调用的结果，出错时content为错误信息并返回给模型"""
+    call: ToolCall
+    content: str
+    error: Optional[str] = None
+    elapsed: float = 0.0
+
+
+@dataclass
+class CompletionResult:
+    """支持工具调用的聊天完成结果"""
+    content: str
+    tool_calls: List[ToolCall] = field(default_factory=list)
+    usage: Optional[Dict[str, Any]] = None
+
+
+def parse_arguments(raw: Optional[str]) -> Union[Dict[str, Any], str]:
+    """解析模型给出的JSON参数，失败时返回原始字符串"""
+    if not raw:
+        return {}
+    try:
+        arguments = json.loads(raw)
+    except ValueError:
+        return raw
+    return arguments if isinstance(arguments, dict) else raw
+
+
+def add_usage(total: Optional[Dict[str, Any]], usage: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """累加多次请求的用量"""
+    if not usage:
+        return total
+    if not total:
+        return dict(usage)
+    return {key: total.get(key, 0) + usage.get(key, 0) for key in set(total) | set(usage)}
+
+
+class ToolRegistry:
+    """按名称管理工具，角色通过metadata["tools"]中的名称引用"""
+
+    def __init__(self):
+        self._tools: Dict[str, Tool] = {}
+
+    def register(self, tool: Tool, override: bool = False) -> Tool:
+        if tool.name in self._tools and not override:
+            raise ValueError(f"工具 {tool.name} 已注册")
+        self._tools[tool.name] = tool
+        return tool
+
+    def tool(self, name: Optional[str] = None, description: Optional[str] = None,
+             parameters: Optional[Dict[str, Any]] = None, timeout: Optional[float] = None):
+        """把函数注册为工具的装饰器，描述默认取函数的文档字符串"""
+        def decorator(func: Callable[..., Any]) -> Callable[..., Any]:
+            self.register(Tool(
+                name=name or func.__name__,
+                description=description or inspect.getdoc(func) or "",
+                func=func,
+                parameters=parameters or dict(EMPTY_PARAMETERS),
+                timeout=timeout,
+            ))
+            return func
+        return decorator
+
+    def unregister(self, name: str):
+        self._tools.pop(name, None)
+
+    def get(self, name: str) -> Optional[Tool]:
+        return self._tools.get(name)
+
+    def list_tools(self) -> List[str]:
+        return sorted(self._tools)
+
+    def resolve(self, tools: Iterable[Union[str, Tool]]) -> List[Tool]:
+        """把工具名称或工具对象转换为工具列表，名称不存在时抛出ValueError"""
+        resolved = []
+        for item in tools:
+            if isinstance(item, Tool):
+                resolved.append(item)
+                continue
+            tool = self._tools.get(item)
+            if tool is None:
+                raise ValueError(f"工具 {item} 未注册")
+            resolved.append(tool)
+        return resolved
+
+
+def _is_async_callable(func: Callable[..., Any]) -> bool:
+    """协程函数，包括functools.partial包装的协程函数和__call__为协程函数的对象"""
+    while isinstance(func, functools.partial):
+        func = func.func
+    return inspect.iscoroutinefunction(func) or inspect.iscoroutinefunction(getattr(func, "__call__", None))
+
+
+# 默认的全局注册表
+default_tool_registry = ToolRegistry()
+tool = default_tool_registry.tool
+
+
+class ToolExecutor:
+    """并发执行一轮中的所有工具调用
+
+    协程工具直接在事件循环中运行，普通函数在有上限的线程池中运行；普通函数返回可等待对象时在事件循环中继续等待。
+    每个调用单独计时，超时或出错时把错误信息作为结果返回给模型，不影响其他调用。
+    注意：线程无法被强制停止，超时的普通函数会继续运行并占用一个线程；
+    这样的线程占满线程池后，新的普通函数调用直接返回错误，而不是无限排队。
+    """
+
+    def __init__(self, max_workers: int = 4, default_timeout: Optional[float] = 30.0):
+        self.max_workers = max_workers
+        self.default_timeout = default_timeout
+        self._executor: Optional[ThreadPoolExecutor] = None
+        # 已超时但线程仍在运行的调用
+        self._abandoned: Set[Future] = set()
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="ai_chat_tool")
+        return self._executor
+
+    @property
+    def stuck_calls(self) -> int:
+        """已超时但仍占用线程的普通函数调用数"""
+        self._abandoned = {future for future in self._abandoned if not future.done()}
+        return len(self._abandoned)
+
+    async def execute(self, calls: Sequence[ToolCall], tools: Sequence[Tool]) -> List[ToolResult]:
+        """执行工具调用，结果顺序与calls一致"""
+        by_name = {t.name: t for t in tools}
+        return list(await asyncio.gather(*(self._execute_one(call, by_name.get(call.name)) for call in calls)))
+
+    async def _execute_one(self, call: ToolCall, tool: Optional[Tool]) -> ToolResult:
+        start = time.monotonic()
+        if tool is None:
+            error = f"工具 {call.name} 不存在"
+            return ToolResult(call, error, error)
+        if not isinstance(call.arguments, dict):
+            error = f"工具 {call.name} 的参数不是有效的JSON对象: {call.arguments}"
+            return ToolResult(call, error, error)
+        timeout = tool.timeout if tool.timeout is not None else self.default_timeout
+        future: Optional[Future] = None
+        try:
+            if _is_async_callable(tool.func):
+                value = await asyncio.wait_for(tool.func(**call.arguments), timeout)
+            else:
+                if self.stuck_calls >= self.max_workers:
+                    error = f"工具 {call.name} 无法执行：线程池已被{self.max_workers}个超时的调用占满"
+                    return ToolResult(call, error, error)
+                future = self.executor.submit(functools.partial(tool.func, **call.arguments))
+                value = await asyncio.wait_for(self._await_result(future), timeout)
+        except asyncio.TimeoutError:
+            if future is not None and not future.done():
+                self._abandoned.add(future)
+            error = f"工具 {call.name} 执行超时（{timeout}秒）"
+            return ToolResult(call, error, error, time.monotonic() - start)
+        except Exception as e:
+            error = f"工具 {call.name} 执行失败: {str(e)}"
+            return ToolResult(call, error, error, time.monotonic() - start)
+        content = value if isinstance(value, str) else json.dumps(value, ensure_ascii=False, default=str)
+        return ToolResult(call, content, None, time.monotonic() - start)
+
+    @staticmethod
+    async def _await_result(future: Future) -> Any:
+        """等待线程池中的调用，返回值是可等待对象时（例如返回协程的包装函数）继续等待"""
+        value = await asyncio.wrap_future(future)
+        if inspect.isawaitable(value):
+            value = await value
+        return value
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
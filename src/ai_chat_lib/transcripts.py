@@ -0,0 +1,338 @@
+"""
+对话记录：把每轮对话的消息异步、批量写入Markdown、JSONL或按大小轮转的文件
+
+写入在后台线程中进行，对话只把记录放入有上限的队列，不等待文件写入。
+"""
+import asyncio
+import json
+import os
+import queue
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import datetime
+from enum import Enum
+from typing import TYPE_CHECKING, Any, Callable, Deque, Dict, List, Optional, TextIO, Tuple
+
+from .models.message import Message, MessageRole
+
+if TYPE_CHECKING:
+    from .chat_interface import ChatSession
+
+
+class OverflowPolicy(Enum):
+    """队列满时的处理方式"""
+    # 丢弃新记录并计数，对话不受影响
+    DROP = "drop"
+    # 等待队列有空位（最多block_timeout秒），超时后丢弃；在事件循环线程中不阻塞，由后台任务等待
+    BLOCK = "block"
+
+
+@dataclass
+class TranscriptRecord:
+    """一条对话记录（消息内容在加入队列时复制）"""
+    session_id: str
+    character: str
+    role: MessageRole
+    content: str
+    timestamp: datetime
+    metadata: Dict[str, Any] = field(default_factory=dict)
+
+    @classmethod
+    def from_message(cls, session: "ChatSession", message: Message) -> "TranscriptRecord":
+        return cls(
+            session_id=session.session_id,
+            character=session.character.name if session.character else "",
+            role=message.role,
+            content=message.content,
+            timestamp=message.timestamp or datetime.now(),
+            metadata=dict(message.metadata or {}),
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "session_id": self.session_id,
+            "character": self.character,
+            "role": self.role.value,
+            "content": self.content,
+            "timestamp": self.timestamp.isoformat(),
+            "metadata": self.metadata,
+        }
+
+
+def format_jsonl(record: TranscriptRecord) -> str:
+    return json.dumps(record.to_dict(), ensure_ascii=False, default=str) + "\n"
+
+
+def format_markdown(record: TranscriptRecord, user_label: str = "用户") -> str:
+    if record.role == MessageRole.USER:
+        speaker = user_label
+    elif record.role == MessageRole.ASSISTANT:
+        speaker = record.character or "AI"
+    else:
+        speaker = record.role.value
+    return f"### {speaker}（{record.session_id} · {record.timestamp:%Y-%m-%d %H:%M:%S}）\n\n{record.content}\n\n"
+
+
+class TranscriptSink(ABC):
+    """对话记录的接收者，通过MultiSessionChatInterface.add_transcript_sink添加
+
+    每轮对话完成后收到本轮的消息（与历史监听器相同）。
+    """
+
+    @abstractmethod
+    def on_message_appended(self, session: "ChatSession", message: Message):
+        pass
+
+    def on_session_removed(self, session_id: str):
+        """会话删除或清空时调用，已写入的记录不受影响"""
+        pass
+
+    def close(self):
+        pass
+
+
+# 写入线程的控制消息
+_CLOSE = object()
+
+# 事件循环中等待队列空位时的检查间隔（秒）
+_OVERFLOW_POLL_INTERVAL = 0.01
+
+
+def _running_loop() -> Optional[asyncio.AbstractEventLoop]:
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+
+
+class BufferedTranscriptSink(TranscriptSink):
+    """在后台线程中批量写入的记录器，子类实现write_batch
+
+    攒够flush_size条或距离本批第一条超过flush_interval秒时写入一次；
+    队列最多max_queue条，满了以后按policy丢弃或等待。
+    BLOCK策略在事件循环线程中不会阻塞：放不下的记录（最多max_queue条）暂存，
+    由事件循环中的任务按顺序等待空位，超过block_timeout秒仍放不下时丢弃并计数；
+    在其他线程中调用时最多阻塞block_timeout秒。
+    """
+
+    def __init__(self, flush_size: int = 100, flush_interval: float = 1.0, max_queue: int = 10000,
+                 policy: OverflowPolicy = OverflowPolicy.DROP, block_timeout: float = 1.0,
+                 roles: Optional[List[MessageRole]] = None):
+        self.flush_size = max(1, flush_size)
+        self.flush_interval = flush_interval
+        self.policy = policy
+        self.block_timeout = block_timeout
+        # None表示记录所有角色的消息
+        self.roles = set(roles) if roles else None
+        self.stats = {"queued": 0, "written": 0, "dropped": 0, "batches": 0, "errors": 0}
+        self._queue: "queue.Queue[Any]" = queue.Queue(maxsize=max_queue)
+        # 事件循环中等待空位的记录：(截止时间, 记录)，只在事件循环线程中读写
+        self._overflow: Deque[Tuple[float, TranscriptRecord]] = deque()
+        self._overflow_task: Optional[asyncio.Task] = None
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name=f"{type(self).__name__}", daemon=True)
+        self._thread.start()
+
+    def on_message_appended(self, session: "ChatSession", message: Message):
+        if self.roles is not None and message.role not in self.roles:
+            return
+        self.submit(TranscriptRecord.from_message(session, message))
+
+    def submit(self, record: TranscriptRecord) -> bool:
+        """把记录放入队列，被丢弃时返回False；在事件循环中暂存等待空位的记录返回True"""
+        if self._closed:
+            self.stats["dropped"] += 1
+            return False
+        # 已有记录在等待时新记录排在后面，保持顺序
+        if not self._overflow and self._put_nowait(record):
+            return True
+        if self.policy is OverflowPolicy.BLOCK:
+            loop = _running_loop()
+            if loop is not None:
+                return self._wait_in_loop(loop, record)
+            try:
+                self._queue.put(record, timeout=self.block_timeout)
+            except queue.Full:
+                pass
+            else:
+                self.stats["queued"] += 1
+                return True
+        self.stats["dropped"] += 1
+        return False
+
+    def _put_nowait(self, record: TranscriptRecord) -> bool:
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            return False
+        self.stats["queued"] += 1
+        return True
+
+    def _wait_in_loop(self, loop: asyncio.AbstractEventLoop, record: TranscriptRecord) -> bool:
+        """暂存记录，由事件循环中的任务等待队列空位，不阻塞事件循环"""
+        if len(self._overflow) >= self._queue.maxsize > 0:
+            self.stats["dropped"] += 1
+            return False
+        self._overflow.append((time.monotonic() + self.block_timeout, record))
+        if self._overflow_task is None or self._overflow_task.done():
+            self._overflow_task = loop.create_task(self._drain_overflow())
+        return True
+
+    async def _drain_overflow(self):
+        while self._overflow:
+            deadline, record = self._overflow[0]
+            if self._closed:
+                self.stats["dropped"] += 1
+            elif not self._put_nowait(record):
+                if time.monotonic() < deadline:
+                    await asyncio.sleep(_OVERFLOW_POLL_INTERVAL)
+                    continue
+                self.stats["dropped"] += 1
+            self._overflow.popleft()
+
+    @abstractmethod
+    def write_batch(self, records: List[TranscriptRecord]):
+        """在写入线程中写入一批记录"""
+        pass
+
+    def _write(self, batch: List[TranscriptRecord]):
+        try:
+            self.write_batch(batch)
+            self.stats["written"] += len(batch)
+            self.stats["batches"] += 1
+        except Exception as e:
+            self.stats["errors"] += 1
+            print(f"写入对话记录失败: {e}")
+
+    def _run(self):
+        batch: List[TranscriptRecord] = []
+        deadline = 0.0
+        while True:
+            timeout = max(0.0, deadline - time.monotonic()) if batch else None
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+            if item is _CLOSE or isinstance(item, threading.Event):
+                if batch:
+                    self._write(batch)
+                    batch = []
+                if item is _CLOSE:
+                    self.on_writer_exit()
+                    return
+                item.set()
+                continue
+            if item is not None:
+                if not batch:
+                    deadline = time.monotonic() + self.flush_interval
+                batch.append(item)
+                if len(batch) < self.flush_size:
+                    continue
+            self._write(batch)
+            batch = []
+
+    def on_writer_exit(self):
+        """写入线程结束前调用，用于关闭文件"""
+        pass
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """等待已入队的记录全部写入，timeout秒内（包括等待队列空位的时间）没有完成时返回False
+
+        在事件循环中等待空位的记录不在等待范围内。
+        """
+        if self._closed:
+            return True
+        deadline = None if timeout is None else time.monotonic() + timeout
+        done = threading.Event()
+        try:
+            self._queue.put(done, timeout=timeout)
+        except queue.Full:
+            return False
+        return done.wait(None if deadline is None else max(0.0, deadline - time.monotonic()))
+
+    def close(self, timeout: Optional[float] = 5.0):
+        """写入剩余的记录并停止写入线程，最多等待timeout秒"""
+        if self._closed:
+            return
+        self._closed = True
+        deadline = None if timeout is None else time.monotonic() + timeout
+        try:
+            self._queue.put(_CLOSE, timeout=timeout)
+        except queue.Full:
+            # 写入线程是守护线程，超时后不再等待
+            return
+        self._thread.join(None if deadline is None else max(0.0, deadline - time.monotonic()))
+
+
+class FileTranscriptSink(BufferedTranscriptSink):
+    """追加写入文件的记录器，文件只打开一次，每批写入后flush"""
+
+    def __init__(self, path: str, formatter: Callable[[TranscriptRecord], str] = format_jsonl,
+                 encoding: str = "utf-8", **kwargs):
+        self.path = path
+        self.formatter = formatter
+        self.encoding = encoding
+        self._file: Optional[TextIO] = None
+        super().__init__(**kwargs)
+
+    def _open(self) -> TextIO:
+        if self._file is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._file = open(self.path, "a", encoding=self.encoding)
+        return self._file
+
+    def write_batch(self, records: List[TranscriptRecord]):
+        f = self._open()
+        f.write("".join(self.formatter(record) for record in records))
+        f.flush()
+
+    def on_writer_exit(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class JsonlTranscriptSink(FileTranscriptSink):
+    """每条消息一行JSON"""
+
+    def __init__(self, path: str, **kwargs):
+        super().__init__(path, format_jsonl, **kwargs)
+
+
+class MarkdownTranscriptSink(FileTranscriptSink):
+    """便于阅读的Markdown记录"""
+
+    def __init__(self, path: str, user_label: str = "用户", **kwargs):
+        super().__init__(path, lambda record: format_markdown(record, user_label), **kwargs)
+
+
+class RotatingFileTranscriptSink(FileTranscriptSink):
+    """文件超过max_bytes后轮转：path -> path.1 -> path.2 ...，最多保留backup_count个旧文件"""
+
+    def __init__(self, path: str, max_bytes: int = 10 * 1024 * 1024, backup_count: int = 5,
+                 formatter: Callable[[TranscriptRecord], str] = format_jsonl, **kwargs):
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        super().__init__(path, formatter, **kwargs)
+
+    def write_batch(self, records: List[TranscriptRecord]):
+        f = self._open()
+        if f.tell() >= self.max_bytes:
+            self._rotate()
+        super().write_batch(records)
+
+    def _rotate(self):
+        self.on_writer_exit()
+        if self.backup_count > 0:
+            for index in range(self.backup_count - 1, 0, -1):
+                source = f"{self.path}.{index}"
+                if os.path.exists(source):
+                    os.replace(source, f"{self.path}.{index + 1}")
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
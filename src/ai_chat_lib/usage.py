@@ -0,0 +1,187 @@
+"""
+用量账本：捕获提供商报告的token用量，按会话、租户、角色、提供商和模型累计费用，并在请求前检查预算
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from .models.message import Message
+from .utils.token_counter import estimate_tokens
+
+# 当前请求收集到的用量；非流式的chat_completion只返回文本，提供商通过report_usage报告用量
+_captured_usage: ContextVar[Optional[List[Dict[str, Any]]]] = ContextVar("ai_chat_captured_usage", default=None)
+
+
+@contextmanager
+def capture_usage() -> Iterator[List[Dict[str, Any]]]:
+    """收集代码块中提供商报告的用量"""
+    captured: List[Dict[str, Any]] = []
+    token = _captured_usage.set(captured)
+    try:
+        yield captured
+    finally:
+        _captured_usage.reset(token)
+
+
+def report_usage(usage: Optional[Dict[str, Any]]):
+    """提供商报告一次请求的用量，不在capture_usage中时忽略"""
+    captured = _captured_usage.get()
+    if captured is not None and usage:
+        captured.append(usage)
+
+
+def estimate_usage(system: str, messages: Sequence[Message], completion: str) -> Dict[str, Any]:
+    """提供商没有报告用量时的本地估算"""
+    prompt_tokens = estimate_tokens(system) + sum(estimate_tokens(m.content) for m in messages)
+    completion_tokens = estimate_tokens(completion)
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "reasoning_tokens": 0,
+        "total_tokens": prompt_tokens + completion_tokens,
+        "estimated": True,
+    }
+
+
+@dataclass
+class ModelPrice:
+    """每百万token的价格"""
+    input: float
+    output: float
+
+
+class PriceTable:
+    """按 (提供商, 模型) 查找价格，模型为"*"的条目作为该提供商的默认价格"""
+
+    def __init__(self, prices: Optional[Dict[Tuple[str, str], ModelPrice]] = None):
+        self._prices: Dict[Tuple[str, str], ModelPrice] = dict(prices or {})
+
+    def set_price(self, provider: str, model: str, input: float, output: float):
+        self._prices[(provider, model)] = ModelPrice(input, output)
+
+    def get(self, provider: str, model: str) -> Optional[ModelPrice]:
+        return self._prices.get((provider, model)) or self._prices.get((provider, "*"))
+
+    def cost(self, provider: str, model: str, usage: Dict[str, Any]) -> float:
+        """一次请求的费用，没有价格时为0"""
+        price = self.get(provider, model)
+        if price is None:
+            return 0.0
+        return (usage.get("prompt_tokens", 0) * price.input
+                + usage.get("completion_tokens", 0) * price.output) / 1_000_000
+
+
+@dataclass
+class UsageTotals:
+    """累计用量"""
+    requests: int = 0
+    estimated_requests: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    reasoning_tokens: int = 0
+    total_tokens: int = 0
+    cost: float = 0.0
+
+    def add(self, usage: Dict[str, Any], cost: float):
+        self.requests += 1
+        if usage.get("estimated"):
+            self.estimated_requests += 1
+        self.prompt_tokens += usage.get("prompt_tokens", 0)
+        self.completion_tokens += usage.get("completion_tokens", 0)
+        self.reasoning_tokens += usage.get("reasoning_tokens", 0)
+        self.total_tokens += usage.get("total_tokens", 0) or \
+            usage.get("prompt_tokens", 0) + usage.get("completion_tokens", 0)
+        self.cost += cost
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "estimated_requests": self.estimated_requests,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "reasoning_tokens": self.reasoning_tokens,
+            "total_tokens": self.total_tokens,
+            "cost": self.cost,
+        }
+
+
+@dataclass
+class Budget:
+    """用量预算；超出后的请求被拒绝，设置了downgrade_model时改用该模型"""
+    max_tokens: Optional[int] = None
+    max_cost: Optional[float] = None
+    downgrade_model: Optional[str] = None
+
+    def exceeded(self, totals: UsageTotals) -> bool:
+        if self.max_tokens is not None and totals.total_tokens >= self.max_tokens:
+            return True
+        return self.max_cost is not None and totals.cost >= self.max_cost
+
+
+class BudgetExceededError(Exception):
+    """请求发送前发现预算已用完"""
+
+    def __init__(self, scope: str, key: str, totals: UsageTotals):
+        self.scope = scope
+        self.key = key
+        self.totals = totals
+        super().__init__(f"{scope} {key} 的预算已用完（{totals.total_tokens} tokens，费用 {totals.cost:.4f}）")
+
+
+# 账本累计的维度
+LEDGER_SCOPES = ("session", "tenant", "character", "provider", "model")
+
+
+class UsageLedger:
+    """按会话、租户、角色、提供商和 提供商/模型 累计用量和费用"""
+
+    def __init__(self, prices: Optional[PriceTable] = None):
+        self.prices = prices or PriceTable()
+        self._totals: Dict[str, Dict[str, UsageTotals]] = {scope: {} for scope in LEDGER_SCOPES}
+        self._budgets: Dict[str, Dict[str, Budget]] = {"session": {}, "tenant": {}}
+
+    def set_budget(self, budget: Optional[Budget], session_id: Optional[str] = None,
+                   tenant: Optional[str] = None):
+        """设置会话或租户的预算，budget为None时取消"""
+        if (session_id is None) == (tenant is None):
+            raise ValueError("需要指定session_id或tenant之一")
+        scope, key = ("session", session_id) if session_id is not None else ("tenant", tenant)
+        if budget is None:
+            self._budgets[scope].pop(key, None)
+        else:
+            self._budgets[scope][key] = budget
+
+    def check(self, session_id: str, tenant: str) -> Optional[str]:
+        """请求前检查预算：超出且不能降级时抛出BudgetExceededError，需要降级时返回改用的模型"""
+        downgrade = None
+        for scope, key in (("session", session_id), ("tenant", tenant)):
+            budget = self._budgets[scope].get(key)
+            if budget is None:
+                continue
+            totals = self._totals[scope].get(key)
+            if totals is None or not budget.exceeded(totals):
+                continue
+            if budget.downgrade_model is None:
+                raise BudgetExceededError(scope, key, totals)
+            downgrade = downgrade or budget.downgrade_model
+        return downgrade
+
+    def record(self, usage: Dict[str, Any], session_id: str, tenant: str, character: str,
+               provider: str, model: str) -> float:
+        """记入一次请求的用量，返回费用"""
+        cost = self.prices.cost(provider, model, usage)
+        keys = (session_id, tenant, character, provider, f"{provider}/{model}")
+        for scope, key in zip(LEDGER_SCOPES, keys):
+            totals = self._totals[scope].get(key)
+            if totals is None:
+                totals = self._totals[scope][key] = UsageTotals()
+            totals.add(usage, cost)
+        return cost
+
+    def get_totals(self, scope: str, key: str) -> UsageTotals:
+        """scope为session/tenant/character/provider/model，model的key为"提供商/模型\""""
+        return self._totals[scope].get(key) or UsageTotals()
+
+    def get_summary(self, scope: str) -> Dict[str, Dict[str, Any]]:
+        return {key: totals.to_dict() for key, totals in self._totals[scope].items()}
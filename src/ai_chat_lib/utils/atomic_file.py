@@ -0,0 +1,27 @@
+"""
+原子写文件：先写到同目录下的临时文件再替换，读取方不会看到写了一半的文件
+"""
+import os
+import threading
+from typing import Union
+
+
+def write_atomic(path: str, data: Union[str, bytes], encoding: str = "utf-8"):
+    """把data写入path
+
+    临时文件名包含进程号和线程号，同一文件被多个线程或进程同时保存时互不覆盖，
+    最后一次替换的内容生效；写入失败时删除临时文件。
+    """
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        if isinstance(data, bytes):
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+        else:
+            with open(tmp_path, "w", encoding=encoding) as f:
+                f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
@@ -0,0 +1,24 @@
+"""
+角色文件迁移工具：把旧的Python角色文件一次性转换为JSON
+
+用法：
+    python -m ai_chat_lib.utils.migrate_characters [角色目录] [--remove-legacy]
+"""
+import argparse
+from ai_chat_lib.storage.file_storage import DEFAULT_CHARACTERS_DIR, FileStorage
+
+
+def migrate_characters(characters_dir: str = DEFAULT_CHARACTERS_DIR, remove_legacy: bool = False):
+    """迁移目录下所有旧格式角色，返回已迁移的角色名"""
+    storage = FileStorage(characters_dir)
+    return storage.migrate_legacy_characters(remove_legacy=remove_legacy)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="把Python角色文件迁移为JSON")
+    parser.add_argument("characters_dir", nargs="?", default=DEFAULT_CHARACTERS_DIR, help="角色目录")
+    parser.add_argument("--remove-legacy", action="store_true", help="迁移成功后删除原Python文件")
+    args = parser.parse_args()
+
+    migrated = migrate_characters(args.characters_dir, args.remove_legacy)
+    print(f"已迁移 {len(migrated)} 个角色: {migrated}")
@@ -0,0 +1,29 @@
+"""
+检索用的文本切分：中日韩文字逐字切分，其他文字按单词切分并转为小写
+
+只用于长期记忆和全文检索，与模型的分词器无关。
+"""
+import re
+from typing import List
+
+_CJK_RANGES = "\u3040-\u30ff\u3400-\u9fff\uac00-\ud7af\uf900-\ufaff"
+_TOKEN_PATTERN = re.compile(f"[{_CJK_RANGES}]|[^\\W_{_CJK_RANGES}]+")
+
+
+def is_cjk(token: str) -> bool:
+    """是否为单个中日韩文字"""
+    return len(token) == 1 and token >= "\u3040"
+
+
+def tokenize(text: str) -> List[str]:
+    """切分为单词和单个中日韩文字"""
+    return _TOKEN_PATTERN.findall(text.lower())
+
+
+def cjk_bigrams(tokens: List[str]) -> List[str]:
+    """相邻中日韩文字组成的二元组"""
+    return [
+        previous + current
+        for previous, current in zip(tokens, tokens[1:])
+        if is_cjk(previous) and is_cjk(current)
+    ]
@@ -0,0 +1,18 @@
+"""
+本地token估算工具（不依赖具体模型的分词器）
+"""
+import re
+
+# 中日韩文字、全角标点等，大多数分词器中约1个字符对应1个token
+_CJK_PATTERN = re.compile(r"[\u2e80-\u9fff\uac00-\ud7af\uf900-\ufaff\uff00-\uffef\u3000-\u303f]")
+# 拉丁字母等其他文字按约4个字符1个token估算
+_CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算文本的token数"""
+    if not text:
+        return 0
+    cjk = len(_CJK_PATTERN.findall(text))
+    other = len(text) - cjk
+    return cjk + (other + _CHARS_PER_TOKEN - 1) // _CHARS_PER_TOKEN
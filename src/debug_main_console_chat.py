@@ -19,6 +19,7 @@ if __name__ == "__main__":
         from ai_chat_lib.chat_interface import ChatInterface
         from ai_chat_lib.providers.google_provider import GoogleAIProvider
         from ai_chat_lib.models.message import MessageRole
+        from ai_chat_lib.transcripts import MarkdownTranscriptSink
         
         # 初始化组件
         chat = ChatInterface()
@@ -49,6 +50,10 @@ if __name__ == "__main__":
         print(f"api provider: {chat.get_current_provider().get_provider_name()}")
         print(f"model: {chat.get_current_provider().model}\n")
         
+        # 对话记录在后台线程中写入chat.md
+        transcript = MarkdownTranscriptSink("chat.md", user_label="You")
+        chat.multi_chat.add_transcript_sink(transcript)
+
         print("=== start ===")
 
 
@@ -71,14 +76,11 @@ if __name__ == "__main__":
                         print(chunk, end="", flush=True)
                         res += chunk
                     print()
-
-                    # write to md file
-                    with open("chat.md", "a", encoding="utf-8") as f:
-                        f.write(f"# You：\n ## {command}\n\n")
-                        f.write(f"# Bot：\n ## {res}\n\n")
                 except Exception as e:
                     print(f"error：{e}")
         
+        chat.multi_chat.remove_transcript_sink(transcript)
+
         # 显示聊天历史
         print("=== 聊天历史 ===")
         history = chat.get_chat_history()
@@ -0,0 +1,24 @@
+import pytest
+
+from ai_chat_lib.chat_interface import MultiSessionChatInterface
+from ai_chat_lib.models.character import Character, ExampleDialog
+from ai_chat_lib.providers.fake_provider import FakeAIProvider
+
+
+@pytest.fixture
+def make_chat():
+    """创建带有测试会话"test"的聊天接口，可以传入提供商"""
+
+    def factory(provider=None) -> MultiSessionChatInterface:
+        chat = MultiSessionChatInterface()
+        session = chat.get_session(chat.create_session("test"))
+        session.character = Character(
+            name="测试角色",
+            description="测试用",
+            system_prompt="你是{{character}}",
+            example_dialogs=[ExampleDialog("你好", "你好呀")],
+        )
+        session.provider = provider or FakeAIProvider(reply="收到")
+        return chat
+
+    return factory
@@ -0,0 +1,68 @@
+import asyncio
+import threading
+
+import pytest
+
+from ai_chat_lib.character_manager import CharacterManager
+from ai_chat_lib.chat_interface import MultiSessionChatInterface
+from ai_chat_lib.models.character import Character, ExampleDialog
+from ai_chat_lib.storage.async_storage import AsyncStorageAdapter
+from ai_chat_lib.storage.file_storage import FileStorage
+from ai_chat_lib.storage.sqlite_storage import SQLiteStorage
+
+
+class CountingStorage(FileStorage):
+    def __init__(self, characters_dir):
+        super().__init__(characters_dir)
+        self.load_calls = 0
+        self.load_threads = set()
+
+    def load_character(self, name):
+        self.load_calls += 1
+        self.load_threads.add(threading.get_ident())
+        return super().load_character(name)
+
+
+def make_character(name="助手") -> Character:
+    return Character(name=name, description="测试", system_prompt="你是{{character}}",
+                     example_dialogs=[ExampleDialog("你好", "你好呀")])
+
+
+@pytest.mark.asyncio
+async def test_concurrent_async_loads_hit_storage_once_off_loop(tmp_path):
+    storage = CountingStorage(str(tmp_path))
+    storage.save_character(make_character())
+    manager = CharacterManager(storage)
+
+    results = await asyncio.gather(*(manager.load_character_async("助手") for _ in range(10)))
+
+    assert all(r is results[0] for r in results)
+    assert storage.load_calls == 1
+    assert threading.get_ident() not in storage.load_threads
+    await manager.async_storage.close()
+
+
+@pytest.mark.asyncio
+async def test_adapter_reuses_sqlite_executor():
+    storage = SQLiteStorage(":memory:")
+    adapter = AsyncStorageAdapter(storage)
+    assert adapter.executor is storage.executor
+
+    assert await adapter.save_character(make_character("甲"))
+    assert await adapter.list_characters() == ["甲"]
+    assert (await adapter.load_character("甲")).system_prompt == "你是{{character}}"
+    assert await adapter.delete_character("甲")
+    storage.close()
+
+
+@pytest.mark.asyncio
+async def test_switch_character_async(tmp_path):
+    storage = FileStorage(str(tmp_path))
+    storage.save_character(make_character())
+    chat = MultiSessionChatInterface(CharacterManager(storage))
+    chat.create_session("test")
+
+    assert await chat.switch_character_async("助手")
+    assert not await chat.switch_character_async("不存在")
+    assert chat.get_character().name == "助手"
+    assert [m.content for m in chat.get_chat_history()] == ["你好", "你好呀"]
@@ -0,0 +1,98 @@
+from ai_chat_lib.models.character import Character, ExampleDialog
+from ai_chat_lib.storage.catalog import CatalogEntry
+from ai_chat_lib.storage.file_storage import FileStorage
+from ai_chat_lib.storage.sqlite_storage import SQLiteStorage
+import os
+import pytest
+
+
+def make_characters():
+    return [
+        Character(
+            name=f"角色{i:02d}",
+            description=f"第{i}个角色",
+            system_prompt="你是{{character}}" * (i + 1),
+            example_dialogs=[ExampleDialog("你好", "你好呀")],
+            metadata={"category": "助手" if i % 2 == 0 else "专业",
+                      "language": "zh-CN" if i < 6 else "en-US"},
+        )
+        for i in range(10)
+    ]
+
+
+@pytest.fixture(params=["file", "sqlite"])
+def storage(request, tmp_path):
+    if request.param == "file":
+        yield FileStorage(str(tmp_path))
+    else:
+        storage = SQLiteStorage(str(tmp_path / "characters.db"))
+        yield storage
+        storage.close()
+
+
+def test_filtered_and_paginated_query(storage):
+    storage.bulk_save(make_characters())
+
+    page = storage.query_characters({"metadata.category": "助手", "language": "zh-CN"})
+    assert [e.name for e in page.entries] == ["角色00", "角色02", "角色04"]
+    assert page.total == 3
+
+    page = storage.query_characters({"category": "专业"}, offset=2, limit=2)
+    assert [e.name for e in page.entries] == ["角色05", "角色07"]
+    assert page.total == 5 and page.has_more
+
+    page = storage.query_characters({"prompt_tokens": lambda n: n > 50}, order_by="-prompt_tokens")
+    assert page.entries[0].name == "角色09"
+
+
+def test_catalog_updated_on_save_and_delete(storage):
+    characters = make_characters()
+    storage.bulk_save(characters)
+    entry = storage.query_characters({"name": "角色03"}).entries[0]
+    assert entry.content_hash == CatalogEntry.from_character("角色03", characters[3]).content_hash
+    assert entry.prompt_tokens > 0 and entry.example_tokens > 0
+
+    characters[3].description = "已修改"
+    storage.save_character(characters[3])
+    updated = storage.query_characters({"name": "角色03"}).entries[0]
+    assert updated.description == "已修改"
+    assert updated.content_hash != entry.content_hash
+
+    storage.delete_character("角色03")
+    assert storage.query_characters({"name": "角色03"}).total == 0
+
+
+def test_file_query_reads_index_without_loading_characters(tmp_path, monkeypatch):
+    FileStorage(str(tmp_path)).bulk_save(make_characters())
+    assert os.path.exists(tmp_path / ".catalog.json")
+
+    storage = FileStorage(str(tmp_path))
+    monkeypatch.setattr(storage, "load_character", lambda name: pytest.fail("不应加载角色"))
+    assert storage.query_characters({"language": "en-US"}).total == 4
+    assert "角色00" in storage.list_characters()
+    assert ".catalog" not in storage.list_characters()
+
+
+def test_file_catalog_rebuilt_and_refreshed_from_files(tmp_path):
+    FileStorage(str(tmp_path)).bulk_save(make_characters())
+    os.remove(tmp_path / ".catalog.json")
+
+    storage = FileStorage(str(tmp_path))
+    assert storage.query_characters().total == 10
+
+    # 绕过存储直接编辑文件后增量刷新
+    path = tmp_path / "角色01.json"
+    path.write_text(path.read_text(encoding="utf-8").replace('"专业"', '"助手" '), encoding="utf-8")
+    assert storage.refresh_catalog(["角色01"]) == 1
+    assert storage.query_characters({"category": "助手"}).total == 6
+
+
+def test_order_by_metadata_with_mixed_types(storage):
+    for name, priority in [("甲", "高"), ("乙", 2), ("丙", None), ("丁", 1.5), ("戊", ["列表"])]:
+        metadata = {} if priority is None else {"priority": priority}
+        storage.save_character(Character(name, "", "", [], metadata=metadata))
+
+    names = [entry.name for entry in storage.query_characters(order_by="metadata.priority").entries]
+    # 数字在前，然后是字符串和其他值，没有该字段的在最后
+    assert names[:2] == ["丁", "乙"]
+    assert names[-1] == "丙"
@@ -0,0 +1,67 @@
+import os
+
+from ai_chat_lib.character_manager import CharacterManager
+from ai_chat_lib.models.character import Character, ExampleDialog
+from ai_chat_lib.storage.file_storage import FileStorage
+from ai_chat_lib.storage.snapshot import CharacterSnapshot
+from ai_chat_lib.storage.sqlite_storage import SQLiteStorage
+
+
+class CountingStorage(FileStorage):
+    def __init__(self, characters_dir):
+        super().__init__(characters_dir)
+        self.loaded = []
+
+    def load_character(self, name):
+        self.loaded.append(name)
+        return super().load_character(name)
+
+
+def make_character(name: str, prompt: str = "你是{{character}}") -> Character:
+    return Character(name=name, description="测试", system_prompt=prompt,
+                     example_dialogs=[ExampleDialog("你好", "你好呀")], metadata={"tags": ["a"]})
+
+
+def test_preload_uses_snapshot_and_reloads_only_stale(tmp_path):
+    characters_dir = str(tmp_path / "characters")
+    snapshot_path = str(tmp_path / "characters.snapshot")
+    writer = FileStorage(characters_dir)
+    writer.bulk_save([make_character(f"角色{i}") for i in range(5)])
+
+    first = CountingStorage(characters_dir)
+    assert len(CharacterManager(first).preload(snapshot_path)) == 5
+    assert sorted(first.loaded) == [f"角色{i}" for i in range(5)]
+    assert os.path.exists(snapshot_path)
+
+    second = CountingStorage(characters_dir)
+    manager = CharacterManager(second)
+    assert len(manager.preload(snapshot_path)) == 5
+    assert second.loaded == []
+    assert manager.get_cached_character("角色3").metadata == {"tags": ["a"]}
+
+    writer.save_character(make_character("角色2", "新的提示词，长度也变了"))
+    writer.delete_character("角色4")
+    third = CountingStorage(characters_dir)
+    manager = CharacterManager(third)
+    preloaded = manager.preload(snapshot_path)
+    assert third.loaded == ["角色2"]
+    assert sorted(preloaded) == [f"角色{i}" for i in range(4)]
+    assert preloaded["角色2"].system_prompt == "新的提示词，长度也变了"
+    assert sorted(CharacterSnapshot(snapshot_path).load()[0]) == sorted(preloaded)
+
+
+def test_preload_sqlite_without_snapshot():
+    storage = SQLiteStorage(":memory:")
+    storage.bulk_save([make_character("甲"), make_character("乙")])
+    manager = CharacterManager(storage)
+
+    assert set(manager.preload()) == {"甲", "乙"}
+    assert manager.get_cached_character("甲") is not None
+    assert storage.get_signatures().keys() == {"甲", "乙"}
+    storage.close()
+
+
+def test_corrupt_snapshot_is_ignored(tmp_path):
+    path = tmp_path / "broken.snapshot"
+    path.write_bytes(b"not a snapshot")
+    assert CharacterSnapshot(str(path)).load() == ({}, {})
@@ -0,0 +1,161 @@
+from ai_chat_lib.character_manager import CharacterManager
+from ai_chat_lib.character_watcher import CharacterWatcher
+from ai_chat_lib.chat_interface import MultiSessionChatInterface
+from ai_chat_lib.models.character import Character, ExampleDialog
+from ai_chat_lib.providers.fake_provider import FakeAIProvider
+from ai_chat_lib.storage.file_storage import FileStorage
+import asyncio
+import threading
+import time
+import pytest
+
+
+def make_character(prompt: str) -> Character:
+    return Character(
+        name="热更新角色",
+        description="测试用",
+        system_prompt=prompt,
+        example_dialogs=[ExampleDialog("你好", prompt)],
+    )
+
+
+def make_chat(tmp_path):
+    storage = FileStorage(str(tmp_path))
+    storage.save_character(make_character("旧提示词"))
+    chat = MultiSessionChatInterface(CharacterManager(FileStorage(str(tmp_path))))
+    chat.create_session("s1")
+    chat.switch_provider(FakeAIProvider())
+    chat.switch_character("热更新角色")
+    return chat, storage
+
+
+def test_reload_only_changed_cached_characters(tmp_path):
+    chat, storage = make_chat(tmp_path)
+    watcher = CharacterWatcher(chat.character_manager)
+
+    storage.save_character(make_character("新提示词"))
+    assert watcher.handle_changes(["热更新角色.json", "未加载.json", "README.md"]) == {"热更新角色"}
+    assert chat.character_manager.get_version("热更新角色") == 1
+    assert chat.character_manager.get_cached_character("热更新角色").system_prompt == "新提示词"
+
+
+def test_session_opts_in_to_new_version(tmp_path):
+    chat, storage = make_chat(tmp_path)
+    chat.create_session("s2")
+    chat.switch_provider(FakeAIProvider(), "s2")
+    chat.switch_character("热更新角色", "s2")
+    chat.set_character_auto_reload(True, "s2")
+
+    storage.save_character(make_character("新提示词"))
+    chat.character_manager.reload_character("热更新角色")
+
+    system_s1, _, _ = chat.prepare_chat("在吗", session_id="s1")
+    system_s2, history_s2, _ = chat.prepare_chat("在吗", session_id="s2")
+    assert system_s1 == "旧提示词"
+    assert system_s2 == "新提示词"
+    assert history_s2[1].content == "新提示词"
+
+
+@pytest.mark.parametrize("use_inotify", [True, False])
+def test_watcher_thread_picks_up_file_edits(tmp_path, use_inotify):
+    chat, storage = make_chat(tmp_path)
+    with CharacterWatcher(chat.character_manager, poll_interval=0.05, use_inotify=use_inotify):
+        time.sleep(0.1)
+        storage.save_character(make_character("新提示词"))
+        deadline = time.time() + 3
+        while chat.character_manager.get_version("热更新角色") == 0 and time.time() < deadline:
+            time.sleep(0.02)
+
+    assert chat.character_manager.get_cached_character("热更新角色").system_prompt == "新提示词"
+
+
+def test_own_save_is_not_reloaded_twice(tmp_path):
+    chat, storage = make_chat(tmp_path)
+    manager = chat.character_manager
+    watcher = CharacterWatcher(manager)
+
+    assert manager.save_character(make_character("新提示词"))
+    assert manager.get_version("热更新角色") == 1
+    watcher.handle_changes(["热更新角色.json"])
+    assert manager.get_version("热更新角色") == 1
+
+    # 之后的外部修改仍会重新加载
+    time.sleep(0.01)
+    storage.save_character(make_character("外部修改"))
+    watcher.handle_changes(["热更新角色.json"])
+    assert manager.get_version("热更新角色") == 2
+    assert manager.get_cached_character("热更新角色").system_prompt == "外部修改"
+
+
+@pytest.mark.asyncio
+async def test_reload_listener_runs_on_given_loop(tmp_path):
+    chat, storage = make_chat(tmp_path)
+    loop = asyncio.get_running_loop()
+    done = asyncio.Event()
+    calls = []
+
+    def listener(name, character, version):
+        calls.append((name, version, threading.current_thread() is threading.main_thread()))
+        done.set()
+
+    chat.character_manager.add_reload_listener(listener, loop)
+    storage.save_character(make_character("新提示词"))
+    thread = threading.Thread(target=chat.character_manager.reload_character, args=("热更新角色",))
+    thread.start()
+    await asyncio.wait_for(done.wait(), 5)
+    thread.join()
+    assert calls == [("热更新角色", 1, True)]
+
+
+def test_half_written_file_keeps_cached_character(tmp_path):
+    chat, storage = make_chat(tmp_path)
+    manager = chat.character_manager
+    path = tmp_path / "热更新角色.json"
+
+    path.write_text("{broken", encoding="utf-8")
+    assert manager.reload_character("热更新角色") is None
+    assert manager.get_version("热更新角色") == 0
+    assert manager.get_cached_character("热更新角色").system_prompt == "旧提示词"
+
+    # 写完之后的正常修改仍能重新加载
+    storage.save_character(make_character("新提示词"))
+    assert manager.reload_character("热更新角色").system_prompt == "新提示词"
+    assert manager.get_version("热更新角色") == 1
+
+    path.unlink()
+    assert manager.reload_character("热更新角色") is None
+    assert manager.get_cached_character("热更新角色") is None
+    assert manager.get_version("热更新角色") == 2
+
+
+def test_polling_scan_skips_files_deleted_while_listing(tmp_path, monkeypatch):
+    from ai_chat_lib import character_watcher
+
+    for name in ("甲", "乙"):
+        FileStorage(str(tmp_path)).save_character(Character(name, "", "", []))
+    backend = character_watcher._PollingBackend(str(tmp_path), 0.01)
+    real_scandir = character_watcher.os.scandir
+
+    class VanishingEntry:
+        def __init__(self, entry):
+            self.name = entry.name
+            self._entry = entry
+
+        def stat(self):
+            if self.name == "甲.json":
+                raise FileNotFoundError(self.name)
+            return self._entry.stat()
+
+    class Listing:
+        def __init__(self, path):
+            self._scan = real_scandir(path)
+
+        def __enter__(self):
+            return [VanishingEntry(entry) for entry in self._scan]
+
+        def __exit__(self, *exc):
+            self._scan.close()
+
+    monkeypatch.setattr(character_watcher.os, "scandir", Listing)
+    # 只有消失的文件算作变化，其他文件不会被当作删除
+    assert backend.poll(0) == {"甲.json"}
@@ -0,0 +1,25 @@
+from ai_chat_lib.models.message import MessageRole
+from ai_chat_lib.providers.fake_provider import FakeAIProvider
+import pytest
+
+
+@pytest.mark.asyncio
+async def test_chat_appends_user_and_assistant_messages(make_chat):
+    chat = make_chat()
+    response = await chat.chat("你好{{character}}")
+
+    assert response == "收到"
+    history = chat.get_chat_history()
+    assert [m.role for m in history] == [MessageRole.USER, MessageRole.ASSISTANT]
+    assert history[0].content == "你好测试角色"
+
+
+@pytest.mark.asyncio
+async def test_chat_stream_yields_provider_chunks(make_chat):
+    provider = FakeAIProvider(reply="一二三四五六七", chunk_size=3)
+    chat = make_chat(provider)
+
+    chunks = [chunk async for chunk in chat.chat_stream("你好")]
+
+    assert chunks == ["一二三", "四五六", "七"]
+    assert chat.get_chat_history()[-1].content == "一二三四五六七"
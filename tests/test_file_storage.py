@@ -0,0 +1,110 @@
+from ai_chat_lib.character_manager import CharacterManager
+from ai_chat_lib.models.character import Character, ExampleDialog
+from ai_chat_lib.storage.file_storage import FileStorage
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+
+def make_character(name: str = "测试角色") -> Character:
+    return Character(
+        name=name,
+        description='包含"""三引号"""的描述',
+        system_prompt='你是{{character}}。\n规则："""不要破坏文件"""',
+        example_dialogs=[ExampleDialog("你好", "你好'''呀'''")],
+        metadata={"category": "助手", "language": "zh-CN"},
+    )
+
+
+def test_json_round_trip_with_triple_quotes(tmp_path):
+    storage = FileStorage(str(tmp_path))
+    character = make_character()
+    assert storage.save_character(character)
+    assert os.path.exists(tmp_path / "测试角色.json")
+
+    loaded = FileStorage(str(tmp_path)).load_character("测试角色")
+    assert loaded.system_prompt == character.system_prompt
+    assert loaded.description == character.description
+    assert loaded.example_dialogs[0].character_response == "你好'''呀'''"
+    assert loaded.metadata == {"category": "助手", "language": "zh-CN"}
+
+
+def test_legacy_py_file_escapes_triple_quotes(tmp_path):
+    storage = FileStorage(str(tmp_path), save_format="py")
+    character = make_character()
+    assert storage.save_character(character)
+
+    loaded = FileStorage(str(tmp_path)).load_character("测试角色")
+    assert loaded.system_prompt == character.system_prompt
+    assert loaded.description == character.description
+
+
+def test_load_is_cached_until_file_changes(tmp_path):
+    storage = FileStorage(str(tmp_path))
+    storage.save_character(make_character())
+
+    first = storage.load_character("测试角色")
+    calls = []
+    storage._load_json = lambda *args: calls.append(args)
+    # 缓存命中时不重新解析，返回副本，调用方的修改不影响缓存
+    first.metadata["category"] = "已修改"
+    second = storage.load_character("测试角色")
+    assert second is not first and second.metadata["category"] == "助手"
+    assert calls == []
+    del storage._load_json
+
+    path = tmp_path / "测试角色.json"
+    path.write_text(path.read_text(encoding="utf-8").replace(
+        '"description": "', '"description": "已修改'), encoding="utf-8")
+    reloaded = storage.load_character("测试角色")
+    assert reloaded is not first
+    assert reloaded.description.startswith("已修改")
+
+
+def test_migrate_legacy_characters(tmp_path):
+    FileStorage(str(tmp_path), save_format="py").save_character(make_character("旧角色"))
+    storage = FileStorage(str(tmp_path))
+
+    assert storage.migrate_legacy_characters(remove_legacy=True) == ["旧角色"]
+    assert not os.path.exists(tmp_path / "旧角色.py")
+    assert storage.list_characters() == ["旧角色"]
+    assert storage.load_character("旧角色").system_prompt == make_character().system_prompt
+
+
+def test_py_save_replaces_shadowing_json(tmp_path):
+    FileStorage(str(tmp_path)).save_character(make_character())
+    storage = FileStorage(str(tmp_path), save_format="py")
+    storage.load_character("测试角色")
+
+    character = make_character()
+    character.description = "新的描述"
+    assert storage.save_character(character)
+    assert not os.path.exists(tmp_path / "测试角色.json")
+    assert storage.load_character("测试角色").description == "新的描述"
+    assert FileStorage(str(tmp_path)).load_character("测试角色").description == "新的描述"
+    assert storage.catalog.entries()["测试角色"].description == "新的描述"
+
+
+def test_update_character_does_not_mutate_on_failed_save(tmp_path):
+    storage = FileStorage(str(tmp_path))
+    storage.save_character(make_character())
+    manager = CharacterManager(storage)
+    cached = manager.load_character("测试角色")
+    before = cached.updated_at
+
+    storage.save_character = lambda character: False
+    assert not manager.update_character(cached)
+    assert manager.load_character("测试角色").updated_at == before
+
+
+def test_concurrent_saves_of_same_character_do_not_collide(tmp_path):
+    storage = FileStorage(str(tmp_path))
+    characters = [Character(name="并发", description=f"版本{i}", system_prompt="", example_dialogs=[])
+                  for i in range(8)]
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(storage.save_character, characters * 5))
+
+    assert all(results)
+    assert storage.load_character("并发").description in {c.description for c in characters}
+    # 临时文件都已替换或删除
+    assert [p.name for p in tmp_path.iterdir() if p.name.endswith(".tmp")] == []
@@ -0,0 +1,70 @@
+import asyncio
+
+import pytest
+
+from ai_chat_lib.fulltext import FullTextIndex, query_terms
+from ai_chat_lib.models.character import Character
+from ai_chat_lib.models.message import Message, MessageRole
+from ai_chat_lib.providers.fake_provider import FakeAIProvider
+
+
+def test_query_terms_use_cjk_bigrams():
+    assert query_terms("退 Order") == ["退", "order"]
+    assert query_terms("申请退款") == ["申请", "请退", "退款"]
+
+
+def test_search_ranks_and_snippets():
+    index = FullTextIndex(snippet_chars=10)
+    index.add("a", Message(MessageRole.USER, "我想申请退款，订单号是A123"))
+    index.add("b", Message(MessageRole.USER, "退款什么时候到账？退款很急"))
+    index.add("b", Message(MessageRole.ASSISTANT, "款项退回需要三天"))
+    index.add("b", Message(MessageRole.TOOL, "退款"))
+
+    hits = index.search("退款")
+    assert [hit.session_id for hit in hits] == ["b", "a"]
+    assert hits[1].snippet == "…想申请退款，订单号是…"
+    # 包含相同的字但不相邻的消息不匹配
+    assert len(index.search("退款需要")) == 0
+    assert [hit.message.content for hit in index.search("a123")] == ["我想申请退款，订单号是A123"]
+    assert [hit.session_id for hit in index.search("退款", session_id="a")] == ["a"]
+
+    index.remove_session("b")
+    assert [hit.session_id for hit in index.search("退款")] == ["a"]
+    assert index.get_stats()["documents"] == 1
+
+
+@pytest.mark.asyncio
+async def test_index_follows_chat_without_blocking(make_chat):
+    chat = make_chat(FakeAIProvider(reply="好的，已为您登记"))
+    index = FullTextIndex(batch_size=1)
+    chat.add_history_listener(index)
+
+    await chat.chat("我的快递丢了")
+    # 对话结束时只入队，之后在事件循环中分批处理
+    assert index.get_stats()["pending"] == 2
+    await asyncio.sleep(0)
+    assert index.get_stats()["pending"] == 1
+    await asyncio.sleep(0)
+    assert index.get_stats()["pending"] == 0
+    assert index.get_stats()["documents"] == 2
+
+    hits = index.search("快递")
+    assert [(hit.session_id, hit.message.role) for hit in hits] == [("test", MessageRole.USER)]
+
+    chat.clear_history()
+    assert index.search("快递") == []
+
+
+@pytest.mark.asyncio
+async def test_switching_character_removes_indexed_history(make_chat):
+    chat = make_chat()
+    index = FullTextIndex()
+    chat.add_history_listener(index)
+    await chat.chat("我的快递丢了")
+    index.flush()
+    assert len(index.search("快递")) == 1
+
+    chat.character_manager.load_character = lambda name: Character(name=name, description="", system_prompt="", example_dialogs=[])
+    assert chat.switch_character("新角色")
+
+    assert index.search("快递") == []
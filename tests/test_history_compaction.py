@@ -0,0 +1,94 @@
+import pytest
+
+from ai_chat_lib.chat_interface import ChatSession
+from ai_chat_lib.fulltext import FullTextIndex
+from ai_chat_lib.history_compaction import HistoryCompactor
+from ai_chat_lib.memory import MemoryStore
+from ai_chat_lib.metrics import ChatMetrics
+from ai_chat_lib.models.message import Message, MessageRole
+from ai_chat_lib.providers.fake_provider import FakeAIProvider
+
+
+def fill_history(chat, count: int):
+    history = chat.get_session("test").chat_history
+    for i in range(count):
+        role = MessageRole.USER if i % 2 == 0 else MessageRole.ASSISTANT
+        history.append(Message(role, f"第{i}条：今天我们讨论了项目进度和下周的计划", metadata={"n": i} if i else None))
+
+
+def test_idle_history_is_packed_and_inflated_on_access(make_chat):
+    chat = make_chat()
+    fill_history(chat, 40)
+    session = chat.get_session("test")
+    original = list(session.chat_history)
+
+    compactor = HistoryCompactor(idle_seconds=60, codec="zlib").bind(chat)
+    assert compactor.compact() == 0
+
+    session.last_active -= 120
+    assert compactor.compact() == 1
+    assert "chat_history" not in session.__dict__
+    assert session.packed_history.message_count == 40
+    assert len(session.packed_history.blob) < session.packed_history.raw_bytes / 2
+    # 列出会话不解压
+    assert chat.list_sessions()[0]["message_count"] == 40
+    assert session.packed_history is not None
+
+    assert session.chat_history == original
+    assert session.chat_history[0].metadata is None
+    assert session.packed_history is None
+    assert compactor.stats["inflated"] == 1
+    # 刚解压的会话不再是空闲的
+    assert compactor.compact() == 0
+
+
+@pytest.mark.asyncio
+async def test_chat_continues_on_packed_history_and_reports_metrics(make_chat):
+    chat = make_chat(FakeAIProvider(reply="收到"))
+    metrics = ChatMetrics().bind(chat)
+    fill_history(chat, 10)
+    compactor = HistoryCompactor(idle_seconds=0).bind(chat)
+    assert compactor.compact() == 1
+
+    text = metrics.render()
+    assert "ai_chat_compressed_sessions 1\n" in text
+    assert "ai_chat_compressed_history_bytes 0\n" not in text
+
+    assert await chat.chat("你好") == "收到"
+    assert len(chat.get_chat_history()) == 12
+    assert "ai_chat_history_inflate_seconds_count 1\n" in metrics.render()
+    assert "ai_chat_compressed_sessions 0\n" in metrics.render()
+
+
+def test_short_histories_are_not_packed(make_chat):
+    chat = make_chat()
+    fill_history(chat, 2)
+    assert HistoryCompactor(idle_seconds=0).bind(chat).compact() == 0
+
+
+def test_read_only_paths_keep_history_packed(make_chat, tmp_path):
+    chat = make_chat()
+    fill_history(chat, 10)
+    session = chat.get_session("test")
+    original = list(session.chat_history)
+    compactor = HistoryCompactor(idle_seconds=0, codec="zlib").bind(chat)
+    assert compactor.compact() == 1
+    last_active = session.last_active
+
+    index = FullTextIndex()
+    index.add_session(session)
+    store = MemoryStore()
+    store.add_session(session)
+    assert list(session.iter_history()) == original
+    assert session == ChatSession("test", character=session.character, provider=session.provider,
+                                  created_at=session.created_at, updated_at=session.updated_at)
+    assert "chat_history" not in repr(session)
+    chat.export_sessions(str(tmp_path / "sessions.jsonl"))
+
+    assert "chat_history" not in session.__dict__
+    assert session.packed_history is not None
+    assert session.last_active == last_active
+    assert compactor.stats["inflated"] == 4
+    # 索引只保存内容，不引用解压出来的消息
+    hit = index.search("项目进度")[0]
+    assert hit.message.content == original[-1].content and hit.message is not original[-1]
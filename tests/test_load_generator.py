@@ -0,0 +1,26 @@
+import json
+
+from benchmarks import load_generator
+
+
+def test_load_generator_smoke(tmp_path, capsys):
+    output = tmp_path / "report.json"
+    report = load_generator.main([
+        "--users", "4", "--duration", "0.5", "--think-time", "const:0.01",
+        "--message-length", "const:5", "--stream-ratio", "0.5", "--seed", "1",
+        "--fake-ttft", "0.01", "--fake-itl", "0", "--fake-reply-chars", "8",
+        "--sample-interval", "0.1", "-o", str(output),
+    ])
+    assert report["turns"] > 0 and not report["errors"]
+    assert report["ttft"]["count"] == report["stream_turns"]
+    assert report["latency"]["count"] == report["turns"]
+    assert json.loads(output.read_text(encoding="utf-8"))["turns"] == report["turns"]
+
+
+def test_non_streaming_run_reports_ttft_as_na(capsys):
+    report = load_generator.main([
+        "--users", "2", "--duration", "0.3", "--think-time", "const:0.01", "--stream-ratio", "0",
+        "--fake-ttft", "0", "--fake-itl", "0", "--fake-reply-chars", "4",
+    ])
+    assert report["ttft"] is None and report["itl"] is None
+    assert "TTFT: N/A" in capsys.readouterr().out
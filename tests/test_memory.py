@@ -0,0 +1,95 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from ai_chat_lib.memory import HashingEmbedder, MemoryStore, VectorIndex
+from ai_chat_lib.models.message import Message, MessageRole
+from ai_chat_lib.providers.fake_provider import FakeAIProvider
+
+
+def test_vector_index_batched_top_k_matches_brute_force():
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((1000, 16)).astype(np.float32)
+    index = VectorIndex(16, capacity=8, chunk_size=128)
+    # 分多次追加，触发扩容
+    for start in range(0, 1000, 300):
+        assert index.add(vectors[start:start + 300]) == range(start, min(start + 300, 1000))
+    assert len(index) == 1000
+
+    queries = rng.standard_normal((5, 16)).astype(np.float32)
+    scores, positions = index.search(queries, k=3)
+    expected = np.argsort(-(queries @ vectors.T), axis=1)[:, :3]
+    assert positions.tolist() == expected.tolist()
+    assert np.all(scores[:, 0] >= scores[:, 1])
+
+    # 向量少于k个时用-1补齐
+    small = VectorIndex(16)
+    small.add(vectors[:2])
+    _, positions = small.search(queries[:1], k=4)
+    assert positions[0, 2:].tolist() == [-1, -1]
+
+
+def test_hashing_embedder_relates_chinese_text():
+    embedder = HashingEmbedder(dim=512)
+    vectors = embedder.embed(["我家的猫叫小白", "小白是一只猫", "明天开会讨论预算", ""])
+    assert vectors.shape == (4, 512)
+    assert vectors[0] @ vectors[1] > vectors[0] @ vectors[2]
+    assert not vectors[3].any()
+
+
+def test_memory_store_search_and_exclude():
+    store = MemoryStore()
+    store.add("s", "我家的猫叫小白", MessageRole.USER)
+    store.add("s", "明天开会讨论预算", MessageRole.USER)
+    store.add_message("s", Message(MessageRole.ASSISTANT, "半句", metadata={"partial": True}))
+    store.add_message("s", Message(MessageRole.TOOL, "{}"))
+    assert len(store) == 2
+
+    hits = store.search("s", "小白是什么猫", k=2)
+    assert [hit.text for hit in hits] == ["我家的猫叫小白"]
+    assert store.search("s", "小白是什么猫", exclude=["我家的猫叫小白"]) == []
+    assert store.search("other", "小白") == []
+
+    store.remove_session("s")
+    assert store.get_stats()["memories"] == 0
+
+
+@pytest.mark.asyncio
+async def test_memory_is_injected_into_system_prompt(make_chat):
+    chat = make_chat(FakeAIProvider(reply="好的"))
+    chat.memory = MemoryStore()
+    chat.memory_exclude_recent = 2
+
+    await chat.chat("我家的猫叫小白")
+    await chat.chat("明天开会讨论预算")
+    # 示例对话不会进入记忆，每轮的用户消息和回复会
+    assert len(chat.memory) == 4
+
+    system_input, _, _ = chat.prepare_chat("小白是什么猫？")
+    assert "我家的猫叫小白" in system_input
+    assert "预算" not in system_input
+
+    chat.memory_token_budget = 1
+    system_input, _, _ = chat.prepare_chat("小白是什么猫？")
+    assert "我家的猫叫小白" not in system_input
+
+
+@pytest.mark.asyncio
+async def test_failed_turn_is_not_remembered(make_chat):
+    chat = make_chat(FakeAIProvider(reply="一二三四", chunk_size=2, fail_after_chunks=0))
+    chat.memory = MemoryStore()
+
+    with pytest.raises(Exception):
+        async for _ in chat.chat_stream("你好"):
+            pass
+    assert len(chat.memory) == 0
+
+    # 保留了部分回复时，用户消息进入记忆，部分回复不进入
+    chat.get_session("test").provider = FakeAIProvider(reply="一二三四", chunk_size=2, fail_after_chunks=1)
+    with pytest.raises(Exception):
+        async for _ in chat.chat_stream("你好"):
+            pass
+    assert len(chat.memory) == 1
+
+    chat.delete_session("test")
+    assert chat.memory.get_stats()["sessions"] == 0
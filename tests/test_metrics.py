@@ -0,0 +1,132 @@
+import asyncio
+import subprocess
+import sys
+import threading
+import urllib.request
+
+import pytest
+
+from ai_chat_lib.metrics import ChatMetrics, MetricsRegistry, start_metrics_server
+from ai_chat_lib.providers.fake_provider import FakeAIProvider
+
+
+def test_sharded_counter_from_many_threads():
+    registry = MetricsRegistry()
+    counter = registry.counter("jobs_total", "任务数", ("kind",))
+    child = counter.labels("a")
+
+    def work():
+        for _ in range(10000):
+            child.inc()
+
+    threads = [threading.Thread(target=work) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert child.value == 40000
+    assert registry.counter("jobs_total", "任务数", ("kind",)) is counter
+    with pytest.raises(ValueError):
+        registry.gauge("jobs_total", "任务数")
+
+
+def test_render_prometheus_text():
+    registry = MetricsRegistry()
+    registry.counter("requests_total", "请求数", ("character",)).labels('说"你好"').inc(2)
+    histogram = registry.histogram("latency_seconds", "耗时", buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 5.0):
+        histogram.observe(value)
+    gauge = registry.gauge("active", "进行中")
+    gauge.inc(3)
+    gauge.dec()
+
+    text = registry.render()
+    assert '# TYPE requests_total counter\nrequests_total{character="说\\"你好\\""} 2\n' in text
+    assert 'latency_seconds_bucket{le="0.1"} 1\n' in text
+    assert 'latency_seconds_bucket{le="1"} 2\n' in text
+    assert 'latency_seconds_bucket{le="+Inf"} 3\n' in text
+    assert "latency_seconds_sum 5.55\nlatency_seconds_count 3\n" in text
+    assert "active 2\n" in text
+
+
+@pytest.mark.asyncio
+async def test_chat_pipeline_metrics(make_chat):
+    chat = make_chat(FakeAIProvider(reply="一二三四五六", chunk_size=2))
+    metrics = ChatMetrics().bind(chat)
+    labels = ("fake", "fake-model", "测试角色")
+
+    chunks = [c async for c in chat.chat_stream("你好", stream_options={"include_usage": True})]
+    assert len(chunks) == 3
+    await chat.chat("你好")
+
+    assert metrics.requests.labels(*labels).value == 2
+    assert metrics.ttft.labels(*labels).count == 1
+    assert metrics.inter_token.labels(*labels).count == 2
+    assert metrics.latency.labels(*labels).count == 2
+    assert metrics.active_streams.labels(*labels).value == 0
+    assert metrics.output_tokens.labels(*labels).value == 6
+
+    chat.get_session("test").provider = FakeAIProvider(reply="一二", fail_after_chunks=0)
+    with pytest.raises(Exception):
+        async for _ in chat.chat_stream("你好"):
+            pass
+    assert metrics.errors.labels(*labels, "Exception").value == 1
+
+    text = metrics.render()
+    assert 'ai_chat_active_sessions{provider="fake",model="fake-model",character="测试角色"} 1' in text
+
+
+@pytest.mark.asyncio
+async def test_disconnect_and_cancel_are_aborted_not_errors(make_chat):
+    chat = make_chat(FakeAIProvider(reply="一二三四五六", chunk_size=2, chunk_delay=0.01))
+    metrics = ChatMetrics().bind(chat)
+    labels = ("fake", "fake-model", "测试角色")
+
+    stream = chat.chat_stream("你好")
+    await stream.__anext__()
+    await stream.aclose()
+
+    chat.get_session("test").provider = FakeAIProvider(reply="收到", first_token_delay=10)
+    task = asyncio.create_task(chat.chat("你好"))
+    await asyncio.sleep(0.05)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+
+    assert metrics.aborted.labels(*labels, "disconnect").value == 1
+    assert metrics.aborted.labels(*labels, "cancelled").value == 1
+    assert "ai_chat_errors_total{" not in metrics.render()
+    assert metrics.active_streams.labels(*labels).value == 0
+
+
+def test_bind_is_idempotent_and_sums_interfaces(make_chat):
+    first, second = make_chat(), make_chat()
+    metrics = ChatMetrics()
+    metrics.bind(first)
+    metrics.bind(first)
+    metrics.bind(second)
+
+    assert len(metrics.registry._collectors) == 2
+    metrics.render()
+    assert metrics.active_sessions.labels("fake", "fake-model", "测试角色").value == 2
+
+
+def test_import_does_not_load_http_server():
+    code = "import sys, ai_chat_lib.metrics; print('http.server' in sys.modules)"
+    output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout
+    assert output.strip() == "False"
+
+
+def test_metrics_server_serves_registry():
+    registry = MetricsRegistry()
+    registry.counter("hits_total", "命中数").inc()
+    server = start_metrics_server(registry, port=0)
+    try:
+        url = f"http://127.0.0.1:{server.server_address[1]}/metrics"
+        with urllib.request.urlopen(url, timeout=5) as response:
+            assert response.headers["Content-Type"].startswith("text/plain; version=0.0.4")
+            assert "hits_total 1" in response.read().decode("utf-8")
+    finally:
+        server.shutdown()
+        server.server_close()
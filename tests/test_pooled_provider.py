@@ -0,0 +1,147 @@
+import asyncio
+
+import pytest
+
+from ai_chat_lib.providers.fake_provider import FakeAIProvider
+from ai_chat_lib.providers.pooled_provider import PooledOpenAIProvider, is_retryable_error
+from ai_chat_lib.timeouts import ChatTimeoutError
+
+
+class FailingProvider(FakeAIProvider):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.failing = True
+
+    async def chat_completion(self, system, messages, **kwargs):
+        self.call_count += 1
+        if self.failing:
+            # 与提供商一样把原始异常包装成Exception
+            try:
+                raise ConnectionError("连接被拒绝")
+            except ConnectionError as e:
+                raise Exception(f"上游不可用: {e}")
+        return self.reply
+
+
+@pytest.mark.asyncio
+async def test_least_outstanding_spreads_concurrent_requests():
+    members = [FakeAIProvider(reply=str(i), first_token_delay=0.02) for i in range(3)]
+    pool = PooledOpenAIProvider(members, model="fake-model")
+
+    await asyncio.gather(*(pool.chat_completion("", []) for _ in range(9)))
+
+    assert [m.call_count for m in members] == [3, 3, 3]
+    assert all(stat["outstanding"] == 0 for stat in pool.get_stats())
+
+
+@pytest.mark.asyncio
+async def test_failing_member_is_ejected_retried_and_readmitted():
+    bad = FailingProvider(reply="bad")
+    good = FakeAIProvider(reply="good")
+    pool = PooledOpenAIProvider([bad, good], model="fake-model", failure_threshold=2, ejection_time=0.05)
+
+    results = [await pool.chat_completion("", []) for _ in range(6)]
+
+    assert results == ["good"] * 6
+    assert bad.call_count == 2
+    assert pool.get_stats()[0]["ejected"]
+
+    await asyncio.sleep(0.06)
+    bad.failing = False
+    for _ in range(4):
+        await pool.chat_completion("", [])
+    assert bad.call_count > 2
+    assert not pool.get_stats()[0]["ejected"]
+
+
+@pytest.mark.asyncio
+async def test_ewma_prefers_faster_member_for_streams():
+    slow = FakeAIProvider(reply="slow", first_token_delay=0.03)
+    fast = FakeAIProvider(reply="fast")
+    pool = PooledOpenAIProvider([slow, fast], model="fake-model", strategy="ewma")
+
+    for _ in range(6):
+        assert "".join([c async for c in pool.chat_completion_stream("", [])]) in ("slow", "fast")
+
+    assert fast.call_count > slow.call_count
+
+
+class StatusError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+def test_error_classification():
+    assert is_retryable_error(StatusError(429))
+    assert is_retryable_error(StatusError(503))
+    assert not is_retryable_error(StatusError(400))
+    assert not is_retryable_error(ChatTimeoutError("total", 1.0))
+    assert not is_retryable_error(ChatTimeoutError("first_token", None))
+    assert is_retryable_error(ChatTimeoutError("connect", None))
+    assert not is_retryable_error(ValueError("内容审核未通过"))
+
+
+@pytest.mark.asyncio
+async def test_caller_errors_are_not_retried_or_counted():
+    class BadRequestProvider(FakeAIProvider):
+        async def chat_completion(self, system, messages, **kwargs):
+            self.call_count += 1
+            try:
+                raise StatusError(400)
+            except StatusError as e:
+                raise Exception(f"OpenAI API调用失败: {e}")
+
+    members = [BadRequestProvider(), BadRequestProvider()]
+    pool = PooledOpenAIProvider(members, model="fake-model", failure_threshold=1)
+    for _ in range(3):
+        with pytest.raises(Exception):
+            await pool.chat_completion("", [])
+
+    assert sum(m.call_count for m in members) == 3
+    assert all(stat["failures"] == 0 and not stat["ejected"] for stat in pool.get_stats())
+
+
+class ConnectTimeoutProvider(FakeAIProvider):
+    """连不上的成员：与OpenAI提供商一样把连接超时转换为ChatTimeoutError(phase="connect")"""
+
+    async def chat_completion(self, system, messages, **kwargs):
+        self.call_count += 1
+        try:
+            raise ConnectionError("connect timeout")
+        except ConnectionError as e:
+            raise ChatTimeoutError("connect", None) from e
+
+
+@pytest.mark.asyncio
+async def test_connect_timeout_member_fails_over_and_is_ejected():
+    unreachable = ConnectTimeoutProvider()
+    good = FakeAIProvider(reply="good")
+    pool = PooledOpenAIProvider([unreachable, good], model="fake-model", failure_threshold=1)
+
+    assert [await pool.chat_completion("", []) for _ in range(3)] == ["good"] * 3
+    assert unreachable.call_count == 1
+    assert pool.get_stats()[0]["ejected"]
+
+
+@pytest.mark.asyncio
+async def test_abandoned_stream_closes_member_stream():
+    closed = []
+
+    class TrackingProvider(FakeAIProvider):
+        async def chat_completion_events(self, system, messages, **kwargs):
+            try:
+                async for event in super().chat_completion_events(system, messages, **kwargs):
+                    yield event
+            finally:
+                closed.append(True)
+
+    pool = PooledOpenAIProvider([TrackingProvider(reply="一二三四五六", chunk_size=2)], model="fake-model")
+    stream = pool.chat_completion_events("", [])
+    async for _ in stream:
+        break
+    await stream.aclose()
+
+    # 不等垃圾回收，成员的流已经关闭
+    assert closed == [True]
+    assert pool.get_stats()[0]["outstanding"] == 0
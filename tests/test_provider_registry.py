@@ -0,0 +1,45 @@
+import subprocess
+import sys
+
+import pytest
+
+from ai_chat_lib.providers.fake_provider import FakeAIProvider
+from ai_chat_lib.providers.registry import (
+    create_provider, list_providers, register_provider, unregister_provider
+)
+
+
+def test_create_builtin_providers_by_name(monkeypatch):
+    monkeypatch.setenv("DEEP_SEEK_API_KEY", "from-env")
+    provider = create_provider("deepseek")
+    assert provider.get_provider_name() == "deepseek"
+    assert provider.api_key == "from-env"
+    assert provider.model == "deepseek-chat"
+
+    assert create_provider("aliyun", api_key="k", model="qwen-max").model == "qwen-max"
+    assert {"openai", "deepseek", "aliyun", "google", "fake"} <= set(list_providers())
+
+
+def test_register_custom_provider():
+    register_provider("test_fake", lambda **kwargs: FakeAIProvider(reply="自定义", **kwargs))
+    try:
+        assert create_provider("test_fake").reply == "自定义"
+        with pytest.raises(ValueError):
+            register_provider("test_fake", FakeAIProvider)
+    finally:
+        unregister_provider("test_fake")
+
+    with pytest.raises(ValueError):
+        create_provider("test_fake")
+
+
+def test_package_import_does_not_import_sdks():
+    code = (
+        "import sys\n"
+        "import ai_chat_lib\n"
+        "from ai_chat_lib import ChatInterface, DeepSeekProvider, GoogleAIProvider, create_provider\n"
+        "create_provider('deepseek', api_key='k'); GoogleAIProvider('k')\n"
+        "print([m for m in ('openai', 'google.genai') if m in sys.modules])\n"
+    )
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == "[]"
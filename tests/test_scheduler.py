@@ -0,0 +1,86 @@
+import asyncio
+
+import pytest
+
+from ai_chat_lib.providers.fake_provider import FakeAIProvider
+from ai_chat_lib.scheduler import FairShareScheduler, Priority
+from ai_chat_lib.timeouts import ChatTimeoutError
+
+
+async def run_jobs(scheduler, jobs, order, hold=0.001):
+    async def job(tenant, priority):
+        ticket = await scheduler.acquire("fake", tenant, priority)
+        order.append(tenant)
+        await asyncio.sleep(hold)
+        scheduler.release(ticket)
+
+    await asyncio.gather(*(job(tenant, priority) for tenant, priority in jobs))
+
+
+@pytest.mark.asyncio
+async def test_interactive_overtakes_queued_batch_requests():
+    scheduler = FairShareScheduler(default_limit=2, interactive_reserve=1)
+    order = []
+    jobs = [("bulk", Priority.BATCH)] * 5 + [("alice", Priority.INTERACTIVE)]
+
+    await run_jobs(scheduler, jobs, order)
+
+    # 第一个批量请求占用了批量可用的唯一许可，交互请求直接使用保留的许可
+    assert order[:2] == ["bulk", "alice"]
+    stats = scheduler.get_stats()["fake"]
+    assert stats["interactive"]["admitted"] == 1
+    assert stats["interactive"]["max_wait_ms"] < 1
+    assert stats["batch"]["admitted"] == 5
+    assert stats["active"] == 0
+
+
+@pytest.mark.asyncio
+async def test_weighted_fair_share_between_tenants():
+    scheduler = FairShareScheduler(default_limit=1, weights={"a": 2.0})
+    order = []
+    blocker = await scheduler.acquire("fake", "x")
+    jobs = [("a", Priority.BATCH)] * 6 + [("b", Priority.BATCH)] * 6
+    task = asyncio.ensure_future(run_jobs(scheduler, jobs, order))
+    await asyncio.sleep(0.01)
+    scheduler.release(blocker)
+    await task
+
+    # 权重为2的租户a在前面获得两倍的份额，而不是先把a的请求全部执行完
+    assert order[:6].count("a") == 4
+    assert order[:6].count("b") == 2
+
+
+@pytest.mark.asyncio
+async def test_cancelled_waiter_leaves_queue():
+    scheduler = FairShareScheduler(default_limit=1)
+    ticket = await scheduler.acquire("fake", "a")
+    waiter = asyncio.ensure_future(scheduler.acquire("fake", "b"))
+    await asyncio.sleep(0)
+    waiter.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await waiter
+
+    scheduler.release(ticket)
+    stats = scheduler.get_stats()["fake"]
+    assert stats["active"] == 0
+    assert stats["interactive"]["waiting"] == 0
+    assert stats["interactive"]["cancelled"] == 1
+
+
+@pytest.mark.asyncio
+async def test_chat_waits_for_scheduler_slot_within_timeout(make_chat):
+    chat = make_chat(FakeAIProvider(reply="收到", first_token_delay=0.05))
+    chat.scheduler = FairShareScheduler(default_limit=1)
+
+    replies = await asyncio.gather(chat.chat("你好"), chat.chat("你好"))
+    assert replies == ["收到", "收到"]
+    stats = chat.scheduler.get_stats()["fake"]["interactive"]
+    assert stats["admitted"] == 2
+    assert stats["max_wait_ms"] > 0
+
+    blocker = await chat.scheduler.acquire("fake", "other")
+    with pytest.raises(ChatTimeoutError):
+        await chat.chat("你好", timeout=0.05)
+    assert len(chat.get_chat_history()) == 4
+    chat.scheduler.release(blocker)
+    assert chat.scheduler.get_stats()["fake"]["active"] == 0
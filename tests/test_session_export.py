@@ -0,0 +1,84 @@
+import gzip
+import json
+
+import pytest
+
+from ai_chat_lib.character_manager import CharacterManager
+from ai_chat_lib.chat_interface import ChatSession, MultiSessionChatInterface
+from ai_chat_lib.fulltext import FullTextIndex
+from ai_chat_lib.models.character import Character, ExampleDialog
+from ai_chat_lib.models.message import Message, MessageRole
+from ai_chat_lib.storage.file_storage import FileStorage
+
+
+def make_chat(tmp_path) -> MultiSessionChatInterface:
+    storage = FileStorage(str(tmp_path / "characters"))
+    storage.save_character(Character("助手", "测试", "你是{{character}}", [ExampleDialog("你好", "你好呀")]))
+    return MultiSessionChatInterface(CharacterManager(storage))
+
+
+@pytest.mark.parametrize("filename", ["sessions.jsonl", "sessions.jsonl.gz"])
+def test_export_import_roundtrip(tmp_path, filename):
+    chat = make_chat(tmp_path)
+    for i in range(3):
+        session_id = chat.create_session(f"s{i}")
+        chat.switch_character("助手", session_id)
+        chat.get_session(session_id).chat_history.append(
+            Message(MessageRole.USER, f"第{i}条\n带换行", metadata={"n": i})
+        )
+    path = str(tmp_path / filename)
+
+    assert chat.export_sessions(path, filter=lambda s: s.session_id != "s1") == 2
+
+    restored = make_chat(tmp_path)
+    assert restored.import_sessions(path, batch_size=1) == 2
+    assert sorted(restored.sessions) == ["s0", "s2"]
+    session = restored.get_session("s2")
+    assert session.character.name == "助手"
+    assert [m.content for m in session.chat_history] == ["你好", "你好呀", "第2条\n带换行"]
+    assert session.chat_history[-1].metadata == {"n": 2}
+    assert session.chat_history[0].metadata is None
+    assert session.chat_history == chat.get_session("s2").chat_history
+    # 已存在的会话默认跳过
+    assert restored.import_sessions(path) == 0
+
+
+def test_export_writes_one_record_per_line(tmp_path):
+    chat = MultiSessionChatInterface()
+    chat.create_session("a")
+    chat.get_session("a").chat_history.append(Message(MessageRole.USER, "hi"))
+    path = str(tmp_path / "out.jsonl.gz")
+    chat.export_sessions(path)
+
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        types = [json.loads(line)["type"] for line in f]
+    assert types == ["header", "session", "message"]
+    # gzip头的XFL字段：9级为2，1级为4，其他级别为0
+    with open(path, "rb") as f:
+        assert f.read(9)[8] == 0
+    chat.export_sessions(path, level=9)
+    with open(path, "rb") as f:
+        assert f.read(9)[8] == 2
+
+
+def test_import_rejects_foreign_file(tmp_path):
+    path = tmp_path / "other.jsonl"
+    path.write_text('{"foo": 1}\n', encoding="utf-8")
+    with pytest.raises(ValueError):
+        MultiSessionChatInterface().import_sessions(str(path))
+
+
+def test_overwriting_import_removes_old_session_from_index(tmp_path):
+    chat = make_chat(tmp_path)
+    chat.create_session("s1")
+    chat.get_session("s1").chat_history.append(Message(MessageRole.USER, "旧的快递问题"))
+    index = FullTextIndex()
+    chat.add_history_listener(index)
+    index.add_session(chat.get_session("s1"))
+    assert len(index.search("快递")) == 1
+
+    replacement = ChatSession("s1", chat_history=[Message(MessageRole.USER, "新的问题")])
+    assert chat.add_sessions([replacement], overwrite=True) == 1
+
+    assert index.search("快递") == []
+    assert chat.get_session("s1") is replacement
@@ -0,0 +1,75 @@
+from ai_chat_lib.models.character import Character, ExampleDialog
+from ai_chat_lib.storage.sqlite_storage import SQLiteStorage
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+
+
+def make_character(name: str, dialogs: int = 2) -> Character:
+    return Character(
+        name=name,
+        description=f"{name}的描述",
+        system_prompt='你是{{character}}，"""引号"""也没问题',
+        example_dialogs=[ExampleDialog(f"问{i}", f"答{i}") for i in range(dialogs)],
+        metadata={"category": "助手", "language": "zh-CN"},
+    )
+
+
+@pytest.fixture
+def storage(tmp_path):
+    storage = SQLiteStorage(str(tmp_path / "characters.db"))
+    yield storage
+    storage.close()
+
+
+def test_save_load_update_delete(storage):
+    assert storage.save_character(make_character("小明", dialogs=3))
+    loaded = storage.load_character("小明")
+    assert loaded.system_prompt == make_character("小明").system_prompt
+    assert [d.user_message for d in loaded.example_dialogs] == ["问0", "问1", "问2"]
+    assert loaded.metadata == {"category": "助手", "language": "zh-CN"}
+
+    # 覆盖保存时示例对话被整体替换
+    assert storage.save_character(make_character("小明", dialogs=1))
+    assert len(storage.load_character("小明").example_dialogs) == 1
+
+    assert storage.delete_character("小明")
+    assert storage.load_character("小明") is None
+    assert not storage.delete_character("小明")
+
+
+def test_bulk_save_and_load(storage):
+    characters = [make_character(f"角色{i:03d}") for i in range(1200)]
+    assert storage.bulk_save(characters) == 1200
+    assert storage.list_characters()[:2] == ["角色000", "角色001"]
+
+    everything = storage.bulk_load()
+    assert len(everything) == 1200
+    some = storage.bulk_load([f"角色{i:03d}" for i in range(0, 1200, 2)] + ["不存在"])
+    assert len(some) == 600
+    assert some["角色010"].example_dialogs[1].character_response == "答1"
+
+
+def test_concurrent_access_from_worker_threads(storage):
+    storage.bulk_save(make_character(f"角色{i}") for i in range(20))
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(lambda i: storage.load_character(f"角色{i % 20}"), range(200)))
+    assert all(result is not None for result in results)
+
+
+@pytest.mark.asyncio
+async def test_async_operations_run_off_loop(storage):
+    assert await storage.save_character_async(make_character("异步角色"))
+    assert await storage.list_characters_async() == ["异步角色"]
+    loaded = await storage.load_character_async("异步角色")
+    assert loaded.name == "异步角色"
+
+
+def test_in_memory_database_is_shared_between_connections():
+    storage = SQLiteStorage(":memory:")
+    try:
+        storage.save_character(make_character("内存角色"))
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            names = list(pool.map(lambda _: storage.list_characters(), range(8)))
+        assert names == [["内存角色"]] * 8
+    finally:
+        storage.close()
@@ -0,0 +1,101 @@
+import time
+
+import pytest
+
+from ai_chat_lib.models.message import MessageRole
+from ai_chat_lib.providers.base import BaseAIProvider, StreamEventType
+from ai_chat_lib.providers.fake_provider import FakeAIProvider
+from ai_chat_lib.providers.openai_base_provider import OpenAIBaseProvider
+
+
+class TextOnlyProvider(BaseAIProvider):
+    def __init__(self):
+        super().__init__("key", "model")
+
+    async def chat_completion(self, system, messages, **kwargs):
+        return "ab"
+
+    async def chat_completion_stream(self, system, messages, **kwargs):
+        yield "a"
+        yield "b"
+
+    def get_provider_name(self):
+        return "text"
+
+    def get_supported_models(self):
+        return ["model"]
+
+
+@pytest.mark.asyncio
+async def test_default_events_wrap_text_stream():
+    events = [event async for event in TextOnlyProvider().chat_completion_events("", [])]
+    assert [event.type for event in events] == [StreamEventType.ANSWER] * 2 + [StreamEventType.COMPLETE]
+    assert events[-1].data["answer"] == "ab"
+
+
+@pytest.mark.asyncio
+async def test_reasoning_kept_in_metadata_not_in_content(make_chat):
+    chat = make_chat(FakeAIProvider(reply="答案是42", reasoning="先想一想", chunk_size=2))
+
+    events = [event async for event in chat.chat_stream_events(
+        "问题", stream_options={"include_usage": True}
+    )]
+
+    types = [event.type for event in events]
+    assert types[:2] == [StreamEventType.REASONING] * 2
+    assert types[-2:] == [StreamEventType.USAGE, StreamEventType.COMPLETE]
+    complete = events[-1].data
+    assert complete["reasoning"] == "先想一想"
+    assert complete["answer"] == "答案是42"
+
+    reply = chat.get_chat_history()[-1]
+    assert complete["message"] is reply
+    assert reply.content == "答案是42"
+    assert reply.metadata["reasoning"] == "先想一想"
+    assert reply.metadata["usage"]["total_tokens"] > 0
+
+    # 再次请求时思考过程不会出现在发给提供商的消息中
+    payload = OpenAIBaseProvider("key", "model")._convert_messages_to_openai_format("", chat.get_chat_history())
+    assert payload[-1] == {"role": "assistant", "content": "答案是42"}
+
+
+@pytest.mark.asyncio
+async def test_chat_stream_yields_only_answer_text(make_chat):
+    chat = make_chat(FakeAIProvider(reply="答案", reasoning="思考", chunk_size=1))
+
+    chunks = [chunk async for chunk in chat.chat_stream("问题")]
+
+    assert chunks == ["答", "案"]
+    metadata = chat.get_chat_history()[-1].metadata
+    assert metadata["reasoning"] == "思考"
+    # 与OpenAI提供商一样默认报告用量
+    assert metadata["usage"]["reasoning_tokens"] == 2
+
+
+@pytest.mark.asyncio
+async def test_partial_reply_keeps_reasoning(make_chat):
+    chat = make_chat(FakeAIProvider(reply="一二三四", reasoning="想", chunk_size=2, fail_after_chunks=1))
+
+    with pytest.raises(Exception):
+        async for _ in chat.chat_stream("问题"):
+            pass
+
+    reply = chat.get_chat_history()[-1]
+    assert reply.role == MessageRole.ASSISTANT
+    assert reply.content == "一二"
+    assert reply.metadata["partial"] is True
+    assert reply.metadata["reasoning"] == "想"
+
+
+@pytest.mark.asyncio
+async def test_fake_reasoning_waits_for_first_token_delay():
+    provider = FakeAIProvider(reply="答案", reasoning="思考", first_token_delay=0.05)
+
+    start = time.monotonic()
+    events = provider.chat_completion_events("", [])
+    first = await events.__anext__()
+    elapsed = time.monotonic() - start
+    await events.aclose()
+
+    assert first.type == StreamEventType.REASONING
+    assert elapsed >= 0.05
@@ -0,0 +1,198 @@
+import asyncio
+
+import pytest
+
+from ai_chat_lib.fulltext import FullTextIndex
+from ai_chat_lib.models.message import MessageRole
+from ai_chat_lib.providers.fake_provider import FakeAIProvider
+from ai_chat_lib.streaming import (
+    BackpressurePolicy, ChunkCoalescer, StreamBroadcaster, SubscriberDisconnected
+)
+
+
+async def delayed(chunks, delays):
+    for chunk, delay in zip(chunks, delays):
+        await asyncio.sleep(delay)
+        yield chunk
+
+
+async def collect(coalescer, stream):
+    return [chunk async for chunk in coalescer.coalesce(stream)]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("max_delay", [None, 10.0])
+async def test_first_chunk_immediate_then_size_and_boundary(max_delay):
+    coalescer = ChunkCoalescer(max_chars=5, max_delay=max_delay)
+    chunks = list("你好啊朋友们今天。天气不错")
+
+    out = await collect(coalescer, delayed(chunks, [0] * len(chunks)))
+
+    assert "".join(out) == "".join(chunks)
+    assert out[0] == "你"
+    assert out[1:] == ["好啊朋友们", "今天。", "天气不错"]
+    stats = coalescer.stats
+    assert (stats.chunks_in, stats.chunks_out) == (len(chunks), 4)
+    assert (stats.flush_first, stats.flush_size, stats.flush_boundary, stats.flush_end) == (1, 1, 1, 1)
+
+
+@pytest.mark.asyncio
+async def test_time_window_flushes_while_provider_stalls():
+    coalescer = ChunkCoalescer(max_chars=100, max_delay=0.02)
+    stream = delayed(["a", "b", "c", "d"], [0, 0, 0, 0.2])
+    received = []
+
+    async for chunk in coalescer.coalesce(stream):
+        received.append((chunk, asyncio.get_running_loop().time()))
+
+    assert [chunk for chunk, _ in received] == ["a", "bc", "d"]
+    assert coalescer.stats.flush_time == 1
+    # "bc"在"d"到达之前就已输出
+    assert received[2][1] - received[1][1] > 0.1
+
+
+@pytest.mark.asyncio
+async def test_chat_stream_coalesces_and_keeps_full_reply(make_chat):
+    provider = FakeAIProvider(reply="一二三四五六七八九十。好", chunk_size=1)
+    chat = make_chat(provider)
+    coalescer = ChunkCoalescer(max_chars=5, max_delay=None)
+
+    chunks = [chunk async for chunk in chat.chat_stream("你好", coalesce=coalescer)]
+
+    assert chunks == ["一", "二三四五六", "七八九十。", "好"]
+    assert chat.get_chat_history()[-1].content == "一二三四五六七八九十。好"
+
+
+@pytest.mark.asyncio
+async def test_broadcast_replays_for_late_joiner_with_one_upstream_call(make_chat):
+    provider = FakeAIProvider(reply="一二三四五六", chunk_size=2, chunk_delay=0.01)
+    chat = make_chat(provider)
+
+    broadcaster = chat.chat_stream_broadcast("你好")
+    first = chat.subscribe_stream()
+    first_chunks = [await first.__anext__()]
+    late = chat.subscribe_stream()
+    live_only = chat.subscribe_stream(from_start=False)
+
+    first_chunks += [chunk async for chunk in first]
+    late_chunks = [chunk async for chunk in late]
+    live_chunks = [chunk async for chunk in live_only]
+
+    assert first_chunks == late_chunks == ["一二", "三四", "五六"]
+    assert live_chunks == ["三四", "五六"]
+    assert provider.call_count == 1
+    await broadcaster.wait()
+    assert chat.get_chat_history()[-1].content == "一二三四五六"
+    assert chat.subscribe_stream() is None
+
+
+async def numbers(count):
+    for i in range(count):
+        yield str(i)
+        await asyncio.sleep(0)
+
+
+@pytest.mark.asyncio
+async def test_slow_subscribers_follow_their_policy_without_stalling_upstream():
+    broadcaster = StreamBroadcaster(numbers(20), replay_size=8).start()
+    drop = broadcaster.subscribe(BackpressurePolicy.DROP, max_lag=3)
+    disconnect = broadcaster.subscribe(BackpressurePolicy.DISCONNECT, max_lag=3)
+    buffered = broadcaster.subscribe(BackpressurePolicy.BUFFER)
+
+    await broadcaster.wait()
+
+    assert [chunk async for chunk in drop] == ["17", "18", "19"]
+    assert drop.dropped == 17
+    with pytest.raises(SubscriberDisconnected):
+        await disconnect.__anext__()
+    with pytest.raises(SubscriberDisconnected):
+        await buffered.__anext__()
+    assert broadcaster.subscriber_count == 0
+
+
+@pytest.mark.asyncio
+async def test_partial_response_is_kept_and_can_be_continued(make_chat):
+    provider = FakeAIProvider(reply="一二三四五六", chunk_size=2, fail_after_chunks=2)
+    chat = make_chat(provider)
+
+    received = []
+    with pytest.raises(Exception):
+        async for chunk in chat.chat_stream("你好"):
+            received.append(chunk)
+
+    history = chat.get_chat_history()
+    assert received == ["一二", "三四"]
+    assert [m.role for m in history] == [MessageRole.USER, MessageRole.ASSISTANT]
+    assert history[-1].content == "一二三四"
+    assert history[-1].metadata["partial"] is True
+
+    provider.fail_after_chunks = None
+    provider.reply = "五六"
+    continued = [chunk async for chunk in chat.continue_response()]
+
+    assert continued == ["五六"]
+    message = chat.get_chat_history()[-1]
+    assert message.content == "一二三四五六"
+    assert "partial" not in message.metadata
+    with pytest.raises(ValueError):
+        [chunk async for chunk in chat.continue_response()]
+
+
+@pytest.mark.asyncio
+async def test_continued_reply_replaces_indexed_partial(make_chat):
+    provider = FakeAIProvider(reply="苹果香蕉", chunk_size=2, fail_after_chunks=1)
+    chat = make_chat(provider)
+    index = FullTextIndex()
+    chat.add_history_listener(index)
+    with pytest.raises(Exception):
+        async for _ in chat.chat_stream("你好"):
+            pass
+    assert [hit.message.content for hit in index.search("苹果")] == ["苹果"]
+
+    provider.fail_after_chunks = None
+    provider.reply = "葡萄"
+    [chunk async for chunk in chat.continue_response()]
+    assert [hit.message.content for hit in index.search("苹果")] == ["苹果葡萄"]
+    assert len(index) == 2
+
+
+@pytest.mark.asyncio
+async def test_client_disconnect_keeps_partial_or_rolls_back(make_chat):
+    chat = make_chat(FakeAIProvider(reply="一二三四五六", chunk_size=2))
+
+    stream = chat.chat_stream("你好")
+    assert await stream.__anext__() == "一二"
+    await stream.aclose()
+    history = chat.get_chat_history()
+    assert [m.role for m in history] == [MessageRole.USER, MessageRole.ASSISTANT]
+    assert history[-1].content == "一二"
+    assert history[-1].metadata["partial"] is True
+    assert history[-1].metadata["error"] == "GeneratorExit"
+
+    chat.clear_history()
+    chat.get_session("test").provider = FakeAIProvider(reply="一二", first_token_delay=5)
+    task = asyncio.ensure_future(chat.chat_stream("你好").__anext__())
+    await asyncio.sleep(0.05)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    assert chat.get_chat_history() == []
+
+
+@pytest.mark.asyncio
+async def test_resume_stream_from_chunk_or_byte_offset(make_chat):
+    chat = make_chat(FakeAIProvider(reply="ab你好cd", chunk_size=3))
+    broadcaster = chat.chat_stream_broadcast("你好", stream_options=None)
+    await broadcaster.wait()
+    stream_id = broadcaster.stream_id
+
+    assert chat.get_chat_history()[-1].metadata == {"stream_id": stream_id}
+    assert [c async for c in chat.resume_stream(stream_id, chunk_offset=1)] == ["好cd"]
+    # "ab你" 是5个字节，从第3个字节开始是"你"
+    assert [c async for c in chat.resume_stream(stream_id, byte_offset=2)] == ["你", "好cd"]
+    assert [c async for c in chat.resume_stream(stream_id, byte_offset=5)] == ["好cd"]
+    assert [c async for c in chat.resume_stream(stream_id, byte_offset=10)] == []
+    with pytest.raises(ValueError):
+        chat.resume_stream(stream_id, byte_offset=3)
+    with pytest.raises(ValueError):
+        chat.resume_stream("missing", chunk_offset=0)
@@ -0,0 +1,71 @@
+import threading
+
+import pytest
+
+from ai_chat_lib.models.message import MessageRole
+from ai_chat_lib.providers.fake_provider import FakeAIProvider
+from ai_chat_lib.sync_client import SyncChatClient
+
+
+@pytest.fixture
+def client(make_chat):
+    client = SyncChatClient(make_chat(FakeAIProvider(reply="一二三四五六", chunk_size=2)))
+    yield client
+    client.close()
+
+
+def test_chat_and_stream_from_sync_code(client):
+    assert client.chat("你好", session_id="test") == "一二三四五六"
+    assert list(client.chat_stream("再见", session_id="test")) == ["一二", "三四", "五六"]
+    history = client.get_chat_history("test")
+    assert [m.role for m in history] == [MessageRole.USER, MessageRole.ASSISTANT] * 2
+
+
+def test_breaking_out_of_stream_keeps_session_usable(client):
+    stream = client.chat_stream("你好", session_id="test")
+    for chunk in stream:
+        break
+    stream.close()
+
+    # 提前结束时保留用户消息和已输出的部分回复
+    history = client.get_chat_history("test")
+    assert [(m.role, m.content) for m in history] == [(MessageRole.USER, "你好"), (MessageRole.ASSISTANT, "一二")]
+    assert history[-1].metadata["partial"] is True
+
+    assert client.chat("再问一次", session_id="test") == "一二三四五六"
+    assert [m.content for m in client.get_chat_history("test")] == ["你好", "一二", "再问一次", "一二三四五六"]
+
+
+def test_many_threads_share_one_loop(client):
+    loops = set()
+    errors = []
+
+    def worker(index: int):
+        session_id = f"s{index}"
+        try:
+            client.create_session(session_id)
+            session = client.get_session(session_id)
+            client.call(setattr, session, "character", client.get_session("test").character)
+            client.call(setattr, session, "provider", FakeAIProvider(reply="收到"))
+            for _ in range(5):
+                assert client.chat("你好", session_id=session_id) == "收到"
+            loops.add(client.call(lambda: threading.current_thread().name))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert loops == {"ai_chat_loop"}
+    assert all(len(client.get_chat_history(f"s{i}")) == 10 for i in range(8))
+
+
+def test_closed_client_rejects_calls(make_chat):
+    client = SyncChatClient(make_chat())
+    client.close()
+    with pytest.raises(RuntimeError):
+        client.chat("你好", session_id="test")
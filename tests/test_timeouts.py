@@ -0,0 +1,111 @@
+import asyncio
+import time
+
+import pytest
+
+from ai_chat_lib.models.message import MessageRole
+from ai_chat_lib.providers.fake_provider import FakeAIProvider
+from ai_chat_lib import timeouts as timeouts_module
+from ai_chat_lib.timeouts import ChatTimeoutError, ChatTimeouts, guard_stream, wait_with_timeout
+
+
+def test_resolve_combines_total_and_deadline():
+    assert ChatTimeouts.resolve() is None
+
+    timeouts = ChatTimeouts.resolve(10.0, deadline=time.monotonic() + 1.0)
+    assert timeouts.total == 10.0
+    assert timeouts.remaining() <= 1.0
+    assert timeouts.phase_timeout("first_token")[1] == "total"
+
+    default = ChatTimeouts(first_token=0.5)
+    timeouts = ChatTimeouts.resolve(None, default=default)
+    assert timeouts.phase_timeout("first_token") == (0.5, "first_token")
+    assert default.deadline is None
+
+
+@pytest.mark.asyncio
+async def test_first_token_timeout_removes_user_message(make_chat):
+    chat = make_chat(FakeAIProvider(reply="收到", first_token_delay=1.0))
+
+    with pytest.raises(ChatTimeoutError) as exc_info:
+        async for _ in chat.chat_stream("你好", timeout=ChatTimeouts(first_token=0.05)):
+            pass
+
+    assert exc_info.value.phase == "first_token"
+    assert chat.get_chat_history() == []
+
+
+@pytest.mark.asyncio
+async def test_chunk_gap_timeout_keeps_partial_reply(make_chat):
+    chat = make_chat(FakeAIProvider(reply="一二三四五六", chunk_size=2, chunk_delay=1.0))
+
+    received = []
+    with pytest.raises(ChatTimeoutError) as exc_info:
+        async for chunk in chat.chat_stream("你好", timeout=ChatTimeouts(chunk_gap=0.05)):
+            received.append(chunk)
+
+    assert exc_info.value.phase == "chunk_gap"
+    assert received == ["一二"]
+    history = chat.get_chat_history()
+    assert history[-1].role == MessageRole.ASSISTANT
+    assert history[-1].content == "一二"
+    assert history[-1].metadata["partial"] is True
+
+
+@pytest.mark.asyncio
+async def test_total_timeout_and_default_timeouts_for_chat(make_chat):
+    chat = make_chat(FakeAIProvider(reply="收到", first_token_delay=1.0))
+    chat.default_timeouts = ChatTimeouts(total=0.05)
+
+    start = time.monotonic()
+    with pytest.raises(ChatTimeoutError) as exc_info:
+        await chat.chat("你好")
+
+    assert exc_info.value.phase == "total"
+    assert time.monotonic() - start < 0.5
+    assert chat.get_chat_history() == []
+
+    # 单次调用的设置覆盖默认设置
+    chat.get_session("test").provider = FakeAIProvider(reply="收到")
+    assert await chat.chat("你好", timeout=1.0) == "收到"
+
+
+@pytest.mark.asyncio
+async def test_guard_stream_closes_upstream_on_timeout():
+    closed = []
+
+    async def upstream():
+        try:
+            yield "a"
+            await asyncio.sleep(1.0)
+            yield "b"
+        finally:
+            closed.append(True)
+
+    timeouts = ChatTimeouts.resolve(ChatTimeouts(chunk_gap=0.05))
+    with pytest.raises(ChatTimeoutError):
+        async for _ in guard_stream(upstream(), timeouts):
+            pass
+
+    assert closed == [True]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("native", [True, False])
+async def test_only_own_deadline_becomes_chat_timeout(monkeypatch, native):
+    if not native:
+        monkeypatch.setattr(timeouts_module, "_asyncio_timeout", None)
+
+    async def inner_timeout():
+        raise asyncio.TimeoutError("工具自己的超时")
+
+    # 操作内部的超时原样抛出，不算作本阶段超时
+    with pytest.raises(asyncio.TimeoutError) as info:
+        await wait_with_timeout(inner_timeout(), ChatTimeouts(total=1).start())
+    assert not isinstance(info.value, ChatTimeoutError)
+
+    with pytest.raises(ChatTimeoutError) as info:
+        await wait_with_timeout(asyncio.sleep(1), ChatTimeouts(total=0.02).start())
+    assert info.value.phase == "total"
+
+    assert await wait_with_timeout(asyncio.sleep(0, "完成"), ChatTimeouts(total=1).start()) == "完成"
@@ -0,0 +1,185 @@
+import asyncio
+import functools
+import threading
+import time
+
+import pytest
+
+from ai_chat_lib.models.message import MessageRole
+from ai_chat_lib.providers.base import StreamEventType
+from ai_chat_lib.providers.fake_provider import FakeAIProvider
+from ai_chat_lib.providers.openai_base_provider import OpenAIBaseProvider
+from ai_chat_lib.tools import Tool, ToolCall, ToolExecutor, ToolRegistry
+
+
+async def slow_weather(city: str) -> dict:
+    await asyncio.sleep(0.1)
+    return {"city": city, "weather": "晴"}
+
+
+def slow_time() -> str:
+    time.sleep(0.1)
+    return "12:00"
+
+
+async def hang() -> str:
+    await asyncio.sleep(10)
+    return "不会返回"
+
+
+def make_registry() -> ToolRegistry:
+    registry = ToolRegistry()
+    registry.register(Tool("weather", "查询天气", slow_weather,
+                           {"type": "object", "properties": {"city": {"type": "string"}}}))
+    registry.register(Tool("time", "当前时间", slow_time))
+    registry.register(Tool("hang", "不会结束", hang, timeout=0.05))
+    return registry
+
+
+@pytest.mark.asyncio
+async def test_tools_run_concurrently_with_per_tool_timeout():
+    registry = make_registry()
+    executor = ToolExecutor(max_workers=4)
+    calls = [
+        ToolCall("1", "weather", {"city": "北京"}),
+        ToolCall("2", "weather", {"city": "上海"}),
+        ToolCall("3", "time", {}),
+        ToolCall("4", "time", {}),
+        ToolCall("5", "hang", {}),
+        ToolCall("6", "missing", {}),
+        ToolCall("7", "weather", "{不是JSON"),
+    ]
+
+    start = time.monotonic()
+    results = await executor.execute(calls, registry.resolve(registry.list_tools()))
+    elapsed = time.monotonic() - start
+    executor.close()
+
+    # 总耗时接近最慢的一个工具，而不是所有工具之和
+    assert elapsed < 0.3
+    assert [r.call.id for r in results] == [c.id for c in calls]
+    assert results[0].content == '{"city": "北京", "weather": "晴"}'
+    assert results[2].content == "12:00"
+    assert "超时" in results[4].error
+    assert "不存在" in results[5].error
+    assert "JSON" in results[6].error
+
+
+@pytest.mark.asyncio
+async def test_chat_feeds_tool_results_back_until_final_reply(make_chat):
+    provider = FakeAIProvider(reply="北京和上海都是晴天", tool_rounds=[[
+        ToolCall("call_1", "weather", {"city": "北京"}),
+        ToolCall("call_2", "weather", {"city": "上海"}),
+    ]])
+    chat = make_chat(provider)
+    chat.tool_registry = make_registry()
+    chat.get_session("test").character.metadata = {"tools": ["weather"]}
+
+    reply = await chat.chat("北京和上海天气怎么样？")
+
+    assert reply == "北京和上海都是晴天"
+    history = chat.get_chat_history()
+    assert [m.role for m in history] == [
+        MessageRole.USER, MessageRole.ASSISTANT, MessageRole.TOOL, MessageRole.TOOL, MessageRole.ASSISTANT
+    ]
+    assert [c["id"] for c in history[1].metadata["tool_calls"]] == ["call_1", "call_2"]
+    assert history[2].metadata == {"tool_call_id": "call_1", "name": "weather"}
+
+    payload = OpenAIBaseProvider("key", "model")._convert_messages_to_openai_format("", history)
+    assert payload[1]["tool_calls"][0]["function"] == {"name": "weather", "arguments": '{"city": "北京"}'}
+    assert payload[2] == {"role": "tool", "content": history[2].content, "tool_call_id": "call_1"}
+
+
+@pytest.mark.asyncio
+async def test_chat_stream_with_tools_outputs_final_reply(make_chat):
+    provider = FakeAIProvider(reply="现在12点", tool_rounds=[[ToolCall("call_1", "time", {})]])
+    chat = make_chat(provider)
+    chat.tool_registry = make_registry()
+
+    chunks = [chunk async for chunk in chat.chat_stream("几点了？", tools=["time"])]
+
+    assert "".join(chunks) == "现在12点"
+    assert chat.get_chat_history()[-1].content == "现在12点"
+
+
+@pytest.mark.asyncio
+async def test_unknown_tool_rolls_back_turn(make_chat):
+    chat = make_chat()
+
+    with pytest.raises(ValueError):
+        await chat.chat("你好", tools=["missing"])
+
+    assert chat.get_chat_history() == []
+
+
+async def greet(name: str, greeting: str) -> str:
+    await asyncio.sleep(0)
+    return f"{greeting}，{name}"
+
+
+class AsyncCallable:
+    async def __call__(self, name: str) -> str:
+        return f"对象：{name}"
+
+
+def returns_coroutine(name: str):
+    # 普通函数返回协程，在线程池中调用后回到事件循环等待
+    return greet(name, "嗨")
+
+
+@pytest.mark.asyncio
+async def test_async_partials_callables_and_awaitable_results_are_awaited():
+    tools = [
+        Tool("partial", "", functools.partial(greet, greeting="你好")),
+        Tool("object", "", AsyncCallable()),
+        Tool("wrapper", "", returns_coroutine),
+    ]
+    executor = ToolExecutor()
+    calls = [ToolCall("1", "partial", {"name": "甲"}), ToolCall("2", "object", {"name": "乙"}),
+             ToolCall("3", "wrapper", {"name": "丙"})]
+
+    results = await executor.execute(calls, tools)
+    executor.close()
+
+    assert [r.content for r in results] == ["你好，甲", "对象：乙", "嗨，丙"]
+    assert all(r.error is None for r in results)
+
+
+@pytest.mark.asyncio
+async def test_hung_sync_tools_do_not_queue_forever():
+    release = threading.Event()
+    tool = Tool("stuck", "", lambda: release.wait(5), timeout=0.05)
+    executor = ToolExecutor(max_workers=1)
+
+    first = await executor.execute([ToolCall("1", "stuck", {})], [tool])
+    # 唯一的线程仍被超时的调用占用，新的调用直接返回错误
+    second = await executor.execute([ToolCall("2", "stuck", {})], [tool])
+    assert "超时" in first[0].error
+    assert "线程池" in second[0].error
+    assert executor.stuck_calls == 1
+
+    release.set()
+    await asyncio.sleep(0.05)
+    assert executor.stuck_calls == 0
+    executor.close()
+
+
+@pytest.mark.asyncio
+async def test_chat_stream_events_streams_final_round_after_tools(make_chat):
+    provider = FakeAIProvider(reply="现在是十二点整", chunk_size=2,
+                              tool_rounds=[[ToolCall("call_1", "time", {})]])
+    chat = make_chat(provider)
+    chat.tool_registry = make_registry()
+
+    events = [event async for event in chat.chat_stream_events("几点了？", tools=["time"])]
+    types = [event.type for event in events]
+
+    assert types[0] == StreamEventType.TOOL_CALLS
+    answers = [event.data for event in events if event.type == StreamEventType.ANSWER]
+    # 最终回复按分片流式输出，而不是一次性输出
+    assert answers == ["现在", "是十", "二点", "整"]
+    assert events[-1].data["answer"] == "现在是十二点整"
+    history = chat.get_chat_history()
+    assert [m.role for m in history] == [MessageRole.USER, MessageRole.ASSISTANT, MessageRole.TOOL,
+                                         MessageRole.ASSISTANT]
+    assert history[2].content == "12:00"
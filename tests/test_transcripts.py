@@ -0,0 +1,138 @@
+import asyncio
+import json
+import threading
+import time
+
+import pytest
+
+from ai_chat_lib.chat_interface import ChatSession
+from ai_chat_lib.models.message import Message, MessageRole
+from ai_chat_lib.providers.fake_provider import FakeAIProvider
+from ai_chat_lib.transcripts import (
+    BufferedTranscriptSink, JsonlTranscriptSink, MarkdownTranscriptSink, OverflowPolicy,
+    RotatingFileTranscriptSink, TranscriptRecord,
+)
+
+
+class BlockedSink(BufferedTranscriptSink):
+    """写入被阻塞的记录器，用于测试队列满的情况"""
+
+    def __init__(self, **kwargs):
+        self.release = threading.Event()
+        self.records = []
+        super().__init__(**kwargs)
+
+    def write_batch(self, records):
+        self.release.wait(5)
+        self.records.extend(records)
+
+
+def make_record(content: str) -> TranscriptRecord:
+    return TranscriptRecord.from_message(ChatSession("test"), Message(MessageRole.USER, content))
+
+
+@pytest.mark.asyncio
+async def test_jsonl_and_markdown_sinks_record_turns(make_chat, tmp_path):
+    chat = make_chat(FakeAIProvider(reply="收到"))
+    jsonl = JsonlTranscriptSink(str(tmp_path / "chat.jsonl"), flush_interval=10)
+    markdown = MarkdownTranscriptSink(str(tmp_path / "logs" / "chat.md"), user_label="我")
+    chat.add_transcript_sink(jsonl)
+    chat.add_transcript_sink(markdown)
+
+    await chat.chat("你好")
+    async for _ in chat.chat_stream("再见"):
+        pass
+    assert jsonl.flush(5)
+
+    lines = [json.loads(line) for line in (tmp_path / "chat.jsonl").read_text(encoding="utf-8").splitlines()]
+    assert [(line["role"], line["content"]) for line in lines] == [
+        ("user", "你好"), ("assistant", "收到"), ("user", "再见"), ("assistant", "收到"),
+    ]
+    # 4条消息在一批中写入
+    assert jsonl.stats["batches"] == 1
+
+    chat.remove_transcript_sink(markdown)
+    text = (tmp_path / "logs" / "chat.md").read_text(encoding="utf-8")
+    assert text.startswith("### 我（test · ")
+    assert "### 测试角色（test · " in text
+    jsonl.close()
+
+
+def test_rotating_sink_keeps_backups(tmp_path):
+    path = tmp_path / "chat.jsonl"
+    sink = RotatingFileTranscriptSink(str(path), max_bytes=100, backup_count=2, flush_size=1)
+    for i in range(6):
+        sink.submit(make_record("很长的一条消息" * 5))
+    sink.close()
+
+    assert path.exists() and (tmp_path / "chat.jsonl.1").exists() and (tmp_path / "chat.jsonl.2").exists()
+    assert not (tmp_path / "chat.jsonl.3").exists()
+    assert sink.stats["written"] == 6
+
+
+def test_drop_policy_never_blocks_when_queue_is_full():
+    sink = BlockedSink(flush_size=1, max_queue=2)
+    results = [sink.submit(make_record(str(i))) for i in range(6)]
+    # 写入线程取走一条后阻塞，队列中还能放两条
+    assert results.count(False) >= 3
+    assert sink.stats["dropped"] == results.count(False)
+    sink.release.set()
+    sink.close()
+    assert len(sink.records) == results.count(True)
+
+
+def test_block_policy_waits_for_space():
+    sink = BlockedSink(flush_size=1, max_queue=1, policy=OverflowPolicy.BLOCK, block_timeout=5)
+    threading.Timer(0.1, sink.release.set).start()
+    assert all(sink.submit(make_record(str(i))) for i in range(4))
+    sink.close()
+    assert [r.content for r in sink.records] == ["0", "1", "2", "3"]
+
+
+@pytest.mark.asyncio
+async def test_block_policy_does_not_block_event_loop():
+    sink = BlockedSink(flush_size=1, max_queue=2, policy=OverflowPolicy.BLOCK, block_timeout=5)
+    loop = asyncio.get_running_loop()
+    loop.call_later(0.1, sink.release.set)
+
+    start = time.monotonic()
+    assert all([sink.submit(make_record(str(i))) for i in range(4)])
+    # 放不下的记录在事件循环中等待，submit立即返回
+    assert time.monotonic() - start < 0.05
+    for _ in range(100):
+        if sink.stats["queued"] == 4:
+            break
+        await asyncio.sleep(0.02)
+    sink.close()
+    assert [r.content for r in sink.records] == ["0", "1", "2", "3"]
+    assert sink.stats["dropped"] == 0
+
+
+@pytest.mark.asyncio
+async def test_block_policy_in_event_loop_drops_after_timeout():
+    sink = BlockedSink(flush_size=1, max_queue=1, policy=OverflowPolicy.BLOCK, block_timeout=0.05)
+    sink.submit(make_record("0"))
+    # 等写入线程取走第一条后阻塞
+    await asyncio.sleep(0.05)
+    results = [sink.submit(make_record(str(i))) for i in range(1, 4)]
+    await asyncio.sleep(0.2)
+
+    # "1"进入队列，"2"暂存后等待超时被丢弃，"3"超过暂存上限直接丢弃
+    assert results == [True, True, False]
+    assert sink.stats["queued"] == 2
+    assert sink.stats["dropped"] == 2
+    sink.release.set()
+    sink.close()
+
+
+def test_flush_respects_timeout_when_queue_is_full():
+    sink = BlockedSink(flush_size=1, max_queue=1)
+    for i in range(3):
+        sink.submit(make_record(str(i)))
+
+    start = time.monotonic()
+    assert sink.flush(0.1) is False
+    assert time.monotonic() - start < 1
+    sink.release.set()
+    assert sink.flush(5)
+    sink.close()
@@ -0,0 +1,69 @@
+import pytest
+
+from ai_chat_lib.providers.fake_provider import FakeAIProvider
+from ai_chat_lib.usage import (
+    Budget, BudgetExceededError, PriceTable, UsageLedger, capture_usage, report_usage
+)
+
+
+def test_capture_usage_collects_reports():
+    report_usage({"prompt_tokens": 1})
+    with capture_usage() as captured:
+        report_usage({"prompt_tokens": 2})
+        report_usage(None)
+    assert captured == [{"prompt_tokens": 2}]
+
+
+def test_ledger_prices_and_scopes():
+    prices = PriceTable()
+    prices.set_price("fake", "*", input=1.0, output=2.0)
+    prices.set_price("fake", "big", input=10.0, output=20.0)
+    ledger = UsageLedger(prices)
+
+    usage = {"prompt_tokens": 1_000_000, "completion_tokens": 500_000, "total_tokens": 1_500_000}
+    assert ledger.record(usage, "s1", "t", "角色", "fake", "small") == 2.0
+    assert ledger.record(usage, "s2", "t", "角色", "fake", "big") == 20.0
+
+    assert ledger.get_totals("tenant", "t").cost == 22.0
+    assert ledger.get_totals("session", "s1").total_tokens == 1_500_000
+    assert ledger.get_summary("model")["fake/big"]["requests"] == 1
+    assert ledger.get_totals("session", "missing").requests == 0
+
+
+@pytest.mark.asyncio
+async def test_chat_records_reported_or_estimated_usage(make_chat):
+    chat = make_chat(FakeAIProvider(reply="一二三四"))
+    chat.usage_ledger = UsageLedger()
+
+    await chat.chat("你好")
+    totals = chat.usage_ledger.get_totals("session", "test")
+    assert totals.requests == 1
+    assert totals.estimated_requests == 1
+    assert totals.completion_tokens == 4
+
+    chunks = [c async for c in chat.chat_stream("你好", stream_options={"include_usage": True})]
+    assert "".join(chunks) == "一二三四"
+    totals = chat.usage_ledger.get_totals("character", "测试角色")
+    assert totals.requests == 2
+    assert totals.estimated_requests == 1
+    assert chat.get_chat_history()[-1].metadata["usage"]["completion_tokens"] == 4
+
+
+@pytest.mark.asyncio
+async def test_budget_rejects_or_downgrades_before_sending(make_chat):
+    provider = FakeAIProvider(reply="收到")
+    chat = make_chat(provider)
+    chat.usage_ledger = UsageLedger()
+    chat.usage_ledger.set_budget(Budget(max_tokens=1), session_id="test")
+
+    await chat.chat("你好")
+    with pytest.raises(BudgetExceededError) as exc_info:
+        await chat.chat("你好")
+    assert exc_info.value.scope == "session"
+    assert provider.call_count == 1
+    assert len(chat.get_chat_history()) == 2
+
+    chat.usage_ledger.set_budget(Budget(max_tokens=1, downgrade_model="fake-mini"), tenant="test")
+    chat.usage_ledger.set_budget(None, session_id="test")
+    await chat.chat("你好")
+    assert chat.usage_ledger.get_totals("model", "fake/fake-mini").requests == 1